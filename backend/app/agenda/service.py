@@ -22,8 +22,10 @@ from app.core.exceptions import (
     SlotUnavailableError,
     ValidationError,
 )
+from app.core.outbox import Evento, registrar_eventos
 from app.core.security import CurrentUser
 from app.core.utils import now_brasilia, today_brasilia
+from app.cards.transicoes import get_tabela_transicoes
 from app.agenda.schemas import (
     AgendamentoCreate,
     AgendamentoResponse,
@@ -658,19 +660,17 @@ class AgendaService:
             if existente:
                 return  # Já existe checklist
 
-            # Busca template do checklist
-            template = await db.select(
-                table="checklist_templates",
-                filters={"fase": fase, "tipo_card": tipo_card, "ativo": True},
-                order_by="posicao"
-            )
+            # Templates vêm da tabela compilada da clínica
+            tabela = await get_tabela_transicoes(db, clinica_id)
+            template = tabela.templates_checklist(fase, tipo_card)
 
             if not template:
                 return  # Sem template, não cria checklist
 
             # Cria itens do checklist
-            for item in template:
-                await db.insert(table="cards_checklist", data={
+            agora = now_brasilia().isoformat()
+            await db.insert_many(table="cards_checklist", data=[
+                {
                     "card_id": card_id,
                     "fase": fase,
                     "item_key": item.get("item_key", ""),
@@ -679,8 +679,10 @@ class AgendaService:
                     "obrigatorio": item.get("obrigatorio", False),
                     "ordem": item.get("ordem", item.get("posicao", 0)),
                     "concluido": False,
-                    "created_at": now_brasilia().isoformat()
-                })
+                    "created_at": agora
+                }
+                for item in template
+            ])
         except Exception as e:
             logger.warning("Erro ao criar checklist", card_id=card_id, fase=fase, erro=str(e))
 
@@ -704,46 +706,41 @@ class AgendaService:
             agora = now_brasilia()
             update_data = {"updated_at": agora.isoformat(), "ultima_interacao": agora.isoformat()}
 
-            # Mapeamento de status do agendamento para ações no card
-            if status == "confirmado":
-                # Marca checklist "confirmacao" como concluído
-                await self._marcar_checklist_card(db, card_id, 1, "confirmacao")
-            elif status == "aguardando":
-                # Move card para Fase 2 se ainda estiver na Fase 1
-                if card.get("fase") == 1:
+            # Efeito do status vem da tabela compilada de transições
+            tabela = await get_tabela_transicoes(db, card.get("clinica_id"))
+            efeito = tabela.efeito_status(status)
+            if not efeito:
+                return
+
+            fase_atual = card.get("fase")
+            tipo_card = card.get("tipo_card", "primeira_consulta")
+            move = efeito.fase_destino is not None and (
+                efeito.fase_origem is None or fase_atual == efeito.fase_origem
+            )
+
+            if move:
+                update_data["fase"] = efeito.fase_destino
+                update_data["coluna"] = efeito.coluna
+                if efeito.reativar:
                     update_data.update({
-                        "fase": 2,
-                        "coluna": "aguardando_checkin",
-                        "fase2_em": agora.isoformat()
+                        "agendamento_id": None,
+                        "data_agendamento": None,
+                        "hora_agendamento": None,
+                        "em_reativacao": True,
+                        "status": efeito.status_card
                     })
-                    await self._criar_checklist_card(db, card_id, card.get("clinica_id"), 2, card.get("tipo_card", "primeira_consulta"))
-                # Marca checklist "checkin" como concluído
-                await self._marcar_checklist_card(db, card_id, 2, "checkin")
-            elif status == "em_atendimento":
-                # Atualiza coluna
-                if card.get("fase") == 2:
-                    update_data["coluna"] = "em_atendimento"
-                # Marca checklist "em_atendimento" como concluído
-                await self._marcar_checklist_card(db, card_id, 2, "em_atendimento")
-            elif status == "atendido":
-                # Move card para Fase 3
-                update_data.update({
-                    "fase": 3,
-                    "coluna": "pendente_documentos",
-                    "fase3_em": agora.isoformat()
-                })
-                await self._criar_checklist_card(db, card_id, card.get("clinica_id"), 3, card.get("tipo_card", "primeira_consulta"))
-            elif status in ("cancelado", "faltou"):
-                # Move card de volta para Fase 0 (reativação)
-                update_data.update({
-                    "fase": 0,
-                    "coluna": "pre_agendamento",
-                    "agendamento_id": None,
-                    "data_agendamento": None,
-                    "hora_agendamento": None,
-                    "em_reativacao": True,
-                    "status": "ativo" if status == "cancelado" else "no_show"
-                })
+                else:
+                    update_data[f"fase{efeito.fase_destino}_em"] = agora.isoformat()
+                if efeito.criar_checklist:
+                    await self._criar_checklist_card(
+                        db, card_id, card.get("clinica_id"), efeito.fase_destino, tipo_card
+                    )
+            elif efeito.coluna and efeito.coluna_se_fase == fase_atual:
+                update_data["coluna"] = efeito.coluna
+
+            if efeito.marcar_item:
+                fase_item, item_key = efeito.marcar_item
+                await self._marcar_checklist_card(db, card_id, fase_item, item_key)
 
             if len(update_data) > 2:  # Mais que updated_at e ultima_interacao
                 await db.update(table="cards", data=update_data, filters={"id": card_id})
@@ -751,6 +748,62 @@ class AgendaService:
         except Exception as e:
             logger.warning("Erro ao atualizar card por status", agendamento_id=agendamento_id, status=status, erro=str(e))
 
+    # ==========================================
+    # EVENTOS (OUTBOX)
+    # ==========================================
+
+    async def _registrar_eventos_criacao(
+        self,
+        agendamento: dict,
+        paciente: dict,
+        medico: dict,
+        card_id: Optional[str]
+    ) -> None:
+        """
+        Confirmação no Kestra e trigger de governança do card.
+        Só grava na outbox (um insert): a entrega sai fora da requisição.
+        """
+        agendamento_id = agendamento["id"]
+        clinica_id = agendamento.get("clinica_id")
+        telefone = paciente.get("celular") or paciente.get("whatsapp") or paciente.get("telefone") or ""
+        chave_ordem = f"agendamento:{agendamento_id}"
+
+        eventos = [Evento(
+            "kestra", "confirmacao-consulta",
+            {
+                "agendamento_id": agendamento_id,
+                "paciente_telefone": telefone,
+                "paciente_nome": paciente.get("nome", ""),
+                "medico_nome": medico.get("nome", ""),
+                "data": str(agendamento.get("data", "")),
+                "hora": str(agendamento.get("hora_inicio", ""))[:5],
+                "clinica_id": clinica_id,
+            },
+            clinica_id=clinica_id,
+            chave_dedupe=f"kestra:confirmacao-consulta:{agendamento_id}",
+            chave_ordem=chave_ordem
+        )]
+
+        if card_id:
+            eventos.append(Evento(
+                "governanca", "card_criado",
+                {
+                    "card_id": card_id,
+                    "agendamento": {
+                        "id": agendamento_id,
+                        "data": str(agendamento.get("data", "")),
+                        "hora_inicio": str(agendamento.get("hora_inicio", "")),
+                        "medico_id": agendamento.get("medico_id"),
+                    },
+                    "paciente": {"nome": paciente.get("nome"), "telefone": telefone},
+                },
+                clinica_id=clinica_id,
+                chave_dedupe=f"governanca:card_criado:{card_id}:{agendamento_id}",
+                chave_ordem=chave_ordem
+            ))
+
+        await registrar_eventos(eventos)
+
     # ==========================================
     # CRUD
     # ==========================================
@@ -894,6 +947,8 @@ class AgendaService:
             # Atualiza o agendamento com card_id
             await db.update(table=self.TABLE, data={"card_id": card_id}, filters={"id": agendamento["id"]})
 
+        await self._registrar_eventos_criacao(agendamento, paciente, medico, card_id)
+
         return await self.get(agendamento["id"], current_user)
 
     async def update(
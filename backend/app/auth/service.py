@@ -9,7 +9,6 @@ from datetime import datetime
 from functools import lru_cache
 from typing import Any
 
-import httpx
 import jwt
 import structlog
 from fastapi import HTTPException, status
@@ -17,6 +16,7 @@ from jwt.algorithms import ECAlgorithm, RSAAlgorithm
 from supabase import create_client
 
 from app.core.config import settings
+from app.core.http import get_http_client
 from app.auth.schemas import (
     LoginRequest,
     LoginResponse,
@@ -53,12 +53,12 @@ async def _fetch_jwks() -> dict[str, Any]:
     jwks_url = _get_jwks_url()
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(jwks_url)
-            response.raise_for_status()
-            _jwks_cache = response.json()
-            logger.debug("JWKS carregado com sucesso", keys_count=len(_jwks_cache.get("keys", [])))
-            return _jwks_cache
+        client = get_http_client("auth")
+        response = await client.get(jwks_url)
+        response.raise_for_status()
+        _jwks_cache = response.json()
+        logger.debug("JWKS carregado com sucesso", keys_count=len(_jwks_cache.get("keys", [])))
+        return _jwks_cache
     except Exception as e:
         logger.error("Erro ao buscar JWKS", url=jwks_url, error=str(e))
         raise HTTPException(
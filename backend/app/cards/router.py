@@ -24,6 +24,8 @@ from app.cards.schemas import (
     CardHistoricoResponse,
     CardKanban,
     CardMoverFase,
+    CardMoverLote,
+    CardMoverLoteResponse,
     CardResponse,
     CardUpdate,
     CardVincularAgendamento,
@@ -163,6 +165,25 @@ async def mover_card(
     )
 
 
+@router.post(
+    "/mover-lote",
+    response_model=CardMoverLoteResponse,
+    summary="Mover Cards em Lote",
+)
+async def mover_cards_lote(
+    data: CardMoverLote,
+    current_user: CurrentUser = Depends(require_permission("agenda", "E"))
+):
+    """
+    Move vários cards para outra fase (IDs ou filtro).
+
+    Usado por automações (ex: reativação noturna da Fase 0, encerramento
+    da Fase 3). Cards com itens obrigatórios pendentes não avançam;
+    o resultado é retornado por card.
+    """
+    return await card_service.mover_fase_lote(data=data, current_user=current_user)
+
+
 @router.post(
     "/{card_id}/vincular-agendamento",
     response_model=CardResponse,
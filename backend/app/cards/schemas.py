@@ -13,7 +13,7 @@ from enum import Enum
 from typing import Optional
 from uuid import UUID
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 from app.core.schemas import BaseSchema
 
@@ -153,6 +153,31 @@ class CardMoverFase(BaseModel):
     motivo: Optional[str] = None
 
 
+class CardLoteFiltro(BaseModel):
+    """Seleção de cards por filtro (movimentação em lote)."""
+    fase: CardFase
+    tipo_card: Optional[CardTipo] = None
+    medico_id: Optional[UUID] = None
+    em_reativacao: Optional[bool] = None
+    ultima_interacao_antes: Optional[datetime] = None
+    data_agendamento_ate: Optional[date] = None
+
+
+class CardMoverLote(BaseModel):
+    """Mover vários cards para outra fase (IDs ou filtro)."""
+    card_ids: Optional[list[UUID]] = Field(default=None, max_length=1000)
+    filtro: Optional[CardLoteFiltro] = None
+    nova_fase: CardFase
+    motivo: Optional[str] = None
+    limite: int = Field(default=500, ge=1, le=5000, description="Máximo de cards selecionados pelo filtro")
+
+    @model_validator(mode="after")
+    def validar_selecao(self):
+        if bool(self.card_ids) == bool(self.filtro):
+            raise ValueError("Informe card_ids ou filtro (apenas um)")
+        return self
+
+
 class CardVincularAgendamento(BaseModel):
     """Vincular agendamento ao card (Fase 0 → 1)."""
     agendamento_id: UUID
@@ -227,6 +252,24 @@ class CardResponse(BaseSchema):
         from_attributes = True
 
 
+class CardMoverLoteItem(BaseModel):
+    """Resultado da movimentação de um card no lote."""
+    card_id: UUID
+    sucesso: bool
+    fase_anterior: Optional[int] = None
+    fase_nova: Optional[int] = None
+    erro: Optional[str] = None
+
+
+class CardMoverLoteResponse(BaseModel):
+    """Resultado da movimentação em lote."""
+    total: int
+    movidos: int
+    falhas: int
+    resultados: list[CardMoverLoteItem]
+    avisos: list[str] = Field(default_factory=list, description="Falhas após mover (checklist, histórico)")
+
+
 class CardListItem(BaseSchema):
     """Item do Kanban (card resumido)."""
     id: UUID
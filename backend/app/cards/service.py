@@ -27,6 +27,9 @@ from app.cards.schemas import (
     CardKanban,
     CardListItem,
     CardMoverFase,
+    CardMoverLote,
+    CardMoverLoteItem,
+    CardMoverLoteResponse,
     CardResponse,
     CardStatus,
     CardTipo,
@@ -37,9 +40,13 @@ from app.cards.schemas import (
     CardDocumentoCreate,
     FASES,
 )
+from app.cards.transicoes import get_tabela_transicoes
 
 logger = structlog.get_logger()
 
+# Tamanho máximo de lista em filtros "__in" (limite de URL do PostgREST)
+LOTE_IN = 200
+
 
 def now_brasilia() -> datetime:
     """Retorna datetime atual no fuso de Brasília."""
@@ -52,6 +59,12 @@ def today_brasilia() -> date:
     return now_brasilia().date()
 
 
+def _chunks(items: list, size: int = LOTE_IN):
+    """Divide lista em blocos de tamanho fixo."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
 class CardService:
     """Service para operações de cards."""
 
@@ -373,14 +386,16 @@ class CardService:
         fase_atual = card.get("fase", 0)
         nova_fase = data.nova_fase.value
 
-        # Valida se pode mover (checklist obrigatório completo)
-        if nova_fase > fase_atual:
+        # Valida transição contra a tabela compilada da clínica
+        tabela = await get_tabela_transicoes(db, current_user.clinica_id)
+        pendentes = 0
+        if tabela.exige_checklist(fase_atual, nova_fase):
             checklist = await self._get_checklist_resumo(db, id, fase_atual)
-            if not checklist.pode_avancar:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Não é possível avançar. Há {checklist.obrigatorios_pendentes} itens obrigatórios pendentes."
-                )
+            pendentes = checklist.obrigatorios_pendentes
+
+        erro = tabela.validar(fase_atual, nova_fase, pendentes)
+        if erro:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=erro)
 
         # Atualiza card
         agora = now_brasilia()
@@ -421,6 +436,251 @@ class CardService:
         logger.info("Card movido", id=id, fase_anterior=fase_atual, nova_fase=nova_fase)
         return await self.get(id, current_user)
 
+    async def mover_fase_lote(
+        self,
+        data: CardMoverLote,
+        current_user: CurrentUser
+    ) -> CardMoverLoteResponse:
+        """
+        Move vários cards para outra fase.
+
+        Seleciona por IDs ou filtro, valida as transições em memória e
+        aplica updates, checklists e histórico em escritas agrupadas.
+        Retorna o resultado por card.
+        """
+        db = get_authenticated_db(current_user.access_token)
+        nova_fase = data.nova_fase.value
+
+        # 1. Seleção
+        cards = await self._selecionar_cards_lote(db, data, current_user.clinica_id)
+        resultados: dict[str, CardMoverLoteItem] = {}
+
+        if data.card_ids:
+            encontrados = {c["id"] for c in cards}
+            for card_id in data.card_ids:
+                if str(card_id) not in encontrados:
+                    resultados[str(card_id)] = CardMoverLoteItem(
+                        card_id=card_id, sucesso=False, erro="Card não encontrado"
+                    )
+
+        tabela = await get_tabela_transicoes(db, current_user.clinica_id)
+
+        # 2. Checklist da fase atual de quem vai avançar (uma query por bloco)
+        avancando = [
+            c["id"] for c in cards
+            if tabela.exige_checklist(c.get("fase", 0), nova_fase)
+        ]
+        pendentes: dict[str, int] = {}
+        fase_por_card = {c["id"]: c.get("fase", 0) for c in cards}
+        for bloco in _chunks(avancando):
+            items = await db.select(
+                table=self.TABLE_CHECKLIST,
+                columns="card_id,fase,obrigatorio,concluido",
+                filters={"card_id__in": bloco}
+            )
+            for i in items:
+                if (
+                    i.get("fase") == fase_por_card.get(i["card_id"])
+                    and i.get("obrigatorio") and not i.get("concluido")
+                ):
+                    pendentes[i["card_id"]] = pendentes.get(i["card_id"], 0) + 1
+
+        # 3. Validação em memória e montagem dos updates
+        agora = now_brasilia()
+        base_update = {
+            "fase": nova_fase,
+            "updated_at": agora.isoformat(),
+            "ultima_interacao": agora.isoformat(),
+            f"fase{nova_fase}_em": agora.isoformat(),
+        }
+        grupos: dict[tuple, list[str]] = {}
+        updates: dict[tuple, dict] = {}
+        movidos: list[dict] = []
+
+        for card in cards:
+            card_id = card["id"]
+            fase_atual = card.get("fase", 0)
+
+            erro = tabela.validar(fase_atual, nova_fase, pendentes.get(card_id, 0))
+            if erro:
+                resultados[card_id] = CardMoverLoteItem(
+                    card_id=card_id, sucesso=False, fase_anterior=fase_atual, erro=erro
+                )
+                continue
+
+            update_data = dict(base_update)
+            if nova_fase == 0 and fase_atual > 0:
+                update_data["em_reativacao"] = True
+                update_data["tentativa_reativacao"] = (card.get("tentativa_reativacao") or 0) + 1
+            if fase_atual == 3 and nova_fase == 3:
+                update_data["status"] = CardStatus.CONCLUIDO.value
+                update_data["concluido_em"] = agora.isoformat()
+
+            # Cards com o mesmo payload vão no mesmo UPDATE
+            chave = tuple(sorted(update_data.items()))
+            grupos.setdefault(chave, []).append(card_id)
+            updates[chave] = update_data
+            movidos.append(card)
+
+        # 4. Escritas agrupadas
+        falhos: set[str] = set()
+        for chave, ids in grupos.items():
+            for bloco in _chunks(ids):
+                try:
+                    await db.update(
+                        table=self.TABLE,
+                        data=updates[chave],
+                        filters={"id__in": bloco, "clinica_id": current_user.clinica_id}
+                    )
+                except Exception as e:
+                    logger.error("Falha ao mover lote de cards", erro=str(e), total=len(bloco))
+                    for card_id in bloco:
+                        falhos.add(card_id)
+                        resultados[card_id] = CardMoverLoteItem(
+                            card_id=card_id, sucesso=False,
+                            fase_anterior=fase_por_card[card_id], erro="Falha ao atualizar card"
+                        )
+
+        movidos = [c for c in movidos if c["id"] not in falhos]
+
+        # Daqui em diante os cards já mudaram de fase: falhas viram aviso,
+        # não erro da requisição (o resultado por card continua valendo)
+        avisos: list[str] = []
+        try:
+            await self._criar_checklists_lote(
+                db,
+                [c for c in movidos if nova_fase > c.get("fase", 0)],
+                current_user.clinica_id,
+                nova_fase
+            )
+        except Exception as e:
+            logger.error("Falha ao criar checklists do lote", erro=str(e), total=len(movidos))
+            avisos.append("Cards movidos, mas os checklists da nova fase não foram criados")
+
+        historico = [
+            {
+                "card_id": c["id"],
+                "tipo": "movimentacao",
+                "descricao": f"Card movido da Fase {c.get('fase', 0)} para Fase {nova_fase}"
+                             + (f" ({data.motivo})" if data.motivo else ""),
+                "dados_anteriores": {"fase": c.get("fase", 0)},
+                "dados_novos": {"fase": nova_fase, "lote": True},
+                "user_id": current_user.id,
+                "automatico": False,
+            }
+            for c in movidos
+        ]
+        sem_historico = 0
+        for bloco in _chunks(historico):
+            try:
+                await db.insert_many(self.TABLE_HISTORICO, bloco)
+            except Exception as e:
+                logger.error("Falha ao registrar histórico do lote", erro=str(e), total=len(bloco))
+                sem_historico += len(bloco)
+        if sem_historico:
+            avisos.append(f"Histórico não registrado para {sem_historico} card(s) movido(s)")
+
+        for c in movidos:
+            resultados[c["id"]] = CardMoverLoteItem(
+                card_id=c["id"], sucesso=True,
+                fase_anterior=c.get("fase", 0), fase_nova=nova_fase
+            )
+
+        total_movidos = len(movidos)
+        logger.info(
+            "Cards movidos em lote",
+            total=len(resultados),
+            movidos=total_movidos,
+            nova_fase=nova_fase
+        )
+
+        return CardMoverLoteResponse(
+            total=len(resultados),
+            movidos=total_movidos,
+            falhas=len(resultados) - total_movidos,
+            resultados=list(resultados.values()),
+            avisos=avisos
+        )
+
+    async def _selecionar_cards_lote(
+        self,
+        db: SupabaseClient,
+        data: CardMoverLote,
+        clinica_id: str
+    ) -> list[dict]:
+        """Seleciona cards do lote (por IDs ou filtro)."""
+        colunas = "id,fase,tipo_card,tentativa_reativacao"
+
+        if data.card_ids:
+            cards = []
+            for bloco in _chunks([str(i) for i in data.card_ids]):
+                cards += await db.select(
+                    table=self.TABLE,
+                    columns=colunas,
+                    filters={"id__in": bloco, "clinica_id": clinica_id}
+                )
+            return cards
+
+        f = data.filtro
+        filters = {"clinica_id": clinica_id, "fase": f.fase.value, "status": "ativo"}
+        if f.tipo_card:
+            filters["tipo_card"] = f.tipo_card.value
+        if f.medico_id:
+            filters["medico_id"] = str(f.medico_id)
+        if f.em_reativacao is not None:
+            filters["em_reativacao"] = f.em_reativacao
+        if f.ultima_interacao_antes:
+            filters["ultima_interacao__lt"] = f.ultima_interacao_antes.isoformat()
+        if f.data_agendamento_ate:
+            filters["data_agendamento__lte"] = str(f.data_agendamento_ate)
+
+        return await db.select(
+            table=self.TABLE,
+            columns=colunas,
+            filters=filters,
+            order_by="ultima_interacao",
+            limit=data.limite
+        )
+
+    async def _criar_checklists_lote(
+        self,
+        db: SupabaseClient,
+        cards: list[dict],
+        clinica_id: str,
+        fase: int
+    ):
+        """Cria checklists da fase para vários cards com um insert por bloco."""
+        if not cards:
+            return
+
+        tabela = await get_tabela_transicoes(db, clinica_id)
+
+        ids = [c["id"] for c in cards]
+        existentes: set[tuple] = set()
+        for bloco in _chunks(ids):
+            items = await db.select(
+                table=self.TABLE_CHECKLIST,
+                columns="card_id,item_key",
+                filters={"card_id__in": bloco, "fase": fase}
+            )
+            existentes |= {(i["card_id"], i["item_key"]) for i in items}
+
+        novos = [
+            {
+                "card_id": c["id"],
+                "fase": fase,
+                "item_key": t["item_key"],
+                "descricao": t["descricao"],
+                "obrigatorio": t["obrigatorio"],
+                "ordem": t["ordem"],
+            }
+            for c in cards
+            for t in tabela.templates_checklist(fase, c.get("tipo_card"))
+            if (c["id"], t["item_key"]) not in existentes
+        ]
+        for bloco in _chunks(novos):
+            await db.insert_many(self.TABLE_CHECKLIST, bloco)
+
     async def vincular_agendamento(
         self,
         id: str,
@@ -555,35 +815,33 @@ class CardService:
         tipo_card: str
     ):
         """Cria checklist para o card baseado nos templates."""
-        # Busca templates (prioriza da clínica, depois global)
-        templates = await db.select(
-            table=self.TABLE_TEMPLATES,
-            filters={"fase": fase, "tipo_card": tipo_card, "ativo": True},
-            order_by="ordem"
-        )
-
-        # Filtra: se tem da clínica usa, senão usa global
-        templates_clinica = [t for t in templates or [] if t.get("clinica_id") == clinica_id]
-        templates_global = [t for t in templates or [] if t.get("clinica_id") is None]
-
-        templates_usar = templates_clinica if templates_clinica else templates_global
+        # Templates vêm da tabela compilada (prioriza da clínica, depois global)
+        tabela = await get_tabela_transicoes(db, clinica_id)
+        templates = tabela.templates_checklist(fase, tipo_card)
+        if not templates:
+            return
 
-        for t in templates_usar:
-            # Verifica se já existe
-            existente = await db.select_one(
-                table=self.TABLE_CHECKLIST,
-                filters={"card_id": card_id, "fase": fase, "item_key": t["item_key"]}
-            )
-
-            if not existente:
-                await db.insert(self.TABLE_CHECKLIST, {
-                    "card_id": card_id,
-                    "fase": fase,
-                    "item_key": t["item_key"],
-                    "descricao": t["descricao"],
-                    "obrigatorio": t["obrigatorio"],
-                    "ordem": t["ordem"],
-                })
+        existentes = await db.select(
+            table=self.TABLE_CHECKLIST,
+            columns="item_key",
+            filters={"card_id": card_id, "fase": fase}
+        )
+        chaves_existentes = {i["item_key"] for i in existentes}
+
+        novos = [
+            {
+                "card_id": card_id,
+                "fase": fase,
+                "item_key": t["item_key"],
+                "descricao": t["descricao"],
+                "obrigatorio": t["obrigatorio"],
+                "ordem": t["ordem"],
+            }
+            for t in templates
+            if t["item_key"] not in chaves_existentes
+        ]
+        if novos:
+            await db.insert_many(self.TABLE_CHECKLIST, novos)
 
     async def _get_checklist_resumo(
         self,
@@ -0,0 +1,239 @@
+"""
+Cards - Transições
+Tabela compilada de regras de transição de fase.
+
+Reúne em um único lugar (carregado uma vez por clínica e cacheado):
+- Transições permitidas entre fases
+- Templates de checklist e itens obrigatórios por fase/tipo de card
+- Efeitos no card de cada status de agendamento
+
+Usado por CardService, AgendaService e KanbanService para validar
+movimentos em memória, sem reler checklist_templates a cada chamada.
+Alterações em checklist_templates valem após CACHE_TTL (ou após
+invalidar_tabela_transicoes da clínica).
+
+Benchmark:
+    python -m app.cards.transicoes
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+import structlog
+
+logger = structlog.get_logger()
+
+
+TABLE_TEMPLATES = "checklist_templates"
+TIPO_CARD_PADRAO = "primeira_consulta"
+CACHE_TTL = 300  # segundos
+
+FASES_CARD = (0, 1, 2, 3)
+
+# O Kanban (app/kanban) arquiva o card numa fase a mais, equivalente
+# ao 3 → 3 (concluir) do CardService: só se chega nela a partir da 3
+FASE_FINALIZADO = 4
+
+# Fases de destino permitidas a partir de cada fase:
+# - avançar uma fase por vez (exige checklist obrigatório da fase atual)
+# - voltar uma fase (corrigir movimento) ou para a 0 (reativação)
+# - 3 → 3 conclui o card; 3 → FINALIZADO arquiva no Kanban
+TRANSICOES_PERMITIDAS: dict[int, frozenset[int]] = {
+    0: frozenset({1}),
+    1: frozenset({2, 0}),
+    2: frozenset({3, 1, 0}),
+    3: frozenset({3, FASE_FINALIZADO, 2, 0}),
+    FASE_FINALIZADO: frozenset({3, 0}),
+}
+
+
+@dataclass(frozen=True)
+class EfeitoStatus:
+    """Efeito de um status de agendamento sobre o card vinculado."""
+    fase_destino: Optional[int] = None
+    fase_origem: Optional[int] = None      # só move se o card estiver nesta fase
+    coluna: Optional[str] = None
+    coluna_se_fase: Optional[int] = None   # atualiza coluna só nesta fase
+    marcar_item: Optional[tuple[int, str]] = None  # (fase, item_key)
+    criar_checklist: bool = False
+    reativar: bool = False
+    status_card: Optional[str] = None
+
+
+# Mapeamento status do agendamento → efeito no card
+EFEITOS_STATUS_AGENDAMENTO: dict[str, EfeitoStatus] = {
+    "confirmado": EfeitoStatus(marcar_item=(1, "confirmacao")),
+    "aguardando": EfeitoStatus(
+        fase_destino=2, fase_origem=1, coluna="aguardando_checkin",
+        marcar_item=(2, "checkin"), criar_checklist=True
+    ),
+    "em_atendimento": EfeitoStatus(
+        coluna="em_atendimento", coluna_se_fase=2,
+        marcar_item=(2, "em_atendimento")
+    ),
+    "atendido": EfeitoStatus(
+        fase_destino=3, coluna="pendente_documentos", criar_checklist=True
+    ),
+    "cancelado": EfeitoStatus(
+        fase_destino=0, coluna="pre_agendamento", reativar=True, status_card="ativo"
+    ),
+    "faltou": EfeitoStatus(
+        fase_destino=0, coluna="pre_agendamento", reativar=True, status_card="no_show"
+    ),
+}
+
+
+@dataclass
+class TabelaTransicoes:
+    """Regras de transição compiladas para uma clínica."""
+    clinica_id: Optional[str]
+    templates: dict[tuple[int, str], tuple[dict, ...]] = field(default_factory=dict)
+    obrigatorios: dict[tuple[int, str], frozenset[str]] = field(default_factory=dict)
+    carregado_em: float = field(default_factory=time.monotonic)
+
+    @classmethod
+    def compilar(cls, clinica_id: Optional[str], templates: list[dict]) -> "TabelaTransicoes":
+        """
+        Compila templates de checklist da clínica.
+
+        Para cada (fase, tipo_card) usa os templates da clínica se houver,
+        senão os globais (clinica_id nulo).
+        """
+        da_clinica: dict[tuple[int, str], list[dict]] = {}
+        globais: dict[tuple[int, str], list[dict]] = {}
+
+        for t in templates:
+            chave = (t.get("fase"), t.get("tipo_card") or TIPO_CARD_PADRAO)
+            if t.get("clinica_id") is None:
+                globais.setdefault(chave, []).append(t)
+            elif t.get("clinica_id") == clinica_id:
+                da_clinica.setdefault(chave, []).append(t)
+
+        tabela = cls(clinica_id=clinica_id)
+        for chave in set(da_clinica) | set(globais):
+            itens = sorted(
+                da_clinica.get(chave) or globais.get(chave, []),
+                key=lambda t: t.get("ordem", t.get("posicao", 0)) or 0
+            )
+            tabela.templates[chave] = tuple(itens)
+            tabela.obrigatorios[chave] = frozenset(
+                t["item_key"] for t in itens if t.get("obrigatorio") and t.get("item_key")
+            )
+        return tabela
+
+    def pode_mover(self, fase_atual: int, nova_fase: int) -> bool:
+        """Verifica se a transição é permitida (sem olhar checklist)."""
+        return nova_fase in TRANSICOES_PERMITIDAS.get(fase_atual, frozenset())
+
+    def exige_checklist(self, fase_atual: int, nova_fase: int) -> bool:
+        """Avançar de fase exige checklist obrigatório completo."""
+        return nova_fase > fase_atual
+
+    def templates_checklist(self, fase: int, tipo_card: Optional[str]) -> tuple[dict, ...]:
+        """Templates de checklist da fase para o tipo de card."""
+        return self.templates.get((fase, tipo_card or TIPO_CARD_PADRAO), ())
+
+    def itens_obrigatorios(self, fase: int, tipo_card: Optional[str]) -> frozenset[str]:
+        """Chaves dos itens obrigatórios da fase."""
+        return self.obrigatorios.get((fase, tipo_card or TIPO_CARD_PADRAO), frozenset())
+
+    def validar(
+        self,
+        fase_atual: int,
+        nova_fase: int,
+        pendentes_obrigatorios: int = 0
+    ) -> Optional[str]:
+        """
+        Valida uma transição em memória.
+
+        Args:
+            pendentes_obrigatorios: itens obrigatórios não concluídos
+                da fase atual (já calculado pelo chamador)
+
+        Returns:
+            None se permitida, senão mensagem de erro
+        """
+        if not self.pode_mover(fase_atual, nova_fase):
+            return f"Transição da Fase {fase_atual} para Fase {nova_fase} não permitida."
+        if self.exige_checklist(fase_atual, nova_fase) and pendentes_obrigatorios:
+            return f"Não é possível avançar. Há {pendentes_obrigatorios} itens obrigatórios pendentes."
+        return None
+
+    def efeito_status(self, status: str) -> Optional[EfeitoStatus]:
+        """Efeito de um status de agendamento sobre o card."""
+        return EFEITOS_STATUS_AGENDAMENTO.get(status)
+
+
+# ==========================================
+# CACHE POR CLÍNICA
+# ==========================================
+
+_tabelas: dict[Optional[str], TabelaTransicoes] = {}
+
+
+async def get_tabela_transicoes(db, clinica_id: Optional[str]) -> TabelaTransicoes:
+    """Retorna tabela compilada da clínica (carrega uma vez, cacheia por CACHE_TTL)."""
+    tabela = _tabelas.get(clinica_id)
+    if tabela and time.monotonic() - tabela.carregado_em < CACHE_TTL:
+        return tabela
+
+    # Só os globais (clinica_id nulo) e os da clínica; compilar escolhe por fase/tipo
+    consultas = [db.select(table=TABLE_TEMPLATES, filters={"clinica_id__is": None, "ativo": True})]
+    if clinica_id:
+        consultas.append(db.select(table=TABLE_TEMPLATES, filters={"clinica_id": clinica_id, "ativo": True}))
+    templates = [t for linhas in await asyncio.gather(*consultas) for t in linhas or []]
+    tabela = TabelaTransicoes.compilar(clinica_id, templates)
+    _tabelas[clinica_id] = tabela
+
+    logger.debug(
+        "Tabela de transições carregada",
+        clinica_id=clinica_id,
+        combinacoes=len(tabela.templates)
+    )
+    return tabela
+
+
+def invalidar_tabela_transicoes(clinica_id: Optional[str] = None) -> None:
+    """Descarta tabela cacheada (ex: após alterar checklist_templates)."""
+    if clinica_id is None:
+        _tabelas.clear()
+    else:
+        _tabelas.pop(clinica_id, None)
+
+
+# ==========================================
+# BENCHMARK
+# ==========================================
+
+def _benchmark(iteracoes: int = 200_000) -> float:
+    """Mede transições validadas por segundo com a tabela em memória."""
+    templates = [
+        {
+            "clinica_id": None, "fase": fase, "tipo_card": tipo,
+            "item_key": f"item_{fase}_{i}", "descricao": f"Item {i}",
+            "obrigatorio": i % 2 == 0, "ordem": i
+        }
+        for fase in FASES_CARD
+        for tipo in (TIPO_CARD_PADRAO, "retorno")
+        for i in range(6)
+    ]
+    tabela = TabelaTransicoes.compilar("bench", templates)
+
+    inicio = time.perf_counter()
+    for n in range(iteracoes):
+        fase_atual = n % 4
+        nova_fase = (n + 1) % 4
+        tabela.validar(fase_atual, nova_fase, pendentes_obrigatorios=n % 3)
+        tabela.itens_obrigatorios(nova_fase, TIPO_CARD_PADRAO)
+        tabela.efeito_status("aguardando")
+    duracao = time.perf_counter() - inicio
+
+    return iteracoes / duracao
+
+
+if __name__ == "__main__":
+    por_segundo = _benchmark()
+    print(f"Transições validadas: {por_segundo:,.0f}/s")
@@ -13,6 +13,7 @@ Uso:
 
 Endpoints:
     POST /chat/mensagem - Processa mensagem do paciente
+    POST /chat/mensagem/stream - Mesmo fluxo via SSE (tokens + progresso)
     POST /chat/webhook/whatsapp - Webhook Evolution API
     GET  /chat/conversas - Lista conversas
     GET  /chat/conversas/{telefone} - Busca conversa
@@ -10,11 +10,24 @@ O agente:
 Não tem mágica. Não tem complexidade desnecessária.
 """
 
+import asyncio
 import json
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Callable, Optional
 from datetime import datetime
 
-from .tools import TOOLS_SCHEMA, executar_ferramenta
+from .tools import (
+    TOOLS_SCHEMA, FERRAMENTAS_SOMENTE_LEITURA, FERRAMENTAS_ALTERAM_CONTEXTO, FERRAMENTAS_DA_CLINICA,
+    executar_ferramenta
+)
+from .intencao import classificar_local, LIMIAR_CONFIANCA
+from . import cache_respostas, rastreamento
+from .roteador_llm import RoteadorLLM
+from .orcamento_tokens import (
+    get_orcamento, estimar_tokens, contabilizar, calcular_custo,
+    selecionar_ferramentas, compactar_resultado, ajustar_historico
+)
+from app.core.http import get_http_client
 
 
 # ============================================================================
@@ -27,14 +40,16 @@ SYSTEM_PROMPT = """Você é Ana, assistente virtual da clínica de cardiologia d
 
 Você é como uma recepcionista simpática. Conversa naturalmente, coleta informações, agenda consultas.
 
-# REGRA OBRIGATÓRIA
+# CONTEXTO DO CLIENTE
 
-SEMPRE que receber uma mensagem, a PRIMEIRA coisa é chamar `verificar_cliente`.
-Não responda nada antes de verificar. Isso te dá o contexto completo.
+O sistema já verificou o cliente pelo telefone antes da sua vez: os dados
+estão em CONTEXTO ATUAL (cadastro, card e consulta agendada).
+NÃO chame `verificar_cliente` se o contexto diz "Cliente verificado".
+Só chame se o contexto disser "Cliente não verificado".
 
 # FLUXOS
 
-## Cliente NOVO (verificar_cliente retornou existe=false):
+## Cliente NOVO (contexto diz "Cliente novo"):
 
 1. Cumprimente e pergunte o nome
 2. Pergunte CPF
@@ -76,6 +91,13 @@ Só chame `cadastrar_cliente` quando tiver TODOS os dados.
 """
 
 
+# Máximo de ferramentas somente-leitura executadas ao mesmo tempo
+MAX_FERRAMENTAS_PARALELAS = 4
+
+# Mensagens de histórico consideradas (depois cortadas pelo orçamento de tokens)
+MAX_HISTORICO = 20
+
+
 # ============================================================================
 # CLASSE DO AGENTE
 # ============================================================================
@@ -92,59 +114,121 @@ class AgenteClinica:
         self.db = db
         self.max_iteracoes = 5
     
-    async def processar(self, state: dict) -> dict:
-        """Processa mensagem e retorna estado atualizado."""
+    async def processar(self, state: dict, emitir: Optional[Callable[[dict], None]] = None) -> dict:
+        """
+        Processa mensagem e retorna estado atualizado.
+        
+        Args:
+            emitir: callback de eventos de progresso. Quando informado, o LLM
+                é chamado em modo streaming e são emitidos eventos
+                {"tipo": "ferramenta", ...} e {"tipo": "token", "conteudo": ...}
+        """
+        
+        # Perguntas de valor/convênio/FAQ já respondidas nesta clínica
+        chave_cache = self._chave_cache_resposta(state)
+        if chave_cache:
+            resposta_cache = cache_respostas.obter(state.get("clinica_id", ""), "resposta_agente", chave_cache)
+            if resposta_cache:
+                if emitir:
+                    emitir({"tipo": "token", "conteudo": resposta_cache})
+                return {
+                    **state,
+                    "resposta": resposta_cache,
+                    "acoes_executadas": [],
+                    "metricas_turno": {**state.get("metricas_turno", {}), "llm_chamadas": 0, "resposta_cache": True},
+                    "updated_at": datetime.now().isoformat()
+                }
         
         # Monta contexto e rascunho para o prompt
         contexto = self._montar_contexto(state)
         rascunho = json.dumps(state.get("rascunho_cadastro", {}), indent=2, ensure_ascii=False)
         
         system = SYSTEM_PROMPT.format(contexto=contexto, rascunho=rascunho)
-        messages = self._montar_mensagens(state)
+        
+        # Histórico cortado para caber no orçamento (reserva espaço para
+        # system, ferramentas e resultados de uma iteração)
+        orcamento = get_orcamento()
+        ferramentas = selecionar_ferramentas(TOOLS_SCHEMA, state)
+        disponivel = (
+            orcamento.limite_prompt
+            - estimar_tokens(system)
+            - estimar_tokens(ferramentas)
+            - orcamento.limite_resultado_ferramenta
+        )
+        messages, resumidas = ajustar_historico(self._montar_mensagens(state), disponivel, orcamento)
         
         # Loop do agente
         acoes = []
         state_atual = dict(state)
+        metricas = {
+            **state.get("metricas_turno", {}),
+            "llm_chamadas": 0,
+            "tokens_prompt": 0,
+            "tokens_completion": 0,
+            "custo_estimado": 0.0,
+            "historico_resumido": resumidas
+        }
         
         for i in range(self.max_iteracoes):
             print(f"[AGENTE] Iteração {i+1}")
             
+            # Ferramentas relevantes para o estado atual (muda após cadastro/agendamento)
+            ferramentas = selecionar_ferramentas(TOOLS_SCHEMA, state_atual)
+            metricas["tokens_estimados"] = contabilizar(system, ferramentas, messages)
+            
             # Chama LLM
-            resposta = await self._chamar_llm(system, messages)
+            with rastreamento.span("llm", **{"llm.iteracao": i + 1, "llm.ferramentas": len(ferramentas)}) as span_llm:
+                if emitir:
+                    resposta = await self._chamar_llm_stream(system, messages, emitir, ferramentas)
+                else:
+                    resposta = await self._chamar_llm(system, messages, ferramentas)
+            
+            uso = resposta.get("usage") or {}
+            span_llm.definir(**{
+                "llm.provider": resposta.get("provider"),
+                "llm.modelo": resposta.get("modelo"),
+                "llm.tokens_prompt": uso.get("prompt_tokens"),
+                "llm.tokens_completion": uso.get("completion_tokens"),
+                "llm.tool_calls": len(resposta.get("tool_calls") or []),
+            })
+            metricas["llm_chamadas"] += 1
+            metricas["tokens_prompt"] += uso.get("prompt_tokens", 0) or 0
+            metricas["tokens_completion"] += uso.get("completion_tokens", 0) or 0
+            metricas["modelo"] = resposta.get("modelo")
+            metricas["custo_estimado"] += calcular_custo(
+                resposta.get("modelo"),
+                uso.get("prompt_tokens", 0) or 0,
+                uso.get("completion_tokens", 0) or 0
+            )
             
             # Se não tem tool calls, é a resposta final
             tool_calls = resposta.get("tool_calls", [])
             if not tool_calls:
+                if chave_cache:
+                    self._guardar_resposta_cache(state_atual, chave_cache, resposta.get("content", ""), acoes)
                 return {
                     **state_atual,
                     "resposta": resposta.get("content", ""),
                     "acoes_executadas": acoes,
+                    "metricas_turno": metricas,
                     "updated_at": datetime.now().isoformat()
                 }
             
-            # Executa cada ferramenta
-            for tc in tool_calls:
+            # Executa ferramentas (leituras do mesmo lote em paralelo);
+            # o state já volta atualizado por cada resultado, em ordem
+            execucoes, state_atual = await self._executar_ferramentas(tool_calls, state_atual, emitir)
+            
+            # Registra resultados na ordem original das chamadas
+            for tc, args, resultado, duracao_ms in execucoes:
                 nome = tc.get("function", {}).get("name", "")
-                args_str = tc.get("function", {}).get("arguments", "{}")
-                
-                try:
-                    args = json.loads(args_str)
-                except:
-                    args = {}
-                
-                print(f"[AGENTE] Chamando: {nome}({args})")
-                
-                resultado = await executar_ferramenta(nome, args, self.db, state_atual)
-                print(f"[AGENTE] Resultado: {resultado}")
-                
-                # Atualiza state
-                state_atual = self._atualizar_state(state_atual, nome, resultado)
                 
                 acoes.append({
                     "ferramenta": nome,
                     "args": args,
-                    "resultado": resultado
+                    "resultado": resultado,
+                    "duracao_ms": duracao_ms
                 })
+                metricas.setdefault("ferramentas_ms", []).append({"ferramenta": nome, "ms": duracao_ms})
                 
                 # Adiciona na conversa para o LLM ver
                 messages.append({
@@ -155,7 +239,7 @@ class AgenteClinica:
                 messages.append({
                     "role": "tool",
                     "tool_call_id": tc.get("id", ""),
-                    "content": json.dumps(resultado, ensure_ascii=False)
+                    "content": compactar_resultado(resultado, orcamento)
                 })
         
         # Limite de iterações
@@ -163,33 +247,160 @@ class AgenteClinica:
             **state_atual,
             "resposta": "Desculpe, tive um problema. Pode repetir?",
             "acoes_executadas": acoes,
+            "metricas_turno": metricas,
             "erro": "Limite de iterações",
             "updated_at": datetime.now().isoformat()
         }
     
+    async def _executar_ferramentas(
+        self,
+        tool_calls: List[Dict],
+        state: dict,
+        emitir: Optional[Callable[[dict], None]] = None
+    ) -> tuple:
+        """
+        Executa os tool_calls de uma resposta do LLM.
+        
+        Chamadas somente-leitura consecutivas rodam em paralelo (limitadas
+        por MAX_FERRAMENTAS_PARALELAS); as demais (atualizar_rascunho,
+        cadastrar_cliente, agendar_consulta...) são barreiras: rodam
+        sozinhas, na ordem pedida pelo LLM, e cada chamada seguinte do
+        lote recebe o state já atualizado pelos resultados anteriores
+        (ex.: rascunho acumulado, cliente_id do cadastro recém-feito).
+        
+        Returns:
+            ([(tool_call, args, resultado, duracao_ms)] na ordem original,
+             state atualizado)
+        """
+        semaforo = asyncio.Semaphore(MAX_FERRAMENTAS_PARALELAS)
+        
+        async def executar(tc: dict, state: dict) -> tuple:
+            nome = tc.get("function", {}).get("name", "")
+            args_str = tc.get("function", {}).get("arguments", "{}")
+            
+            try:
+                args = json.loads(args_str)
+            except:
+                args = {}
+            
+            async with semaforo:
+                print(f"[AGENTE] Chamando: {nome}({args})")
+                if emitir:
+                    emitir({"tipo": "ferramenta", "ferramenta": nome, "status": "executando"})
+                
+                inicio = time.perf_counter()
+                with rastreamento.span("ferramenta", **{"ferramenta.nome": nome}) as span_ferramenta:
+                    try:
+                        resultado = await executar_ferramenta(nome, args, self.db, state)
+                    except Exception as e:
+                        resultado = {"erro": str(e)}
+                    span_ferramenta.definir(**{"ferramenta.sucesso": not resultado.get("erro")})
+                duracao_ms = int((time.perf_counter() - inicio) * 1000)
+                
+                print(f"[AGENTE] Resultado ({duracao_ms}ms): {resultado}")
+                if emitir:
+                    emitir({
+                        "tipo": "ferramenta",
+                        "ferramenta": nome,
+                        "status": "erro" if resultado.get("erro") else "concluida",
+                        "duracao_ms": duracao_ms
+                    })
+            
+            return tc, args, resultado, duracao_ms
+        
+        execucoes = []
+        leituras = []
+        
+        def aplicar(resultados) -> None:
+            nonlocal state
+            for tc, _, resultado, _ in resultados:
+                state = self._atualizar_state(state, tc.get("function", {}).get("name", ""), resultado)
+            execucoes.extend(resultados)
+        
+        for tc in tool_calls:
+            nome = tc.get("function", {}).get("name", "")
+            if nome in FERRAMENTAS_SOMENTE_LEITURA:
+                leituras.append(tc)
+                continue
+            
+            # Barreira: conclui as leituras pendentes antes, mantendo a ordem
+            if leituras:
+                aplicar(await asyncio.gather(*(executar(l, state) for l in leituras)))
+                leituras = []
+            aplicar([await executar(tc, state)])
+        
+        if leituras:
+            aplicar(await asyncio.gather(*(executar(l, state) for l in leituras)))
+        
+        return execucoes, state
+    
+    def _chave_cache_resposta(self, state: dict) -> Optional[str]:
+        """
+        Chave de cache da resposta (None se a mensagem não é cacheável).
+        
+        Só perguntas classificadas localmente com confiança como
+        valor/convênio/FAQ, fora de um cadastro em andamento.
+        """
+        mensagem = state.get("mensagem_atual", "")
+        if not mensagem or state.get("rascunho_cadastro"):
+            return None
+        
+        intencao, confianca = classificar_local(mensagem)
+        if intencao not in cache_respostas.INTENCOES_CACHEAVEIS or confianca < LIMIAR_CONFIANCA:
+            return None
+        
+        return f"{intencao}:{cache_respostas.chave_pergunta(mensagem)}"
+    
+    def _guardar_resposta_cache(self, state: dict, chave: str, resposta: str, acoes: List[Dict]) -> None:
+        """
+        Guarda a resposta só se ela não pode depender do paciente: gerada
+        só com ferramentas da clínica (ver_info_clinica) e sem cliente
+        identificado no state.
+        """
+        if not resposta or any(a.get("ferramenta") not in FERRAMENTAS_DA_CLINICA for a in acoes):
+            return
+        if state.get("cliente_id") or (state.get("dados_cliente") or {}).get("nome_curto"):
+            return
+        
+        cache_respostas.guardar(state.get("clinica_id", ""), "resposta_agente", chave, resposta)
+    
     # ========================================================================
     # MÉTODOS AUXILIARES
     # ========================================================================
     
     def _montar_contexto(self, state: dict) -> str:
-        """Monta string de contexto."""
+        """Monta string de contexto (dados pré-carregados em carregar_contexto)."""
         partes = []
         
-        if state.get("cliente_id"):
+        if not state.get("cliente_verificado"):
+            partes.append("Cliente não verificado")
+        elif state.get("cliente_id"):
             dados = state.get("dados_cliente", {})
             nome = dados.get("nome", "Cliente")
-            partes.append(f"Cliente: {nome}")
+            partes.append(f"Cliente verificado: {nome} (cadastrado)")
+            
+            if dados.get("convenio"):
+                partes.append(f"Convênio: {dados['convenio']}")
             
             if not dados.get("cadastro_completo"):
                 partes.append("Cadastro INCOMPLETO")
             
+            card = state.get("card_atual")
+            if card:
+                partes.append(f"Card: fase {card.get('fase')}, coluna {card.get('coluna')}")
+            
             if state.get("consulta_agendada"):
                 c = state["consulta_agendada"]
-                partes.append(f"Consulta: {c.get('data_formatada', c.get('data'))}")
+                linha = f"Consulta: {c.get('data_formatada', c.get('data'))}"
+                if c.get("id"):
+                    linha += f" (agendamento_id: {c['id']})"
                 if c.get("confirmada"):
-                    partes.append("(Confirmada)")
+                    linha += " (Confirmada)"
+                partes.append(linha)
+            else:
+                partes.append("Sem consulta agendada")
         else:
-            partes.append("Cliente não identificado")
+            partes.append("Cliente verificado: Cliente novo (sem cadastro)")
         
         return "\n".join(partes) if partes else "Início da conversa"
     
@@ -198,23 +409,33 @@ class AgenteClinica:
         messages = []
         
         # Histórico
-        for msg in state.get("historico_mensagens", [])[-10:]:
+        for msg in state.get("historico_mensagens", [])[-MAX_HISTORICO:]:
             role = "user" if msg.get("direcao") == "recebida" else "assistant"
             messages.append({"role": role, "content": msg.get("conteudo", "")})
         
-        # Mensagem atual
-        if state.get("mensagem_atual"):
-            messages.append({"role": "user", "content": state["mensagem_atual"]})
+        # Mensagem atual. As recebidas deste turno já foram registradas antes
+        # do grafo (e podem ser várias, agrupadas em mensagem_atual): as
+        # mensagens do paciente ainda sem resposta no fim do histórico saem
+        atual = state.get("mensagem_atual")
+        if atual:
+            while messages and messages[-1]["role"] == "user":
+                messages.pop()
+            messages.append({"role": "user", "content": atual})
         
         return messages
     
-    async def _chamar_llm(self, system: str, messages: List[Dict]) -> dict:
-        """Chama o LLM."""
-        import httpx
-        
-        api_key = self.llm_client.api_key
-        model = self.llm_client.model
-        base_url = self.llm_client.base_url
+    def _montar_requisicao(
+        self,
+        system: str,
+        messages: List[Dict],
+        ferramentas: Optional[List[Dict]] = None,
+        provider=None
+    ) -> tuple[str, dict, dict]:
+        """URL, headers e body da chamada de chat completions."""
+        provider = provider or self.llm_client
+        api_key = provider.api_key
+        model = provider.model
+        base_url = provider.base_url
         
         headers = {
             "Authorization": f"Bearer {api_key}",
@@ -228,28 +449,155 @@ class AgenteClinica:
         body = {
             "model": model,
             "messages": [{"role": "system", "content": system}, *messages],
-            "tools": TOOLS_SCHEMA,
-            "tool_choice": "auto",
             "temperature": 0.7,
             "max_tokens": 500
         }
         
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                f"{base_url}/chat/completions",
-                headers=headers,
-                json=body,
-                timeout=60.0
+        ferramentas = TOOLS_SCHEMA if ferramentas is None else ferramentas
+        if ferramentas:
+            body["tools"] = ferramentas
+            body["tool_choice"] = "auto"
+        
+        return f"{base_url}/chat/completions", headers, body
+    
+    async def _chamar_llm(
+        self,
+        system: str,
+        messages: List[Dict],
+        ferramentas: Optional[List[Dict]] = None
+    ) -> dict:
+        """Chama o LLM (com failover/hedge quando o cliente é um RoteadorLLM)."""
+        if isinstance(self.llm_client, RoteadorLLM):
+            return await self.llm_client.executar(
+                lambda provider: self._chamar_llm_provider(provider, system, messages, ferramentas)
             )
-            resp.raise_for_status()
-            data = resp.json()
+        return await self._chamar_llm_provider(self.llm_client, system, messages, ferramentas)
+    
+    async def _chamar_llm_provider(
+        self,
+        provider,
+        system: str,
+        messages: List[Dict],
+        ferramentas: Optional[List[Dict]] = None
+    ) -> dict:
+        """Chamada de chat completions em um provedor específico."""
+        url, headers, body = self._montar_requisicao(system, messages, ferramentas, provider)
+        
+        client = get_http_client("llm")
+        resp = await client.post(
+            url,
+            headers=headers,
+            json=body,
+            timeout=60.0
+        )
+        resp.raise_for_status()
+        data = resp.json()
         
         choice = data.get("choices", [{}])[0]
         message = choice.get("message", {})
         
         return {
             "content": message.get("content", ""),
-            "tool_calls": message.get("tool_calls", [])
+            "tool_calls": message.get("tool_calls", []),
+            "usage": data.get("usage", {}),
+            "modelo": provider.model,
+            "provider": _nome_provider(provider)
+        }
+    
+    async def _chamar_llm_stream(
+        self,
+        system: str,
+        messages: List[Dict],
+        emitir: Callable[[dict], None],
+        ferramentas: Optional[List[Dict]] = None
+    ) -> dict:
+        """
+        Chama o LLM em modo streaming (SSE compatível com OpenAI).
+        
+        Emite cada trecho de texto como evento "token" e remonta os
+        tool_calls a partir dos deltas. Retorna no mesmo formato de _chamar_llm.
+        
+        Com RoteadorLLM há failover mas não hedge, e só enquanto nenhum
+        token foi emitido (senão o cliente veria a resposta duplicada).
+        """
+        if not isinstance(self.llm_client, RoteadorLLM):
+            return await self._chamar_llm_stream_provider(self.llm_client, system, messages, emitir, ferramentas)
+        
+        emitidos = []
+        
+        def emitir_contando(evento: dict) -> None:
+            emitidos.append(1)
+            emitir(evento)
+        
+        return await self.llm_client.executar(
+            lambda provider: self._chamar_llm_stream_provider(
+                provider, system, messages, emitir_contando, ferramentas
+            ),
+            hedge=False,
+            pode_repetir=lambda: not emitidos
+        )
+    
+    async def _chamar_llm_stream_provider(
+        self,
+        provider,
+        system: str,
+        messages: List[Dict],
+        emitir: Callable[[dict], None],
+        ferramentas: Optional[List[Dict]] = None
+    ) -> dict:
+        """Chamada streaming em um provedor específico."""
+        url, headers, body = self._montar_requisicao(system, messages, ferramentas, provider)
+        body["stream"] = True
+        body["stream_options"] = {"include_usage": True}
+        
+        conteudo = []
+        tool_calls: Dict[int, dict] = {}
+        usage = {}
+        
+        client = get_http_client("llm")
+        async with client.stream("POST", url, headers=headers, json=body, timeout=60.0) as resp:
+            resp.raise_for_status()
+            
+            async for linha in resp.aiter_lines():
+                if not linha.startswith("data:"):
+                    continue
+                dados = linha[5:].strip()
+                if dados == "[DONE]":
+                    break
+                
+                try:
+                    chunk = json.loads(dados)
+                except json.JSONDecodeError:
+                    continue
+                
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                
+                for choice in chunk.get("choices", []):
+                    delta = choice.get("delta", {})
+                    
+                    if delta.get("content"):
+                        conteudo.append(delta["content"])
+                        emitir({"tipo": "token", "conteudo": delta["content"]})
+                    
+                    for parcial in delta.get("tool_calls") or []:
+                        tc = tool_calls.setdefault(parcial.get("index", 0), {
+                            "id": "",
+                            "type": "function",
+                            "function": {"name": "", "arguments": ""}
+                        })
+                        if parcial.get("id"):
+                            tc["id"] = parcial["id"]
+                        funcao = parcial.get("function", {})
+                        tc["function"]["name"] += funcao.get("name") or ""
+                        tc["function"]["arguments"] += funcao.get("arguments") or ""
+        
+        return {
+            "content": "".join(conteudo),
+            "tool_calls": [tool_calls[i] for i in sorted(tool_calls)],
+            "usage": usage,
+            "modelo": provider.model,
+            "provider": _nome_provider(provider)
         }
     
     def _atualizar_state(self, state: dict, ferramenta: str, resultado: dict) -> dict:
@@ -257,16 +605,7 @@ class AgenteClinica:
         novo = dict(state)
         
         if ferramenta == "verificar_cliente":
-            if resultado.get("existe"):
-                cliente = resultado.get("cliente", {})
-                novo["cliente_id"] = cliente.get("id")
-                novo["cliente_existe"] = True
-                novo["dados_cliente"] = cliente
-                
-                if resultado.get("consulta_agendada"):
-                    novo["consulta_agendada"] = resultado["consulta_agendada"]
-            else:
-                novo["cliente_existe"] = False
+            novo = aplicar_verificacao_cliente(novo, resultado)
         
         elif ferramenta == "cadastrar_cliente":
             if resultado.get("sucesso"):
@@ -286,8 +625,19 @@ class AgenteClinica:
                     "id": resultado.get("agendamento_id"),
                     "data": resultado.get("data"),
                     "hora": resultado.get("hora"),
-                    "data_formatada": resultado.get("data_formatada")
+                    "data_formatada": resultado.get("data_formatada"),
+                    "medico": resultado.get("medico_nome"),
+                    "confirmada": False
                 }
+                if resultado.get("card_id"):
+                    novo["card_id"] = resultado["card_id"]
+                    novo["card_atual"] = {
+                        **(novo.get("card_atual") or {}),
+                        "id": resultado["card_id"],
+                        "agendamento_id": resultado.get("agendamento_id"),
+                        "fase": resultado.get("fase_atual"),
+                        "coluna": resultado.get("coluna_atual")
+                    }
         
         elif ferramenta == "atualizar_rascunho":
             if resultado.get("rascunho"):
@@ -300,16 +650,67 @@ class AgenteClinica:
                     novo["consulta_agendada"] = None
                 elif acao == "remarcada":
                     novo["consulta_agendada"] = {
-                        **novo.get("consulta_agendada", {}),
+                        **(novo.get("consulta_agendada") or {}),
                         "data_formatada": resultado.get("nova_data_formatada")
                     }
                 elif acao == "confirmada":
                     if novo.get("consulta_agendada"):
-                        novo["consulta_agendada"]["confirmada"] = True
+                        novo["consulta_agendada"] = {**novo["consulta_agendada"], "confirmada": True}
+        
+        elif ferramenta == "ver_consulta":
+            if "tem_consulta" in resultado:
+                novo["consulta_agendada"] = resultado.get("consulta")
+        
+        # Banco alterado: o contexto do paciente é recarregado no próximo turno
+        # (até lá, o state já reflete o resultado da ferramenta)
+        if ferramenta in FERRAMENTAS_ALTERAM_CONTEXTO and not resultado.get("erro"):
+            novo["contexto_atualizado_em"] = None
         
         return novo
 
 
+def _nome_provider(provider) -> Optional[str]:
+    obter_nome = getattr(provider, "get_provider_name", None)
+    return obter_nome() if callable(obter_nome) else None
+
+
+# ============================================================================
+# CONTEXTO DO CLIENTE
+# ============================================================================
+
+def aplicar_verificacao_cliente(state: dict, resultado: dict) -> dict:
+    """
+    Aplica no state o resultado de verificar_cliente.
+    
+    Usado tanto pelo pré-carregamento (carregar_contexto) quanto
+    quando o agente chama a ferramenta explicitamente.
+    """
+    novo = dict(state)
+    
+    if resultado.get("erro"):
+        return novo
+    
+    novo["cliente_verificado"] = True
+    novo["contexto_atualizado_em"] = time.time()
+    novo["medico_padrao"] = resultado.get("medico_padrao") or novo.get("medico_padrao")
+    
+    if resultado.get("existe"):
+        cliente = resultado.get("cliente", {})
+        novo["cliente_id"] = cliente.get("id")
+        novo["cliente_existe"] = True
+        novo["dados_cliente"] = cliente
+        novo["consulta_agendada"] = resultado.get("consulta_agendada")
+        
+        card = resultado.get("card")
+        novo["card_atual"] = card
+        if card:
+            novo["card_id"] = card.get("id")
+    else:
+        novo["cliente_existe"] = False
+    
+    return novo
+
+
 # ============================================================================
 # FACTORY
 # ============================================================================
@@ -0,0 +1,593 @@
+# app/chat_langgraph/benchmark.py
+"""
+Benchmark do chat: replay de conversas e carga concorrente.
+
+Reproduz conversas (sintéticas ou gravadas) pelo caminho real de produção
+(ChatService → ChatGraph → AgenteClinica → ferramentas), trocando só as
+bordas:
+
+- BancoLocal: banco em memória com a mesma interface do SupabaseClient,
+  latência configurável por ida ao banco e contagem de idas
+- Stub LLM: servidor HTTP local compatível com /chat/completions, com
+  latência configurável e roteiro de respostas (texto ou tool_calls)
+  por mensagem do paciente
+
+Relata, por nível de concorrência: latência do turno (p50/p95), chamadas
+ao LLM por turno, idas ao banco por turno e vazão (turnos/s).
+
+Com --baseline, compara com uma execução anterior e sai com código 1 se
+alguma métrica piorar além da tolerância (uso em CI).
+
+Uso:
+    python -m app.chat_langgraph.benchmark
+    python -m app.chat_langgraph.benchmark --concorrencia 1,10,50 --latencia-llm-ms 300
+    python -m app.chat_langgraph.benchmark --salvar benchmark_chat.json
+    python -m app.chat_langgraph.benchmark --baseline benchmark_chat.json --tolerancia 0.2
+    python -m app.chat_langgraph.benchmark --conversas conversas_gravadas.jsonl
+
+Formato de --conversas (JSONL, uma conversa por linha):
+    {"nome": "...", "paciente": {...} | null,
+     "turnos": [{"mensagem": "...", "llm": [{"conteudo": "..."} |
+                                           {"ferramentas": [["nome", {args}]]}]},
+                {"mensagem": "...", "resposta": "texto gravado"}]}
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import sys
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+
+CLINICA_ID = "00000000-0000-0000-0000-00000000b3c4"
+
+# Métricas comparadas com a baseline: (nome, maior_é_pior)
+METRICAS_REGRESSAO = [
+    ("latencia_p50_ms", True),
+    ("latencia_p95_ms", True),
+    ("llm_chamadas_por_turno", True),
+    ("db_idas_por_turno", True),
+    ("vazao_turnos_s", False),
+]
+
+
+# ============================================================================
+# BANCO LOCAL
+# ============================================================================
+
+class BancoLocal:
+    """
+    Banco em memória com a interface do SupabaseClient usada pelo chat.
+
+    Cada operação conta como uma ida ao banco e espera `latencia_ms`
+    (simula a rede até o Supabase). Com rpc=False as RPCs falham, para
+    medir os caminhos de fallback.
+    """
+
+    def __init__(self, latencia_ms: float = 5.0, rpc: bool = True):
+        self.latencia_s = latencia_ms / 1000
+        self.rpc_habilitada = rpc
+        self.tabelas: Dict[str, List[Dict]] = {}
+        self.idas: Counter = Counter()
+        self.semear("usuarios", {
+            "id": str(uuid.uuid4()), "clinica_id": CLINICA_ID, "nome": "Dra. Helena Prado",
+            "tipo": "medico", "ativo": True, "crm": "12345"
+        })
+        self.semear("clinicas", {
+            "id": CLINICA_ID, "nome": "Clínica Demo", "logradouro": "Rua das Flores", "numero": "123",
+            "complemento": "Sala 45", "bairro": "Centro", "cidade": "São Paulo", "estado": "SP", "ativo": True
+        })
+        self.semear("tipos_consulta", {"clinica_id": CLINICA_ID, "nome": "Consulta", "valor_particular": 300.0, "ativo": True})
+        for convenio in ("Unimed", "Bradesco Saúde", "SulAmérica"):
+            self.semear("convenios", {"clinica_id": CLINICA_ID, "nome": convenio, "ativo": True})
+
+    def semear(self, tabela: str, linha: Dict) -> Dict:
+        """Insere sem contar ida ao banco (preparação do cenário)."""
+        linha = {"id": str(uuid.uuid4()), "created_at": datetime.now().isoformat(), **linha}
+        self.tabelas.setdefault(tabela, []).append(linha)
+        return linha
+
+    @property
+    def total_idas(self) -> int:
+        return sum(self.idas.values())
+
+    async def _ida(self, operacao: str, tabela: str) -> None:
+        self.idas[f"{operacao}:{tabela}"] += 1
+        if self.latencia_s:
+            await asyncio.sleep(self.latencia_s)
+
+    def _filtrar(self, tabela: str, filters: Optional[Dict]) -> List[Dict]:
+        filtros = filters or {}
+        return [
+            linha for linha in self.tabelas.get(tabela, [])
+            if all(linha.get(campo) == valor for campo, valor in filtros.items())
+        ]
+
+    async def select(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Optional[Dict] = None,
+        order_by: Optional[str] = None,
+        order_asc: bool = True,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None
+    ) -> List[Dict]:
+        await self._ida("select", table)
+        linhas = self._filtrar(table, filters)
+        if order_by:
+            linhas = sorted(linhas, key=lambda l: str(l.get(order_by) or ""), reverse=not order_asc)
+        inicio = offset or 0
+        return [dict(l) for l in linhas[inicio:inicio + limit if limit else None]]
+
+    async def select_one(self, table: str, columns: str = "*", filters: Optional[Dict] = None) -> Optional[Dict]:
+        await self._ida("select_one", table)
+        linhas = self._filtrar(table, filters)
+        return dict(linhas[0]) if linhas else None
+
+    async def insert(self, table: str, data: Dict) -> Dict:
+        await self._ida("insert", table)
+        return dict(self.semear(table, data))
+
+    async def insert_many(self, table: str, data: List[Dict]) -> List[Dict]:
+        await self._ida("insert_many", table)
+        return [dict(self.semear(table, linha)) for linha in data]
+
+    async def update(self, table: str, data: Dict, filters: Dict) -> List[Dict]:
+        await self._ida("update", table)
+        linhas = self._filtrar(table, filters)
+        for linha in linhas:
+            linha.update(data)
+        return [dict(l) for l in linhas]
+
+    async def delete(self, table: str, filters: Dict) -> List[Dict]:
+        await self._ida("delete", table)
+        linhas = self._filtrar(table, filters)
+        self.tabelas[table] = [l for l in self.tabelas.get(table, []) if l not in linhas]
+        return linhas
+
+    async def rpc(self, function_name: str, params: Optional[Dict] = None) -> Any:
+        await self._ida("rpc", function_name)
+        params = params or {}
+        if not self.rpc_habilitada:
+            raise RuntimeError(f"Could not find the function public.{function_name} in the schema cache")
+
+        if function_name == "obter_ou_criar_conversa":
+            filtros = {"clinica_id": params["p_clinica_id"], "telefone": params["p_telefone"]}
+            conversas = self._filtrar("conversas", filtros)
+            conversa = conversas[0] if conversas else self.semear("conversas", filtros)
+            conversa["ativa"] = True
+            return [dict(conversa)]
+
+        if function_name == "contexto_paciente":
+            return self._contexto_paciente(params["p_clinica_id"], params["p_telefone"])
+
+        if function_name == "registrar_uso_tokens_conversa":
+            for conversa in self._filtrar("conversas", {"id": params["p_conversa_id"]}):
+                conversa["tokens_prompt"] = conversa.get("tokens_prompt", 0) + params["p_tokens_prompt"]
+                conversa["tokens_completion"] = conversa.get("tokens_completion", 0) + params["p_tokens_completion"]
+                conversa["turnos_llm"] = conversa.get("turnos_llm", 0) + params.get("p_turnos", 1)
+            return None
+
+        raise RuntimeError(f"Could not find the function public.{function_name} in the schema cache")
+
+    def _contexto_paciente(self, clinica_id: str, telefone: str) -> Dict:
+        """Mesmo resultado da função contexto_paciente (migração 010)."""
+        pacientes = (
+            self._filtrar("pacientes", {"clinica_id": clinica_id, "celular": telefone})
+            or self._filtrar("pacientes", {"clinica_id": clinica_id, "whatsapp": telefone})
+        )
+        paciente = pacientes[0] if pacientes else None
+        card = agendamento = None
+        if paciente:
+            cards = self._filtrar("cards", {"clinica_id": clinica_id, "paciente_id": paciente["id"], "status": "ativo"})
+            card = max(cards, key=lambda c: c.get("created_at") or "", default=None)
+            agendamentos = self._filtrar(
+                "agendamentos", {"clinica_id": clinica_id, "paciente_id": paciente["id"], "status": "agendado"}
+            )
+            agendamento = min(agendamentos, key=lambda a: str(a.get("data")), default=None)
+        medicos = self._filtrar("usuarios", {"clinica_id": clinica_id, "tipo": "medico", "ativo": True})
+        return {
+            "paciente": paciente,
+            "card": card,
+            "agendamento": agendamento,
+            "medico_padrao": {"id": medicos[0]["id"], "nome": medicos[0]["nome"]} if medicos else None,
+        }
+
+
+# ============================================================================
+# STUB LLM
+# ============================================================================
+
+class StubLLM:
+    """
+    Servidor /chat/completions local com roteiro de respostas.
+
+    O roteiro mapeia a mensagem do paciente para a sequência de respostas
+    do LLM naquele turno: a n-ésima chamada após a mensagem recebe a
+    n-ésima resposta (tool_calls ou texto). Fora do roteiro responde texto.
+    """
+
+    def __init__(self, roteiros: Dict[str, List[Dict]], latencia_ms: float = 300.0):
+        self.roteiros = roteiros
+        self.latencia_s = latencia_ms / 1000
+        self.chamadas = 0
+        self._servidor = None
+        self.url = ""
+
+    async def iniciar(self) -> str:
+        self._servidor = await asyncio.start_server(self._atender, "127.0.0.1", 0)
+        porta = self._servidor.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{porta}"
+        return self.url
+
+    async def encerrar(self) -> None:
+        if self._servidor:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:  # keep-alive: várias requisições por conexão
+                cabecalho = await reader.readuntil(b"\r\n\r\n")
+                tamanho = 0
+                for linha in cabecalho.decode().split("\r\n"):
+                    if linha.lower().startswith("content-length:"):
+                        tamanho = int(linha.split(":", 1)[1])
+                corpo = json.loads(await reader.readexactly(tamanho)) if tamanho else {}
+
+                self.chamadas += 1
+                await asyncio.sleep(self.latencia_s)
+
+                resposta = json.dumps(self._responder(corpo)).encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(resposta)}\r\n\r\n".encode() + resposta
+                )
+                await writer.drain()
+        except (asyncio.CancelledError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _responder(self, corpo: Dict) -> Dict:
+        mensagens = corpo.get("messages", [])
+        ultima_usuario = max((i for i, m in enumerate(mensagens) if m.get("role") == "user"), default=-1)
+        mensagem = mensagens[ultima_usuario].get("content", "") if ultima_usuario >= 0 else ""
+        passo = sum(1 for m in mensagens[ultima_usuario + 1:] if m.get("role") == "assistant")
+
+        roteiro = self.roteiros.get(mensagem) or []
+        passo_roteiro = roteiro[passo] if passo < len(roteiro) else {"conteudo": "Certo! Posso ajudar em algo mais?"}
+
+        mensagem_llm: Dict[str, Any] = {"role": "assistant", "content": passo_roteiro.get("conteudo")}
+        ferramentas = passo_roteiro.get("ferramentas") or []
+        # Sem tools no request (orçamento/seleção de ferramentas) o LLM só pode responder texto
+        if ferramentas and corpo.get("tools"):
+            mensagem_llm["tool_calls"] = [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                    "type": "function",
+                    "function": {"name": nome, "arguments": json.dumps(args, ensure_ascii=False)}
+                }
+                for nome, args in ferramentas
+            ]
+        elif not mensagem_llm["content"]:
+            mensagem_llm["content"] = "Certo!"
+
+        prompt = sum(len(str(m.get("content") or "")) for m in mensagens) // 4
+        return {
+            "model": corpo.get("model"),
+            "choices": [{"message": mensagem_llm, "finish_reason": "tool_calls" if "tool_calls" in mensagem_llm else "stop"}],
+            "usage": {"prompt_tokens": prompt, "completion_tokens": 20, "total_tokens": prompt + 20}
+        }
+
+
+# ============================================================================
+# CONVERSAS
+# ============================================================================
+
+def _proximo_dia_util(dias: int) -> str:
+    data = datetime.now() + timedelta(days=dias)
+    while data.weekday() >= 5:
+        data += timedelta(days=1)
+    return data.strftime("%Y-%m-%d")
+
+
+def conversas_sinteticas() -> List[Dict]:
+    """Cenários típicos da Fase 0: paciente novo, paciente com consulta e dúvidas."""
+    data_consulta = _proximo_dia_util(3)
+    return [
+        {
+            "nome": "paciente_novo_agenda",
+            "paciente": None,
+            "turnos": [
+                {"mensagem": "Oi, boa tarde! Queria marcar uma consulta", "llm": [
+                    {"ferramentas": [["verificar_cliente", {}]]},
+                    {"conteudo": "Boa tarde! Claro. Pode me passar seu nome completo, CPF e data de nascimento?"},
+                ]},
+                {"mensagem": "Mariana Costa Lima, 123.456.789-09, 14/03/1991, particular", "llm": [
+                    {"ferramentas": [["cadastrar_cliente", {
+                        "nome": "Mariana Costa Lima", "cpf": "12345678909",
+                        "data_nascimento": "1991-03-14", "convenio": "Particular",
+                        "intencao_inicial": "agendar_consulta"
+                    }]]},
+                    {"ferramentas": [["ver_horarios", {"dias": 7}]]},
+                    {"conteudo": "Cadastro feito, Mariana! Tenho horários na semana que vem. Qual prefere?"},
+                ]},
+                {"mensagem": "Pode ser às 10h no primeiro dia", "llm": [
+                    {"ferramentas": [["agendar_consulta", {"data": data_consulta, "hora": "10:00"}]]},
+                    {"conteudo": "Pronto! Sua consulta está agendada. Até lá!"},
+                ]},
+            ],
+        },
+        {
+            "nome": "paciente_existente_confirma",
+            "paciente": {
+                "nome": "Roberto Almeida", "cpf": "98765432100",
+                "data_nascimento": "1980-07-22", "convenio_nome": "Unimed",
+            },
+            "consulta": {"data": data_consulta, "hora": "14:00"},
+            "turnos": [
+                {"mensagem": "Olá, tenho consulta marcada?", "llm": [
+                    {"ferramentas": [["ver_consulta", {}]]},
+                    {"conteudo": "Olá, Roberto! Sim, sua consulta está marcada. Deseja confirmar?"},
+                ]},
+                {"mensagem": "Confirmo sim", "llm": [
+                    {"ferramentas": [["gerenciar_consulta", {"acao": "confirmar"}]]},
+                    {"conteudo": "Consulta confirmada. Obrigado!"},
+                ]},
+            ],
+        },
+        {
+            "nome": "duvidas_clinica",
+            "paciente": {"nome": "Fernanda Rocha", "convenio_nome": "Particular"},
+            "turnos": [
+                {"mensagem": "Quanto custa a consulta particular?", "llm": [
+                    {"ferramentas": [["ver_info_clinica", {"tipo": "valores"}]]},
+                    {"conteudo": "A consulta particular custa R$ 300,00, com retorno gratuito em 30 dias."},
+                ]},
+                {"mensagem": "E qual o endereço?", "llm": [
+                    {"ferramentas": [["ver_info_clinica", {"tipo": "endereco"}]]},
+                    {"conteudo": "Rua das Flores, 123 - Sala 45 - Centro."},
+                ]},
+            ],
+        },
+    ]
+
+
+def carregar_conversas(caminho: str) -> List[Dict]:
+    """Conversas gravadas (JSONL). Turnos com "resposta" viram roteiro de texto."""
+    conversas = []
+    with open(caminho, encoding="utf-8") as arquivo:
+        for numero, linha in enumerate(arquivo, 1):
+            if not linha.strip():
+                continue
+            conversa = json.loads(linha)
+            conversa.setdefault("nome", f"gravada_{numero}")
+            for turno in conversa.get("turnos", []):
+                if "llm" not in turno:
+                    turno["llm"] = [{"conteudo": turno.get("resposta") or "Certo!"}]
+            conversas.append(conversa)
+    return conversas
+
+
+def _roteiros(conversas: List[Dict]) -> Dict[str, List[Dict]]:
+    return {turno["mensagem"]: turno["llm"] for c in conversas for turno in c["turnos"]}
+
+
+def _preparar_conversa(db: BancoLocal, conversa: Dict, telefone: str) -> None:
+    """Cadastra paciente, card e consulta do cenário (sem contar idas ao banco)."""
+    if not conversa.get("paciente"):
+        return
+    paciente = db.semear("pacientes", {
+        **conversa["paciente"], "clinica_id": CLINICA_ID, "celular": telefone, "whatsapp": telefone
+    })
+    card = db.semear("cards", {
+        "clinica_id": CLINICA_ID, "paciente_id": paciente["id"], "status": "ativo",
+        "fase": 0, "coluna": "pre_agendamento"
+    })
+    if conversa.get("consulta"):
+        agendamento = db.semear("agendamentos", {
+            "clinica_id": CLINICA_ID, "paciente_id": paciente["id"], "card_id": card["id"],
+            "status": "agendado", "confirmado": False, **conversa["consulta"]
+        })
+        card.update({"agendamento_id": agendamento["id"], "fase": 1, "coluna": "pre_consulta"})
+
+
+# ============================================================================
+# EXECUÇÃO
+# ============================================================================
+
+def _percentil(valores: List[float], p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+async def executar_nivel(
+    conversas: List[Dict],
+    concorrencia: int,
+    rodadas: int = 2,
+    latencia_llm_ms: float = 300.0,
+    latencia_db_ms: float = 5.0,
+    rpc: bool = True
+) -> Dict[str, Any]:
+    """
+    `concorrencia` conversas simultâneas; cada uma repete `rodadas` cenários
+    em sequência (telefone novo por cenário, turnos em ordem).
+    """
+    from app.core import http
+    from .roteador_llm import ProviderCompativelOpenAI
+    from .service import ChatService
+    from . import cache_respostas, historico_conversas
+
+    cache_respostas.invalidar_clinica()
+    historico_conversas.invalidar()
+
+    db = BancoLocal(latencia_ms=latencia_db_ms, rpc=rpc)
+    stub = StubLLM(_roteiros(conversas), latencia_ms=latencia_llm_ms)
+    llm = ProviderCompativelOpenAI("stub", await stub.iniciar(), "stub-model")
+
+    service = ChatService(db=db, llm_client=llm, debounce_ms=0, debounce_max_ms=0)
+    await service.iniciar()
+
+    metricas_turnos: List[Dict] = []
+    latencias_ms: List[float] = []
+    erros = 0
+
+    async def trabalhador(indice: int) -> None:
+        nonlocal erros
+        for rodada in range(rodadas):
+            conversa = conversas[(indice + rodada) % len(conversas)]
+            telefone = f"5511{90000000 + indice * rodadas + rodada:08d}"
+            _preparar_conversa(db, conversa, telefone)
+            for turno in conversa["turnos"]:
+                inicio = time.perf_counter()
+                try:
+                    resposta = await service.processar_mensagem(CLINICA_ID, telefone, turno["mensagem"]) or {}
+                    metricas_turnos.append(resposta.get("metricas") or {})
+                    if resposta.get("estado") == "erro":
+                        erros += 1
+                except Exception:
+                    erros += 1
+                latencias_ms.append((time.perf_counter() - inicio) * 1000)
+
+    try:
+        inicio = time.perf_counter()
+        await asyncio.gather(*(trabalhador(i) for i in range(concorrencia)))
+        duracao_s = time.perf_counter() - inicio
+        await service.escrita.descarregar()
+    finally:
+        await service.encerrar()
+        await stub.encerrar()
+        await http.fechar_http_clients()
+
+    turnos = len(latencias_ms)
+    return {
+        "concorrencia": concorrencia,
+        "turnos": turnos,
+        "erros": erros,
+        "latencia_p50_ms": round(_percentil(latencias_ms, 50), 1),
+        "latencia_p95_ms": round(_percentil(latencias_ms, 95), 1),
+        "latencia_max_ms": round(max(latencias_ms, default=0.0), 1),
+        "llm_chamadas_por_turno": round(stub.chamadas / turnos, 2) if turnos else 0.0,
+        "llm_chamadas_max_turno": max((m.get("llm_chamadas", 0) for m in metricas_turnos), default=0),
+        "db_idas_por_turno": round(db.total_idas / turnos, 2) if turnos else 0.0,
+        "db_idas_por_operacao": dict(db.idas.most_common()),
+        "vazao_turnos_s": round(turnos / duracao_s, 2) if duracao_s else 0.0,
+    }
+
+
+async def executar(
+    conversas: List[Dict],
+    niveis: List[int],
+    silencioso: bool = True,
+    **kwargs
+) -> Dict[str, Any]:
+    """Roda cada nível de concorrência; o log do chat fica oculto se silencioso."""
+    resultados = {}
+    for nivel in niveis:
+        saida = io.StringIO() if silencioso else sys.stdout
+        with contextlib.redirect_stdout(saida):
+            resultados[str(nivel)] = await executar_nivel(conversas, nivel, **kwargs)
+    return {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "parametros": {k: v for k, v in kwargs.items()},
+        "niveis": resultados,
+    }
+
+
+# ============================================================================
+# REGRESSÃO
+# ============================================================================
+
+def comparar(atual: Dict, baseline: Dict, tolerancia: float) -> List[str]:
+    """Regressões além da tolerância (ex: 0.2 = 20%) em relação à baseline."""
+    regressoes = []
+    for nivel, medido in atual["niveis"].items():
+        referencia = baseline.get("niveis", {}).get(nivel)
+        if medido["erros"]:
+            regressoes.append(f"concorrência {nivel}: {medido['erros']} turnos com erro")
+        if not referencia:
+            continue
+        for metrica, maior_e_pior in METRICAS_REGRESSAO:
+            antes, depois = referencia.get(metrica), medido.get(metrica)
+            if not antes or depois is None:
+                continue
+            variacao = (depois - antes) / antes
+            if (variacao > tolerancia) if maior_e_pior else (variacao < -tolerancia):
+                regressoes.append(
+                    f"concorrência {nivel}: {metrica} {antes} → {depois} ({variacao:+.0%})"
+                )
+    return regressoes
+
+
+def _imprimir(resultado: Dict) -> None:
+    colunas = [
+        ("conc.", "concorrencia"), ("turnos", "turnos"), ("p50 ms", "latencia_p50_ms"),
+        ("p95 ms", "latencia_p95_ms"), ("llm/turno", "llm_chamadas_por_turno"),
+        ("db/turno", "db_idas_por_turno"), ("turnos/s", "vazao_turnos_s"), ("erros", "erros"),
+    ]
+    print(" | ".join(f"{titulo:>9}" for titulo, _ in colunas))
+    for medido in resultado["niveis"].values():
+        print(" | ".join(f"{medido[chave]:>9}" for _, chave in colunas))
+    ultimo = list(resultado["niveis"].values())[-1]
+    print(f"\nIdas ao banco por operação (concorrência {ultimo['concorrencia']}):")
+    for operacao, total in ultimo["db_idas_por_operacao"].items():
+        print(f"  {operacao:<45} {total / ultimo['turnos']:.2f}/turno")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark do chat (replay + carga)")
+    parser.add_argument("--concorrencia", default="1,10,50", help="níveis separados por vírgula")
+    parser.add_argument("--rodadas", type=int, default=2, help="cenários por conversa simultânea")
+    parser.add_argument("--latencia-llm-ms", type=float, default=300.0)
+    parser.add_argument("--latencia-db-ms", type=float, default=5.0)
+    parser.add_argument("--sem-rpc", action="store_true", help="mede os fallbacks sem as RPCs")
+    parser.add_argument("--conversas", help="JSONL com conversas gravadas (padrão: sintéticas)")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="piora máxima aceita (0.2 = 20%%)")
+    parser.add_argument("--salvar", help="grava o resultado em JSON (nova baseline)")
+    parser.add_argument("--verbose", action="store_true", help="mostra o log do chat")
+    args = parser.parse_args(argv)
+
+    conversas = carregar_conversas(args.conversas) if args.conversas else conversas_sinteticas()
+    niveis = [int(n) for n in args.concorrencia.split(",") if n.strip()]
+
+    resultado = asyncio.run(executar(
+        conversas, niveis,
+        silencioso=not args.verbose,
+        rodadas=args.rodadas,
+        latencia_llm_ms=args.latencia_llm_ms,
+        latencia_db_ms=args.latencia_db_ms,
+        rpc=not args.sem_rpc,
+    ))
+    _imprimir(resultado)
+
+    if args.salvar:
+        with open(args.salvar, "w", encoding="utf-8") as arquivo:
+            json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+        print(f"\nResultado salvo em {args.salvar}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as arquivo:
+            regressoes = comparar(resultado, json.load(arquivo), args.tolerancia)
+        if regressoes:
+            print(f"\n[ERROR] Regressões acima de {args.tolerancia:.0%}:")
+            for regressao in regressoes:
+                print(f"  - {regressao}")
+            return 1
+        print(f"\nSem regressões acima de {args.tolerancia:.0%} em relação a {args.baseline}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+# app/chat_langgraph/cache_respostas.py
+"""
+Cache de respostas por clínica.
+
+Guarda resultados de ferramentas de informação (ver_info_clinica) e
+respostas finais do LLM para perguntas sobre valores, convênios e FAQ.
+Essas respostas mudam raramente, então tráfego repetido não deve custar
+chamadas ao LLM nem leituras no banco.
+
+Chave: (clinica_id, versão da configuração, categoria, chave da pergunta).
+A versão é incrementada por invalidar_clinica() quando a configuração
+da clínica muda (assinado em app/clinicas/eventos.py, avisado por
+ClinicaService.update / update_configuracoes), o que descarta tudo que
+foi cacheado antes. Um TTL limita o tempo de vida em
+cenários com vários processos.
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.clinicas.eventos import ao_alterar_clinica
+
+from .intencao import normalizar
+
+
+CACHE_TTL = 3600  # segundos
+CACHE_MAX_ITENS = 5000
+
+# Intenções cujas respostas não dependem do paciente
+INTENCOES_CACHEAVEIS = frozenset({"VALOR", "CONVENIO", "FAQ"})
+
+# Palavras ignoradas ao montar a chave da pergunta
+_STOPWORDS = frozenset({
+    "a", "o", "as", "os", "de", "da", "do", "das", "dos", "e", "em", "na", "no",
+    "um", "uma", "por", "favor", "pf", "pfv", "qual", "quais", "me", "voce",
+    "voces", "vcs", "vc", "oi", "ola", "bom", "dia", "boa", "tarde", "noite",
+    "queria", "gostaria", "saber", "?", "ai", "ah", "la", "que", "pra", "para",
+})
+
+_itens: "OrderedDict[Tuple, Tuple[Any, float]]" = OrderedDict()
+_versoes: Dict[str, int] = {}
+_metricas = {"hits": 0, "misses": 0}
+
+
+def chave_pergunta(mensagem: str) -> str:
+    """Normaliza a pergunta: sem acento/pontuação/stopwords, tokens ordenados."""
+    tokens = {t for t in normalizar(mensagem).split() if t not in _STOPWORDS}
+    return " ".join(sorted(tokens))
+
+
+def versao_clinica(clinica_id: str) -> int:
+    """Versão atual da configuração da clínica (em memória)."""
+    return _versoes.get(clinica_id, 0)
+
+
+def obter(clinica_id: str, categoria: str, chave: str) -> Optional[Any]:
+    """Retorna valor cacheado (ou None)."""
+    k = (clinica_id, versao_clinica(clinica_id), categoria, chave)
+    item = _itens.get(k)
+
+    if item is None or item[1] < time.monotonic():
+        if item is not None:
+            _itens.pop(k, None)
+        _metricas["misses"] += 1
+        return None
+
+    _itens.move_to_end(k)
+    _metricas["hits"] += 1
+    return item[0]
+
+
+def guardar(clinica_id: str, categoria: str, chave: str, valor: Any, ttl: int = CACHE_TTL) -> None:
+    """Guarda valor para a versão atual da configuração da clínica."""
+    k = (clinica_id, versao_clinica(clinica_id), categoria, chave)
+    _itens[k] = (valor, time.monotonic() + ttl)
+    _itens.move_to_end(k)
+
+    while len(_itens) > CACHE_MAX_ITENS:
+        _itens.popitem(last=False)
+
+
+def invalidar_clinica(clinica_id: Optional[str] = None) -> None:
+    """
+    Descarta o cache da clínica (ou de todas) após mudança de configuração.
+
+    Incrementa a versão (entradas antigas deixam de ser encontradas)
+    e remove as entradas já existentes.
+    """
+    if clinica_id is None:
+        _itens.clear()
+        _versoes.clear()
+        return
+
+    _versoes[clinica_id] = versao_clinica(clinica_id) + 1
+    for k in [k for k in _itens if k[0] == clinica_id]:
+        del _itens[k]
+
+
+ao_alterar_clinica(invalidar_clinica)
+
+
+def get_metricas_cache() -> dict:
+    """Hits/misses e tamanho do cache."""
+    total = _metricas["hits"] + _metricas["misses"]
+    return {
+        **_metricas,
+        "itens": len(_itens),
+        "taxa_acerto": round(_metricas["hits"] / total, 3) if total else 0.0,
+    }
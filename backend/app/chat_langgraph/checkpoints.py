@@ -0,0 +1,224 @@
+# app/chat_langgraph/checkpoints.py
+"""
+Compactação e poda dos checkpoints do ChatGraph.
+
+O checkpointer grava um checkpoint por nó em cada turno e nunca apaga.
+Aqui:
+
+- compactar_estado(): reduz o estado final do turno ao que precisa
+  sobreviver entre turnos (sem histórico do banco, ações resumidas)
+- medir_bytes(): tamanho serializado do estado (métrica por turno)
+- podar_memoria() / podar_postgres(): mantém só os últimos N checkpoints
+  por conversa e apaga conversas inativas há mais de TTL
+
+A poda roda periodicamente dentro do processo (ChatGraph.iniciar).
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+
+# ============================================================================
+# ESTADO COMPACTO
+# ============================================================================
+
+def resumir_acoes(acoes: List[Dict]) -> List[Dict]:
+    """Ações do turno sem os resultados completos das ferramentas."""
+    resumo = []
+    for acao in acoes or []:
+        if not isinstance(acao, dict):
+            continue
+        resultado = acao.get("resultado")
+        resumo.append({
+            "ferramenta": acao.get("ferramenta"),
+            "sucesso": not (isinstance(resultado, dict) and resultado.get("erro")),
+            "duracao_ms": acao.get("duracao_ms"),
+        })
+    return resumo
+
+
+def compactar_estado(state: dict) -> dict:
+    """
+    Campos do estado reduzidos antes do checkpoint final do turno.
+
+    - historico_mensagens: recarregado do banco no próximo turno
+    - acoes_executadas: só nome, sucesso e duração
+    """
+    return {
+        "historico_mensagens": [],
+        "acoes_executadas": resumir_acoes(state.get("acoes_executadas", [])),
+    }
+
+
+def medir_bytes(serde, state: dict) -> int:
+    """Bytes do estado serializado pelo serde do checkpointer."""
+    total = 0
+    for valor in state.values():
+        try:
+            total += len(serde.dumps_typed(valor)[1])
+        except Exception:
+            continue
+    return total
+
+
+# ============================================================================
+# PODA - MEMÓRIA
+# ============================================================================
+
+def podar_memoria(saver, manter_por_thread: int, ttl_s: float) -> Dict[str, int]:
+    """
+    Poda um MemorySaver (InMemorySaver).
+
+    Mantém os últimos `manter_por_thread` checkpoints de cada conversa e
+    remove conversas cujo último checkpoint é mais antigo que `ttl_s`.
+    """
+    removidos = {"threads_expiradas": 0, "checkpoints": 0, "blobs": 0, "writes": 0}
+    limite = datetime.now(timezone.utc) - timedelta(seconds=ttl_s)
+
+    for thread_id in list(saver.storage.keys()):
+        namespaces = saver.storage[thread_id]
+
+        # TTL: conversa inteira
+        if _ultimo_ts_memoria(saver, namespaces) < limite:
+            removidos["threads_expiradas"] += 1
+            removidos["checkpoints"] += sum(len(c) for c in namespaces.values())
+            saver.delete_thread(thread_id)
+            continue
+
+        for ns, checkpoints in namespaces.items():
+            ids = sorted(checkpoints)
+            antigos, mantidos = ids[:-manter_por_thread], ids[-manter_por_thread:]
+            for checkpoint_id in antigos:
+                del checkpoints[checkpoint_id]
+                if saver.writes.pop((thread_id, ns, checkpoint_id), None) is not None:
+                    removidos["writes"] += 1
+            removidos["checkpoints"] += len(antigos)
+
+            if antigos:
+                removidos["blobs"] += _podar_blobs_memoria(saver, thread_id, ns, [checkpoints[i] for i in mantidos])
+
+    return removidos
+
+
+def _ultimo_ts_memoria(saver, namespaces: dict) -> datetime:
+    ultimo = datetime.min.replace(tzinfo=timezone.utc)
+    for checkpoints in namespaces.values():
+        if not checkpoints:
+            continue
+        checkpoint = saver.serde.loads_typed(checkpoints[max(checkpoints)][0])
+        try:
+            ultimo = max(ultimo, datetime.fromisoformat(checkpoint["ts"]))
+        except (KeyError, ValueError):
+            continue
+    return ultimo
+
+
+def _podar_blobs_memoria(saver, thread_id: str, ns: str, mantidos: list) -> int:
+    """Remove blobs de canais que nenhum checkpoint mantido referencia."""
+    referenciados = set()
+    for salvo in mantidos:
+        checkpoint = saver.serde.loads_typed(salvo[0])
+        referenciados.update(checkpoint.get("channel_versions", {}).items())
+
+    removidos = 0
+    for chave in [k for k in saver.blobs if k[0] == thread_id and k[1] == ns]:
+        if (chave[2], chave[3]) not in referenciados:
+            del saver.blobs[chave]
+            removidos += 1
+    return removidos
+
+
+# ============================================================================
+# PODA - POSTGRES
+# ============================================================================
+
+# Conversas inteiras sem checkpoint novo dentro do TTL
+SQL_THREADS_EXPIRADAS = """
+    SELECT thread_id FROM checkpoints
+    GROUP BY thread_id
+    HAVING max((checkpoint->>'ts')::timestamptz) < now() - make_interval(secs => %(ttl_s)s)
+"""
+
+SQL_PODAR = [
+    ("checkpoints_expirados", f"DELETE FROM checkpoints WHERE thread_id IN ({SQL_THREADS_EXPIRADAS})"),
+    ("checkpoints", """
+        DELETE FROM checkpoints c
+        USING (
+            SELECT thread_id, checkpoint_ns, checkpoint_id,
+                   row_number() OVER (
+                       PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                   ) AS posicao
+            FROM checkpoints
+        ) r
+        WHERE c.thread_id = r.thread_id
+          AND c.checkpoint_ns = r.checkpoint_ns
+          AND c.checkpoint_id = r.checkpoint_id
+          AND r.posicao > %(manter)s
+    """),
+    ("writes", """
+        DELETE FROM checkpoint_writes w
+        WHERE NOT EXISTS (
+            SELECT 1 FROM checkpoints c
+            WHERE c.thread_id = w.thread_id
+              AND c.checkpoint_ns = w.checkpoint_ns
+              AND c.checkpoint_id = w.checkpoint_id
+        )
+    """),
+    ("blobs", """
+        DELETE FROM checkpoint_blobs b
+        WHERE NOT EXISTS (
+            SELECT 1 FROM checkpoints c
+            WHERE c.thread_id = b.thread_id
+              AND c.checkpoint_ns = b.checkpoint_ns
+              AND c.checkpoint->'channel_versions'->>b.channel = b.version
+        )
+    """),
+]
+
+
+async def podar_postgres(pool, manter_por_thread: int, ttl_s: float) -> Dict[str, int]:
+    """
+    Poda as tabelas do AsyncPostgresSaver (checkpoints, writes e blobs).
+
+    Mesma política de podar_memoria; writes e blobs órfãos saem depois.
+    """
+    removidos = {}
+    parametros = {"manter": manter_por_thread, "ttl_s": ttl_s}
+
+    async with pool.connection() as conn:
+        for nome, sql in SQL_PODAR:
+            cursor = await conn.execute(sql, parametros if "%(" in sql else None)
+            removidos[nome] = cursor.rowcount
+
+    return removidos
+
+
+# ============================================================================
+# MÉTRICAS
+# ============================================================================
+
+class MetricasCheckpoint:
+    """Bytes do estado por turno e resultado das podas."""
+
+    def __init__(self):
+        self.turnos = 0
+        self.total_bytes = 0
+        self.max_bytes = 0
+        self.ultima_poda: Dict[str, Any] = {}
+
+    def registrar_turno(self, tamanho: int) -> None:
+        self.turnos += 1
+        self.total_bytes += tamanho
+        self.max_bytes = max(self.max_bytes, tamanho)
+
+    def registrar_poda(self, removidos: Dict[str, int], duracao_ms: int) -> None:
+        self.ultima_poda = {**removidos, "duracao_ms": duracao_ms, "em": time.time()}
+
+    def to_dict(self) -> dict:
+        return {
+            "turnos": self.turnos,
+            "bytes_medio": round(self.total_bytes / self.turnos) if self.turnos else 0,
+            "bytes_max": self.max_bytes,
+            "ultima_poda": self.ultima_poda,
+        }
@@ -0,0 +1,225 @@
+# app/chat_langgraph/escrita_atrasada.py
+"""
+Escrita atrasada (write-behind) das mensagens e conversas do chat.
+
+O turno do chat não espera o banco para registrar mensagens, atualizar a
+conversa ou somar tokens: as escritas entram numa fila em memória e uma
+task as grava em lote a cada INTERVALO_S (ou antes, se a fila encher).
+
+Em cada descarga:
+- mensagens: um único insert_many; se falhar, o lote é dividido ao meio
+  até isolar as linhas ruins (as boas são gravadas na mesma descarga)
+- conversas: atualizações da mesma conversa são combinadas (última vence)
+- uso de tokens: tokens, custo e turnos somados por conversa, uma RPC
+  por conversa
+
+Falhas voltam para a fila com backoff exponencial (calcular_backoff do
+outbox) e são tentadas de novo até MAX_TENTATIVAS — alguns minutos no total,
+o suficiente para atravessar uma queda curta do banco.
+No shutdown, encerrar() descarrega o que restou, ignorando o backoff.
+"""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.core.outbox import calcular_backoff
+
+
+INTERVALO_S = 0.25
+MAX_LOTE = 200
+MAX_TENTATIVAS = 8
+BACKOFF_BASE_S = 1.0
+BACKOFF_MAX_S = 60.0
+
+
+@dataclass
+class _Lote:
+    mensagens: List[Dict] = field(default_factory=list)
+    conversas: Dict[str, Dict] = field(default_factory=dict)
+    uso_tokens: Dict[str, Dict] = field(default_factory=dict)
+    tentativas: int = 0
+    proxima_em: float = 0.0
+
+    def vazio(self) -> bool:
+        return not (self.mensagens or self.conversas or self.uso_tokens)
+
+
+class EscritaAtrasada:
+    """Fila de escritas do chat, descarregada em lote fora do caminho da resposta."""
+
+    def __init__(self, db, intervalo_s: float = INTERVALO_S, max_lote: int = MAX_LOTE):
+        self.db = db
+        self.intervalo_s = intervalo_s
+        self.max_lote = max_lote
+        self._atual = _Lote()
+        self._retentar: deque = deque()
+        self._cheia = asyncio.Event()
+        self._tarefa: Optional[asyncio.Task] = None
+        self._metricas = {
+            "descargas": 0, "mensagens": 0, "conversas": 0, "falhas": 0, "descartados": 0, "lotes_divididos": 0
+        }
+        self._duracoes_ms: deque = deque(maxlen=200)
+
+    # ========================================
+    # ENFILEIRAR
+    # ========================================
+
+    def registrar_mensagem(self, mensagem: Dict) -> None:
+        self._atual.mensagens.append(mensagem)
+        if len(self._atual.mensagens) >= self.max_lote:
+            self._cheia.set()
+
+    def atualizar_conversa(self, conversa_id: str, dados: Dict) -> None:
+        self._atual.conversas.setdefault(conversa_id, {}).update(dados)
+
+    def somar_uso_tokens(self, conversa_id: str, tokens_prompt: int, tokens_completion: int, custo: float) -> None:
+        uso = self._atual.uso_tokens.setdefault(
+            conversa_id, {"tokens_prompt": 0, "tokens_completion": 0, "custo": 0.0, "turnos": 0}
+        )
+        uso["tokens_prompt"] += tokens_prompt
+        uso["tokens_completion"] += tokens_completion
+        uso["custo"] += custo
+        uso["turnos"] += 1
+
+    # ========================================
+    # CICLO DE VIDA
+    # ========================================
+
+    @property
+    def ativa(self) -> bool:
+        """Task de descarga rodando (senão o chamador descarrega manualmente)."""
+        return self._tarefa is not None and not self._tarefa.done()
+
+    def iniciar(self) -> None:
+        if not self.ativa:
+            self._tarefa = asyncio.create_task(self._loop())
+
+    async def encerrar(self) -> None:
+        """Para a task e grava o que está pendente."""
+        if self._tarefa:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+        await self.descarregar(forcar=True)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._cheia.wait(), self.intervalo_s)
+            except asyncio.TimeoutError:
+                pass
+            self._cheia.clear()
+            try:
+                await self.descarregar()
+            except Exception as e:
+                print(f"[ERROR] Escrita atrasada: {e}")
+
+    # ========================================
+    # DESCARGA
+    # ========================================
+
+    async def descarregar(self, forcar: bool = False) -> None:
+        """
+        Grava o lote atual e os lotes que falharam antes.
+
+        Lotes em backoff ficam na fila até vencer a espera, exceto com forcar
+        (shutdown), que tenta tudo agora.
+        """
+        agora = time.monotonic()
+        lotes = [lote for lote in self._retentar if forcar or lote.proxima_em <= agora]
+        self._retentar = deque(lote for lote in self._retentar if not (forcar or lote.proxima_em <= agora))
+        if not self._atual.vazio():
+            lotes.append(self._atual)
+            self._atual = _Lote()
+
+        for lote in lotes:
+            inicio = time.perf_counter()
+            await self._gravar(lote)
+            self._duracoes_ms.append((time.perf_counter() - inicio) * 1000)
+            self._metricas["descargas"] += 1
+
+    async def _gravar(self, lote: _Lote) -> None:
+        """Grava cada parte do lote; o que falhar volta para a fila."""
+        falhou = _Lote(tentativas=lote.tentativas + 1)
+
+        if lote.mensagens:
+            falhou.mensagens = await self._inserir_mensagens(lote.mensagens)
+
+        for conversa_id, dados in lote.conversas.items():
+            try:
+                await self.db.update(table="conversas", data=dados, filters={"id": conversa_id})
+                self._metricas["conversas"] += 1
+            except Exception as e:
+                print(f"[WARN] Erro ao atualizar conversa: {e}")
+                falhou.conversas[conversa_id] = dados
+
+        for conversa_id, uso in lote.uso_tokens.items():
+            try:
+                await self.db.rpc(
+                    "registrar_uso_tokens_conversa",
+                    {
+                        "p_conversa_id": conversa_id,
+                        "p_tokens_prompt": uso["tokens_prompt"],
+                        "p_tokens_completion": uso["tokens_completion"],
+                        "p_custo": round(uso["custo"], 6),
+                        "p_turnos": uso["turnos"]
+                    }
+                )
+            except Exception as e:
+                print(f"[WARN] Erro ao registrar uso de tokens: {e}")
+                falhou.uso_tokens[conversa_id] = uso
+
+        if falhou.vazio():
+            return
+
+        self._metricas["falhas"] += 1
+        if falhou.tentativas >= MAX_TENTATIVAS:
+            descartados = len(falhou.mensagens) + len(falhou.conversas) + len(falhou.uso_tokens)
+            self._metricas["descartados"] += descartados
+            print(f"[ERROR] Escrita atrasada: {descartados} escritas descartadas após {MAX_TENTATIVAS} tentativas")
+            return
+        falhou.proxima_em = time.monotonic() + calcular_backoff(falhou.tentativas, BACKOFF_BASE_S, BACKOFF_MAX_S)
+        self._retentar.append(falhou)
+
+    async def _inserir_mensagens(self, mensagens: List[Dict]) -> List[Dict]:
+        """
+        Insere as mensagens; retorna as que não entraram.
+
+        Um insert_many falha inteiro por causa de uma linha ruim, então o lote
+        que falha é dividido ao meio até isolar as linhas problemáticas. Se
+        nenhuma linha da primeira metade entrar, assume que o problema é o
+        banco (não uma linha) e devolve o resto sem tentar.
+        """
+        try:
+            await self.db.insert_many("mensagens", mensagens)
+            self._metricas["mensagens"] += len(mensagens)
+            return []
+        except Exception as e:
+            if len(mensagens) == 1:
+                print(f"[WARN] Erro ao gravar mensagem da conversa {mensagens[0].get('conversa_id')}: {e}")
+                return mensagens
+            print(f"[WARN] Erro ao gravar {len(mensagens)} mensagens, dividindo o lote: {e}")
+
+        self._metricas["lotes_divididos"] += 1
+        meio = len(mensagens) // 2
+        falharam = await self._inserir_mensagens(mensagens[:meio])
+        if len(falharam) == meio and meio > 1:
+            # Nada da metade entrou: provável indisponibilidade, não uma linha ruim
+            return falharam + mensagens[meio:]
+        return falharam + await self._inserir_mensagens(mensagens[meio:])
+
+    def get_metricas(self) -> dict:
+        """Contadores, pendências e duração das descargas."""
+        duracoes = sorted(self._duracoes_ms)
+        return {
+            **self._metricas,
+            "pendentes": len(self._atual.mensagens) + len(self._atual.conversas) + len(self._atual.uso_tokens),
+            "lotes_para_retentar": len(self._retentar),
+            "descarga_p95_ms": round(duracoes[int(0.95 * (len(duracoes) - 1))], 1) if duracoes else 0.0,
+        }
@@ -0,0 +1,167 @@
+# app/chat_langgraph/fila_conversas.py
+"""
+Fila por conversa (um "ator" por clínica + telefone).
+
+Pacientes costumam mandar várias mensagens seguidas ("oi", "quero marcar",
+"pra semana que vem"). Sem coordenação, cada uma dispara um turno do agente
+no mesmo thread_id: execuções concorrentes, checkpoints disputados e várias
+respostas.
+
+Aqui cada conversa tem no máximo um processamento em andamento:
+- Mensagens que chegam dentro da janela de debounce são agrupadas em um
+  único turno (a janela reinicia a cada mensagem, até espera_max_s)
+- Mensagens que chegam durante um turno formam o lote seguinte
+- Todos os chamadores do lote recebem o mesmo resultado
+
+O ator só existe enquanto há mensagens; conversas ociosas não mantêm task.
+"""
+
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+AMOSTRAS_ESPERA = 500
+
+
+@dataclass
+class MensagemPendente:
+    """Mensagem aguardando o próximo turno da conversa."""
+    mensagem: str
+    tipo: str = "texto"
+    midia_url: Optional[str] = None
+    chegada: float = field(default_factory=time.monotonic)
+    futuro: Optional[asyncio.Future] = None
+
+
+@dataclass
+class _Ator:
+    pendentes: List[MensagemPendente] = field(default_factory=list)
+    nova_mensagem: asyncio.Event = field(default_factory=asyncio.Event)
+    trava: asyncio.Lock = field(default_factory=asyncio.Lock)
+    tarefa: Optional[asyncio.Task] = None
+    usuarios: int = 0  # usos diretos da trava (ex: streaming)
+
+
+ProcessarLote = Callable[[Hashable, List[MensagemPendente]], Awaitable[Any]]
+
+
+class FilaConversas:
+    """
+    Serializa e agrupa mensagens por conversa.
+
+    Args:
+        processar_lote: corrotina (chave, mensagens) -> resultado do turno
+        janela_s: silêncio esperado após a última mensagem antes de processar
+        espera_max_s: espera máxima desde a primeira mensagem do lote
+    """
+
+    def __init__(self, processar_lote: ProcessarLote, janela_s: float = 1.2, espera_max_s: float = 4.0):
+        self.processar_lote = processar_lote
+        self.janela_s = janela_s
+        self.espera_max_s = espera_max_s
+        self._atores: Dict[Hashable, _Ator] = {}
+        self._metricas = {"mensagens": 0, "lotes": 0, "mensagens_agrupadas": 0, "erros": 0, "fila_max": 0}
+        self._esperas_ms: deque = deque(maxlen=AMOSTRAS_ESPERA)
+
+    async def enviar(self, chave: Hashable, pendente: MensagemPendente) -> Any:
+        """Enfileira a mensagem e aguarda o resultado do turno que a incluir."""
+        ator = self._atores.setdefault(chave, _Ator())
+        pendente.futuro = asyncio.get_running_loop().create_future()
+
+        ator.pendentes.append(pendente)
+        ator.nova_mensagem.set()
+        self._metricas["mensagens"] += 1
+        self._metricas["fila_max"] = max(self._metricas["fila_max"], len(ator.pendentes))
+
+        if ator.tarefa is None or ator.tarefa.done():
+            ator.tarefa = asyncio.create_task(self._executar(chave, ator))
+
+        return await pendente.futuro
+
+    @asynccontextmanager
+    async def exclusivo(self, chave: Hashable):
+        """
+        Executa um bloco com a conversa travada (sem agrupamento).
+
+        Usado pelo streaming, onde cada chamador precisa dos próprios eventos.
+        """
+        ator = self._atores.setdefault(chave, _Ator())
+        ator.usuarios += 1
+        try:
+            async with ator.trava:
+                yield
+        finally:
+            ator.usuarios -= 1
+            self._descartar_se_ocioso(chave, ator)
+
+    async def _executar(self, chave: Hashable, ator: _Ator) -> None:
+        try:
+            while ator.pendentes:
+                await self._aguardar_rajada(ator)
+
+                async with ator.trava:
+                    lote, ator.pendentes = ator.pendentes, []
+                    agora = time.monotonic()
+                    for p in lote:
+                        self._esperas_ms.append((agora - p.chegada) * 1000)
+                    self._metricas["lotes"] += 1
+                    self._metricas["mensagens_agrupadas"] += len(lote) - 1
+
+                    try:
+                        resultado = await self.processar_lote(chave, lote)
+                    except Exception as e:
+                        self._metricas["erros"] += 1
+                        for p in lote:
+                            if not p.futuro.done():
+                                p.futuro.set_exception(e)
+                        continue
+
+                    for p in lote:
+                        if not p.futuro.done():
+                            p.futuro.set_result(resultado)
+        finally:
+            self._descartar_se_ocioso(chave, ator)
+
+    async def _aguardar_rajada(self, ator: _Ator) -> None:
+        """Espera a conversa ficar em silêncio por janela_s (limitado por espera_max_s)."""
+        limite = ator.pendentes[0].chegada + self.espera_max_s
+
+        while True:
+            ator.nova_mensagem.clear()
+            restante = min(self.janela_s, limite - time.monotonic())
+            if restante <= 0:
+                return
+            try:
+                await asyncio.wait_for(ator.nova_mensagem.wait(), restante)
+            except asyncio.TimeoutError:
+                return
+
+    def _descartar_se_ocioso(self, chave: Hashable, ator: _Ator) -> None:
+        ocioso = (
+            not ator.pendentes
+            and ator.usuarios == 0
+            and (ator.tarefa is None or ator.tarefa.done() or ator.tarefa is asyncio.current_task())
+        )
+        if ocioso and self._atores.get(chave) is ator:
+            del self._atores[chave]
+
+    def get_metricas(self) -> dict:
+        """Profundidade das filas, tempo de espera e taxa de agrupamento."""
+        esperas = sorted(self._esperas_ms)
+
+        def percentil(p: float) -> float:
+            if not esperas:
+                return 0.0
+            return esperas[min(len(esperas) - 1, int(round(p / 100 * (len(esperas) - 1))))]
+
+        return {
+            **self._metricas,
+            "conversas_ativas": len(self._atores),
+            "fila_atual": sum(len(a.pendentes) for a in self._atores.values()),
+            "espera_p50_ms": round(percentil(50), 1),
+            "espera_p95_ms": round(percentil(95), 1),
+        }
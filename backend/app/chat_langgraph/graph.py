@@ -8,7 +8,13 @@ Fluxo:
 O agente faz todo o trabalho. O grafo só organiza.
 """
 
+import asyncio
+import time
 from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_stream_writer
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.memory import MemorySaver
 
@@ -22,52 +28,93 @@ except ImportError:
     except ImportError:
         POSTGRES_DISPONIVEL = False
 
-from .states import ConversaState, criar_estado_inicial
-from .agent import criar_agente
+from .states import ConversaState, contexto_cliente_valido, criar_estado_inicial, nova_mensagem
+from .checkpoints import (
+    MetricasCheckpoint, compactar_estado, medir_bytes, podar_memoria, podar_postgres
+)
+from .agent import criar_agente, aplicar_verificacao_cliente
+from .tools import verificar_cliente
+from . import historico_conversas, rastreamento
+from .rastreamento import instrumentar_checkpointer
+
+
+# Poda periódica dos checkpoints
+INTERVALO_PODA_S = 3600
 
 
 # ============================================================================
 # NÓS DO GRAFO
 # ============================================================================
 
+async def _carregar_historico(db, conversa_id: str) -> List[Dict]:
+    """Últimas mensagens da conversa (cache em memória, hidratado do banco)."""
+    return await historico_conversas.obter(db, conversa_id)
+
+
+async def _carregar_cliente(db, state: ConversaState) -> Optional[dict]:
+    """
+    Cliente, card ativo e consulta agendada (mesma consulta de verificar_cliente).
+    
+    Retorna None se o contexto cacheado no state ainda é válido.
+    """
+    if contexto_cliente_valido(state):
+        return None
+    return await verificar_cliente(db, state.get("clinica_id"), state.get("telefone", ""))
+
+
 async def carregar_contexto(state: ConversaState, db) -> ConversaState:
     """
-    Carrega contexto (histórico de mensagens).
+    Carrega contexto: histórico de mensagens e dados do cliente, em paralelo.
+    
+    Os dados do cliente ficam no state (persistido pelo checkpointer) e só
+    são relidos após CONTEXTO_CLIENTE_TTL ou depois de uma ferramenta que
+    os altera, então o agente normalmente responde sem precisar chamar
+    verificar_cliente.
     """
     telefone = state.get("telefone", "")
     print(f"[NODE] carregar_contexto: {telefone[:4]}***")
     
+    inicio = time.perf_counter()
+    historico, verificacao = await asyncio.gather(
+        _carregar_historico(db, state.get("conversa_id")),
+        _carregar_cliente(db, state),
+        return_exceptions=True
+    )
+    
     novo = dict(state)
+    novo["historico_mensagens"] = historico if isinstance(historico, list) else []
     
-    # Carrega histórico
-    try:
-        conversa_id = state.get("conversa_id")
-        if conversa_id:
-            mensagens = await db.select(
-                table="mensagens",
-                filters={"conversa_id": conversa_id},
-                order_by="created_at",
-                order_asc=False,
-                limit=20
-            )
-            novo["historico_mensagens"] = list(reversed(mensagens)) if mensagens else []
-    except Exception as e:
-        print(f"[WARN] Erro ao carregar histórico: {e}")
-        novo["historico_mensagens"] = []
+    if isinstance(verificacao, dict):
+        novo = aplicar_verificacao_cliente(novo, verificacao)
+    elif isinstance(verificacao, Exception):
+        print(f"[WARN] Erro ao carregar cliente: {verificacao}")
+    
+    novo["metricas_turno"] = {
+        "contexto_ms": int((time.perf_counter() - inicio) * 1000),
+        "contexto_cache": verificacao is None
+    }
     
     return novo
 
 
-async def executar_agente(state: ConversaState, llm_client, db) -> ConversaState:
+async def executar_agente(
+    state: ConversaState,
+    llm_client,
+    db,
+    emitir: Optional[Callable[[dict], None]] = None
+) -> ConversaState:
     """
     Executa o agente.
+    
+    Com `emitir` (modo streaming), o progresso das ferramentas e os
+    tokens da resposta são repassados como eventos.
     """
     print(f"[NODE] executar_agente: '{state.get('mensagem_atual', '')[:50]}...'")
     
     agente = criar_agente(llm_client, db)
     
     try:
-        resultado = await agente.processar(state)
+        resultado = await agente.processar(state, emitir=emitir)
         return resultado
     except Exception as e:
         print(f"[ERROR] Agente falhou: {e}")
@@ -83,13 +130,21 @@ async def executar_agente(state: ConversaState, llm_client, db) -> ConversaState
 async def finalizar(state: ConversaState, db) -> ConversaState:
     """
     Finaliza o processamento.
+    
+    Registra a resposta no anel de turnos e compacta o estado antes do
+    checkpoint final (histórico do banco e resultados de ferramentas
+    não precisam sobreviver ao turno).
     """
     print(f"[NODE] finalizar")
     
-    return {
+    novo = {
         **state,
+        **compactar_estado(state),
         "updated_at": datetime.now().isoformat()
     }
+    if state.get("resposta"):
+        novo["mensagens"] = [nova_mensagem("assistant", state["resposta"])]
+    return novo
 
 
 # ============================================================================
@@ -103,21 +158,110 @@ class ChatGraph:
     Fluxo: carregar_contexto → agente → finalizar
     """
     
-    def __init__(self, db, llm_client, checkpointer=None):
+    def __init__(
+        self,
+        db,
+        llm_client,
+        checkpointer=None,
+        pool=None,
+        checkpoints_por_thread: int = 3,
+        checkpoint_ttl_dias: int = 30
+    ):
         self.db = db
         self.llm_client = llm_client
         self.checkpointer = checkpointer
+        self.pool = pool  # AsyncConnectionPool do checkpointer (se Postgres)
+        self.checkpoints_por_thread = checkpoints_por_thread
+        self.checkpoint_ttl_s = checkpoint_ttl_dias * 86400
+        self.metricas_checkpoint = MetricasCheckpoint()
+        self._tarefa_poda: Optional[asyncio.Task] = None
         self.graph = self._build_graph()
     
+    # ========================================================================
+    # CICLO DE VIDA
+    # ========================================================================
+    
+    async def iniciar(self):
+        """
+        Abre o pool do checkpointer (uma vez, no startup da aplicação).
+        
+        Se o Postgres não estiver acessível, cai para MemorySaver
+        e recompila o grafo. Também inicia a poda periódica dos checkpoints.
+        """
+        self._tarefa_poda = asyncio.create_task(self._loop_poda())
+        
+        if not self.pool:
+            return
+        
+        try:
+            await self.pool.open(wait=True, timeout=10.0)
+            await self.checkpointer.setup()
+            print("[INFO] Pool do checkpointer aberto")
+        except Exception as e:
+            print(f"[WARN] Falha ao abrir pool do checkpointer: {e}")
+            await self._fechar_pool()
+            self.checkpointer = MemorySaver()
+            self.graph = self._build_graph()
+            print("[INFO] ChatGraph usando MemorySaver (fallback)")
+    
+    async def encerrar(self):
+        """Para a poda e fecha o pool do checkpointer (shutdown da aplicação)."""
+        if self._tarefa_poda:
+            self._tarefa_poda.cancel()
+            self._tarefa_poda = None
+        await self._fechar_pool()
+    
+    async def _fechar_pool(self):
+        if not self.pool:
+            return
+        
+        pool, self.pool = self.pool, None
+        try:
+            await pool.close()
+            print("[INFO] Pool do checkpointer fechado")
+        except Exception as e:
+            print(f"[WARN] Erro ao fechar pool do checkpointer: {e}")
+    
+    # ========================================================================
+    # CHECKPOINTS
+    # ========================================================================
+    
+    async def podar_checkpoints(self) -> dict:
+        """
+        Mantém os últimos `checkpoints_por_thread` checkpoints de cada conversa
+        e apaga conversas sem atividade há mais de `checkpoint_ttl_dias`.
+        """
+        inicio = time.perf_counter()
+        
+        if self.pool:
+            removidos = await podar_postgres(self.pool, self.checkpoints_por_thread, self.checkpoint_ttl_s)
+        elif isinstance(self.checkpointer, MemorySaver):
+            removidos = podar_memoria(self.checkpointer, self.checkpoints_por_thread, self.checkpoint_ttl_s)
+        else:
+            return {}
+        
+        duracao_ms = int((time.perf_counter() - inicio) * 1000)
+        self.metricas_checkpoint.registrar_poda(removidos, duracao_ms)
+        print(f"[INFO] Poda de checkpoints: {removidos} ({duracao_ms}ms)")
+        return removidos
+    
+    async def _loop_poda(self):
+        while True:
+            await asyncio.sleep(INTERVALO_PODA_S)
+            try:
+                await self.podar_checkpoints()
+            except Exception as e:
+                print(f"[WARN] Erro na poda de checkpoints: {e}")
+    
     def _build_graph(self):
         """Constrói o grafo."""
         
         workflow = StateGraph(ConversaState)
         
         # Nós
-        workflow.add_node("carregar_contexto", self._wrap_db(carregar_contexto))
-        workflow.add_node("agente", self._wrap_db_llm(executar_agente))
-        workflow.add_node("finalizar", self._wrap_db(finalizar))
+        workflow.add_node("carregar_contexto", self._wrap_db("carregar_contexto", carregar_contexto))
+        workflow.add_node("agente", self._wrap_db_llm("agente", executar_agente))
+        workflow.add_node("finalizar", self._wrap_db("finalizar", finalizar))
         
         # Fluxo
         workflow.set_entry_point("carregar_contexto")
@@ -125,18 +269,23 @@ class ChatGraph:
         workflow.add_edge("agente", "finalizar")
         workflow.add_edge("finalizar", END)
         
-        return workflow.compile(checkpointer=self.checkpointer)
+        return workflow.compile(checkpointer=instrumentar_checkpointer(self.checkpointer))
     
-    def _wrap_db(self, func):
-        """Wrapper que injeta db."""
+    def _wrap_db(self, nome: str, func):
+        """Wrapper que injeta db (e mede o nó como um span)."""
         async def wrapper(state: ConversaState):
-            return await func(state, self.db)
+            with rastreamento.span(f"no.{nome}"):
+                return await func(state, self.db)
         return wrapper
     
-    def _wrap_db_llm(self, func):
-        """Wrapper que injeta db e llm_client."""
-        async def wrapper(state: ConversaState):
-            return await func(state, self.llm_client, self.db)
+    def _wrap_db_llm(self, nome: str, func):
+        """Wrapper que injeta db e llm_client (e o stream writer, em modo streaming)."""
+        async def wrapper(state: ConversaState, config: RunnableConfig):
+            emitir = None
+            if config.get("configurable", {}).get("stream"):
+                emitir = get_stream_writer()
+            with rastreamento.span(f"no.{nome}"):
+                return await func(state, self.llm_client, self.db, emitir)
         return wrapper
     
     # ========================================================================
@@ -154,42 +303,90 @@ class ChatGraph:
         Processa mensagem através do grafo.
         """
         config = {"configurable": {"thread_id": thread_id}}
+        input_state = await self._preparar_entrada(config, clinica_id, telefone, mensagem, thread_id)
+        
+        # Executa
+        result = await self.graph.ainvoke(input_state, config)
+        self._medir_checkpoint(result)
+        
+        return self._formatar_resultado(result)
+    
+    async def processar_mensagem_stream(
+        self,
+        clinica_id: str,
+        telefone: str,
+        mensagem: str,
+        thread_id: str
+    ) -> AsyncIterator[dict]:
+        """
+        Variante streaming de processar_mensagem.
+        
+        Gera eventos do agente ({"tipo": "ferramenta"|"token", ...}) conforme
+        acontecem e, por último, {"tipo": "resultado", "resultado": {...}}.
+        """
+        config = {"configurable": {"thread_id": thread_id, "stream": True}}
+        input_state = await self._preparar_entrada(config, clinica_id, telefone, mensagem, thread_id)
+        
+        result = input_state
+        async for modo, dados in self.graph.astream(
+            input_state, config, stream_mode=["custom", "values"]
+        ):
+            if modo == "custom":
+                yield dados
+            else:
+                result = dados
+        
+        self._medir_checkpoint(result)
+        yield {"tipo": "resultado", "resultado": self._formatar_resultado(result)}
+    
+    async def _preparar_entrada(
+        self,
+        config: dict,
+        clinica_id: str,
+        telefone: str,
+        mensagem: str,
+        thread_id: str
+    ) -> dict:
+        """Recupera o estado da conversa (se existir) e aplica a nova mensagem."""
+        turno = {
+            "mensagem_atual": mensagem,
+            "conversa_id": thread_id,
+            "mensagens": [nova_mensagem("user", mensagem)],
+            "resposta": "",
+            "acoes_executadas": [],
+            "erro": None
+        }
         
-        # Tenta recuperar estado existente
         try:
             state_snapshot = await self.graph.aget_state(config)
             if state_snapshot and state_snapshot.values:
-                # Conversa existente - PRESERVA o estado anterior!
-                estado_anterior = dict(state_snapshot.values)
-                
-                # Atualiza só o que mudou
-                estado_anterior["mensagem_atual"] = mensagem
-                estado_anterior["conversa_id"] = thread_id
-                
-                # Adiciona mensagem ao histórico (se existir)
-                msgs = estado_anterior.get("mensagens", [])
-                msgs.append({"role": "user", "content": mensagem, "timestamp": datetime.now().isoformat()})
-                estado_anterior["mensagens"] = msgs
-                
-                input_state = estado_anterior
+                # Conversa existente: envia só o que muda no turno; o LangGraph
+                # combina com o estado do checkpoint (mensagens via reducer)
+                estado_anterior = state_snapshot.values
                 print(f"[GRAPH] Continuando conversa: {thread_id[:8]}...")
                 print(f"[GRAPH] Estado preservado: cliente_id={estado_anterior.get('cliente_id')}, rascunho={estado_anterior.get('rascunho_cadastro')}")
-            else:
-                # Nova conversa
-                input_state = criar_estado_inicial(clinica_id, telefone, thread_id)
-                input_state["mensagem_atual"] = mensagem
-                print(f"[GRAPH] Nova conversa: {thread_id[:8]}...")
+                return turno
+            
+            # Nova conversa
+            print(f"[GRAPH] Nova conversa: {thread_id[:8]}...")
         except Exception as e:
             print(f"[WARN] Erro ao recuperar estado: {e}")
             import traceback
             traceback.print_exc()
-            input_state = criar_estado_inicial(clinica_id, telefone, thread_id)
-            input_state["mensagem_atual"] = mensagem
         
-        # Executa
-        result = await self.graph.ainvoke(input_state, config)
-        
-        # Monta resposta
+        return {**criar_estado_inicial(clinica_id, telefone, thread_id), **turno}
+    
+    def _medir_checkpoint(self, result: dict) -> None:
+        """Tamanho serializado do estado final do turno (bytes do checkpoint)."""
+        serde = getattr(self.checkpointer, "serde", None)
+        if serde is None or not result:
+            return
+        tamanho = medir_bytes(serde, result)
+        self.metricas_checkpoint.registrar_turno(tamanho)
+        result.setdefault("metricas_turno", {})["checkpoint_bytes"] = tamanho
+    
+    def _formatar_resultado(self, result: dict) -> dict:
+        """Monta resposta a partir do estado final."""
         return {
             "resposta": result.get("resposta", ""),
             "cliente_id": result.get("cliente_id"),
@@ -200,6 +397,7 @@ class ChatGraph:
             "acoes_executadas": [a.get("ferramenta", a) if isinstance(a, dict) else a for a in result.get("acoes_executadas", [])],
             "erro": result.get("erro"),
             "rascunho_cadastro": result.get("rascunho_cadastro"),  # Debug
+            "metricas": result.get("metricas_turno", {}),
         }
 
 
@@ -207,16 +405,35 @@ class ChatGraph:
 # FACTORY
 # ============================================================================
 
-def criar_chat_graph(db, llm_client, connection_string: str = None) -> ChatGraph:
-    """Cria instância do ChatGraph."""
+def criar_chat_graph(
+    db,
+    llm_client,
+    connection_string: str = None,
+    checkpoints_por_thread: int = 3,
+    checkpoint_ttl_dias: int = 30
+) -> ChatGraph:
+    """
+    Cria instância do ChatGraph.
+    
+    Com Postgres, o pool é criado fechado: chame `await graph.iniciar()`
+    no startup e `await graph.encerrar()` no shutdown.
+    """
     
     checkpointer = None
+    pool = None
     
     if connection_string and POSTGRES_DISPONIVEL:
         try:
             from psycopg_pool import AsyncConnectionPool
             
-            pool = AsyncConnectionPool(conninfo=connection_string)
+            pool = AsyncConnectionPool(
+                conninfo=connection_string,
+                min_size=1,
+                max_size=10,
+                open=False,
+                # Exigido pelo AsyncPostgresSaver
+                kwargs={"autocommit": True, "prepare_threshold": 0}
+            )
             checkpointer = AsyncPostgresSaver(pool)
             
             print("[INFO] ChatGraph usando AsyncPostgresSaver")
@@ -225,9 +442,14 @@ def criar_chat_graph(db, llm_client, connection_string: str = None) -> ChatGraph
             import traceback
             traceback.print_exc()
             checkpointer = MemorySaver()
+            pool = None
             print("[INFO] ChatGraph usando MemorySaver (fallback)")
     else:
         checkpointer = MemorySaver()
         print("[INFO] ChatGraph usando MemorySaver")
     
-    return ChatGraph(db, llm_client, checkpointer)
+    return ChatGraph(
+        db, llm_client, checkpointer, pool=pool,
+        checkpoints_por_thread=checkpoints_por_thread,
+        checkpoint_ttl_dias=checkpoint_ttl_dias
+    )
@@ -0,0 +1,111 @@
+# app/chat_langgraph/historico_conversas.py
+"""
+Histórico recente das conversas em memória (LRU).
+
+carregar_contexto relia as últimas mensagens da conversa no banco a cada
+turno. Aqui cada conversa mantém um anel com as últimas MAX_MENSAGENS:
+
+- Na primeira leitura (ou após expirar) o anel é hidratado do banco
+- Mensagens novas entram no anel na hora em que são registradas, mesmo
+  antes de a escrita atrasada gravá-las no banco
+- Conversas menos usadas saem quando passa de MAX_CONVERSAS
+
+O TTL limita a defasagem quando mais de um processo atende a mesma
+conversa (cada processo tem o seu cache).
+"""
+
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+MAX_CONVERSAS = 2000
+MAX_MENSAGENS = 20
+CACHE_TTL = 600  # segundos
+
+
+@dataclass
+class _Entrada:
+    mensagens: deque = field(default_factory=lambda: deque(maxlen=MAX_MENSAGENS))
+    hidratada: bool = False
+    expira_em: float = 0.0
+
+
+_conversas: "OrderedDict[str, _Entrada]" = OrderedDict()
+_metricas = {"hits": 0, "hidratacoes": 0, "erros": 0}
+
+
+async def obter(db, conversa_id: str) -> List[Dict]:
+    """Últimas mensagens da conversa (ordem cronológica)."""
+    if not conversa_id:
+        return []
+
+    entrada = _conversas.get(conversa_id)
+    if entrada and entrada.hidratada and entrada.expira_em > time.monotonic():
+        _conversas.move_to_end(conversa_id)
+        _metricas["hits"] += 1
+        return list(entrada.mensagens)
+
+    try:
+        do_banco = await db.select(
+            table="mensagens",
+            filters={"conversa_id": conversa_id},
+            order_by="created_at",
+            order_asc=False,
+            limit=MAX_MENSAGENS
+        )
+    except Exception as e:
+        print(f"[WARN] Erro ao carregar histórico: {e}")
+        _metricas["erros"] += 1
+        return list(entrada.mensagens) if entrada else []
+
+    _metricas["hidratacoes"] += 1
+
+    # Junta banco + mensagens registradas ainda não gravadas (escrita atrasada)
+    por_id = {m.get("id"): m for m in reversed(do_banco or [])}
+    if entrada:
+        for m in entrada.mensagens:
+            por_id.setdefault(m.get("id"), m)
+    mensagens = sorted(por_id.values(), key=lambda m: m.get("created_at") or "")
+
+    nova = _Entrada(hidratada=True, expira_em=time.monotonic() + CACHE_TTL)
+    nova.mensagens.extend(mensagens)
+    _guardar(conversa_id, nova)
+    return list(nova.mensagens)
+
+
+def registrar(conversa_id: str, mensagem: Dict) -> None:
+    """Adiciona mensagem ao anel da conversa (hidratado ou não)."""
+    entrada = _conversas.get(conversa_id)
+    if entrada is None:
+        entrada = _Entrada()
+        _guardar(conversa_id, entrada)
+    else:
+        _conversas.move_to_end(conversa_id)
+    entrada.mensagens.append(mensagem)
+
+
+def invalidar(conversa_id: Optional[str] = None) -> None:
+    """Descarta o histórico em cache (de uma conversa ou de todas)."""
+    if conversa_id is None:
+        _conversas.clear()
+    else:
+        _conversas.pop(conversa_id, None)
+
+
+def _guardar(conversa_id: str, entrada: _Entrada) -> None:
+    _conversas[conversa_id] = entrada
+    _conversas.move_to_end(conversa_id)
+    while len(_conversas) > MAX_CONVERSAS:
+        _conversas.popitem(last=False)
+
+
+def get_metricas_historico() -> dict:
+    """Hits, hidratações e tamanho do cache."""
+    total = _metricas["hits"] + _metricas["hidratacoes"]
+    return {
+        **_metricas,
+        "conversas": len(_conversas),
+        "taxa_acerto": round(_metricas["hits"] / total, 3) if total else 0.0,
+    }
@@ -0,0 +1,543 @@
+# app/chat_langgraph/intencao.py
+"""
+Classificador local de intenção (caminho rápido antes do LLM).
+
+Duas camadas:
+1. Regras (regex) para mensagens triviais: "oi", "ok", "obrigado", "cheguei"...
+2. Naive Bayes multinomial sobre bag-of-words (unigramas + bigramas),
+   treinado com EXEMPLOS_BASE e, opcionalmente, com mensagens já
+   rotuladas no banco (mensagens.interpretacao->intencao).
+
+Responde em microssegundos com confiança real (probabilidade posterior).
+Abaixo de LIMIAR_CONFIANCA o chamador deve consultar o LLM.
+
+Respostas curtas ("sim", "ok", "não", "pode ser") dependem da pergunta
+feita pelo assistente: com pergunta pendente o caminho rápido não
+responde e o LLM decide com o contexto.
+
+Uso:
+    from .intencao import classificar_local
+
+    intencao, confianca = classificar_local("quanto custa a consulta?")
+
+Avaliação offline (acurácia e economia de chamadas ao LLM):
+    python -m app.chat_langgraph.intencao avaliar
+    python -m app.chat_langgraph.intencao avaliar conversas.jsonl   # held-out
+
+Regerar o modelo embarcado (intencao_modelo.json):
+    python -m app.chat_langgraph.intencao treinar
+"""
+
+import json
+import math
+import random
+import re
+import sys
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Confiança mínima para dispensar o LLM
+LIMIAR_CONFIANCA = 0.75
+
+CAMINHO_MODELO = Path(__file__).with_name("intencao_modelo.json")
+
+INTENCOES = (
+    "AGENDAR", "REMARCAR", "CANCELAR", "CONFIRMAR",
+    "VALOR", "CONVENIO", "FAQ", "EXAMES", "ANAMNESE",
+    "CHECK_IN", "SAUDACAO", "DESPEDIDA", "RETORNO",
+)
+
+
+# ============================================================================
+# NORMALIZAÇÃO
+# ============================================================================
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sem acentos e sem pontuação."""
+    texto = unicodedata.normalize("NFKD", (texto or "").lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"[^a-z0-9\s]", " ", texto)
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def _features(texto_normalizado: str) -> List[str]:
+    """Unigramas + bigramas."""
+    tokens = texto_normalizado.split()
+    return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+
+# ============================================================================
+# REGRAS (mensagens triviais)
+# ============================================================================
+
+CONFIANCA_REGRA = 0.97
+
+REGRAS: Tuple[Tuple[str, "re.Pattern"], ...] = tuple(
+    (intencao, re.compile(padrao))
+    for intencao, padrao in (
+        ("SAUDACAO", r"^(oi+|ola|ei|opa|hey|e ai|eai|bom dia|boa tarde|boa noite)"
+                     r"( (tudo bem|tudo bom|td bem|ana|doutor|dr))*$"),
+        ("DESPEDIDA", r"^((ok|certo|ta) )?((muito )?obrigad[oa]|brigad[oa]|obg|valeu|vlw|tchau"
+                      r"|ate (logo|mais|amanha|breve))( (pela atencao|por tudo|ana|viu))*$"),
+        ("CONFIRMAR", r"^(sim|ok|okay|certo|combinado|confirmo|confirmado|confirmada|pode ser"
+                      r"|beleza|blz|fechado|perfeito|isso|sim confirmo|confirmo sim|estarei la"
+                      r"|vou sim|pode confirmar|ta bom|ta certo)$"),
+        ("CHECK_IN", r"^(ja )?(cheguei|to aqui|estou aqui|acabei de chegar|estou na recepcao"
+                     r"|cheguei na clinica|ja estou ai|to na recepcao)$"),
+    )
+)
+
+
+# Sim/não curtos: o significado vem da pergunta anterior
+# ("sim" para "quer remarcar?" é REMARCAR, não CONFIRMAR)
+RESPOSTA_CURTA = re.compile(
+    r"^((sim|s|nao|n|ok|okay|certo|claro|pode|pode ser|isso|isso mesmo|beleza|blz|fechado"
+    r"|perfeito|combinado|ta bom|ta certo|quero|nao quero|prefiro nao|melhor nao|agora nao"
+    r"|ainda nao|pode sim|quero sim|por favor)( |$))+$"
+)
+
+
+def ha_pergunta_pendente(contexto) -> bool:
+    """
+    True se a última fala do assistente é uma pergunta.
+
+    Aceita o texto do contexto ou a lista de turnos do state
+    ([{"role", "content"}, ...]).
+    """
+    if not contexto:
+        return False
+    if isinstance(contexto, str):
+        return "?" in contexto
+    for turno in reversed(contexto):
+        if turno.get("role") == "assistant":
+            return "?" in (turno.get("content") or "")
+    return False
+
+
+def _aplicar_regras(texto_normalizado: str) -> Optional[str]:
+    for intencao, padrao in REGRAS:
+        if padrao.match(texto_normalizado):
+            return intencao
+    return None
+
+
+# ============================================================================
+# MODELO (Naive Bayes multinomial)
+# ============================================================================
+
+class ModeloIntencao:
+    """Naive Bayes multinomial com suavização de Laplace."""
+
+    def __init__(self):
+        self.contagem_classe: Dict[str, int] = {}
+        self.contagem_features: Dict[str, Dict[str, int]] = {}
+        self.total_features: Dict[str, int] = {}
+        self.vocabulario: set = set()
+
+    def treinar(self, exemplos: Iterable[Tuple[str, str]]) -> "ModeloIntencao":
+        classes: Counter = Counter()
+        features: Dict[str, Counter] = defaultdict(Counter)
+
+        for texto, intencao in exemplos:
+            if intencao not in INTENCOES:
+                continue
+            tokens = _features(normalizar(texto))
+            if not tokens:
+                continue
+            classes[intencao] += 1
+            features[intencao].update(tokens)
+
+        self.contagem_classe = dict(classes)
+        self.contagem_features = {c: dict(f) for c, f in features.items()}
+        self.total_features = {c: sum(f.values()) for c, f in features.items()}
+        self.vocabulario = {t for f in features.values() for t in f}
+        return self
+
+    def prever(self, texto_normalizado: str) -> Tuple[Optional[str], float]:
+        """Retorna (intenção, probabilidade posterior) ou (None, 0.0)."""
+        tokens = _features(texto_normalizado)
+        conhecidos = [t for t in tokens if t in self.vocabulario]
+        if not conhecidos or not self.contagem_classe:
+            return None, 0.0
+
+        total_exemplos = sum(self.contagem_classe.values())
+        tamanho_vocab = len(self.vocabulario)
+        log_probs = {}
+
+        for classe, n in self.contagem_classe.items():
+            contagens = self.contagem_features.get(classe, {})
+            denominador = self.total_features.get(classe, 0) + tamanho_vocab
+            lp = math.log(n / total_exemplos)
+            for t in conhecidos:
+                lp += math.log((contagens.get(t, 0) + 1) / denominador)
+            log_probs[classe] = lp
+
+        maximo = max(log_probs.values())
+        exps = {c: math.exp(lp - maximo) for c, lp in log_probs.items()}
+        soma = sum(exps.values())
+        melhor = max(exps, key=exps.get)
+        confianca = exps[melhor] / soma
+
+        # Palavras fora do vocabulário reduzem a confiança
+        unigramas = texto_normalizado.split()
+        cobertura = sum(1 for t in unigramas if t in self.vocabulario) / len(unigramas)
+        return melhor, confianca * cobertura
+
+    def to_dict(self) -> dict:
+        return {
+            "contagem_classe": self.contagem_classe,
+            "contagem_features": self.contagem_features,
+        }
+
+    @classmethod
+    def from_dict(cls, dados: dict) -> "ModeloIntencao":
+        modelo = cls()
+        modelo.contagem_classe = dados.get("contagem_classe", {})
+        modelo.contagem_features = dados.get("contagem_features", {})
+        modelo.total_features = {c: sum(f.values()) for c, f in modelo.contagem_features.items()}
+        modelo.vocabulario = {t for f in modelo.contagem_features.values() for t in f}
+        return modelo
+
+
+# ============================================================================
+# API
+# ============================================================================
+
+_modelo: Optional[ModeloIntencao] = None
+
+
+def get_modelo() -> ModeloIntencao:
+    """Modelo embarcado (carregado uma vez; treina com EXEMPLOS_BASE se faltar o arquivo)."""
+    global _modelo
+    if _modelo is None:
+        try:
+            _modelo = ModeloIntencao.from_dict(json.loads(CAMINHO_MODELO.read_text(encoding="utf-8")))
+        except (OSError, ValueError):
+            _modelo = ModeloIntencao().treinar(EXEMPLOS_BASE)
+    return _modelo
+
+
+def definir_modelo(modelo: ModeloIntencao) -> None:
+    """Troca o modelo em uso (ex: após treinar com mensagens do banco)."""
+    global _modelo
+    _modelo = modelo
+
+
+def classificar_local(
+    mensagem: str,
+    modelo: Optional[ModeloIntencao] = None,
+    pergunta_pendente: bool = False
+) -> Tuple[str, float]:
+    """
+    Classifica sem LLM.
+
+    Args:
+        pergunta_pendente: a última fala do assistente foi uma pergunta
+            (ver ha_pergunta_pendente); sim/não curtos vão para o LLM
+
+    Returns:
+        (intencao, confianca). Confiança abaixo de LIMIAR_CONFIANCA
+        indica que o LLM deve ser consultado.
+    """
+    texto = normalizar(mensagem)
+    if not texto:
+        return "DESCONHECIDO", 0.0
+
+    if pergunta_pendente and RESPOSTA_CURTA.match(texto):
+        return "DESCONHECIDO", 0.0
+
+    intencao = _aplicar_regras(texto)
+    if intencao:
+        return intencao, CONFIANCA_REGRA
+
+    intencao, confianca = (modelo or get_modelo()).prever(texto)
+    if not intencao:
+        return "DESCONHECIDO", 0.0
+    return intencao, round(confianca, 4)
+
+
+async def carregar_exemplos_do_banco(db, limite: int = 5000, confianca_minima: float = 0.8) -> List[Tuple[str, str]]:
+    """
+    Exemplos rotulados a partir de mensagens recebidas já interpretadas.
+
+    Usa mensagens.interpretacao (intencao/confianca) gravada pelo LLM.
+    """
+    try:
+        mensagens = await db.select(
+            table="mensagens",
+            columns="conteudo,interpretacao",
+            filters={"direcao": "recebida"},
+            order_by="created_at",
+            order_asc=False,
+            limit=limite
+        )
+    except Exception as e:
+        print(f"[WARN] Erro ao carregar mensagens para treino: {e}")
+        return []
+
+    exemplos = []
+    for m in mensagens:
+        interpretacao = m.get("interpretacao") or {}
+        intencao = interpretacao.get("intencao")
+        confianca = interpretacao.get("confianca", 1.0) or 0
+        if m.get("conteudo") and intencao in INTENCOES and confianca >= confianca_minima:
+            exemplos.append((m["conteudo"], intencao))
+    return exemplos
+
+
+async def treinar_com_banco(db, limite: int = 5000) -> ModeloIntencao:
+    """Treina com EXEMPLOS_BASE + mensagens rotuladas do banco e passa a usar o modelo."""
+    exemplos = list(EXEMPLOS_BASE) + await carregar_exemplos_do_banco(db, limite)
+    modelo = ModeloIntencao().treinar(exemplos)
+    definir_modelo(modelo)
+    return modelo
+
+
+# ============================================================================
+# AVALIAÇÃO OFFLINE
+# ============================================================================
+
+def avaliar(
+    exemplos: List[Tuple[str, str]],
+    limiar: float = LIMIAR_CONFIANCA,
+    folds: int = 5,
+    seed: int = 42
+) -> dict:
+    """
+    Validação cruzada k-fold.
+
+    Métricas:
+    - cobertura: fração respondida localmente (= chamadas ao LLM economizadas)
+    - acuracia_local: acerto entre as respondidas localmente
+    - acuracia_sem_limiar: acerto se o modelo respondesse tudo
+    """
+    dados = list(exemplos)
+    random.Random(seed).shuffle(dados)
+
+    respondidas = acertos_local = acertos_total = 0
+    for k in range(folds):
+        teste = dados[k::folds]
+        treino = [e for i, e in enumerate(dados) if i % folds != k]
+        modelo = ModeloIntencao().treinar(treino)
+
+        for texto, esperado in teste:
+            intencao, confianca = classificar_local(texto, modelo)
+            acertos_total += intencao == esperado
+            if confianca >= limiar:
+                respondidas += 1
+                acertos_local += intencao == esperado
+
+    total = len(dados)
+    return {
+        "exemplos": total,
+        "limiar": limiar,
+        "cobertura": round(respondidas / total, 3) if total else 0.0,
+        "acuracia_local": round(acertos_local / respondidas, 3) if respondidas else 0.0,
+        "acuracia_sem_limiar": round(acertos_total / total, 3) if total else 0.0,
+        "chamadas_llm_evitadas": respondidas,
+    }
+
+
+def avaliar_holdout(
+    exemplos: List[Tuple[str, str, str]],
+    modelo: Optional[ModeloIntencao] = None,
+    limiar: float = LIMIAR_CONFIANCA
+) -> dict:
+    """
+    Avaliação em conversas reais que o modelo não viu no treino.
+
+    exemplos: (texto, intencao esperada, última fala do assistente).
+    Mede também os erros de sim/não curtos fora de contexto.
+    """
+    modelo = modelo or get_modelo()
+    respondidas = acertos_local = curtas_erradas = 0
+    for texto, esperado, anterior in exemplos:
+        intencao, confianca = classificar_local(texto, modelo, ha_pergunta_pendente(anterior))
+        if confianca >= limiar:
+            respondidas += 1
+            acertos_local += intencao == esperado
+            curtas_erradas += intencao != esperado and bool(RESPOSTA_CURTA.match(normalizar(texto)))
+
+    total = len(exemplos)
+    return {
+        "exemplos": total,
+        "limiar": limiar,
+        "cobertura": round(respondidas / total, 3) if total else 0.0,
+        "acuracia_local": round(acertos_local / respondidas, 3) if respondidas else 0.0,
+        "respostas_curtas_erradas": curtas_erradas,
+    }
+
+
+# Sim/não depois de perguntas diferentes: o caminho rápido não pode decidir
+CASOS_CONTEXTO: Tuple[Tuple[str, str, str], ...] = (
+    ("sim", "REMARCAR", "Sua consulta é amanhã às 10h. Quer remarcar?"),
+    ("sim", "CANCELAR", "Posso cancelar sua consulta de sexta?"),
+    ("pode ser", "AGENDAR", "Tenho terça às 14h, pode ser?"),
+    ("ok", "CONFIRMAR", "Confirma sua consulta amanhã às 9h?"),
+    ("nao", "CANCELAR", "Você vai conseguir comparecer amanhã?"),
+    ("sim", "CONFIRMAR", ""),
+    ("ok obrigado", "DESPEDIDA", "Pronto, está agendado."),
+    ("cheguei", "CHECK_IN", "Te esperamos às 10h."),
+)
+
+
+# ============================================================================
+# EXEMPLOS BASE
+# ============================================================================
+
+EXEMPLOS_BASE: Tuple[Tuple[str, str], ...] = tuple(
+    (texto, intencao)
+    for intencao, textos in {
+        "AGENDAR": (
+            "quero marcar uma consulta", "gostaria de agendar uma consulta",
+            "tem horario disponivel essa semana?", "preciso marcar com o doutor",
+            "queria uma consulta com o cardiologista", "quero agendar",
+            "tem vaga para amanha?", "consigo marcar para sexta?",
+            "quais horarios voces tem livres", "preciso de uma consulta urgente",
+            "quero marcar um horario", "da pra agendar pra semana que vem?",
+            "gostaria de marcar uma avaliacao", "tem agenda para segunda de manha?",
+            "quero fazer uma consulta", "preciso passar com o dr carlos",
+            "agendar consulta por favor", "qual o proximo horario livre",
+            "queria ver um horario pra minha mae", "marcar consulta cardiologia",
+        ),
+        "REMARCAR": (
+            "preciso remarcar minha consulta", "quero mudar o horario da consulta",
+            "da pra trocar o dia da minha consulta?", "nao vou poder ir, quero remarcar",
+            "posso passar minha consulta para outro dia?", "quero reagendar",
+            "preciso mudar a data", "tem como adiar minha consulta",
+            "consigo trocar para a tarde?", "remarcar para semana que vem",
+            "mudar minha consulta de quinta para sexta", "gostaria de alterar o horario",
+            "preciso transferir a consulta para outro dia", "da pra antecipar minha consulta?",
+        ),
+        "CANCELAR": (
+            "quero cancelar minha consulta", "preciso cancelar", "cancela por favor",
+            "nao vou mais, pode cancelar", "desmarcar a consulta", "quero desmarcar",
+            "cancelar o agendamento de amanha", "nao preciso mais da consulta",
+            "pode tirar meu horario", "vou ter que cancelar infelizmente",
+            "cancelar consulta", "desisti da consulta",
+        ),
+        "CONFIRMAR": (
+            "sim confirmo", "confirmo a consulta", "estarei la", "pode confirmar",
+            "vou sim", "confirmado", "sim, vou comparecer", "confirmo presenca",
+            "ok, estarei ai", "sim pode manter", "mantenho o horario",
+            "confirmo meu horario de amanha", "tudo certo, vou sim",
+        ),
+        "VALOR": (
+            "quanto custa a consulta?", "qual o valor da consulta", "qual o preco",
+            "quanto e a consulta particular", "valor da consulta?", "quanto fica",
+            "quanto voces cobram", "qual o valor do eletrocardiograma",
+            "preco da consulta particular", "quanto custa o retorno",
+            "tem desconto no pix?", "aceita cartao? qual o valor",
+            "quanto sai a consulta", "valores por favor",
+        ),
+        "CONVENIO": (
+            "aceita unimed?", "voces atendem bradesco saude", "atende convenio?",
+            "qual convenio voces aceitam", "meu plano e amil, atende?",
+            "aceitam sulamerica", "trabalham com plano de saude?",
+            "tenho unimed, posso usar?", "atende pelo convenio",
+            "quais planos voces aceitam", "aceita hapvida?", "meu convenio e cassi",
+            "o plano cobre a consulta?", "tem cobertura do meu plano",
+        ),
+        "FAQ": (
+            "qual o endereco da clinica", "onde fica a clinica?", "tem estacionamento?",
+            "qual o horario de funcionamento", "voces abrem sabado?",
+            "como chego ai", "qual o telefone da clinica", "ate que horas voces atendem",
+            "a clinica fica perto do metro?", "preciso levar algum documento?",
+            "precisa de jejum?", "quanto tempo dura a consulta",
+            "o doutor atende crianca?", "qual a especialidade do doutor",
+        ),
+        "EXAMES": (
+            "quero enviar meus exames", "posso mandar o resultado do exame",
+            "segue meu exame de sangue", "fiz os exames, como envio?",
+            "tenho um eletro para mostrar", "mandei o ecocardiograma",
+            "vou enviar o resultado do holter", "onde mando os exames",
+            "recebeu meu exame?", "estou enviando os exames pedidos",
+            "resultado do exame em anexo", "o doutor ja viu meu exame?",
+        ),
+        "ANAMNESE": (
+            "onde preencho o questionario", "recebi o link da anamnese",
+            "nao consegui abrir o formulario", "ja preenchi a ficha",
+            "preciso preencher a anamnese?", "o link do questionario nao abre",
+            "terminei o questionario", "como faco a ficha de saude",
+            "me manda de novo o formulario", "preenchi o questionario pre consulta",
+        ),
+        "CHECK_IN": (
+            "cheguei", "ja cheguei", "estou na recepcao", "acabei de chegar",
+            "to aqui na clinica", "cheguei para a consulta das 10h",
+            "estou aqui embaixo", "ja estou na sala de espera",
+            "cheguei, onde eu vou?", "estou na porta da clinica",
+        ),
+        "SAUDACAO": (
+            "oi", "ola", "bom dia", "boa tarde", "boa noite", "oi tudo bem?",
+            "ola bom dia", "oii", "e ai", "opa", "oi ana", "bom dia tudo bem",
+            "oi boa tarde", "ola, tudo bom?",
+        ),
+        "DESPEDIDA": (
+            "obrigado", "obrigada", "valeu", "tchau", "ate logo", "muito obrigado",
+            "obrigado pela atencao", "ate mais", "brigado", "obg", "valeu, ate amanha",
+            "obrigada por tudo", "ok obrigado", "tchau tchau",
+        ),
+        "RETORNO": (
+            "preciso marcar o retorno", "quando e meu retorno?",
+            "o retorno e gratuito?", "tenho direito a retorno",
+            "quero agendar o retorno da consulta", "retorno para mostrar exames",
+            "qual o prazo do retorno", "o retorno tem custo?",
+            "marcar retorno com o doutor", "ja posso fazer o retorno?",
+        ),
+    }.items()
+    for texto in textos
+)
+
+
+# ============================================================================
+# CLI
+# ============================================================================
+
+def _main(argv: List[str]) -> None:
+    comando = argv[0] if argv else "avaliar"
+
+    if comando == "treinar":
+        modelo = ModeloIntencao().treinar(EXEMPLOS_BASE)
+        CAMINHO_MODELO.write_text(
+            json.dumps(modelo.to_dict(), ensure_ascii=False, sort_keys=True),
+            encoding="utf-8"
+        )
+        print(f"Modelo salvo em {CAMINHO_MODELO} ({len(modelo.vocabulario)} features)")
+
+    elif comando == "avaliar":
+        arquivo = argv[1] if len(argv) > 1 else None
+        exemplos = list(EXEMPLOS_BASE)
+
+        # k-fold só mede o ajuste ao próprio seed; conversas reais vão como held-out
+        for limiar in (0.5, 0.6, LIMIAR_CONFIANCA, 0.9):
+            print(avaliar(exemplos, limiar=limiar))
+        print("contexto:", avaliar_holdout(list(CASOS_CONTEXTO)))
+
+        if arquivo:
+            # JSONL com {"texto", "intencao", "anterior"} (última fala do assistente),
+            # exportado de conversas reais rotuladas
+            with open(arquivo, encoding="utf-8") as f:
+                conversas = [
+                    (d["texto"], d["intencao"], d.get("anterior") or "")
+                    for d in map(json.loads, f) if d.get("texto")
+                ]
+            modelo = ModeloIntencao().treinar(EXEMPLOS_BASE)
+            for limiar in (0.6, LIMIAR_CONFIANCA, 0.9):
+                print("held-out:", avaliar_holdout(conversas, modelo, limiar))
+
+        import time
+        inicio = time.perf_counter()
+        for texto, _ in exemplos * 10:
+            classificar_local(texto)
+        por_msg_us = (time.perf_counter() - inicio) * 1e6 / (len(exemplos) * 10)
+        print(f"Latência média: {por_msg_us:.1f} µs/mensagem")
+
+    else:
+        print("Uso: python -m app.chat_langgraph.intencao [avaliar [arquivo.jsonl] | treinar]")
+
+
+if __name__ == "__main__":
+    _main(sys.argv[1:])
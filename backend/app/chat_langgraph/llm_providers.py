@@ -23,6 +23,7 @@ from pydantic import BaseModel
 # Import das configurações do ClinicOS
 try:
     from app.core.config import settings
+    from app.core.http import get_http_client
 except ImportError:
     # Fallback para desenvolvimento isolado
     from dataclasses import dataclass
@@ -50,6 +51,15 @@ except ImportError:
     
     settings = MockSettings()
     print("[WARN] Usando MockSettings - configure app.core.config para produção")
+    
+    _http_client: Optional[httpx.AsyncClient] = None
+    
+    def get_http_client(servico: str = "default") -> httpx.AsyncClient:
+        """Cliente HTTP único (desenvolvimento isolado)."""
+        global _http_client
+        if _http_client is None or _http_client.is_closed:
+            _http_client = httpx.AsyncClient()
+        return _http_client
 
 
 class LLMResponse(BaseModel):
@@ -141,35 +151,35 @@ class OpenRouterProvider(BaseLLMProvider):
         temperature: float = 0.1,
         max_tokens: int = 500
     ) -> LLMResponse:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self._base_url}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self._api_key}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "https://clinicos.app",  # Opcional: identificar app
-                    "X-Title": "ClinicOS Agent"  # Opcional: nome do app
-                },
-                json={
-                    "model": self._model,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_message}
-                    ],
-                    "temperature": temperature,
-                    "max_tokens": max_tokens
-                },
-                timeout=60.0  # OpenRouter pode ser mais lento
-            )
-            response.raise_for_status()
-            data = response.json()
+        client = get_http_client("llm")
+        response = await client.post(
+            f"{self._base_url}/chat/completions",
+            headers={
+                "Authorization": f"Bearer {self._api_key}",
+                "Content-Type": "application/json",
+                "HTTP-Referer": "https://clinicos.app",  # Opcional: identificar app
+                "X-Title": "ClinicOS Agent"  # Opcional: nome do app
+            },
+            json={
+                "model": self._model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                "temperature": temperature,
+                "max_tokens": max_tokens
+            },
+            timeout=60.0  # OpenRouter pode ser mais lento
+        )
+        response.raise_for_status()
+        data = response.json()
             
-            return LLMResponse(
-                content=data["choices"][0]["message"]["content"],
-                model=self._model,
-                provider="openrouter",
-                tokens_used=data.get("usage", {}).get("total_tokens")
-            )
+        return LLMResponse(
+            content=data["choices"][0]["message"]["content"],
+            model=self._model,
+            provider="openrouter",
+            tokens_used=data.get("usage", {}).get("total_tokens")
+        )
     
     def get_provider_name(self) -> str:
         return "openrouter"
@@ -220,33 +230,33 @@ class GroqProvider(BaseLLMProvider):
         temperature: float = 0.1,
         max_tokens: int = 500
     ) -> LLMResponse:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self._base_url}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self._api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": self._model,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_message}
-                    ],
-                    "temperature": temperature,
-                    "max_tokens": max_tokens
-                },
-                timeout=30.0
-            )
-            response.raise_for_status()
-            data = response.json()
+        client = get_http_client("llm")
+        response = await client.post(
+            f"{self._base_url}/chat/completions",
+            headers={
+                "Authorization": f"Bearer {self._api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": self._model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                "temperature": temperature,
+                "max_tokens": max_tokens
+            },
+            timeout=30.0
+        )
+        response.raise_for_status()
+        data = response.json()
             
-            return LLMResponse(
-                content=data["choices"][0]["message"]["content"],
-                model=self._model,
-                provider="groq",
-                tokens_used=data.get("usage", {}).get("total_tokens")
-            )
+        return LLMResponse(
+            content=data["choices"][0]["message"]["content"],
+            model=self._model,
+            provider="groq",
+            tokens_used=data.get("usage", {}).get("total_tokens")
+        )
     
     def get_provider_name(self) -> str:
         return "groq"
@@ -291,33 +301,33 @@ class DeepSeekProvider(BaseLLMProvider):
         temperature: float = 0.1,
         max_tokens: int = 500
     ) -> LLMResponse:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self._base_url}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self._api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": self._model,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_message}
-                    ],
-                    "temperature": temperature,
-                    "max_tokens": max_tokens
-                },
-                timeout=30.0
-            )
-            response.raise_for_status()
-            data = response.json()
+        client = get_http_client("llm")
+        response = await client.post(
+            f"{self._base_url}/chat/completions",
+            headers={
+                "Authorization": f"Bearer {self._api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": self._model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                "temperature": temperature,
+                "max_tokens": max_tokens
+            },
+            timeout=30.0
+        )
+        response.raise_for_status()
+        data = response.json()
             
-            return LLMResponse(
-                content=data["choices"][0]["message"]["content"],
-                model=self._model,
-                provider="deepseek",
-                tokens_used=data.get("usage", {}).get("total_tokens")
-            )
+        return LLMResponse(
+            content=data["choices"][0]["message"]["content"],
+            model=self._model,
+            provider="deepseek",
+            tokens_used=data.get("usage", {}).get("total_tokens")
+        )
     
     def get_provider_name(self) -> str:
         return "deepseek"
@@ -361,33 +371,33 @@ class OpenAIProvider(BaseLLMProvider):
         temperature: float = 0.1,
         max_tokens: int = 500
     ) -> LLMResponse:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self._base_url}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {self._api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": self._model,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_message}
-                    ],
-                    "temperature": temperature,
-                    "max_tokens": max_tokens
-                },
-                timeout=30.0
-            )
-            response.raise_for_status()
-            data = response.json()
+        client = get_http_client("llm")
+        response = await client.post(
+            f"{self._base_url}/chat/completions",
+            headers={
+                "Authorization": f"Bearer {self._api_key}",
+                "Content-Type": "application/json"
+            },
+            json={
+                "model": self._model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                "temperature": temperature,
+                "max_tokens": max_tokens
+            },
+            timeout=30.0
+        )
+        response.raise_for_status()
+        data = response.json()
             
-            return LLMResponse(
-                content=data["choices"][0]["message"]["content"],
-                model=self._model,
-                provider="openai",
-                tokens_used=data.get("usage", {}).get("total_tokens")
-            )
+        return LLMResponse(
+            content=data["choices"][0]["message"]["content"],
+            model=self._model,
+            provider="openai",
+            tokens_used=data.get("usage", {}).get("total_tokens")
+        )
     
     def get_provider_name(self) -> str:
         return "openai"
@@ -410,6 +420,9 @@ def get_llm_provider() -> BaseLLMProvider:
     - deepseek (barato)
     - openai (direto)
     
+    Com LLM_PROVIDERS_FALLBACK (ex: "groq,deepseek") retorna um
+    RoteadorLLM com failover/hedge entre o principal e os reservas.
+    
     Returns:
         Instância do provedor configurado
     
@@ -422,6 +435,11 @@ def get_llm_provider() -> BaseLLMProvider:
         return _provider_instance
     
     provider_name = getattr(settings, 'llm_provider', 'openrouter').lower()
+    fallback = [
+        nome.strip().lower()
+        for nome in (getattr(settings, 'llm_providers_fallback', '') or '').split(',')
+        if nome.strip() and nome.strip().lower() != provider_name
+    ]
     
     providers = {
         "openrouter": OpenRouterProvider,
@@ -430,14 +448,38 @@ def get_llm_provider() -> BaseLLMProvider:
         "openai": OpenAIProvider,
     }
     
-    if provider_name not in providers:
-        raise ValueError(
-            f"Provedor LLM inválido: {provider_name}. "
-            f"Opções: {list(providers.keys())}"
-        )
+    for nome in [provider_name, *fallback]:
+        if nome not in providers:
+            raise ValueError(
+                f"Provedor LLM inválido: {nome}. "
+                f"Opções: {list(providers.keys())}"
+            )
+    
+    principal = providers[provider_name]()
+    
+    if not fallback:
+        _provider_instance = principal
+        print(f"[INFO] LLM Provider: {provider_name} ({principal.model})")
+        return _provider_instance
     
-    _provider_instance = providers[provider_name]()
-    print(f"[INFO] LLM Provider: {provider_name} ({_provider_instance.model})")
+    # Provedores reserva sem API key configurada são ignorados
+    instancias = [principal]
+    for nome in fallback:
+        try:
+            instancias.append(providers[nome]())
+        except ValueError as e:
+            print(f"[WARN] LLM fallback {nome} ignorado: {e}")
+    
+    from .roteador_llm import RoteadorLLM
+    
+    _provider_instance = RoteadorLLM(
+        instancias,
+        hedge=getattr(settings, 'llm_hedge_habilitado', False),
+        hedge_min_ms=getattr(settings, 'llm_hedge_min_ms', 1500),
+        falhas_para_abrir=getattr(settings, 'llm_circuito_falhas', 3),
+        espera_circuito_s=getattr(settings, 'llm_circuito_espera_s', 30)
+    )
+    print(f"[INFO] LLM Providers: {[p.get_provider_name() for p in instancias]} (roteador)")
     
     return _provider_instance
 
@@ -478,6 +520,9 @@ async def classificar_intencao(mensagem: str, contexto: str = "") -> tuple[str,
     """
     Classifica a intenção de uma mensagem.
     
+    Tenta primeiro o classificador local (regras + modelo, microssegundos);
+    o LLM só é chamado quando a confiança local fica abaixo de LIMIAR_CONFIANCA.
+    
     Args:
         mensagem: Mensagem do paciente
         contexto: Contexto adicional (nome, estado, etc)
@@ -485,11 +530,18 @@ async def classificar_intencao(mensagem: str, contexto: str = "") -> tuple[str,
     Returns:
         Tuple (intencao, confianca)
     """
-    provider = get_llm_provider()
+    from .intencao import classificar_local, ha_pergunta_pendente, LIMIAR_CONFIANCA
+    
+    intencao_local, confianca_local = classificar_local(
+        mensagem, pergunta_pendente=ha_pergunta_pendente(contexto)
+    )
+    if confianca_local >= LIMIAR_CONFIANCA:
+        return intencao_local, confianca_local
     
     user_message = f"{contexto}\n\nMensagem do paciente: {mensagem}" if contexto else mensagem
     
     try:
+        provider = get_llm_provider()
         response = await provider.complete(
             system_prompt=PROMPT_CLASSIFICACAO,
             user_message=user_message,
@@ -507,10 +559,23 @@ async def classificar_intencao(mensagem: str, contexto: str = "") -> tuple[str,
         ]
         
         if intencao not in intencoes_validas:
-            return "DESCONHECIDO", 0.0
+            return intencao_local, confianca_local
         
-        return intencao, 0.85  # TODO: extrair confiança real do LLM
+        return intencao, _confianca_llm(intencao, intencao_local, confianca_local)
         
     except Exception as e:
         print(f"[ERROR] Falha na classificação: {e}")
-        return "DESCONHECIDO", 0.0
+        return intencao_local, confianca_local
+
+
+def _confianca_llm(intencao_llm: str, intencao_local: str, confianca_local: float) -> float:
+    """
+    Confiança da resposta do LLM (que não expõe probabilidade).
+    
+    Concordância com o classificador local reforça; discordância reduz.
+    """
+    if intencao_llm == "DESCONHECIDO":
+        return 0.0
+    if intencao_llm == intencao_local:
+        return round(max(0.9, confianca_local), 4)
+    return 0.7
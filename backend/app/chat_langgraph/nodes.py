@@ -22,6 +22,8 @@ import uuid
 import json
 
 from .states import ConversaState, DadosPaciente
+from .intencao import classificar_local, ha_pergunta_pendente, LIMIAR_CONFIANCA
+from .llm_providers import _confianca_llm
 
 
 # ============================================
@@ -225,7 +227,22 @@ async def classificar_intencao(state: ConversaState, llm_client) -> ConversaStat
     # Atualiza dados do paciente
     dados_paciente.update(dados_extraidos)
     
-    # === CLASSIFICAÇÃO COM LLM ===
+    # === CLASSIFICAÇÃO LOCAL (regras + modelo) ===
+    intencao_local, confianca_local = classificar_local(
+        mensagem, pergunta_pendente=ha_pergunta_pendente(state.get("mensagens") or [])
+    )
+    if confianca_local >= LIMIAR_CONFIANCA:
+        print(f"[NODE] Intenção (local): {intencao_local} ({confianca_local:.2f})")
+        return {
+            **state,
+            "intencao": intencao_local,
+            "confianca_intencao": confianca_local,
+            "dados_paciente": dados_paciente,
+            "dados_extraidos_agora": dados_extraidos,
+            "estado": "gerar_resposta"
+        }
+    
+    # === CLASSIFICAÇÃO COM LLM (confiança local abaixo do limiar) ===
     system_prompt = """Você é um classificador de intenções para uma clínica médica.
 Analise a mensagem e retorne APENAS a intenção em uma palavra.
 
@@ -269,7 +286,7 @@ Retorne APENAS uma palavra."""
         return {
             **state,
             "intencao": intencao,
-            "confianca_intencao": 0.85,
+            "confianca_intencao": _confianca_llm(intencao, intencao_local, confianca_local),
             "dados_paciente": dados_paciente,
             "dados_extraidos_agora": dados_extraidos,
             "estado": "gerar_resposta"
@@ -17,6 +17,7 @@ import re
 import uuid
 
 from .states import ConversaState, DadosAgendamento
+from . import cache_respostas
 
 
 # ============================================
@@ -527,6 +528,17 @@ async def responder_faq(state: ConversaState, llm_client) -> ConversaState:
                 "estado": "finalizado"
             }
     
+    # Resposta já gerada para a mesma pergunta nesta clínica
+    clinica_id = state.get("clinica_id", "")
+    chave = cache_respostas.chave_pergunta(mensagem)
+    resposta_cache = cache_respostas.obter(clinica_id, "resposta_faq", chave)
+    if resposta_cache:
+        return {
+            **state,
+            "resposta": resposta_cache,
+            "estado": "finalizado"
+        }
+    
     # Usa LLM para outras perguntas
     try:
         system_prompt = """Você é uma assistente de uma clínica médica.
@@ -545,9 +557,12 @@ Informações da clínica:
             max_tokens=200
         )
         
+        resposta = response.content.strip()
+        cache_respostas.guardar(clinica_id, "resposta_faq", chave, resposta)
+        
         return {
             **state,
-            "resposta": response.content.strip(),
+            "resposta": resposta,
             "estado": "finalizado"
         }
     except Exception as e:
@@ -0,0 +1,215 @@
+# app/chat_langgraph/orcamento_tokens.py
+"""
+Orçamento de tokens do agente.
+
+A cada iteração o agente reenvia system prompt, schemas das ferramentas,
+histórico e resultados de ferramentas. Este módulo:
+
+- Estima tokens por segmento (tiktoken se instalado, senão ~4 caracteres/token)
+- Seleciona só os schemas de ferramentas relevantes para o estado da conversa
+- Compacta resultados grandes de ferramentas
+- Corta o histórico antigo para caber no orçamento, trocando-o por um resumo
+- Calcula custo estimado por modelo
+"""
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from app.core.config import settings
+except ImportError:
+    settings = None
+
+try:
+    import tiktoken
+    _ENCODER = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODER = None
+
+
+# ============================================================================
+# CONFIGURAÇÃO
+# ============================================================================
+
+@dataclass(frozen=True)
+class OrcamentoTokens:
+    """Limites de tokens por chamada ao LLM."""
+    limite_prompt: int = 4000           # system + ferramentas + mensagens
+    limite_resultado_ferramenta: int = 600
+    max_itens_lista: int = 5            # itens mantidos por lista ao compactar
+    max_caracteres_resumo: int = 400
+
+
+def get_orcamento() -> OrcamentoTokens:
+    """Orçamento configurado (LLM_ORCAMENTO_PROMPT_TOKENS / LLM_ORCAMENTO_RESULTADO_TOKENS)."""
+    if settings is None:
+        return OrcamentoTokens()
+    return OrcamentoTokens(
+        limite_prompt=getattr(settings, "llm_orcamento_prompt_tokens", 4000),
+        limite_resultado_ferramenta=getattr(settings, "llm_orcamento_resultado_tokens", 600),
+    )
+
+
+# Preço em USD por milhão de tokens (prompt, completion)
+PRECOS_POR_MILHAO: Dict[str, Tuple[float, float]] = {
+    "anthropic/claude-sonnet-4.5": (3.00, 15.00),
+    "anthropic/claude-sonnet-4": (3.00, 15.00),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "deepseek-chat": (0.27, 1.10),
+    "llama-3.3-70b-versatile": (0.59, 0.79),
+    "llama-3.1-70b-versatile": (0.59, 0.79),
+}
+
+
+# ============================================================================
+# ESTIMATIVA
+# ============================================================================
+
+def estimar_tokens(conteudo: Any) -> int:
+    """Estimativa de tokens de um texto ou estrutura JSON."""
+    if conteudo is None:
+        return 0
+    if not isinstance(conteudo, str):
+        conteudo = json.dumps(conteudo, ensure_ascii=False)
+    if _ENCODER is not None:
+        return len(_ENCODER.encode(conteudo))
+    return (len(conteudo) + 3) // 4
+
+
+def estimar_mensagem(mensagem: Dict) -> int:
+    """Tokens de uma mensagem do chat (conteúdo + tool_calls + overhead)."""
+    return 4 + estimar_tokens(mensagem.get("content") or "") + estimar_tokens(mensagem.get("tool_calls"))
+
+
+def contabilizar(system: str, ferramentas: List[Dict], mensagens: List[Dict]) -> Dict[str, int]:
+    """Tokens estimados por segmento do prompt."""
+    historico = sum(estimar_mensagem(m) for m in mensagens if m.get("role") != "tool")
+    resultados = sum(estimar_mensagem(m) for m in mensagens if m.get("role") == "tool")
+    segmentos = {
+        "system": estimar_tokens(system),
+        "ferramentas": estimar_tokens(ferramentas) if ferramentas else 0,
+        "historico": historico,
+        "resultados": resultados,
+    }
+    segmentos["total"] = sum(segmentos.values())
+    return segmentos
+
+
+def calcular_custo(modelo: str, tokens_prompt: int, tokens_completion: int) -> float:
+    """Custo estimado em USD (0 se o modelo não tiver preço cadastrado)."""
+    preco_prompt, preco_completion = PRECOS_POR_MILHAO.get(modelo or "", (0.0, 0.0))
+    return round((tokens_prompt * preco_prompt + tokens_completion * preco_completion) / 1_000_000, 6)
+
+
+# ============================================================================
+# FERRAMENTAS RELEVANTES
+# ============================================================================
+
+def selecionar_ferramentas(tools_schema: List[Dict], state: dict) -> List[Dict]:
+    """
+    Schemas das ferramentas que fazem sentido no estado atual.
+
+    - Cliente não verificado: verificar_cliente
+    - Cliente sem cadastro: cadastrar_cliente, atualizar_rascunho
+    - Cliente cadastrado: agendar_consulta (+ atualizar_card se tem card)
+    - Com consulta agendada: ver_consulta, gerenciar_consulta
+    - Sempre: ver_horarios, ver_info_clinica
+    """
+    nomes = {"ver_horarios", "ver_info_clinica"}
+
+    if not state.get("cliente_verificado"):
+        nomes.add("verificar_cliente")
+
+    if state.get("cliente_id"):
+        nomes.add("agendar_consulta")
+        if state.get("card_id"):
+            nomes.add("atualizar_card")
+        if state.get("consulta_agendada"):
+            nomes.update({"ver_consulta", "gerenciar_consulta"})
+    else:
+        nomes.update({"cadastrar_cliente", "atualizar_rascunho"})
+
+    return [t for t in tools_schema if t.get("function", {}).get("name") in nomes]
+
+
+# ============================================================================
+# COMPACTAÇÃO
+# ============================================================================
+
+def compactar_resultado(resultado: Any, orcamento: Optional[OrcamentoTokens] = None) -> str:
+    """
+    Serializa o resultado de uma ferramenta dentro do limite de tokens.
+
+    Listas longas são cortadas (com a contagem do que foi omitido);
+    se ainda assim exceder, o JSON é truncado.
+    """
+    orcamento = orcamento or get_orcamento()
+    texto = json.dumps(resultado, ensure_ascii=False)
+    if estimar_tokens(texto) <= orcamento.limite_resultado_ferramenta:
+        return texto
+
+    texto = json.dumps(_cortar_listas(resultado, orcamento.max_itens_lista), ensure_ascii=False)
+    if estimar_tokens(texto) <= orcamento.limite_resultado_ferramenta:
+        return texto
+
+    limite_caracteres = orcamento.limite_resultado_ferramenta * 4
+    return texto[:limite_caracteres] + " …[resultado truncado]"
+
+
+def _cortar_listas(valor: Any, max_itens: int) -> Any:
+    if isinstance(valor, dict):
+        return {k: _cortar_listas(v, max_itens) for k, v in valor.items()}
+    if isinstance(valor, list):
+        cortada = [_cortar_listas(v, max_itens) for v in valor[:max_itens]]
+        if len(valor) > max_itens:
+            cortada.append(f"... +{len(valor) - max_itens} itens")
+        return cortada
+    return valor
+
+
+def ajustar_historico(
+    mensagens: List[Dict],
+    disponivel: int,
+    orcamento: Optional[OrcamentoTokens] = None
+) -> Tuple[List[Dict], int]:
+    """
+    Mantém as mensagens mais recentes que cabem em `disponivel` tokens.
+
+    As mais antigas viram um único resumo (trechos das falas), para o
+    agente não perder o fio da conversa. A última mensagem é sempre mantida.
+
+    Returns:
+        (mensagens ajustadas, quantidade de mensagens resumidas)
+    """
+    orcamento = orcamento or get_orcamento()
+    mantidas: List[Dict] = []
+    usado = 0
+
+    for i, mensagem in enumerate(reversed(mensagens)):
+        custo = estimar_mensagem(mensagem)
+        if mantidas and usado + custo > disponivel:
+            antigas = mensagens[:len(mensagens) - i]
+            return [_resumir(antigas, orcamento.max_caracteres_resumo)] + list(reversed(mantidas)), len(antigas)
+        mantidas.append(mensagem)
+        usado += custo
+
+    return mensagens, 0
+
+
+def _resumir(mensagens: List[Dict], max_caracteres: int) -> Dict:
+    """Resumo extrativo das mensagens descartadas (sem chamar o LLM)."""
+    falas = []
+    for m in mensagens:
+        conteudo = (m.get("content") or "").strip().replace("\n", " ")
+        if not conteudo or m.get("role") == "tool":
+            continue
+        quem = "Paciente" if m.get("role") == "user" else "Ana"
+        falas.append(f"{quem}: {conteudo[:80]}")
+
+    texto = " | ".join(falas)
+    if len(texto) > max_caracteres:
+        texto = "…" + texto[-max_caracteres:]
+
+    return {"role": "system", "content": f"Resumo da conversa anterior: {texto}"}
@@ -0,0 +1,440 @@
+# app/chat_langgraph/rastreamento.py
+"""
+Rastreamento (spans) do pipeline do chat.
+
+Cada turno vira um trace com spans aninhados:
+
+    chat.turno
+    ├── conversa.obter          (upsert da conversa, registro das mensagens)
+    ├── grafo
+    │   ├── checkpoint.carregar / checkpoint.gravar
+    │   ├── no.carregar_contexto
+    │   │   └── db.rpc contexto_paciente ...
+    │   ├── no.agente
+    │   │   ├── llm             (provider, modelo, tokens, tool_calls)
+    │   │   └── ferramenta      (nome, sucesso, idas ao banco)
+    │   │       └── db.insert cards ...
+    │   └── no.finalizar
+    └── turno.concluir
+
+Os spans seguem o modelo do OpenTelemetry (trace_id/span_id/parent,
+início/fim em ns, atributos, status) e são exportados no formato
+OTLP/JSON. Exportadores:
+
+- ExportadorMemoria: últimos N traces (testes, benchmark)
+- ExportadorArquivo: um JSON OTLP por linha (JSONL)
+- ExportadorOTLP: POST em um coletor OpenTelemetry (/v1/traces)
+
+Sem trace ativo (escritas em background, scripts) span() não faz nada.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+
+MAX_SPANS_POR_TRACE = 500
+MAX_ETAPAS_RESUMO = 60
+
+
+# ============================================================================
+# SPANS
+# ============================================================================
+
+@dataclass
+class Span:
+    """Um intervalo medido do turno (modelo de span do OpenTelemetry)."""
+    nome: str
+    trace_id: str
+    span_id: str
+    pai_id: Optional[str] = None
+    inicio_ns: int = field(default_factory=time.time_ns)
+    fim_ns: Optional[int] = None
+    atributos: Dict[str, Any] = field(default_factory=dict)
+    erro: Optional[str] = None
+
+    @property
+    def duracao_ms(self) -> float:
+        fim = self.fim_ns or time.time_ns()
+        return (fim - self.inicio_ns) / 1e6
+
+    def definir(self, **atributos) -> None:
+        self.atributos.update({k: v for k, v in atributos.items() if v is not None})
+
+    def contar(self, chave: str, quantidade: int = 1) -> None:
+        self.atributos[chave] = self.atributos.get(chave, 0) + quantidade
+
+    def to_otlp(self) -> dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.pai_id or "",
+            "name": self.nome,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(self.inicio_ns),
+            "endTimeUnixNano": str(self.fim_ns or self.inicio_ns),
+            "attributes": [_atributo_otlp(k, v) for k, v in self.atributos.items()],
+            "status": {"code": 2, "message": self.erro} if self.erro else {"code": 1},
+        }
+
+
+class _SpanNulo:
+    """Span usado fora de um trace: aceita atributos e descarta."""
+
+    def definir(self, **atributos) -> None:
+        pass
+
+    def contar(self, chave: str, quantidade: int = 1) -> None:
+        pass
+
+
+SPAN_NULO = _SpanNulo()
+
+
+@dataclass
+class Trace:
+    """Spans de um turno; exportado quando a raiz termina."""
+    raiz: Span
+    spans: List[Span] = field(default_factory=list)
+
+
+_trace_atual: ContextVar[Optional[Trace]] = ContextVar("chat_trace_atual", default=None)
+_span_atual: ContextVar[Optional[Span]] = ContextVar("chat_span_atual", default=None)
+
+
+def span_atual() -> Optional[Span]:
+    return _span_atual.get()
+
+
+@contextmanager
+def iniciar_trace(nome: str, **atributos) -> Iterator[Trace]:
+    """Abre o trace do turno (span raiz) e exporta ao sair."""
+    raiz = Span(nome=nome, trace_id=os.urandom(16).hex(), span_id=os.urandom(8).hex())
+    raiz.definir(**atributos)
+    trace = Trace(raiz=raiz, spans=[raiz])
+
+    token_trace = _trace_atual.set(trace)
+    token_span = _span_atual.set(raiz)
+    try:
+        yield trace
+    except BaseException as e:
+        raiz.erro = raiz.erro or f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        raiz.fim_ns = time.time_ns()
+        _resetar(_span_atual, token_span)
+        _resetar(_trace_atual, token_trace)
+        _exportar(trace)
+
+
+@contextmanager
+def span(nome: str, **atributos) -> Iterator[Any]:
+    """Span filho do span atual (no-op sem trace ativo)."""
+    trace = _trace_atual.get()
+    if trace is None or len(trace.spans) >= MAX_SPANS_POR_TRACE:
+        yield SPAN_NULO
+        return
+
+    pai = _span_atual.get()
+    atual = Span(
+        nome=nome,
+        trace_id=trace.raiz.trace_id,
+        span_id=os.urandom(8).hex(),
+        pai_id=pai.span_id if pai else None,
+    )
+    atual.definir(**atributos)
+    trace.spans.append(atual)
+
+    token = _span_atual.set(atual)
+    try:
+        yield atual
+    except BaseException as e:
+        atual.erro = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        atual.fim_ns = time.time_ns()
+        _resetar(_span_atual, token)
+
+
+def _resetar(variavel: ContextVar, token) -> None:
+    # Geradores assíncronos (streaming) podem terminar em outro contexto
+    try:
+        variavel.reset(token)
+    except ValueError:
+        pass
+
+
+def _atributo_otlp(chave: str, valor: Any) -> dict:
+    if isinstance(valor, bool):
+        return {"key": chave, "value": {"boolValue": valor}}
+    if isinstance(valor, int):
+        return {"key": chave, "value": {"intValue": str(valor)}}
+    if isinstance(valor, float):
+        return {"key": chave, "value": {"doubleValue": valor}}
+    return {"key": chave, "value": {"stringValue": str(valor)}}
+
+
+def para_otlp(trace: Trace) -> dict:
+    """Trace no formato ExportTraceServiceRequest (OTLP/JSON)."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_atributo_otlp("service.name", "clinicos-chat")]},
+            "scopeSpans": [{
+                "scope": {"name": "app.chat_langgraph"},
+                "spans": [s.to_otlp() for s in trace.spans],
+            }],
+        }]
+    }
+
+
+# ============================================================================
+# INSTRUMENTAÇÃO
+# ============================================================================
+
+class DBRastreado:
+    """
+    Envolve o SupabaseClient: cada operação vira um span `db.<operação>`
+    e conta uma ida ao banco (`db.idas`) no span que a chamou.
+    """
+
+    OPERACOES = frozenset({"select", "select_one", "insert", "insert_many", "update", "delete", "rpc"})
+
+    def __init__(self, db):
+        self._db = db
+
+    def __getattr__(self, nome: str):
+        atributo = getattr(self._db, nome)
+        if nome not in self.OPERACOES:
+            return atributo
+
+        async def chamar(*args, **kwargs):
+            chamador = _span_atual.get()
+            if chamador is None:
+                return await atributo(*args, **kwargs)
+            chamador.contar("db.idas")
+            alvo = kwargs.get("table") or kwargs.get("function_name") or (args[0] if args else "")
+            with span(f"db.{nome}", **{"db.operacao": nome, "db.alvo": alvo}):
+                return await atributo(*args, **kwargs)
+
+        return chamar
+
+
+def instrumentar_checkpointer(saver):
+    """Mede leitura e gravação de checkpoints (métodos async usados pelo grafo)."""
+    if saver is None or getattr(saver, "_rastreado", False):
+        return saver
+
+    for metodo, nome in (
+        ("aget_tuple", "checkpoint.carregar"),
+        ("aput", "checkpoint.gravar"),
+        ("aput_writes", "checkpoint.gravar_writes"),
+    ):
+        original = getattr(saver, metodo, None)
+        if original is None:
+            continue
+
+        async def medido(*args, _original=original, _nome=nome, **kwargs):
+            with span(_nome):
+                return await _original(*args, **kwargs)
+
+        setattr(saver, metodo, medido)
+
+    saver._rastreado = True
+    return saver
+
+
+# ============================================================================
+# RESUMO
+# ============================================================================
+
+def resumir(trace: Trace) -> dict:
+    """
+    Resumo do trace para a resposta de debug.
+
+    - etapas: spans em ordem de início, com profundidade e duração
+    - por_etapa: tempo total e quantidade por nome de span
+    - dominante: etapa (fora a raiz e os spans de banco) que mais tomou tempo
+    """
+    filhos: Dict[Optional[str], List[Span]] = {}
+    for s in trace.spans:
+        filhos.setdefault(s.pai_id, []).append(s)
+
+    etapas = []
+
+    def visitar(s: Span, profundidade: int) -> None:
+        if len(etapas) < MAX_ETAPAS_RESUMO:
+            etapas.append({
+                "nome": s.nome,
+                "profundidade": profundidade,
+                "inicio_ms": round((s.inicio_ns - trace.raiz.inicio_ns) / 1e6, 1),
+                "duracao_ms": round(s.duracao_ms, 1),
+                **({"atributos": s.atributos} if s.atributos else {}),
+                **({"erro": s.erro} if s.erro else {}),
+            })
+        for filho in sorted(filhos.get(s.span_id, []), key=lambda f: f.inicio_ns):
+            visitar(filho, profundidade + 1)
+
+    visitar(trace.raiz, 0)
+
+    por_etapa: Dict[str, Dict[str, float]] = {}
+    for s in trace.spans[1:]:
+        agregado = por_etapa.setdefault(s.nome, {"ms": 0.0, "quantidade": 0})
+        agregado["ms"] = round(agregado["ms"] + s.duracao_ms, 1)
+        agregado["quantidade"] += 1
+
+    # Folhas "de trabalho": LLM, ferramentas, checkpoints e nós sem filhos medidos
+    candidatas = {n: v for n, v in por_etapa.items() if not n.startswith("db.") and n not in ("grafo", "no.agente")}
+
+    return {
+        "trace_id": trace.raiz.trace_id,
+        "total_ms": round(trace.raiz.duracao_ms, 1),
+        "db_idas": sum(1 for s in trace.spans if s.nome.startswith("db.")),
+        "dominante": max(candidatas, key=lambda n: candidatas[n]["ms"]) if candidatas else None,
+        "por_etapa": por_etapa,
+        "etapas": etapas,
+    }
+
+
+# ============================================================================
+# EXPORTADORES
+# ============================================================================
+
+class ExportadorMemoria:
+    """Guarda os últimos traces em memória (testes e benchmark)."""
+
+    def __init__(self, max_traces: int = 200):
+        self.traces: deque = deque(maxlen=max_traces)
+
+    def exportar(self, trace: Trace) -> None:
+        self.traces.append(para_otlp(trace))
+
+
+class ExportadorArquivo:
+    """
+    Acrescenta cada trace (OTLP/JSON) como uma linha do arquivo.
+    Dentro do event loop a escrita vai para uma thread (asyncio.to_thread):
+    disco lento não pode segurar os outros turnos.
+    """
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+
+    def exportar(self, trace: Trace) -> None:
+        linha = json.dumps(para_otlp(trace), ensure_ascii=False) + "\n"
+        if not _em_segundo_plano(self._gravar_em_thread(linha)):
+            self._gravar(linha)  # fora de um event loop
+
+    async def _gravar_em_thread(self, linha: str) -> None:
+        try:
+            await asyncio.to_thread(self._gravar, linha)
+        except Exception as e:
+            _metricas["erros_exportacao"] += 1
+            print(f"[WARN] Falha ao exportar trace: {e}")
+
+    def _gravar(self, linha: str) -> None:
+        # Threads concorrentes não intercalam linhas
+        with self._lock, open(self.caminho, "a", encoding="utf-8") as arquivo:
+            arquivo.write(linha)
+
+
+class ExportadorOTLP:
+    """Envia cada trace a um coletor OpenTelemetry (OTLP/HTTP JSON), sem bloquear o turno."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/") + "/v1/traces"
+
+    def exportar(self, trace: Trace) -> None:
+        _em_segundo_plano(self._enviar(para_otlp(trace)))  # fora de um event loop, descarta
+
+    async def _enviar(self, corpo: dict) -> None:
+        from app.core.http import get_http_client
+
+        try:
+            await get_http_client("default").post(self.url, json=corpo)
+        except Exception as e:
+            _metricas["erros_exportacao"] += 1
+            print(f"[WARN] Falha ao exportar trace: {e}")
+
+
+_exportadores: List[Any] = []
+_metricas = {"traces": 0, "spans": 0, "erros_exportacao": 0}
+
+# O loop só guarda referência fraca às tasks: sem esta, uma exportação
+# em andamento pode ser coletada pelo GC antes de terminar
+_tarefas: set = set()
+
+
+def _em_segundo_plano(corrotina) -> bool:
+    """Agenda a corrotina no loop atual; False (e a descarta) fora de um loop."""
+    try:
+        tarefa = asyncio.get_running_loop().create_task(corrotina)
+    except RuntimeError:
+        corrotina.close()
+        return False
+    _tarefas.add(tarefa)
+    tarefa.add_done_callback(_tarefas.discard)
+    return True
+
+
+async def aguardar_exportacoes() -> None:
+    """Espera as exportações em andamento (shutdown, testes)."""
+    if _tarefas:
+        await asyncio.gather(*list(_tarefas), return_exceptions=True)
+
+
+def criar_exportador(especificacao: str):
+    """
+    Exportador a partir da configuração:
+    "memoria" | "arquivo:/caminho/traces.jsonl" | "otlp:http://coletor:4318"
+    """
+    tipo, _, destino = especificacao.partition(":")
+    tipo = tipo.strip().lower()
+    if tipo == "memoria":
+        return ExportadorMemoria()
+    if tipo == "arquivo" and destino:
+        return ExportadorArquivo(destino)
+    if tipo == "otlp" and destino:
+        return ExportadorOTLP(destino)
+    raise ValueError(f"Exportador de rastreamento inválido: {especificacao}")
+
+
+def configurar(especificacoes: str = "") -> List[Any]:
+    """Substitui os exportadores (lista separada por vírgula; vazio = nenhum)."""
+    _exportadores.clear()
+    for especificacao in filter(None, (e.strip() for e in (especificacoes or "").split(","))):
+        try:
+            _exportadores.append(criar_exportador(especificacao))
+        except ValueError as e:
+            print(f"[WARN] {e}")
+    return list(_exportadores)
+
+
+def adicionar_exportador(exportador) -> None:
+    _exportadores.append(exportador)
+
+
+def _exportar(trace: Trace) -> None:
+    _metricas["traces"] += 1
+    _metricas["spans"] += len(trace.spans)
+    for exportador in _exportadores:
+        try:
+            exportador.exportar(trace)
+        except Exception as e:
+            _metricas["erros_exportacao"] += 1
+            print(f"[WARN] Falha ao exportar trace: {e}")
+
+
+def get_metricas_rastreamento() -> dict:
+    return {
+        **_metricas,
+        "exportadores": [type(e).__name__ for e in _exportadores],
+        "exportacoes_pendentes": len(_tarefas),
+    }
@@ -0,0 +1,501 @@
+# app/chat_langgraph/roteador_llm.py
+"""
+Roteador de provedores de LLM.
+
+Distribui as chamadas entre vários BaseLLMProvider (ex: OpenRouter + Groq)
+em vez de fixar um único provedor para o processo:
+
+- Estatísticas móveis de latência e erros por provedor/modelo
+- Ordem de tentativa pela latência observada (provedores medidos primeiro)
+- Failover: erro ou timeout em um provedor → tenta o próximo
+- Hedge (opcional): se o primeiro não respondeu até o seu p95, dispara a
+  mesma chamada no próximo provedor e fica com a primeira resposta
+- Circuit breaker: após N falhas seguidas o provedor fica fora por um tempo;
+  depois recebe uma única chamada de teste (meio-aberto)
+
+Configurar via .env:
+    LLM_PROVIDER=openrouter
+    LLM_PROVIDERS_FALLBACK=groq,deepseek
+    LLM_HEDGE_HABILITADO=true
+
+Demonstração com servidores locais (stub compatível com OpenAI):
+    python -m app.chat_langgraph.roteador_llm
+"""
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, List, Optional, TypeVar
+
+from .llm_providers import BaseLLMProvider, LLMResponse, get_http_client
+
+
+T = TypeVar("T")
+
+AMOSTRAS_LATENCIA = 200
+MIN_AMOSTRAS_P95 = 10       # abaixo disso o hedge usa só o atraso mínimo
+PENALIDADE_ERRO = 4.0       # peso da taxa de erro na pontuação
+
+
+# ============================================================================
+# PROVEDOR GENÉRICO (compatível com OpenAI)
+# ============================================================================
+
+class ProviderCompativelOpenAI(BaseLLMProvider):
+    """
+    Provedor para qualquer endpoint /chat/completions compatível com OpenAI.
+
+    Usado para servidores próprios e para os stubs locais de teste.
+    """
+
+    def __init__(self, nome: str, base_url: str, model: str, api_key: str = "local"):
+        self._nome = nome
+        self._base_url = base_url.rstrip("/")
+        self._model = model
+        self._api_key = api_key
+
+    @property
+    def api_key(self) -> str:
+        return self._api_key
+
+    @property
+    def model(self) -> str:
+        return self._model
+
+    @property
+    def base_url(self) -> str:
+        return self._base_url
+
+    async def complete(
+        self,
+        system_prompt: str,
+        user_message: str,
+        temperature: float = 0.1,
+        max_tokens: int = 500
+    ) -> LLMResponse:
+        client = get_http_client("llm")
+        response = await client.post(
+            f"{self._base_url}/chat/completions",
+            headers={"Authorization": f"Bearer {self._api_key}"},
+            json={
+                "model": self._model,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message}
+                ],
+                "temperature": temperature,
+                "max_tokens": max_tokens
+            },
+            timeout=60.0
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        return LLMResponse(
+            content=data["choices"][0]["message"]["content"],
+            model=self._model,
+            provider=self._nome,
+            tokens_used=data.get("usage", {}).get("total_tokens")
+        )
+
+    def get_provider_name(self) -> str:
+        return self._nome
+
+
+# ============================================================================
+# ESTADO POR PROVEDOR
+# ============================================================================
+
+@dataclass
+class EstadoProvider:
+    """Latência, erros e circuit breaker de um provedor/modelo."""
+    provider: BaseLLMProvider
+    falhas_para_abrir: int = 3
+    espera_circuito_s: float = 30.0
+
+    chamadas: int = 0
+    erros: int = 0
+    falhas_seguidas: int = 0
+    canceladas: int = 0
+    aberto_ate: float = 0.0
+    teste_em_andamento: bool = False
+    latencias: deque = field(default_factory=lambda: deque(maxlen=AMOSTRAS_LATENCIA))
+    resultados: deque = field(default_factory=lambda: deque(maxlen=AMOSTRAS_LATENCIA))
+
+    @property
+    def chave(self) -> str:
+        return f"{self.provider.get_provider_name()}:{self.provider.model}"
+
+    @property
+    def circuito(self) -> str:
+        if self.aberto_ate == 0.0:
+            return "fechado"
+        if time.monotonic() < self.aberto_ate:
+            return "aberto"
+        return "meio_aberto"
+
+    def disponivel(self) -> bool:
+        """Pode receber chamada agora (meio-aberto: só uma de teste por vez)."""
+        circuito = self.circuito
+        if circuito == "fechado":
+            return True
+        if circuito == "meio_aberto" and not self.teste_em_andamento:
+            return True
+        return False
+
+    def iniciar(self) -> None:
+        if self.circuito == "meio_aberto":
+            self.teste_em_andamento = True
+
+    def registrar_sucesso(self, duracao_ms: float) -> None:
+        self.chamadas += 1
+        self.latencias.append(duracao_ms)
+        self.resultados.append(True)
+        self.falhas_seguidas = 0
+        self.aberto_ate = 0.0
+        self.teste_em_andamento = False
+
+    def registrar_falha(self) -> None:
+        self.chamadas += 1
+        self.erros += 1
+        self.resultados.append(False)
+        self.falhas_seguidas += 1
+        self.teste_em_andamento = False
+
+        if self.circuito == "meio_aberto" or self.falhas_seguidas >= self.falhas_para_abrir:
+            self.aberto_ate = time.monotonic() + self.espera_circuito_s
+
+    def registrar_cancelada(self, duracao_ms: float) -> None:
+        """
+        Chamada cancelada (ex.: hedge perdeu): não é sucesso nem falha,
+        mas o tempo decorrido entra como amostra (limite inferior da
+        latência). Sem isso um provedor que ficou lento manteria o p50
+        antigo e continuaria primeiro na ordem, pagando o atraso do hedge
+        em toda chamada.
+        """
+        self.chamadas += 1
+        self.canceladas += 1
+        self.latencias.append(duracao_ms)
+        self.teste_em_andamento = False
+
+    def percentil(self, p: float) -> float:
+        if not self.latencias:
+            return 0.0
+        ordenadas = sorted(self.latencias)
+        indice = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+        return ordenadas[indice]
+
+    @property
+    def taxa_erro(self) -> float:
+        if not self.resultados:
+            return 0.0
+        return self.resultados.count(False) / len(self.resultados)
+
+    def pontuacao(self) -> float:
+        """Menor é melhor. Provedores sem medição ficam por último."""
+        if not self.latencias:
+            return float("inf")
+        return self.percentil(50) * (1 + PENALIDADE_ERRO * self.taxa_erro)
+
+    def to_dict(self) -> dict:
+        return {
+            "chamadas": self.chamadas,
+            "erros": self.erros,
+            "canceladas": self.canceladas,
+            "taxa_erro": round(self.taxa_erro, 3),
+            "p50_ms": round(self.percentil(50), 1),
+            "p95_ms": round(self.percentil(95), 1),
+            "circuito": self.circuito,
+        }
+
+
+# ============================================================================
+# ROTEADOR
+# ============================================================================
+
+class RoteadorLLM(BaseLLMProvider):
+    """
+    Provedor composto: roteia cada chamada entre os provedores configurados.
+
+    Mantém a interface de BaseLLMProvider (api_key/model/base_url do
+    provedor preferido no momento) para quem só usa complete(). O agente
+    usa executar() para rotear as chamadas de chat completions com tools.
+    """
+
+    def __init__(
+        self,
+        providers: List[BaseLLMProvider],
+        hedge: bool = False,
+        hedge_min_ms: float = 1500.0,
+        falhas_para_abrir: int = 3,
+        espera_circuito_s: float = 30.0
+    ):
+        if not providers:
+            raise ValueError("RoteadorLLM precisa de ao menos um provedor")
+
+        self.estados = [
+            EstadoProvider(p, falhas_para_abrir=falhas_para_abrir, espera_circuito_s=espera_circuito_s)
+            for p in providers
+        ]
+        self.hedge = hedge
+        self.hedge_min_ms = hedge_min_ms
+        self.metricas = {"failovers": 0, "hedges": 0, "hedges_vencedores": 0}
+
+    # ------------------------------------------------------------------
+    # Interface BaseLLMProvider (delegada ao preferido)
+    # ------------------------------------------------------------------
+
+    @property
+    def preferido(self) -> BaseLLMProvider:
+        return self._ordem()[0].provider
+
+    @property
+    def api_key(self) -> str:
+        return self.preferido.api_key
+
+    @property
+    def model(self) -> str:
+        return self.preferido.model
+
+    @property
+    def base_url(self) -> str:
+        return self.preferido.base_url
+
+    def get_provider_name(self) -> str:
+        return self.preferido.get_provider_name()
+
+    async def complete(
+        self,
+        system_prompt: str,
+        user_message: str,
+        temperature: float = 0.1,
+        max_tokens: int = 500
+    ) -> LLMResponse:
+        return await self.executar(
+            lambda p: p.complete(system_prompt, user_message, temperature, max_tokens)
+        )
+
+    # ------------------------------------------------------------------
+    # Roteamento
+    # ------------------------------------------------------------------
+
+    def _ordem(self) -> List[EstadoProvider]:
+        """
+        Provedores disponíveis, do melhor para o pior.
+
+        Empate (ex: nenhum medido) mantém a ordem configurada. Se todos
+        estão com circuito aberto, usa o que reabre primeiro.
+        """
+        disponiveis = [e for e in self.estados if e.disponivel()]
+        if not disponiveis:
+            return [min(self.estados, key=lambda e: e.aberto_ate)]
+        return sorted(disponiveis, key=lambda e: (e.pontuacao(), e.taxa_erro))
+
+    def _atraso_hedge(self, estado: EstadoProvider) -> float:
+        """Quanto esperar (s) antes de disparar a chamada de hedge."""
+        atraso_ms = self.hedge_min_ms
+        if len(estado.latencias) >= MIN_AMOSTRAS_P95:
+            atraso_ms = max(atraso_ms, estado.percentil(95))
+        return atraso_ms / 1000
+
+    async def _tentar(self, estado: EstadoProvider, funcao: Callable[[BaseLLMProvider], Awaitable[T]]) -> T:
+        estado.iniciar()
+        inicio = time.perf_counter()
+        try:
+            resultado = await funcao(estado.provider)
+        except asyncio.CancelledError:
+            estado.registrar_cancelada((time.perf_counter() - inicio) * 1000)
+            raise
+        except Exception:
+            estado.registrar_falha()
+            raise
+        estado.registrar_sucesso((time.perf_counter() - inicio) * 1000)
+        return resultado
+
+    async def executar(
+        self,
+        funcao: Callable[[BaseLLMProvider], Awaitable[T]],
+        hedge: Optional[bool] = None,
+        pode_repetir: Optional[Callable[[], bool]] = None
+    ) -> T:
+        """
+        Executa funcao(provider) com failover entre os provedores.
+
+        Args:
+            funcao: chamada a fazer com o provedor escolhido
+            hedge: sobrescreve a configuração de hedge (streaming usa False)
+            pode_repetir: consultado antes do failover; retorna False quando a
+                tentativa já produziu efeito visível (ex: tokens emitidos)
+
+        Raises:
+            A última exceção, se todos os provedores falharem
+        """
+        usar_hedge = self.hedge if hedge is None else hedge
+        candidatos = self._ordem()
+        ultimo_erro: Optional[Exception] = None
+
+        while candidatos:
+            estado = candidatos.pop(0)
+            reserva = candidatos[0] if usar_hedge and candidatos else None
+            tentados = {estado.chave}
+
+            try:
+                if reserva is None:
+                    return await self._tentar(estado, funcao)
+                return await self._com_hedge(estado, reserva, funcao, tentados)
+            except Exception as e:
+                ultimo_erro = e
+                print(f"[WARN] LLM {estado.chave} falhou: {type(e).__name__}: {e}")
+
+                if pode_repetir is not None and not pode_repetir():
+                    raise
+                candidatos = [c for c in candidatos if c.chave not in tentados]
+                if candidatos:
+                    self.metricas["failovers"] += 1
+
+        raise ultimo_erro or RuntimeError("Nenhum provedor LLM disponível")
+
+    async def _com_hedge(
+        self,
+        estado: EstadoProvider,
+        reserva: EstadoProvider,
+        funcao: Callable[[BaseLLMProvider], Awaitable[T]],
+        tentados: set
+    ) -> T:
+        """
+        Chamada principal + hedge no provedor reserva após o p95 do principal.
+
+        A primeira resposta bem-sucedida vence; a outra chamada é cancelada.
+        Provedores efetivamente chamados são adicionados a `tentados`.
+        """
+        principal = asyncio.create_task(self._tentar(estado, funcao))
+        pendentes = {principal}
+
+        try:
+            feitas, _ = await asyncio.wait(pendentes, timeout=self._atraso_hedge(estado))
+            if feitas:
+                return principal.result()
+
+            self.metricas["hedges"] += 1
+            tentados.add(reserva.chave)
+            secundaria = asyncio.create_task(self._tentar(reserva, funcao))
+            pendentes = {principal, secundaria}
+
+            while pendentes:
+                feitas, pendentes = await asyncio.wait(pendentes, return_when=asyncio.FIRST_COMPLETED)
+                for tarefa in feitas:
+                    if tarefa.exception() is None:
+                        if tarefa is secundaria:
+                            self.metricas["hedges_vencedores"] += 1
+                        return tarefa.result()
+
+            # As duas falharam: propaga o erro do principal
+            return principal.result()
+        finally:
+            canceladas = [t for t in pendentes if not t.done()]
+            for tarefa in canceladas:
+                tarefa.cancel()
+            # Aguarda o cancelamento para a amostra do perdedor já valer na próxima ordenação
+            if canceladas:
+                await asyncio.gather(*canceladas, return_exceptions=True)
+
+    def get_metricas(self) -> dict:
+        """Estatísticas por provedor/modelo e contadores de failover/hedge."""
+        return {
+            **self.metricas,
+            "hedge_habilitado": self.hedge,
+            "providers": {e.chave: e.to_dict() for e in self.estados},
+        }
+
+
+# ============================================================================
+# DEMONSTRAÇÃO COM STUBS LOCAIS
+# ============================================================================
+
+async def _iniciar_stub(atraso_s: float = 0.0, status: int = 200, conteudo: str = "ok") -> tuple[Any, str]:
+    """Servidor HTTP mínimo que responde /chat/completions no formato OpenAI."""
+    import json
+
+    async def atender(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            cabecalho = await reader.readuntil(b"\r\n\r\n")
+            tamanho = 0
+            for linha in cabecalho.decode().split("\r\n"):
+                if linha.lower().startswith("content-length:"):
+                    tamanho = int(linha.split(":", 1)[1])
+            if tamanho:
+                await reader.readexactly(tamanho)
+
+            await asyncio.sleep(atraso_s)
+            corpo = json.dumps({
+                "choices": [{"message": {"content": conteudo}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12}
+            }).encode()
+            writer.write(
+                f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(corpo)}\r\n\r\n".encode() + corpo
+            )
+            await writer.drain()
+        except (asyncio.CancelledError, ConnectionError, asyncio.IncompleteReadError):
+            pass  # cliente desistiu (hedge perdedor)
+        finally:
+            writer.close()
+
+    servidor = await asyncio.start_server(atender, "127.0.0.1", 0)
+    porta = servidor.sockets[0].getsockname()[1]
+    return servidor, f"http://127.0.0.1:{porta}"
+
+
+async def _demonstrar():
+    servidores = []
+
+    async def stub(**kwargs) -> str:
+        servidor, url = await _iniciar_stub(**kwargs)
+        servidores.append(servidor)
+        return url
+
+    # 1. Failover: principal devolve 503, reserva responde
+    roteador = RoteadorLLM([
+        ProviderCompativelOpenAI("fora_do_ar", await stub(status=503), "m1"),
+        ProviderCompativelOpenAI("reserva", await stub(conteudo="reserva"), "m2"),
+    ])
+    for _ in range(4):
+        resposta = await roteador.complete("sys", "oi")
+    print(f"Failover → {resposta.provider}; {roteador.get_metricas()}")
+
+    # 2. Hedge: principal lento (800ms), reserva rápido
+    roteador = RoteadorLLM([
+        ProviderCompativelOpenAI("lento", await stub(atraso_s=0.8), "m1"),
+        ProviderCompativelOpenAI("rapido", await stub(atraso_s=0.05, conteudo="rapido"), "m2"),
+    ], hedge=True, hedge_min_ms=200)
+    inicio = time.perf_counter()
+    resposta = await roteador.complete("sys", "oi")
+    print(f"Hedge → {resposta.provider} em {(time.perf_counter() - inicio) * 1000:.0f}ms; {roteador.get_metricas()}")
+
+    # O perdedor do hedge ganha amostra (limite inferior): a ordem se ajusta
+    inicio = time.perf_counter()
+    resposta = await roteador.complete("sys", "oi")
+    print(
+        f"Depois do hedge → {resposta.provider} em {(time.perf_counter() - inicio) * 1000:.0f}ms; "
+        f"ordem: {[e.chave for e in roteador._ordem()]}"
+    )
+
+    # 3. Circuit breaker: único provedor falhando abre o circuito
+    roteador = RoteadorLLM(
+        [ProviderCompativelOpenAI("instavel", await stub(status=500), "m1")],
+        falhas_para_abrir=3, espera_circuito_s=5
+    )
+    for _ in range(3):
+        try:
+            await roteador.complete("sys", "oi")
+        except Exception:
+            pass
+    print(f"Circuit breaker → {roteador.get_metricas()['providers']}")
+
+    for servidor in servidores:
+        servidor.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(_demonstrar())
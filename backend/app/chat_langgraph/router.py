@@ -4,8 +4,10 @@ Endpoints FastAPI para Chat LangGraph - ADAPTADO PARA CLINICOS
 Usa o padrão de database do projeto (get_service_client + SupabaseClient)
 """
 
+import json
 from typing import Optional, List
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
 # ============================================
 # IMPORTS DO PROJETO CLINICOS
@@ -17,9 +19,13 @@ from app.core.security import CurrentUser, require_permission
 
 # LLM Provider
 from .llm_providers import get_llm_provider
+from .roteador_llm import RoteadorLLM
 
 # Service e Schemas locais
-from .service import criar_chat_service
+from .cache_respostas import get_metricas_cache
+from .historico_conversas import get_metricas_historico
+from .rastreamento import get_metricas_rastreamento
+from .service import criar_chat_service, iniciar_chat_service, get_chat_service_atual
 from .schemas import (
     MensagemRequest,
     MensagemResponse,
@@ -58,7 +64,8 @@ def get_db() -> SupabaseClient:
 
 def get_chat_service_sync():
     """
-    Retorna o ChatService configurado.
+    Cria um ChatService novo (fora do ciclo de vida da aplicação).
+    Usar apenas em scripts; requests usam get_chat_service().
     """
     db = get_db()
     llm_client = get_llm_provider()
@@ -67,9 +74,15 @@ def get_chat_service_sync():
 
 async def get_chat_service():
     """
-    Dependency que retorna o ChatService configurado.
+    Dependency que retorna o ChatService compartilhado.
+
+    Criado no lifespan da aplicação; se o lifespan não rodou
+    (ex: TestClient sem contexto), é criado na primeira chamada.
     """
-    return get_chat_service_sync()
+    service = get_chat_service_atual()
+    if service is None:
+        service = await iniciar_chat_service(get_db(), get_llm_provider(), settings)
+    return service
 
 
 def get_clinica_id(current_user: Optional[dict] = None) -> str:
@@ -86,6 +99,7 @@ def get_clinica_id(current_user: Optional[dict] = None) -> str:
 @router.post("/mensagem", response_model=MensagemResponse)
 async def processar_mensagem(
     request: MensagemRequest,
+    debug: bool = Query(False, description="Inclui o resumo dos spans do turno (etapas e tempos)"),
     current_user: CurrentUser = Depends(require_permission("chat", "C")),
     chat_service = Depends(get_chat_service)
 ):
@@ -113,6 +127,9 @@ async def processar_mensagem(
             midia_url=request.midia_url
         )
 
+        if not debug:
+            resultado = {k: v for k, v in resultado.items() if k != "rastreamento"}
+
         return MensagemResponse(**resultado)
 
     except Exception as e:
@@ -125,6 +142,51 @@ async def processar_mensagem(
         )
 
 
+@router.post("/mensagem/stream")
+async def processar_mensagem_stream(
+    request: MensagemRequest,
+    debug: bool = Query(False, description="Inclui o resumo dos spans no evento `fim`"),
+    current_user: CurrentUser = Depends(require_permission("chat", "C")),
+    chat_service = Depends(get_chat_service)
+):
+    """
+    Variante streaming de /mensagem (Server-Sent Events).
+
+    **Eventos:**
+    - `ferramenta`: progresso de uma ferramenta (executando/concluida/erro)
+    - `token`: trecho da resposta conforme o LLM gera
+    - `fim`: response completo (mesmo formato de /mensagem)
+    - `erro`: falha no processamento
+    """
+
+    async def eventos():
+        try:
+            async for evento in chat_service.processar_mensagem_stream(
+                clinica_id=current_user.clinica_id,
+                telefone=request.telefone,
+                mensagem=request.mensagem,
+                tipo_mensagem=request.tipo,
+                midia_url=request.midia_url
+            ):
+                if evento.get("tipo") == "fim" and not debug:
+                    evento = {**evento, "resposta": {k: v for k, v in evento["resposta"].items() if k != "rastreamento"}}
+                yield _formatar_sse(evento.get("tipo", "mensagem"), evento)
+        except Exception as e:
+            print(f"[ERROR] processar_mensagem_stream: {e}")
+            yield _formatar_sse("erro", {"tipo": "erro", "detalhe": str(e)})
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _formatar_sse(evento: str, dados: dict) -> str:
+    """Serializa um evento no formato Server-Sent Events."""
+    return f"event: {evento}\ndata: {json.dumps(dados, ensure_ascii=False, default=str)}\n\n"
+
+
 @router.post("/webhook/whatsapp")
 async def webhook_whatsapp(
     payload: WebhookWhatsAppRequest,
@@ -287,13 +349,22 @@ async def get_status(
         # Valida configuração
         db = get_db()
         llm = get_llm_provider()
+        service = get_chat_service_atual()
 
         return {
             "status": "ok",
             "servico": "chat_langgraph",
             "versao": "1.0.0",
             "llm_provider": llm.get_provider_name(),
-            "clinica_padrao": DEFAULT_CLINICA_ID
+            "clinica_padrao": DEFAULT_CLINICA_ID,
+            "cache_respostas": get_metricas_cache(),
+            "roteador_llm": llm.get_metricas() if isinstance(llm, RoteadorLLM) else None,
+            "fila_conversas": service.fila.get_metricas() if service else None,
+            "checkpoints": service.graph.metricas_checkpoint.to_dict() if service else None,
+            "escrita_atrasada": service.escrita.get_metricas() if service else None,
+            "outbox": service.outbox.get_metricas() if service else None,
+            "historico": get_metricas_historico(),
+            "rastreamento": get_metricas_rastreamento()
         }
     except Exception as e:
         return {
@@ -114,6 +114,8 @@ class MensagemResponse(BaseModel):
     
     # Métricas
     tempo_processamento_ms: int = Field(default=0)
+    metricas: Dict[str, Any] = Field(default_factory=dict, description="LLM chamadas/tokens e tempo de contexto do turno")
+    rastreamento: Optional[Dict[str, Any]] = Field(default=None, description="Resumo dos spans do turno (só com debug=true)")
     
     # Campos extras
     estado: Optional[str] = None
@@ -230,6 +232,7 @@ def converter_estado_para_response(state: dict) -> dict:
         "validacao_pendente": state.get("validacao_pendente", False),
         "validacao_id": state.get("validacao_id"),
         "tempo_processamento_ms": state.get("tempo_processamento_ms", 0),
+        "metricas": state.get("metricas", {}),
         "estado": state.get("estado"),
         "conversa_id": state.get("conversa_id"),
         "paciente_id": state.get("paciente_id") or state.get("cliente_id"),
@@ -257,6 +260,7 @@ def converter_resultado_para_response(resultado: dict) -> MensagemResponse:
         validacao_pendente=dados.get("validacao_pendente", False),
         validacao_id=dados.get("validacao_id"),
         tempo_processamento_ms=dados.get("tempo_processamento_ms", 0),
+        metricas=dados.get("metricas", {}),
         estado=dados.get("estado"),
         conversa_id=dados.get("conversa_id"),
         paciente_id=dados.get("paciente_id"),
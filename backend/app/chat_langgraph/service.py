@@ -4,29 +4,44 @@ Serviço principal de Chat LangGraph - ADAPTADO PARA CLINICOS
 Usa SupabaseClient wrapper e retorna formato compatível com frontend
 """
 
-from typing import Optional
+from typing import AsyncIterator, Optional
 from datetime import datetime
-import httpx
 import uuid
 
+import structlog
+
+from app.core.database import rpc_inexistente
+from app.core.outbox import Evento, Outbox, get_outbox
+
 from .graph import criar_chat_graph, ChatGraph
+from .fila_conversas import FilaConversas, MensagemPendente
+from .escrita_atrasada import EscritaAtrasada
+from . import historico_conversas, rastreamento
+from .rastreamento import DBRastreado
 from .states import ConversaState
+from .tools import FERRAMENTAS_ALTERAM_CONTEXTO
 from .schemas import converter_estado_para_response
 
+logger = structlog.get_logger()
+
 
 class ChatService:
     """
     Serviço de chat usando LangGraph.
-    Gerencia conversas, persistência e integração com Kestra.
+    Gerencia conversas, persistência e efeitos pós-turno (Kestra e
+    governança, entregues pela outbox).
     """
     
     def __init__(
         self,
         db,
         llm_client,
-        kestra_url: str = None,
-        kestra_token: str = None,
-        pg_connection_string: str = None
+        outbox: Outbox = None,
+        pg_connection_string: str = None,
+        debounce_ms: int = 1200,
+        debounce_max_ms: int = 4000,
+        checkpoints_por_thread: int = 3,
+        checkpoint_ttl_dias: int = 30
     ):
         """
         Inicializa o serviço de chat.
@@ -34,22 +49,53 @@ class ChatService:
         Args:
             db: SupabaseClient wrapper
             llm_client: Cliente LLM (Groq)
-            kestra_url: URL base do Kestra (para webhooks)
-            kestra_token: Token de autenticação Kestra
+            outbox: Outbox dos efeitos pós-turno (padrão: a da aplicação)
             pg_connection_string: Conexão PostgreSQL para checkpointer
+            debounce_ms: silêncio aguardado antes de processar uma rajada de mensagens
+            debounce_max_ms: espera máxima desde a primeira mensagem da rajada
+            checkpoints_por_thread: checkpoints mantidos por conversa na poda
+            checkpoint_ttl_dias: conversas sem atividade há mais tempo são podadas
         """
+        # Cada ida ao banco vira um span do turno (sem trace ativo, repassa direto)
+        db = DBRastreado(db)
         self.db = db
         self.llm_client = llm_client
-        self.kestra_url = kestra_url
-        self.kestra_token = kestra_token
+        self.outbox = outbox or get_outbox()
         
         # Cria o grafo
         self.graph = criar_chat_graph(
             db=db,
             llm_client=llm_client,
-            connection_string=pg_connection_string
+            connection_string=pg_connection_string,
+            checkpoints_por_thread=checkpoints_por_thread,
+            checkpoint_ttl_dias=checkpoint_ttl_dias
+        )
+        
+        # Mensagens, conversa e uso de tokens são gravados em lote, fora da resposta
+        self.escrita = EscritaAtrasada(db)
+        
+        # Um turno por conversa; mensagens em rajada viram um único turno
+        self.fila = FilaConversas(
+            self._processar_lote,
+            janela_s=debounce_ms / 1000,
+            espera_max_s=debounce_max_ms / 1000
         )
     
+    # ========================================
+    # CICLO DE VIDA
+    # ========================================
+    
+    async def iniciar(self):
+        """Abre recursos de longa duração (pool do checkpointer, escrita atrasada)."""
+        await self.graph.iniciar()
+        self.escrita.iniciar()
+    
+    async def encerrar(self):
+        """Libera recursos abertos em iniciar() (grava escritas pendentes)."""
+        await self.escrita.encerrar()
+        await self.graph.encerrar()
+        await rastreamento.aguardar_exportacoes()
+    
     # ========================================
     # MÉTODO PRINCIPAL
     # ========================================
@@ -65,61 +111,167 @@ class ChatService:
         """
         Processa uma mensagem recebida do paciente.
         
+        Mensagens da mesma conversa são processadas uma de cada vez; as que
+        chegam em rajada (dentro do debounce) são respondidas em um único
+        turno, e todos os chamadores recebem o mesmo resultado.
+        
         Returns:
             dict compatível com ChatResponse do frontend
         """
+        telefone = self._normalizar_telefone(telefone)
         
-        # Tempo de início
+        return await self.fila.enviar(
+            (clinica_id, telefone),
+            MensagemPendente(mensagem=mensagem, tipo=tipo_mensagem, midia_url=midia_url)
+        )
+    
+    async def _processar_lote(self, chave: tuple, pendentes: list) -> dict:
+        """Um turno do agente para as mensagens acumuladas da conversa."""
+        clinica_id, telefone = chave
         inicio = datetime.now()
         
-        # Normaliza telefone
+        with rastreamento.iniciar_trace(
+            "chat.turno", **{"clinica.id": clinica_id, "chat.mensagens_agrupadas": len(pendentes)}
+        ) as trace:
+            with rastreamento.span("conversa.obter"):
+                conversa_id = await self._iniciar_turno_lote(clinica_id, telefone, pendentes)
+            trace.raiz.definir(**{"conversa.id": conversa_id})
+            mensagem = "\n".join(p.mensagem for p in pendentes if p.mensagem)
+            
+            # Processa com o grafo
+            try:
+                with rastreamento.span("grafo"):
+                    resultado = await self.graph.processar_mensagem(
+                        clinica_id=clinica_id,
+                        telefone=telefone,
+                        mensagem=mensagem,
+                        thread_id=conversa_id
+                    )
+            except Exception as e:
+                print(f"[ERROR] Falha no grafo: {e}")
+                resultado = self._resultado_erro(e)
+            
+            resultado.setdefault("metricas", {})["mensagens_agrupadas"] = len(pendentes)
+            
+            with rastreamento.span("turno.concluir"):
+                resposta = await self._concluir_turno(
+                    clinica_id, conversa_id, resultado, inicio, telefone=telefone, mensagem=mensagem
+                )
+        
+        resposta["rastreamento"] = rastreamento.resumir(trace)
+        return resposta
+    
+    async def processar_mensagem_stream(
+        self,
+        clinica_id: str,
+        telefone: str,
+        mensagem: str,
+        tipo_mensagem: str = "texto",
+        midia_url: str = None
+    ) -> AsyncIterator[dict]:
+        """
+        Variante streaming de processar_mensagem.
+        
+        Gera eventos {"tipo": "ferramenta"|"token", ...} durante o processamento
+        e, por último, {"tipo": "fim", "resposta": <mesmo dict de processar_mensagem>}.
+        """
         telefone = self._normalizar_telefone(telefone)
         
+        # Streaming não agrupa mensagens, mas respeita a fila da conversa
+        async with self.fila.exclusivo((clinica_id, telefone)):
+            inicio = datetime.now()
+            
+            with rastreamento.iniciar_trace(
+                "chat.turno", **{"clinica.id": clinica_id, "chat.streaming": True}
+            ) as trace:
+                with rastreamento.span("conversa.obter"):
+                    conversa_id = await self._iniciar_turno_lote(
+                        clinica_id, telefone,
+                        [MensagemPendente(mensagem=mensagem, tipo=tipo_mensagem, midia_url=midia_url)]
+                    )
+                trace.raiz.definir(**{"conversa.id": conversa_id})
+                
+                resultado = None
+                try:
+                    with rastreamento.span("grafo"):
+                        async for evento in self.graph.processar_mensagem_stream(
+                            clinica_id=clinica_id,
+                            telefone=telefone,
+                            mensagem=mensagem,
+                            thread_id=conversa_id
+                        ):
+                            if evento.get("tipo") == "resultado":
+                                resultado = evento["resultado"]
+                            else:
+                                yield evento
+                except Exception as e:
+                    print(f"[ERROR] Falha no grafo: {e}")
+                    resultado = self._resultado_erro(e)
+                
+                with rastreamento.span("turno.concluir"):
+                    resposta = await self._concluir_turno(
+                        clinica_id, conversa_id, resultado or {}, inicio, telefone=telefone, mensagem=mensagem
+                    )
+            
+            resposta["rastreamento"] = rastreamento.resumir(trace)
+        
+        yield {"tipo": "fim", "resposta": resposta}
+    
+    async def _iniciar_turno_lote(
+        self,
+        clinica_id: str,
+        telefone: str,
+        pendentes: list
+    ) -> str:
+        """Busca/cria conversa e registra cada mensagem recebida (telefone já normalizado)."""
+        
         # Busca ou cria conversa
         conversa = await self._get_ou_criar_conversa(clinica_id, telefone)
         conversa_id = conversa.get("id", str(uuid.uuid4()))
         
-        # Registra mensagem recebida
-        await self._registrar_mensagem(
-            conversa_id=conversa_id,
-            direcao="recebida",
-            conteudo=mensagem,
-            tipo=tipo_mensagem,
-            midia_url=midia_url
-        )
-        
-        # Processa com o grafo
-        try:
-            resultado = await self.graph.processar_mensagem(
-                clinica_id=clinica_id,
-                telefone=telefone,
-                mensagem=mensagem,
-                thread_id=conversa_id
+        # Registra mensagens recebidas (uma linha por mensagem, na ordem)
+        for p in pendentes:
+            self._registrar_mensagem(
+                conversa_id=conversa_id,
+                direcao="recebida",
+                conteudo=p.mensagem,
+                tipo=p.tipo,
+                midia_url=p.midia_url
             )
-        except Exception as e:
-            print(f"[ERROR] Falha no grafo: {e}")
-            resultado = {
-                "resposta": "Desculpe, ocorreu um erro. Tente novamente.",
-                "estado": "erro",
-                "intencao": "DESCONHECIDO",
-                "confianca_intencao": 0,
-                "acoes_executadas": [],
-                "erro": str(e)
-            }
+        
+        return conversa_id
+    
+    async def _concluir_turno(
+        self,
+        clinica_id: str,
+        conversa_id: str,
+        resultado: dict,
+        inicio: datetime,
+        telefone: str = None,
+        mensagem: str = ""
+    ) -> dict:
+        """Registra resposta, enfileira efeitos (outbox), atualiza conversa e monta o response."""
         
         # Registra resposta
-        await self._registrar_mensagem(
+        self._registrar_mensagem(
             conversa_id=conversa_id,
             direcao="enviada",
             conteudo=resultado.get("resposta", ""),
             tipo="texto"
         )
         
-        # Dispara webhooks Kestra se necessário
-        await self._disparar_webhooks(resultado, clinica_id)
+        # Webhooks Kestra e governança: só grava, a outbox entrega fora do turno
+        await self._registrar_efeitos(resultado, clinica_id, conversa_id, telefone, mensagem)
         
         # Atualiza conversa
-        await self._atualizar_conversa(conversa_id, resultado)
+        self._atualizar_conversa(conversa_id, resultado)
+        
+        # Acumula tokens/custo do turno na conversa
+        self._registrar_uso_tokens(conversa_id, resultado.get("metricas", {}))
+        
+        # Fora do ciclo de vida da aplicação (scripts) não há task de escrita
+        if not self.escrita.ativa:
+            await self.escrita.descarregar()
         
         # Calcula tempo de processamento
         tempo_ms = int((datetime.now() - inicio).total_seconds() * 1000)
@@ -131,12 +283,42 @@ class ChatService:
         # CONVERTE PARA FORMATO DO FRONTEND
         return converter_estado_para_response(resultado)
     
+    def _resultado_erro(self, erro: Exception) -> dict:
+        """Resultado padrão quando o grafo falha."""
+        return {
+            "resposta": "Desculpe, ocorreu um erro. Tente novamente.",
+            "estado": "erro",
+            "intencao": "DESCONHECIDO",
+            "confianca_intencao": 0,
+            "acoes_executadas": [],
+            "erro": str(erro)
+        }
+    
     # ========================================
     # MÉTODOS DE CONVERSA (usando SupabaseClient)
     # ========================================
     
     async def _get_ou_criar_conversa(self, clinica_id: str, telefone: str) -> dict:
-        """Busca conversa ativa ou cria nova"""
+        """
+        Busca conversa ativa ou cria nova.
+        
+        Usa a RPC obter_ou_criar_conversa (upsert atômico, uma ida ao banco);
+        se ela não existir (migração não aplicada), cai para select + insert.
+        Outros erros da RPC sobem: o fallback não é atômico e duplicaria
+        conversas justamente sob carga.
+        """
+        
+        try:
+            conversas = await self.db.rpc(
+                "obter_ou_criar_conversa",
+                {"p_clinica_id": clinica_id, "p_telefone": telefone}
+            )
+            if conversas:
+                return conversas[0] if isinstance(conversas, list) else conversas
+        except Exception as e:
+            if not rpc_inexistente(e):
+                raise
+            logger.warning("RPC obter_ou_criar_conversa inexistente, usando fallback", error=str(e))
         
         try:
             # Busca conversa ativa usando SupabaseClient wrapper
@@ -174,8 +356,8 @@ class ChatService:
             print(f"[WARN] Erro ao criar conversa: {e}")
             return nova_conversa
     
-    async def _atualizar_conversa(self, conversa_id: str, resultado: dict):
-        """Atualiza dados da conversa"""
+    def _atualizar_conversa(self, conversa_id: str, resultado: dict):
+        """Enfileira atualização dos dados da conversa (escrita atrasada)"""
         
         update_data = {
             "updated_at": datetime.now().isoformat(),
@@ -184,16 +366,21 @@ class ChatService:
             "ultimo_estado": resultado.get("estado")
         }
         
-        try:
-            await self.db.update(
-                table="conversas",
-                data=update_data,
-                filters={"id": conversa_id}
-            )
-        except Exception as e:
-            print(f"[WARN] Erro ao atualizar conversa: {e}")
+        self.escrita.atualizar_conversa(conversa_id, update_data)
+    
+    def _registrar_uso_tokens(self, conversa_id: str, metricas: dict):
+        """Soma tokens e custo estimado do turno nos totais da conversa (escrita atrasada)."""
+        
+        tokens_prompt = metricas.get("tokens_prompt", 0)
+        tokens_completion = metricas.get("tokens_completion", 0)
+        if not tokens_prompt and not tokens_completion:
+            return
+        
+        self.escrita.somar_uso_tokens(
+            conversa_id, tokens_prompt, tokens_completion, metricas.get("custo_estimado", 0)
+        )
     
-    async def _registrar_mensagem(
+    def _registrar_mensagem(
         self,
         conversa_id: str,
         direcao: str,
@@ -201,7 +388,7 @@ class ChatService:
         tipo: str = "texto",
         midia_url: str = None
     ):
-        """Registra mensagem no histórico"""
+        """Registra mensagem no histórico (cache em memória + escrita atrasada)"""
         
         mensagem = {
             "id": str(uuid.uuid4()),
@@ -213,67 +400,78 @@ class ChatService:
             "created_at": datetime.now().isoformat()
         }
         
-        try:
-            await self.db.insert("mensagens", mensagem)
-        except Exception as e:
-            print(f"[WARN] Erro ao registrar mensagem: {e}")
+        historico_conversas.registrar(conversa_id, mensagem)
+        self.escrita.registrar_mensagem(mensagem)
     
     # ========================================
-    # INTEGRAÇÃO KESTRA
+    # EFEITOS PÓS-TURNO (OUTBOX)
     # ========================================
     
-    async def _disparar_webhooks(self, resultado: dict, clinica_id: str):
-        """Dispara webhooks do Kestra baseado nas ações executadas."""
-        
-        if not self.kestra_url:
-            print("[INFO] Kestra não configurado - pulando webhooks")
-            return
-        
-        acoes = resultado.get("acoes_executadas", [])
-        
-        webhooks = {
-            "card_criado": "confirmacao-consulta",
-            "agendamento_criado": "confirmacao-consulta",
-            "paciente_criado": "boas-vindas"
-        }
-        
-        for acao in acoes:
-            acao_tipo = acao if isinstance(acao, str) else acao.get("tipo", "")
-            if acao_tipo in webhooks:
-                await self._chamar_kestra(
-                    workflow=webhooks[acao_tipo],
-                    dados={
-                        "clinica_id": clinica_id,
-                        "paciente_id": resultado.get("paciente_id"),
-                        "card_id": resultado.get("card_id"),
-                        "agendamento_id": resultado.get("agendamento_id"),
-                        "telefone": resultado.get("telefone"),
-                        "timestamp": datetime.now().isoformat()
-                    }
-                )
+    # Ação do turno → workflow do Kestra
+    WEBHOOKS_KESTRA = {
+        "card_criado": "confirmacao-consulta",
+        "agendamento_criado": "confirmacao-consulta",
+        "paciente_criado": "boas-vindas"
+    }
     
-    async def _chamar_kestra(self, workflow: str, dados: dict):
-        """Faz chamada HTTP para webhook do Kestra"""
+    async def _registrar_efeitos(
+        self,
+        resultado: dict,
+        clinica_id: str,
+        conversa_id: str,
+        telefone: str = None,
+        mensagem: str = ""
+    ):
+        """
+        Grava na outbox (um insert) os webhooks do Kestra e o trigger de governança do turno.
         
-        url = f"{self.kestra_url}/api/v1/executions/webhook/clinica/{workflow}"
+        Nada é chamado aqui: o dispatcher da outbox entrega em lote, com
+        retentativa, sem atrasar a resposta ao paciente.
+        """
+        acoes = [a if isinstance(a, str) else a.get("tipo", "") for a in resultado.get("acoes_executadas", [])]
+        agendamento_id = resultado.get("agendamento_id")
+        paciente_id = resultado.get("paciente_id")
+        dados = {
+            "clinica_id": clinica_id,
+            "paciente_id": paciente_id,
+            "card_id": resultado.get("card_id"),
+            "agendamento_id": agendamento_id,
+            "telefone": telefone,
+            "timestamp": datetime.now().isoformat()
+        }
         
-        headers = {"Content-Type": "application/json"}
-        if self.kestra_token:
-            headers["Authorization"] = f"Bearer {self.kestra_token}"
+        eventos = []
+        for workflow in dict.fromkeys(self.WEBHOOKS_KESTRA[a] for a in acoes if a in self.WEBHOOKS_KESTRA):
+            referencia = agendamento_id or paciente_id or conversa_id
+            eventos.append(Evento(
+                "kestra", workflow, dados,
+                clinica_id=clinica_id,
+                chave_dedupe=f"chat:{workflow}:{referencia}",
+                chave_ordem=f"agendamento:{agendamento_id}" if agendamento_id else f"conversa:{conversa_id}"
+            ))
+        
+        # Turno que alterou dados vai para a governança conferir a interpretação
+        alteracoes = [a for a in acoes if a in FERRAMENTAS_ALTERAM_CONTEXTO]
+        if alteracoes:
+            eventos.append(Evento(
+                "governanca", "mensagem_whatsapp",
+                {
+                    "clinica_id": clinica_id,
+                    "telefone": telefone,
+                    "mensagem": mensagem,
+                    "interpretacao": {
+                        "intencao": resultado.get("intencao"),
+                        "estado": resultado.get("estado"),
+                        "resposta": resultado.get("resposta", "")[:500]
+                    },
+                    "acao_tomada": {**dados, "ferramentas": alteracoes}
+                },
+                clinica_id=clinica_id,
+                chave_ordem=f"conversa:{conversa_id}"
+            ))
         
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    url,
-                    json=dados,
-                    headers=headers,
-                    timeout=5.0
-                )
-                print(f"[INFO] Kestra webhook {workflow}: {response.status_code}")
-        except httpx.TimeoutException:
-            print(f"[WARN] Timeout ao chamar Kestra: {workflow}")
-        except Exception as e:
-            print(f"[ERROR] Erro ao chamar Kestra: {e}")
+        if eventos:
+            await self.outbox.registrar_lote(eventos)
     
     # ========================================
     # UTILITÁRIOS
@@ -382,19 +580,90 @@ def criar_chat_service(
 ) -> ChatService:
     """Cria instância do ChatService com configurações."""
     
-    kestra_url = None
-    kestra_token = None
     pg_connection = None
     
     if settings:
-        kestra_url = getattr(settings, 'kestra_url', None) or getattr(settings, 'KESTRA_URL', None)
-        kestra_token = getattr(settings, 'kestra_token', None) or getattr(settings, 'KESTRA_TOKEN', None)
+        rastreamento.configurar(getattr(settings, 'chat_rastreamento_exportadores', ''))
         pg_connection = getattr(settings, 'supabase_db_url', None) or getattr(settings, 'SUPABASE_DB_URL', None)
     
     return ChatService(
         db=db,
         llm_client=llm_client,
-        kestra_url=kestra_url,
-        kestra_token=kestra_token,
-        pg_connection_string=pg_connection
+        pg_connection_string=pg_connection,
+        debounce_ms=getattr(settings, 'chat_debounce_ms', 1200),
+        debounce_max_ms=getattr(settings, 'chat_debounce_max_ms', 4000),
+        checkpoints_por_thread=getattr(settings, 'chat_checkpoints_por_thread', 3),
+        checkpoint_ttl_dias=getattr(settings, 'chat_checkpoint_ttl_dias', 30)
     )
+
+
+# ============================================
+# INSTÂNCIA DA APLICAÇÃO
+# ============================================
+# O ChatService (grafo compilado + checkpointer + pool) é criado uma
+# única vez no startup e compartilhado entre requests. Recriá-lo por
+# request recompilava o StateGraph, perdia o MemorySaver e abria um
+# AsyncConnectionPool novo que nunca era fechado.
+
+_chat_service: Optional[ChatService] = None
+
+
+async def iniciar_chat_service(db, llm_client, settings = None) -> ChatService:
+    """Cria e inicia o ChatService da aplicação (chamado no lifespan)."""
+    global _chat_service
+    
+    if _chat_service is None:
+        service = criar_chat_service(db, llm_client, settings)
+        await service.iniciar()
+        _chat_service = service
+    
+    return _chat_service
+
+
+def get_chat_service_atual() -> Optional[ChatService]:
+    """Retorna o ChatService da aplicação (None se não iniciado)."""
+    return _chat_service
+
+
+async def encerrar_chat_service():
+    """Encerra o ChatService da aplicação (chamado no shutdown)."""
+    global _chat_service
+    
+    service, _chat_service = _chat_service, None
+    if service:
+        await service.encerrar()
+
+
+# ============================================
+# BENCHMARK
+# ============================================
+
+def _benchmark(iteracoes: int = 200) -> dict:
+    """
+    Mede o overhead por mensagem de montar o ChatService a cada request
+    (compilação do grafo + checkpointer) vs reutilizar a instância.
+    
+    Uso:
+        python -m app.chat_langgraph.service
+    """
+    import time
+    
+    inicio = time.perf_counter()
+    for _ in range(iteracoes):
+        ChatService(db=None, llm_client=None)
+    por_request_ms = (time.perf_counter() - inicio) * 1000 / iteracoes
+    
+    service = ChatService(db=None, llm_client=None)
+    inicio = time.perf_counter()
+    for _ in range(iteracoes):
+        service.graph.graph
+    compartilhado_ms = (time.perf_counter() - inicio) * 1000 / iteracoes
+    
+    return {
+        "por_request_ms": round(por_request_ms, 3),
+        "compartilhado_ms": round(compartilhado_ms, 5),
+    }
+
+
+if __name__ == "__main__":
+    print(_benchmark())
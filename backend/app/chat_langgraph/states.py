@@ -7,13 +7,50 @@ O estado guarda:
 - Dados do cliente (se existe)
 - Dados da consulta (se tem)
 - Rascunho do cadastro (formulário em memória)
-- Mensagens
+- Mensagens (anel com os turnos recentes; o histórico completo fica
+  na tabela `mensagens`)
 - Resposta
+
+O estado é gravado pelo checkpointer a cada nó, então só guarda o que é
+pequeno e necessário entre turnos.
 """
 
+import time
+import uuid
 from typing import TypedDict, Optional, List, Dict, Any, Annotated
 from datetime import datetime
-import operator
+
+
+# Turnos (mensagens do paciente + respostas) mantidos no estado
+MAX_TURNOS_ESTADO = 12
+
+# Tempo que os dados do cliente carregados ficam válidos na conversa
+CONTEXTO_CLIENTE_TTL = 300  # segundos
+
+
+def acumular_turnos(atual: Optional[List[Dict]], novos: Optional[List[Dict]]) -> List[Dict]:
+    """
+    Reducer de `mensagens`: junta por id e mantém só os últimos MAX_TURNOS_ESTADO.
+
+    Os nós devolvem o estado inteiro ({**state, ...}); com operator.add a
+    lista era duplicada a cada nó. Aqui uma entrada já presente não é
+    adicionada de novo.
+    """
+    por_chave: Dict[Any, Dict] = {}
+    for m in (atual or []) + (novos or []):
+        chave = m.get("id") or (m.get("role"), m.get("content"), m.get("timestamp"))
+        por_chave[chave] = m
+    return list(por_chave.values())[-MAX_TURNOS_ESTADO:]
+
+
+def nova_mensagem(role: str, content: str) -> Dict:
+    """Entrada do anel de turnos."""
+    return {
+        "id": uuid.uuid4().hex,
+        "role": role,
+        "content": content,
+        "timestamp": datetime.now().isoformat()
+    }
 
 
 # ============================================================================
@@ -75,24 +112,39 @@ class ConversaState(TypedDict, total=False):
     
     # Card
     card_id: Optional[str]
+    card_atual: Optional[Dict]
+    
+    # Contexto pré-carregado (carregar_contexto / verificar_cliente)
+    cliente_verificado: bool
+    contexto_atualizado_em: Optional[float]  # None = recarregar no próximo turno
+    medico_padrao: Optional[Dict]
     
     # Rascunho do cadastro (formulário em memória)
     rascunho_cadastro: RascunhoCadastro
     
     # Mensagens
     mensagem_atual: str
-    mensagens: Annotated[List[Dict], operator.add]
-    historico_mensagens: List[Dict]
+    mensagens: Annotated[List[Dict], acumular_turnos]
+    historico_mensagens: List[Dict]  # recarregado do banco a cada turno (não persiste)
     
     # Resposta
     resposta: str
-    acoes_executadas: List[Dict]
+    acoes_executadas: List[Dict]  # resultados completos só durante o turno
+    metricas_turno: Dict
     
     # Controle
     erro: Optional[str]
     updated_at: str
 
 
+def contexto_cliente_valido(state: Dict) -> bool:
+    """Contexto do cliente já carregado nesta conversa e ainda fresco."""
+    carregado_em = state.get("contexto_atualizado_em")
+    if not state.get("cliente_verificado") or not carregado_em:
+        return False
+    return time.time() - carregado_em < CONTEXTO_CLIENTE_TTL
+
+
 # ============================================================================
 # FACTORY
 # ============================================================================
@@ -117,6 +169,12 @@ def criar_estado_inicial(clinica_id: str, telefone: str, conversa_id: str = None
         
         # Card
         card_id=None,
+        card_atual=None,
+        
+        # Contexto
+        cliente_verificado=False,
+        contexto_atualizado_em=None,
+        medico_padrao=None,
         
         # Rascunho
         rascunho_cadastro={},
@@ -129,6 +187,7 @@ def criar_estado_inicial(clinica_id: str, telefone: str, conversa_id: str = None
         # Resposta
         resposta="",
         acoes_executadas=[],
+        metricas_turno={},
         
         # Controle
         erro=None,
@@ -17,10 +17,21 @@ AUXILIARES:
 
 import re
 import uuid
+import asyncio
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
 from dataclasses import dataclass
 
+import structlog
+
+from app.core.database import rpc_inexistente
+from app.pacientes.eventos import notificar_telefones
+
+from . import cache_respostas
+from .states import contexto_cliente_valido
+
+logger = structlog.get_logger()
+
 
 # ============================================================================
 # RESULTADO PADRÃO
@@ -55,29 +66,25 @@ async def verificar_cliente(db, clinica_id: str, telefone: str) -> dict:
     - Se tem consulta agendada (e qual)
     - Se tem card ativo (e em qual coluna)
     - Se convênio está válido
+    - Médico padrão da clínica (usado por agendar_consulta)
     """
     resultado = {
         "existe": False,
         "cliente": None,
         "consulta_agendada": None,
         "card": None,
-        "convenio_valido": None
+        "convenio_valido": None,
+        "medico_padrao": None
     }
     
     try:
-        # Busca cliente pelo celular
-        cliente = await db.select_one(
-            table="pacientes",
-            filters={"clinica_id": clinica_id, "celular": telefone}
-        )
+        contexto = await contexto_paciente(db, clinica_id, telefone)
         
-        # Se não achou por celular, tenta por whatsapp
-        if not cliente:
-            cliente = await db.select_one(
-                table="pacientes",
-                filters={"clinica_id": clinica_id, "whatsapp": telefone}
-            )
+        medico = contexto.get("medico_padrao")
+        if medico:
+            resultado["medico_padrao"] = {"id": medico["id"], "nome": medico.get("nome")}
         
+        cliente = contexto.get("paciente")
         if not cliente:
             return resultado
         
@@ -98,25 +105,13 @@ async def verificar_cliente(db, clinica_id: str, telefone: str) -> dict:
             ])
         }
         
-        # Busca card ativo do cliente
-        cards = await db.select(
-            table="cards",
-            filters={
-                "clinica_id": clinica_id,
-                "paciente_id": cliente["id"],
-                "status": "ativo"
-            },
-            order_by="created_at",
-            order_asc=False,
-            limit=1
-        )
-        
-        if cards:
-            card = cards[0]
+        card = contexto.get("card")
+        if card:
             resultado["card"] = {
                 "id": card["id"],
                 "fase": card.get("fase"),
                 "coluna": card.get("coluna"),
+                "agendamento_id": card.get("agendamento_id"),
                 "intencao_inicial": card.get("intencao_inicial"),
                 "ultima_interacao": str(card.get("ultima_interacao")) if card.get("ultima_interacao") else None,
                 "tentativa_reativacao": card.get("tentativa_reativacao", 0),
@@ -124,39 +119,8 @@ async def verificar_cliente(db, clinica_id: str, telefone: str) -> dict:
                 "convenio_status": card.get("convenio_status"),
             }
         
-        # Busca consulta agendada (se tiver)
-        agendamentos = await db.select(
-            table="agendamentos",
-            filters={
-                "clinica_id": clinica_id,
-                "paciente_id": cliente["id"],
-                "status": "agendado"
-            },
-            order_by="data",
-            limit=1
-        )
-        
-        if agendamentos:
-            ag = agendamentos[0]
-            data_str = str(ag["data"]) if ag.get("data") else None
-            if data_str:
-                try:
-                    data_obj = datetime.strptime(data_str[:10], "%Y-%m-%d")
-                    dia_semana = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"][data_obj.weekday()]
-                    hora = ag.get("hora") or ag.get("hora_inicio")
-                    hora_str = str(hora)[:5] if hora else ""
-                    
-                    resultado["consulta_agendada"] = {
-                        "id": ag["id"],
-                        "data": data_str[:10],
-                        "hora": hora_str,
-                        "data_formatada": f"{dia_semana}, {data_obj.strftime('%d/%m')} às {hora_str}",
-                        "medico": ag.get("medico_nome", "Dr. Carlos"),
-                        "tipo": "Retorno" if not ag.get("primeira_vez", True) else "Primeira vez",
-                        "confirmada": ag.get("confirmado", False)
-                    }
-                except:
-                    pass
+        if contexto.get("agendamento"):
+            resultado["consulta_agendada"] = _formatar_consulta(contexto["agendamento"])
         
         # Valida convênio (simplificado)
         convenio = cliente.get("convenio_nome")
@@ -171,6 +135,114 @@ async def verificar_cliente(db, clinica_id: str, telefone: str) -> dict:
         return {"erro": str(e)}
 
 
+async def contexto_paciente(db, clinica_id: str, telefone: str) -> dict:
+    """
+    Paciente, card ativo, próximo agendamento e médico padrão (dados brutos).
+    
+    Usa a RPC contexto_paciente (uma ida ao banco); se ela não existir
+    (migração não aplicada), cai para as consultas em sequência. Outros
+    erros da RPC sobem para o chamador. No fallback o médico padrão
+    não é buscado: agendar_consulta busca quando precisar.
+    """
+    try:
+        contexto = await db.rpc(
+            "contexto_paciente",
+            {"p_clinica_id": clinica_id, "p_telefone": telefone}
+        )
+        if isinstance(contexto, list):
+            contexto = contexto[0] if contexto else None
+        if isinstance(contexto, dict):
+            return contexto
+    except Exception as e:
+        if not rpc_inexistente(e):
+            raise
+        logger.warning("RPC contexto_paciente inexistente, usando fallback", error=str(e))
+    
+    contexto = {"paciente": None, "card": None, "agendamento": None, "medico_padrao": None}
+    
+    # Busca cliente pelo celular
+    cliente = await db.select_one(
+        table="pacientes",
+        filters={"clinica_id": clinica_id, "celular": telefone}
+    )
+    
+    # Se não achou por celular, tenta por whatsapp
+    if not cliente:
+        cliente = await db.select_one(
+            table="pacientes",
+            filters={"clinica_id": clinica_id, "whatsapp": telefone}
+        )
+    
+    if not cliente:
+        return contexto
+    contexto["paciente"] = cliente
+    
+    cards, agendamentos = await asyncio.gather(
+        db.select(
+            table="cards",
+            filters={"clinica_id": clinica_id, "paciente_id": cliente["id"], "status": "ativo"},
+            order_by="created_at",
+            order_asc=False,
+            limit=1
+        ),
+        db.select(
+            table="agendamentos",
+            filters={"clinica_id": clinica_id, "paciente_id": cliente["id"], "status": "agendado"},
+            order_by="data",
+            limit=1
+        )
+    )
+    contexto["card"] = cards[0] if cards else None
+    contexto["agendamento"] = agendamentos[0] if agendamentos else None
+    return contexto
+
+
+async def _buscar_medico_padrao(db, clinica_id: str) -> Optional[dict]:
+    """Primeiro médico ativo da clínica (ou usuário ativo com CRM)."""
+    medicos = await db.select(
+        table="usuarios",
+        filters={"clinica_id": clinica_id, "tipo": "medico", "ativo": True},
+        limit=1
+    )
+    
+    if not medicos:
+        todos_usuarios = await db.select(
+            table="usuarios",
+            filters={"clinica_id": clinica_id, "ativo": True},
+            limit=10
+        )
+        medicos = [u for u in todos_usuarios if u.get("crm")]
+    
+    if not medicos:
+        return None
+    return {"id": medicos[0]["id"], "nome": medicos[0].get("nome")}
+
+
+def _formatar_consulta(ag: dict) -> Optional[dict]:
+    """Agendamento no formato apresentado ao agente."""
+    data_str = str(ag["data"])[:10] if ag.get("data") else None
+    if not data_str:
+        return None
+    try:
+        data_obj = datetime.strptime(data_str, "%Y-%m-%d")
+    except ValueError:
+        return None
+    
+    dia_semana = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"][data_obj.weekday()]
+    hora = ag.get("hora") or ag.get("hora_inicio")
+    hora_str = str(hora)[:5] if hora else ""
+    
+    return {
+        "id": ag["id"],
+        "data": data_str,
+        "hora": hora_str or None,
+        "data_formatada": f"{dia_semana}, {data_obj.strftime('%d/%m')} às {hora_str}",
+        "medico": ag.get("medico_nome", "Dr. Carlos"),
+        "tipo": "Retorno" if not ag.get("primeira_vez", True) else "Primeira consulta",
+        "confirmada": ag.get("confirmado", False)
+    }
+
+
 # ============================================================================
 # TOOL 2: CADASTRAR CLIENTE
 # ============================================================================
@@ -249,6 +321,9 @@ async def cadastrar_cliente(
             })
             await db.insert("pacientes", dados_paciente)
         
+        # Webhook do WhatsApp passa a achar o paciente por celular/whatsapp
+        notificar_telefones(clinica_id, telefone)
+        
         # Verifica se já tem card ativo
         cards_existentes = await db.select(
             table="cards",
@@ -429,7 +504,9 @@ async def agendar_consulta(
     clinica_id: str,
     cliente_id: str,
     data: str,
-    hora: str
+    hora: str,
+    card_id: Optional[str] = None,
+    medico: Optional[dict] = None
 ) -> dict:
     """
     Cria o agendamento da consulta.
@@ -438,39 +515,31 @@ async def agendar_consulta(
     Pré-requisitos:
     - Cliente cadastrado (com ID)
     - Data e hora escolhidos
+    
+    card_id e medico vêm do contexto do paciente no state; só são
+    buscados no banco quando não estão lá.
     """
     try:
         # Busca o card do cliente
-        cards = await db.select(
-            table="cards",
-            filters={"clinica_id": clinica_id, "paciente_id": cliente_id, "status": "ativo"},
-            order_by="created_at",
-            order_asc=False,
-            limit=1
-        )
-        card_id = cards[0]["id"] if cards else None
+        if not card_id:
+            cards = await db.select(
+                table="cards",
+                filters={"clinica_id": clinica_id, "paciente_id": cliente_id, "status": "ativo"},
+                order_by="created_at",
+                order_asc=False,
+                limit=1
+            )
+            card_id = cards[0]["id"] if cards else None
         
         # Busca médico da clínica
-        medicos = await db.select(
-            table="usuarios",
-            filters={"clinica_id": clinica_id, "tipo": "medico", "ativo": True},
-            limit=1
-        )
-        
-        if not medicos:
-            todos_usuarios = await db.select(
-                table="usuarios",
-                filters={"clinica_id": clinica_id, "ativo": True},
-                limit=10
-            )
-            medicos = [u for u in todos_usuarios if u.get("crm")]
+        if not medico:
+            medico = await _buscar_medico_padrao(db, clinica_id)
         
-        if not medicos:
+        if not medico:
             return {"erro": "Nenhum médico cadastrado na clínica. Configure um médico primeiro."}
         
-        medico = medicos[0]
         medico_id = medico["id"]
-        medico_nome = medico.get("nome", "Dr.")
+        medico_nome = medico.get("nome") or "Dr."
         
         # Calcula hora fim (30 min)
         hora_inicio = datetime.strptime(hora, "%H:%M")
@@ -555,27 +624,11 @@ async def ver_consulta(db, clinica_id: str, cliente_id: str) -> dict:
             limit=1
         )
         
-        if not agendamentos:
+        consulta = _formatar_consulta(agendamentos[0]) if agendamentos else None
+        if not consulta:
             return {"tem_consulta": False}
         
-        ag = agendamentos[0]
-        data_str = str(ag["data"])[:10]
-        data_obj = datetime.strptime(data_str, "%Y-%m-%d")
-        dia_semana = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"][data_obj.weekday()]
-        hora = ag.get("hora") or ag.get("hora_inicio")
-        
-        return {
-            "tem_consulta": True,
-            "consulta": {
-                "id": ag["id"],
-                "data": data_str,
-                "hora": str(hora)[:5] if hora else None,
-                "data_formatada": f"{dia_semana}, {data_obj.strftime('%d/%m')} às {str(hora)[:5] if hora else ''}",
-                "medico": ag.get("medico_nome", "Dr. Carlos"),
-                "confirmada": ag.get("confirmado", False),
-                "tipo": "Retorno" if not ag.get("primeira_vez", True) else "Primeira consulta"
-            }
-        }
+        return {"tem_consulta": True, "consulta": consulta}
         
     except Exception as e:
         return {"erro": str(e)}
@@ -592,13 +645,20 @@ async def gerenciar_consulta(
     acao: str,
     nova_data: Optional[str] = None,
     nova_hora: Optional[str] = None,
-    motivo: Optional[str] = None
+    motivo: Optional[str] = None,
+    card_id: Optional[str] = None
 ) -> dict:
     """
     Confirma, cancela ou remarca uma consulta.
     
     acao: "confirmar", "cancelar", "remarcar"
+    
+    card_id: card vinculado ao agendamento, quando já conhecido pelo
+    contexto do paciente (evita buscar o card pelo agendamento).
     """
+    if not agendamento_id:
+        return {"erro": "agendamento_id não informado"}
+    
     try:
         agora = datetime.now()
         
@@ -623,12 +683,9 @@ async def gerenciar_consulta(
             )
             
             # Move card para reativação
-            cards = await db.select(
-                table="cards",
-                filters={"agendamento_id": agendamento_id},
-                limit=1
-            )
-            if cards:
+            if not card_id:
+                card_id = await _buscar_card_do_agendamento(db, agendamento_id)
+            if card_id:
                 await db.update(
                     table="cards",
                     data={
@@ -639,7 +696,7 @@ async def gerenciar_consulta(
                         "ultima_interacao": agora.isoformat(),
                         "updated_at": agora.isoformat()
                     },
-                    filters={"id": cards[0]["id"]}
+                    filters={"id": card_id}
                 )
             
             return {"sucesso": True, "acao": "cancelada", "motivo": motivo}
@@ -661,12 +718,9 @@ async def gerenciar_consulta(
             )
             
             # Atualiza card
-            cards = await db.select(
-                table="cards",
-                filters={"agendamento_id": agendamento_id},
-                limit=1
-            )
-            if cards:
+            if not card_id:
+                card_id = await _buscar_card_do_agendamento(db, agendamento_id)
+            if card_id:
                 await db.update(
                     table="cards",
                     data={
@@ -675,7 +729,7 @@ async def gerenciar_consulta(
                         "ultima_interacao": agora.isoformat(),
                         "updated_at": agora.isoformat()
                     },
-                    filters={"id": cards[0]["id"]}
+                    filters={"id": card_id}
                 )
             
             data_obj = datetime.strptime(nova_data, "%Y-%m-%d")
@@ -694,6 +748,15 @@ async def gerenciar_consulta(
         return {"erro": str(e)}
 
 
+async def _buscar_card_do_agendamento(db, agendamento_id: str) -> Optional[str]:
+    cards = await db.select(
+        table="cards",
+        filters={"agendamento_id": agendamento_id},
+        limit=1
+    )
+    return cards[0]["id"] if cards else None
+
+
 # ============================================================================
 # TOOL 8: VER INFO CLÍNICA
 # ============================================================================
@@ -703,29 +766,14 @@ async def ver_info_clinica(db, clinica_id: str, tipo: str = "tudo") -> dict:
     Retorna informações da clínica: valores, convênios, endereço.
     
     tipo: "valores", "convenios", "endereco", "tudo"
+    
+    Cacheado por clínica (cache_respostas) até a configuração mudar;
+    tipos de consulta e convênios alterados aparecem no fim do TTL.
     """
-    # TODO: Em produção, buscar do banco
-    info = {
-        "valores": {
-            "consulta_particular": "R$ 300,00",
-            "retorno_30_dias": "Gratuito",
-            "formas_pagamento": ["Dinheiro", "PIX", "Cartão crédito (até 3x)", "Cartão débito"]
-        },
-        "convenios": [
-            "Unimed",
-            "Bradesco Saúde",
-            "SulAmérica",
-            "Amil",
-            "Porto Seguro",
-            "NotreDame Intermédica"
-        ],
-        "endereco": {
-            "completo": "Rua das Flores, 123 - Sala 45 - Centro",
-            "referencia": "Próximo ao Metrô República",
-            "estacionamento": "Estacionamento conveniado no prédio"
-        },
-        "horario_funcionamento": "Segunda a Sexta: 8h às 18h | Sábado: 8h às 12h"
-    }
+    info = cache_respostas.obter(clinica_id, "info_clinica", "tudo")
+    if info is None:
+        info = await _carregar_info_clinica(db, clinica_id)
+        cache_respostas.guardar(clinica_id, "info_clinica", "tudo", info)
     
     if tipo == "tudo":
         return info
@@ -735,6 +783,45 @@ async def ver_info_clinica(db, clinica_id: str, tipo: str = "tudo") -> dict:
         return info
 
 
+async def _carregar_info_clinica(db, clinica_id: str) -> dict:
+    """
+    Informações da clínica para o paciente: endereço e contato (clinicas),
+    valores particulares (tipos_consulta) e convênios aceitos (convenios).
+    """
+    clinica, tipos, convenios = await asyncio.gather(
+        db.select_one(table="clinicas", filters={"id": clinica_id}),
+        db.select(table="tipos_consulta", filters={"clinica_id": clinica_id, "ativo": True}, order_by="nome"),
+        db.select(table="convenios", filters={"clinica_id": clinica_id, "ativo": True}, order_by="nome"),
+    )
+    clinica = clinica or {}
+    
+    logradouro = ", ".join(str(clinica[c]) for c in ("logradouro", "numero") if clinica.get(c))
+    partes = [p for p in (logradouro, clinica.get("complemento"), clinica.get("bairro")) if p]
+    cidade = " - ".join(str(clinica[c]) for c in ("cidade", "estado") if clinica.get(c))
+    if cidade:
+        partes.append(cidade)
+    
+    return {
+        "valores": {
+            t["nome"]: _formatar_valor(t["valor_particular"])
+            for t in tipos
+            if t.get("valor_particular") is not None
+        },
+        "convenios": [c["nome"] for c in convenios],
+        "endereco": {
+            "completo": " - ".join(partes),
+            "cep": clinica.get("cep"),
+            "telefone": clinica.get("telefone"),
+        },
+    }
+
+
+def _formatar_valor(valor) -> str:
+    """Decimal/float → "R$ 1.234,56"."""
+    texto = f"{float(valor):,.2f}"
+    return "R$ " + texto.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
 # ============================================================================
 # TOOL 9: ATUALIZAR RASCUNHO (Formulário em memória)
 # ============================================================================
@@ -1067,6 +1154,35 @@ Quando completo, use cadastrar_cliente.""",
 ]
 
 
+# ============================================================================
+# CLASSIFICAÇÃO
+# ============================================================================
+
+# Só leem dados: podem rodar em paralelo no mesmo lote de tool_calls.
+# As demais alteram banco ou rascunho e rodam em ordem.
+FERRAMENTAS_SOMENTE_LEITURA = frozenset({
+    "verificar_cliente",
+    "ver_horarios",
+    "ver_consulta",
+    "ver_info_clinica",
+})
+
+# Alteram paciente, card ou agendamento: depois delas o contexto do
+# paciente no state fica marcado para recarregar no próximo turno.
+FERRAMENTAS_ALTERAM_CONTEXTO = frozenset({
+    "cadastrar_cliente",
+    "atualizar_card",
+    "agendar_consulta",
+    "gerenciar_consulta",
+})
+
+# Dependem só da clínica (invalidadas via app/clinicas/eventos.py): a
+# resposta final que só usou estas pode ir para o cache de respostas.
+FERRAMENTAS_DA_CLINICA = frozenset({
+    "ver_info_clinica",
+})
+
+
 # ============================================================================
 # EXECUTOR
 # ============================================================================
@@ -1110,21 +1226,32 @@ async def executar_ferramenta(nome: str, args: dict, db, state: dict) -> dict:
     elif nome == "agendar_consulta":
         if not cliente_id:
             return {"erro": "Cliente não identificado. Use verificar_cliente primeiro."}
-        return await agendar_consulta(db, clinica_id, cliente_id, args.get("data"), args.get("hora"))
+        return await agendar_consulta(
+            db, clinica_id, cliente_id, args.get("data"), args.get("hora"),
+            card_id=state.get("card_id"),
+            medico=state.get("medico_padrao")
+        )
     
     elif nome == "ver_consulta":
         if not cliente_id:
             return {"erro": "Cliente não identificado."}
+        # Contexto do paciente fresco no state: responde sem ir ao banco
+        if contexto_cliente_valido(state):
+            consulta = state.get("consulta_agendada")
+            return {"tem_consulta": True, "consulta": consulta} if consulta else {"tem_consulta": False}
         return await ver_consulta(db, clinica_id, cliente_id)
     
     elif nome == "gerenciar_consulta":
+        agendamento_id = args.get("agendamento_id") or (state.get("consulta_agendada") or {}).get("id")
+        card = state.get("card_atual") or {}
         return await gerenciar_consulta(
             db, clinica_id,
-            agendamento_id=args.get("agendamento_id"),
+            agendamento_id=agendamento_id,
             acao=args.get("acao"),
             nova_data=args.get("nova_data"),
             nova_hora=args.get("nova_hora"),
-            motivo=args.get("motivo")
+            motivo=args.get("motivo"),
+            card_id=card.get("id") if agendamento_id and card.get("agendamento_id") == agendamento_id else None
         )
     
     elif nome == "ver_info_clinica":
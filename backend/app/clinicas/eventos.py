@@ -0,0 +1,32 @@
+"""
+Clinicas - Eventos
+Aviso de alteração da clínica para quem guarda dados derivados dela.
+
+O módulo de clínicas não conhece os consumidores: cada um assina aqui
+(ex.: cache de respostas do chat, app/chat_langgraph/cache_respostas.py).
+"""
+from __future__ import annotations
+
+from typing import Callable
+
+import structlog
+
+logger = structlog.get_logger()
+
+_assinantes: list[Callable[[str], None]] = []
+
+
+def ao_alterar_clinica(callback: Callable[[str], None]) -> Callable[[str], None]:
+    """Registra callback chamado com o clinica_id após alteração de dados/configuração."""
+    if callback not in _assinantes:
+        _assinantes.append(callback)
+    return callback
+
+
+def notificar_alteracao(clinica_id: str) -> None:
+    """Avisa os assinantes; falha de um não impede os demais nem a alteração."""
+    for callback in _assinantes:
+        try:
+            callback(clinica_id)
+        except Exception as e:
+            logger.warning("Falha ao notificar alteração da clínica", callback=getattr(callback, "__name__", "?"), error=str(e))
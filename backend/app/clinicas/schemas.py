@@ -57,6 +57,7 @@ class ClinicaUpdate(BaseModel):
     estado: Optional[str] = None
     cep: Optional[str] = None
     logo_url: Optional[str] = None
+    whatsapp_instancia: Optional[str] = Field(default=None, max_length=100)
 
 
 class ClinicaResponse(BaseSchema):
@@ -76,6 +77,7 @@ class ClinicaResponse(BaseSchema):
     cep: Optional[str]
     fuso_horario: str
     logo_url: Optional[str]
+    whatsapp_instancia: Optional[str] = None
     ativo: bool
     created_at: datetime
     updated_at: datetime
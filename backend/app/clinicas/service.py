@@ -27,6 +27,7 @@ from app.clinicas.schemas import (
     PerfilResponse,
     PerfilUpdate,
 )
+from app.clinicas.eventos import notificar_alteracao
 
 logger = structlog.get_logger()
 
@@ -68,6 +69,7 @@ class ClinicaService:
                 data=update_data,
                 filters={"id": current_user.clinica_id}
             )
+            notificar_alteracao(current_user.clinica_id)
 
         return await self.get(current_user)
 
@@ -132,6 +134,7 @@ class ClinicaService:
                 data={"clinica_id": current_user.clinica_id, **data}
             )
 
+        notificar_alteracao(current_user.clinica_id)
         return await self.get_configuracoes(current_user)
 
 
@@ -56,17 +56,70 @@ class Settings(BaseSettings):
     openrouter_api_key: str = ""
     openrouter_model: str = "anthropic/claude-sonnet-4.5"
 
+    # Roteamento entre provedores LLM (failover / hedge / circuit breaker)
+    llm_providers_fallback: str = ""  # ex: "groq,deepseek" (vazio = só llm_provider)
+    llm_hedge_habilitado: bool = False
+    llm_hedge_min_ms: int = 1500
+    llm_circuito_falhas: int = 3
+    llm_circuito_espera_s: int = 30
+
+    # Chat: rajadas de mensagens do mesmo paciente viram um único turno
+    chat_debounce_ms: int = 1200
+    chat_debounce_max_ms: int = 4000
+
+    # Chat: retenção dos checkpoints do LangGraph
+    chat_checkpoints_por_thread: int = 3
+    chat_checkpoint_ttl_dias: int = 30
+
+    # Chat: exportadores dos spans por turno (vazio = só o resumo de debug)
+    # ex: "arquivo:/var/log/clinicos/traces.jsonl,otlp:http://otel-collector:4318"
+    chat_rastreamento_exportadores: str = ""
+
+    # Orçamento de tokens do agente (por chamada ao LLM)
+    llm_orcamento_prompt_tokens: int = 4000
+    llm_orcamento_resultado_tokens: int = 600
+
     # Clinica padrão para desenvolvimento (sem auth)
     default_clinica_id: Optional[str] = None
 
+    # HTTP (clientes externos compartilhados)
+    http2_habilitado: bool = True
+
     # Webhook
     webhook_secret: Optional[str] = None
 
+    # Bearer dos endpoints internos (workflows do Kestra); sem valor, ficam fechados
+    api_internal_token: Optional[str] = None
+
     # WhatsApp / Evolution API
     evolution_api_url: Optional[str] = None
     evolution_api_key: Optional[str] = None
     evolution_instance: Optional[str] = None
 
+    # Webhook WhatsApp: pool que processa os eventos enfileirados
+    whatsapp_webhook_workers: int = 16
+    whatsapp_webhook_capacidade: int = 5000
+
+    # Envios WhatsApp em lote (app/integracoes/whatsapp/dispatcher.py), por instância
+    whatsapp_envios_por_s: float = 5.0
+    whatsapp_envios_rajada: int = 10
+    whatsapp_envios_concorrencia: int = 4
+
+    # Mídias recebidas no WhatsApp, copiadas para o Storage (app/webhooks/midia.py)
+    whatsapp_midia_max_mb: int = 32
+    whatsapp_midia_workers: int = 4
+    whatsapp_midia_capacidade: int = 500
+
+    # Governança: intervalo do refresh de mv_governanca_resumo_diario
+    governanca_refresh_resumo_s: int = 900
+
+    # Outbox: dias que eventos enviados/desistidos ficam em outbox_eventos
+    outbox_retencao_dias: int = 7
+
+    # Kestra (webhooks entregues pela outbox - app/core/outbox.py)
+    kestra_url: Optional[str] = None
+    kestra_token: Optional[str] = None
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -28,6 +28,7 @@ Exemplo de uso correto:
 
 Veja SECURITY.md para documentação completa.
 """
+import asyncio
 from typing import Any, Optional
 
 from supabase import create_client, Client
@@ -97,6 +98,15 @@ class SupabaseClient:
     def __init__(self, client: Client):
         self._client = client
     
+    async def _execute(self, query):
+        """
+        Executa a query fora do event loop.
+        
+        O cliente supabase-py é síncrono: executar direto bloquearia o
+        loop e serializaria chamadas feitas com asyncio.gather.
+        """
+        return await asyncio.to_thread(query.execute)
+    
     # ==========================================
     # SELECT
     # ==========================================
@@ -123,6 +133,7 @@ class SupabaseClient:
         - {"campo__neq": valor} -> neq (diferente)
         - {"campo__in": [valores]} -> in_ (está na lista)
         - {"campo__ilike": valor} -> ilike (like case-insensitive)
+        - {"campo__is": None} -> is (IS NULL)
         """
         query = self._client.table(table).select(columns)
         
@@ -138,7 +149,7 @@ class SupabaseClient:
         if offset:
             query = query.offset(offset)
         
-        result = query.execute()
+        result = await self._execute(query)
         return result.data or []
     
     def _apply_filters(self, query, filters: dict):
@@ -160,6 +171,8 @@ class SupabaseClient:
                     query = query.in_(field, value)
                 elif op == "ilike":
                     query = query.ilike(field, f"%{value}%")
+                elif op == "is":
+                    query = query.is_(field, "null" if value is None else value)
                 else:
                     # Operador desconhecido, trata como campo normal
                     query = query.eq(key, value)
@@ -180,7 +193,7 @@ class SupabaseClient:
             query = self._apply_filters(query, filters)
         
         query = query.limit(1)
-        result = query.execute()
+        result = await self._execute(query)
         
         if result.data and len(result.data) > 0:
             return result.data[0]
@@ -196,7 +209,7 @@ class SupabaseClient:
         data: dict
     ) -> dict:
         """Insere registro na tabela."""
-        result = self._client.table(table).insert(data).execute()
+        result = await self._execute(self._client.table(table).insert(data))
         if result.data and len(result.data) > 0:
             return result.data[0]
         raise Exception(f"Falha ao inserir em {table}")
@@ -207,7 +220,7 @@ class SupabaseClient:
         data: list[dict]
     ) -> list[dict]:
         """Insere múltiplos registros."""
-        result = self._client.table(table).insert(data).execute()
+        result = await self._execute(self._client.table(table).insert(data))
         return result.data or []
     
     # ==========================================
@@ -220,13 +233,11 @@ class SupabaseClient:
         data: dict,
         filters: dict
     ) -> list[dict]:
-        """Atualiza registros na tabela."""
+        """Atualiza registros na tabela (filtros aceitam os operadores do select)."""
         query = self._client.table(table).update(data)
+        query = self._apply_filters(query, filters)
         
-        for key, value in filters.items():
-            query = query.eq(key, value)
-        
-        result = query.execute()
+        result = await self._execute(query)
         return result.data or []
     
     # ==========================================
@@ -244,7 +255,7 @@ class SupabaseClient:
         for key, value in filters.items():
             query = query.eq(key, value)
         
-        result = query.execute()
+        result = await self._execute(query)
         return result.data or []
     
     # ==========================================
@@ -256,13 +267,14 @@ class SupabaseClient:
         table: str,
         filters: Optional[dict] = None
     ) -> int:
-        """Conta registros na tabela."""
+        """Conta registros na tabela (sem trafegar as linhas)."""
         query = self._client.table(table).select("*", count="exact")
         
         if filters:
             query = self._apply_filters(query, filters)
         
-        result = query.execute()
+        # O total vem no Content-Range, independente do limit
+        result = await self._execute(query.limit(1))
         return result.count or 0
     
     # ==========================================
@@ -323,5 +335,34 @@ class SupabaseClient:
         params: Optional[dict] = None
     ) -> Any:
         """Executa função RPC no Supabase."""
-        result = self._client.rpc(function_name, params or {}).execute()
+        result = await self._execute(self._client.rpc(function_name, params or {}))
         return result.data
+
+
+# Função ausente no banco (migração não aplicada): PostgREST PGRST202 ou Postgres 42883
+CODIGOS_RPC_INEXISTENTE = ("PGRST202", "42883")
+
+
+def rpc_inexistente(erro: Exception) -> bool:
+    """
+    True se a RPC falhou por não existir no banco.
+    Só esse caso justifica cair no fallback; timeout e erros da
+    própria função devem aparecer.
+    """
+    codigo = getattr(erro, "code", None)
+    if codigo in CODIGOS_RPC_INEXISTENTE:
+        return True
+    texto = str(erro)
+    return any(c in texto for c in CODIGOS_RPC_INEXISTENTE) or "Could not find the function" in texto
+
+
+# Violação de índice único (linha já existe): Postgres 23505
+CODIGO_VIOLACAO_UNICA = "23505"
+
+
+def violacao_unica(erro: Exception) -> bool:
+    """True se o insert falhou por chave duplicada (e só nesse caso)."""
+    if getattr(erro, "code", None) == CODIGO_VIOLACAO_UNICA:
+        return True
+    texto = str(erro)
+    return CODIGO_VIOLACAO_UNICA in texto or "duplicate key value" in texto
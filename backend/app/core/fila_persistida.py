@@ -0,0 +1,227 @@
+"""
+Core - Fila Persistida
+Base comum da outbox (app/core/outbox.py) e da fila de envios do WhatsApp
+(app/integracoes/whatsapp/dispatcher.py): itens gravados numa tabela,
+reservados em lote (FOR UPDATE SKIP LOCKED), concluídos em uma ida e
+retentados com backoff exponencial + jitter.
+
+Cada fila tem três RPCs com o mesmo formato, nomeadas pelo sufixo
+(ex.: "eventos_outbox"):
+
+- registrar_<sufixo>(p_<itens>)        → ids inseridos (duplicados ficam de fora)
+- reservar_<sufixo>(p_limite, p_reserva_s, ...) → linhas reservadas
+- concluir_<sufixo>(p_resultados)      → [{id, status, tentou, erro, proximo_envio_em, ...}]
+
+ArmazemMemoria tem a mesma semântica sem banco. O processo só usa a
+memória quando as RPCs não existem (migração não aplicada); erro
+transitório na subida mantém o banco e o loop tenta de novo.
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional
+
+import structlog
+
+from app.core.database import rpc_inexistente
+
+logger = structlog.get_logger()
+
+
+BACKOFF_BASE_S = 2.0
+BACKOFF_MAX_S = 600.0
+MAX_DEDUPE_MEMORIA = 50_000
+
+
+class ErroPermanente(Exception):
+    """Destino recusou o item de forma definitiva (não adianta retentar)."""
+
+
+def calcular_backoff(tentativas: int, base_s: float = BACKOFF_BASE_S, maximo_s: float = BACKOFF_MAX_S) -> float:
+    """Espera antes da próxima tentativa: exponencial, com jitter na metade de cima."""
+    teto = min(maximo_s, base_s * 2 ** max(0, tentativas - 1))
+    return random.uniform(teto / 2, teto)
+
+
+# ==========================================
+# ARMAZENAMENTO
+# ==========================================
+
+class ArmazemBanco:
+    """
+    Fila numa tabela com as RPCs registrar/reservar/concluir_<sufixo>.
+
+    Args:
+        db: SupabaseClient
+        sufixo: nome comum das RPCs (ex.: "envios_whatsapp")
+        parametro_itens: parâmetro da RPC de registro (ex.: "p_envios")
+        de_linha: monta o item a partir da linha reservada
+    """
+
+    modo = "banco"
+
+    def __init__(self, db, sufixo: str, parametro_itens: str, de_linha: Callable[[dict], Any]):
+        self.db = db
+        self.sufixo = sufixo
+        self.parametro_itens = parametro_itens
+        self.de_linha = de_linha
+
+    async def gravar(self, itens: list) -> list[str]:
+        """Insere o lote em uma ida; retorna os ids que entraram (o resto era duplicado)."""
+        inseridos = await self.db.rpc(
+            f"registrar_{self.sufixo}",
+            {self.parametro_itens: [i.to_dict() for i in itens]}
+        )
+        return [str(r["id"]) for r in inseridos or []]
+
+    async def reservar(self, limite: int, reserva_s: int, **filtros) -> list:
+        """Reserva até `limite` itens vencidos; filtros viram parâmetros p_<nome> da RPC."""
+        linhas = await self.db.rpc(
+            f"reservar_{self.sufixo}",
+            {"p_limite": limite, "p_reserva_s": reserva_s, **{f"p_{k}": v for k, v in filtros.items()}}
+        )
+        return sorted((self.de_linha(r) for r in linhas or []), key=lambda i: i.seq)
+
+    async def concluir(self, resultados: list[dict]) -> None:
+        await self.db.rpc(f"concluir_{self.sufixo}", {"p_resultados": resultados})
+
+
+class ArmazemMemoria:
+    """
+    Mesma semântica do ArmazemBanco, sem durabilidade entre reinícios.
+
+    Itens com `chave_ordem` seguram os seguintes da mesma chave enquanto
+    esperam backoff ou estão reservados (mesma regra do NOT EXISTS da RPC).
+    """
+
+    modo = "memoria"
+    status_reservado = "processando"
+
+    def __init__(self, max_dedupe: int = MAX_DEDUPE_MEMORIA):
+        self._itens: "OrderedDict[str, dict]" = OrderedDict()
+        self._dedupe: "OrderedDict[str, None]" = OrderedDict()
+        self._max_dedupe = max_dedupe
+        self._seq = 0
+
+    async def gravar(self, itens: list) -> list[str]:
+        inseridos = []
+        for item in itens:
+            if item.chave_dedupe:
+                if item.chave_dedupe in self._dedupe:
+                    continue
+                self._dedupe[item.chave_dedupe] = None
+                if len(self._dedupe) > self._max_dedupe:
+                    self._dedupe.popitem(last=False)
+            self._seq += 1
+            item.seq = self._seq
+            self._itens[item.id] = {
+                "item": item, "status": "pendente", "proximo_envio_em": 0.0, "reservado_ate": 0.0
+            }
+            inseridos.append(item.id)
+        return inseridos
+
+    def _aceita(self, item, filtros: dict) -> bool:
+        """Filtros do reservar (subclasses); por padrão, todos."""
+        return True
+
+    async def reservar(self, limite: int, reserva_s: int, **filtros) -> list:
+        agora = time.time()
+        bloqueadas: set = set()
+        lote = []
+        for registro in self._itens.values():
+            item = registro["item"]
+            chave_ordem = getattr(item, "chave_ordem", None)
+            if chave_ordem and chave_ordem in bloqueadas:
+                continue
+            disponivel = (
+                (registro["status"] == "pendente" and registro["proximo_envio_em"] <= agora)
+                or (registro["status"] == self.status_reservado and registro["reservado_ate"] < agora)
+            )
+            if not disponivel:
+                if chave_ordem:
+                    bloqueadas.add(chave_ordem)
+                continue
+            if not self._aceita(item, filtros):
+                continue
+            if len(lote) < limite:
+                registro["status"] = self.status_reservado
+                registro["reservado_ate"] = agora + reserva_s
+                lote.append(item)
+        return lote
+
+    def _finalizado(self, item, status: str) -> None:
+        """Item saiu da fila como enviado/falhou (subclasses guardam o que precisarem)."""
+
+    async def concluir(self, resultados: list[dict]) -> None:
+        for r in resultados:
+            registro = self._itens.get(r["id"])
+            if not registro or registro["status"] != self.status_reservado:
+                continue
+            item = registro["item"]
+            if r.get("tentou"):
+                item.tentativas += 1
+            if r["status"] in ("enviado", "falhou"):
+                del self._itens[r["id"]]
+                self._finalizado(item, r["status"])
+                continue
+            registro["status"] = "pendente"
+            if r.get("proximo_envio_em"):
+                registro["proximo_envio_em"] = datetime.fromisoformat(r["proximo_envio_em"]).timestamp()
+
+    def pendentes(self) -> int:
+        return len(self._itens)
+
+
+# ==========================================
+# CICLO DE VIDA
+# ==========================================
+
+async def conferir_armazem(armazem, criar_memoria: Callable[[], Any], descricao: str):
+    """
+    Confere as RPCs do ArmazemBanco antes de subir o loop.
+
+    Só cai para memória se as RPCs não existirem (rpc_inexistente); outro
+    erro (rede, timeout) é logado e o banco é mantido: o loop tenta de
+    novo a cada ciclo e nada aceito vai parar numa fila volátil.
+    """
+    if not isinstance(armazem, ArmazemBanco):
+        return armazem
+    try:
+        await armazem.reservar(0, 1)
+    except Exception as e:
+        if rpc_inexistente(e):
+            logger.warning(f"{descricao}: RPCs inexistentes, usando memória", sufixo=armazem.sufixo, error=str(e))
+            return criar_memoria()
+        logger.error(f"{descricao}: falha ao conferir RPCs, mantendo o banco", sufixo=armazem.sufixo, error=str(e))
+    return armazem
+
+
+async def loop_em_lotes(
+    acordar: asyncio.Event,
+    intervalo_s: float,
+    ciclo: Callable[[], Awaitable[int]],
+    max_lote: int,
+    descricao: str,
+    depois: Optional[Callable[[], Awaitable[Any]]] = None,
+) -> None:
+    """
+    Roda `ciclo` a cada intervalo_s (ou ao ser acordado); lotes cheios
+    seguidos continuam sem esperar. `depois` roda ao fim de cada rodada.
+    """
+    while True:
+        try:
+            await asyncio.wait_for(acordar.wait(), intervalo_s)
+        except asyncio.TimeoutError:
+            pass
+        acordar.clear()
+        try:
+            while await ciclo() >= max_lote:
+                pass
+        except Exception as e:
+            logger.error(f"{descricao}: erro no loop", error=str(e))
+        if depois:
+            await depois()
@@ -0,0 +1,184 @@
+"""
+Core - HTTP
+Clientes HTTP compartilhados para chamadas externas (LLM, WhatsApp, etc).
+
+Cada serviço tem um httpx.AsyncClient de longa duração, com pool de
+conexões próprio (keep-alive, limites e timeouts do serviço). Evita
+pagar handshake TCP/TLS a cada chamada.
+
+Os clientes são criados sob demanda e fechados no shutdown da
+aplicação (fechar_http_clients no lifespan).
+
+Uso:
+    from app.core.http import get_http_client
+
+    client = get_http_client("whatsapp")
+    response = await client.post(url, json=payload)
+"""
+from __future__ import annotations
+
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+import httpx
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger()
+
+try:
+    import h2  # noqa: F401
+    HTTP2_DISPONIVEL = True
+except ImportError:
+    HTTP2_DISPONIVEL = False
+
+
+# ==========================================
+# CONFIGURAÇÃO POR SERVIÇO
+# ==========================================
+
+@dataclass(frozen=True)
+class ConfigServico:
+    """Timeouts e limites do pool de um serviço externo."""
+    timeout: float = 30.0
+    connect_timeout: float = 5.0
+    max_connections: int = 20
+    max_keepalive: int = 10
+    keepalive_expiry: float = 60.0
+    http2: bool = False
+
+
+SERVICOS: dict[str, ConfigServico] = {
+    "llm": ConfigServico(timeout=60.0, max_connections=50, max_keepalive=20, http2=True),
+    "openrouter": ConfigServico(timeout=120.0, max_connections=20, http2=True),
+    "groq": ConfigServico(timeout=300.0, max_connections=10),
+    "whatsapp": ConfigServico(timeout=30.0, max_connections=20),
+    "auth": ConfigServico(timeout=10.0, max_connections=5, max_keepalive=2),
+    "kestra": ConfigServico(timeout=5.0, max_connections=10),
+    "midia": ConfigServico(timeout=60.0, max_connections=10),
+    "storage": ConfigServico(timeout=120.0, max_connections=10),
+    "default": ConfigServico(),
+}
+
+
+# ==========================================
+# MÉTRICAS POR HOST
+# ==========================================
+
+AMOSTRAS_LATENCIA = 500
+
+
+@dataclass
+class MetricasHost:
+    """Latência e erros das chamadas para um host."""
+    requisicoes: int = 0
+    erros: int = 0
+    total_ms: float = 0.0
+    max_ms: float = 0.0
+    amostras: deque = field(default_factory=lambda: deque(maxlen=AMOSTRAS_LATENCIA))
+
+    def registrar(self, duracao_ms: float, erro: bool = False) -> None:
+        self.requisicoes += 1
+        self.total_ms += duracao_ms
+        self.max_ms = max(self.max_ms, duracao_ms)
+        self.amostras.append(duracao_ms)
+        if erro:
+            self.erros += 1
+
+    def percentil(self, p: float) -> float:
+        if not self.amostras:
+            return 0.0
+        ordenadas = sorted(self.amostras)
+        indice = min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))
+        return ordenadas[indice]
+
+    def to_dict(self) -> dict:
+        media = self.total_ms / self.requisicoes if self.requisicoes else 0.0
+        return {
+            "requisicoes": self.requisicoes,
+            "erros": self.erros,
+            "media_ms": round(media, 1),
+            "p50_ms": round(self.percentil(50), 1),
+            "p95_ms": round(self.percentil(95), 1),
+            "max_ms": round(self.max_ms, 1),
+        }
+
+
+_metricas: dict[str, MetricasHost] = {}
+
+
+class _TransporteComMetricas(httpx.AsyncHTTPTransport):
+    """Transport que mede a latência de cada chamada por host."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        inicio = time.perf_counter()
+        erro = True
+        try:
+            response = await super().handle_async_request(request)
+            erro = response.status_code >= 500
+            return response
+        finally:
+            duracao_ms = (time.perf_counter() - inicio) * 1000
+            _metricas.setdefault(host, MetricasHost()).registrar(duracao_ms, erro)
+
+
+def get_metricas_http() -> dict[str, dict]:
+    """Métricas de latência das chamadas externas, por host."""
+    return {host: m.to_dict() for host, m in sorted(_metricas.items())}
+
+
+def resetar_metricas_http() -> None:
+    """Zera as métricas (usado em benchmarks)."""
+    _metricas.clear()
+
+
+# ==========================================
+# REGISTRO DE CLIENTES
+# ==========================================
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def _criar_client(config: ConfigServico) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=config.max_connections,
+        max_keepalive_connections=config.max_keepalive,
+        keepalive_expiry=config.keepalive_expiry,
+    )
+    http2 = config.http2 and settings.http2_habilitado and HTTP2_DISPONIVEL
+    transport = _TransporteComMetricas(limits=limits, http2=http2)
+
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(config.timeout, connect=config.connect_timeout),
+    )
+
+
+def get_http_client(servico: str = "default") -> httpx.AsyncClient:
+    """
+    Retorna o cliente HTTP compartilhado do serviço.
+
+    O cliente NÃO deve ser usado com `async with` (fecharia o pool);
+    o fechamento é feito por fechar_http_clients() no shutdown.
+    """
+    client = _clients.get(servico)
+    if client is None or client.is_closed:
+        config = SERVICOS.get(servico, SERVICOS["default"])
+        client = _criar_client(config)
+        _clients[servico] = client
+    return client
+
+
+async def fechar_http_clients() -> None:
+    """Fecha todos os clientes (shutdown da aplicação)."""
+    clients = list(_clients.items())
+    _clients.clear()
+
+    for servico, client in clients:
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning("Erro ao fechar cliente HTTP", servico=servico, error=str(e))
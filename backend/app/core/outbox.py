@@ -0,0 +1,720 @@
+"""
+Core - Outbox
+Entrega durável de efeitos colaterais (webhooks do Kestra, triggers da
+governança, eventos da agenda).
+
+O caminho da requisição grava o evento na tabela outbox_eventos (um
+insert por chamada; duplicados pela chave_dedupe são descartados pelo
+banco) e acorda o dispatcher. Uma task do processo, a cada INTERVALO_S:
+
+1. Reserva um lote de eventos vencidos (FOR UPDATE SKIP LOCKED)
+2. Entrega o lote: chaves de ordem diferentes em paralelo, eventos da
+   mesma chave em sequência
+3. Conclui o lote em uma ida: enviados saem; falhas voltam com backoff
+   exponencial + jitter até MAX_TENTATIVAS, depois ficam como 'falhou'
+4. De hora em hora, apaga os eventos enviados/desistidos mais antigos que
+   retencao_dias (purgar_eventos_outbox)
+
+Se o insert falhar, o evento fica num buffer do processo (até
+MAX_PENDENTES) e o dispatcher regrava a cada ciclo; com o buffer cheio,
+registrar levanta OutboxIndisponivel em vez de descartar.
+
+Garantias:
+- Pelo menos uma vez: cada entrega leva o id do evento no header
+  Idempotency-Key, para o destino descartar repetições
+- Ordem por chave_ordem: um evento só sai depois dos anteriores da mesma
+  chave; uma falha segura os seguintes até ser entregue (ou desistida)
+
+Armazenamento, reserva e ciclo de vida vêm de app/core/fila_persistida.py
+(mesma base da fila de envios do WhatsApp).
+
+Uso:
+    from app.core.outbox import registrar_evento
+
+    await registrar_evento(
+        "kestra", "confirmacao-consulta", payload,
+        clinica_id=clinica_id,
+        chave_dedupe=f"kestra:confirmacao-consulta:{agendamento_id}",
+        chave_ordem=f"agendamento:{agendamento_id}"
+    )
+
+Demonstração com servidor stub local (entrega, ordem, retentativa, dedupe),
+com dois dispatchers dividindo o mesmo armazenamento:
+    python -m app.core.outbox            # ArmazemMemoria
+    python -m app.core.outbox --banco    # ArmazemBanco: exercita as RPCs da migração 011
+                                         # (reserva SKIP LOCKED, ordem, ON CONFLICT);
+                                         # use um banco de desenvolvimento
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+import structlog
+
+from app.core import fila_persistida
+from app.core.fila_persistida import ErroPermanente, calcular_backoff, conferir_armazem, loop_em_lotes
+
+logger = structlog.get_logger()
+
+
+INTERVALO_S = 0.5
+MAX_LOTE = 50
+CONCORRENCIA = 8
+MAX_TENTATIVAS = 8
+BACKOFF_BASE_S = 2.0
+BACKOFF_MAX_S = 600.0
+TIMEOUT_ENTREGA_S = 10.0
+RESERVA_S = 60
+MAX_PENDENTES = 10_000
+MAX_DEDUPE_RECENTES = 5_000
+RETENCAO_DIAS = 7
+INTERVALO_PURGA_S = 3600.0
+LOTE_PURGA = 5_000
+
+
+class OutboxIndisponivel(Exception):
+    """Banco fora e buffer de regravação cheio: o evento não foi aceito."""
+
+
+# ==========================================
+# EVENTO
+# ==========================================
+
+@dataclass
+class Evento:
+    """Efeito colateral a entregar em um destino."""
+    destino: str
+    tipo: str
+    payload: dict
+    clinica_id: Optional[str] = None
+    chave_dedupe: Optional[str] = None
+    chave_ordem: Optional[str] = None
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    seq: int = 0
+    tentativas: int = 0
+    created_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "clinica_id": self.clinica_id,
+            "destino": self.destino,
+            "tipo": self.tipo,
+            "payload": self.payload,
+            "chave_dedupe": self.chave_dedupe,
+            "chave_ordem": self.chave_ordem,
+            "created_at": self.created_at,
+        }
+
+    @classmethod
+    def from_row(cls, row: dict) -> "Evento":
+        return cls(
+            destino=row["destino"],
+            tipo=row["tipo"],
+            payload=row.get("payload") or {},
+            clinica_id=row.get("clinica_id"),
+            chave_dedupe=row.get("chave_dedupe"),
+            chave_ordem=row.get("chave_ordem"),
+            id=row["id"],
+            seq=row.get("seq") or 0,
+            tentativas=row.get("tentativas") or 0,
+            created_at=row.get("created_at") or datetime.now(timezone.utc).isoformat(),
+        )
+
+    def idade_ms(self) -> float:
+        """Tempo desde o registro."""
+        try:
+            criado = datetime.fromisoformat(self.created_at)
+        except ValueError:
+            return 0.0
+        if criado.tzinfo is None:
+            criado = criado.replace(tzinfo=timezone.utc)
+        return (datetime.now(timezone.utc) - criado).total_seconds() * 1000
+
+
+# ==========================================
+# ARMAZENAMENTO
+# ==========================================
+
+class ArmazemBanco(fila_persistida.ArmazemBanco):
+    """Outbox na tabela outbox_eventos (migração 011)."""
+
+    def __init__(self, db):
+        super().__init__(db, "eventos_outbox", "p_eventos", Evento.from_row)
+
+    async def purgar(self, dias: int, limite: int) -> int:
+        """Apaga até `limite` eventos concluídos com mais de `dias`; retorna quantos."""
+        apagados = await self.db.rpc("purgar_eventos_outbox", {"p_dias": dias, "p_limite": limite})
+        return apagados or 0
+
+
+class ArmazemMemoria(fila_persistida.ArmazemMemoria):
+    """Outbox sem banco; reserva só eventos dos `destinos` pedidos."""
+
+    def __init__(self):
+        super().__init__(max_dedupe=MAX_DEDUPE_RECENTES)
+
+    def _aceita(self, evento: Evento, filtros: dict) -> bool:
+        destinos = filtros.get("destinos")
+        return destinos is None or evento.destino in destinos
+
+    async def purgar(self, dias: int, limite: int) -> int:
+        # Concluídos já saem da memória no concluir()
+        return 0
+
+
+# ==========================================
+# OUTBOX
+# ==========================================
+
+Entregador = Callable[[Evento], Awaitable[None]]
+
+
+class Outbox:
+    """Registro de eventos no caminho da requisição e dispatcher em background."""
+
+    def __init__(
+        self,
+        armazem=None,
+        intervalo_s: float = INTERVALO_S,
+        max_lote: int = MAX_LOTE,
+        concorrencia: int = CONCORRENCIA,
+        max_tentativas: int = MAX_TENTATIVAS,
+        backoff_base_s: float = BACKOFF_BASE_S,
+        backoff_max_s: float = BACKOFF_MAX_S,
+        retencao_dias: int = RETENCAO_DIAS,
+    ):
+        self.armazem = armazem or ArmazemMemoria()
+        self.intervalo_s = intervalo_s
+        self.max_lote = max_lote
+        self.concorrencia = concorrencia
+        self.max_tentativas = max_tentativas
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.retencao_dias = retencao_dias
+        self._ultima_purga: Optional[float] = None
+        self._destinos: dict[str, Entregador] = {}
+        self._novos: deque = deque()
+        self._recentes: "OrderedDict[str, None]" = OrderedDict()
+        self._acordar = asyncio.Event()
+        self._tarefa: Optional[asyncio.Task] = None
+        self._metricas = {
+            "registrados": 0, "duplicados": 0, "sem_destino": 0, "recusados": 0,
+            "enviados": 0, "retentativas": 0, "falhas": 0, "lotes": 0, "erros_armazem": 0, "purgados": 0,
+        }
+        self._por_destino: dict[str, int] = {}
+        self._latencias_ms: deque = deque(maxlen=500)
+
+    # ==========================================
+    # DESTINOS
+    # ==========================================
+
+    def registrar_destino(self, nome: str, entregar: Entregador) -> None:
+        """Associa um destino (ex.: "kestra") à função que entrega um evento."""
+        self._destinos[nome] = entregar
+
+    def tem_destino(self, nome: str) -> bool:
+        return nome in self._destinos
+
+    # ==========================================
+    # REGISTRAR (caminho da requisição)
+    # ==========================================
+
+    async def registrar(
+        self,
+        destino: str,
+        tipo: str,
+        payload: dict,
+        clinica_id: Optional[str] = None,
+        chave_dedupe: Optional[str] = None,
+        chave_ordem: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Grava o evento (um insert) e acorda o dispatcher. Retorna o id do
+        evento, ou None se o destino não está configurado ou o evento é
+        duplicado.
+        """
+        ids = await self.registrar_lote([Evento(
+            destino=destino,
+            tipo=tipo,
+            payload=payload,
+            clinica_id=clinica_id,
+            chave_dedupe=chave_dedupe,
+            chave_ordem=chave_ordem,
+        )])
+        return ids[0] if ids else None
+
+    async def registrar_lote(self, eventos: list[Evento]) -> list[str]:
+        """
+        Grava vários eventos em um insert, na ordem recebida. Retorna os
+        ids aceitos (sem os de destino não configurado e os duplicados).
+
+        Com o banco fora, os eventos ficam no buffer de regravação; com o
+        buffer cheio levanta OutboxIndisponivel (nada é descartado calado).
+        """
+        aceitos = []
+        for evento in eventos:
+            if evento.destino not in self._destinos:
+                self._metricas["sem_destino"] += 1
+                continue
+            if evento.chave_dedupe:
+                if evento.chave_dedupe in self._recentes:
+                    self._metricas["duplicados"] += 1
+                    continue
+                self._recentes[evento.chave_dedupe] = None
+                if len(self._recentes) > MAX_DEDUPE_RECENTES:
+                    self._recentes.popitem(last=False)
+            aceitos.append(evento)
+        if not aceitos:
+            return []
+
+        # Pendentes de regravação vão antes, para não inverter a ordem por chave
+        anteriores = list(self._novos)
+        self._novos.clear()
+        try:
+            inseridos = set(await self.armazem.gravar(anteriores + aceitos))
+        except Exception as e:
+            self._metricas["erros_armazem"] += 1
+            if len(anteriores) + len(aceitos) > MAX_PENDENTES:
+                self._novos.extend(anteriores)
+                self._metricas["recusados"] += len(aceitos)
+                for evento in aceitos:
+                    self._recentes.pop(evento.chave_dedupe, None)
+                logger.error("Outbox: banco indisponível e buffer cheio", error=str(e), eventos=len(aceitos))
+                raise OutboxIndisponivel(f"outbox sem armazenamento: {e}") from e
+            self._novos.extend(anteriores + aceitos)
+            logger.error("Outbox: erro ao gravar eventos, regravando no dispatcher", error=str(e), eventos=len(aceitos))
+            return [e.id for e in aceitos]
+
+        self._contar_gravados(anteriores + aceitos, inseridos)
+        if inseridos:
+            self._acordar.set()
+        return [e.id for e in aceitos if e.id in inseridos]
+
+    def _contar_gravados(self, eventos: list[Evento], inseridos: set) -> None:
+        self._metricas["registrados"] += len(inseridos)
+        self._metricas["duplicados"] += len(eventos) - len(inseridos)
+
+    # ==========================================
+    # CICLO DE VIDA
+    # ==========================================
+
+    @property
+    def ativa(self) -> bool:
+        return self._tarefa is not None and not self._tarefa.done()
+
+    async def iniciar(self) -> None:
+        """Confere as RPCs (memória só se não existirem) e sobe o dispatcher."""
+        if self.ativa:
+            return
+        self.armazem = await conferir_armazem(self.armazem, ArmazemMemoria, "Outbox")
+        self._tarefa = asyncio.create_task(loop_em_lotes(
+            self._acordar, self.intervalo_s, self.processar, self.max_lote, "Outbox",
+            depois=self._purgar_se_vencido
+        ))
+
+    async def encerrar(self) -> None:
+        """Para o dispatcher e regrava o buffer (em memória, tenta entregar)."""
+        if self._tarefa:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+        await self._gravar_novos()
+        if self._novos:
+            logger.error("Outbox: eventos não gravados no encerramento", eventos=len(self._novos))
+        if isinstance(self.armazem, ArmazemMemoria) and self.armazem.pendentes():
+            await self.processar()
+
+    async def _purgar_se_vencido(self) -> None:
+        if self._ultima_purga is None or time.monotonic() - self._ultima_purga >= INTERVALO_PURGA_S:
+            self._ultima_purga = time.monotonic()
+            await self.purgar()
+
+    # ==========================================
+    # DESPACHO
+    # ==========================================
+
+    async def processar(self) -> int:
+        """Um ciclo: regrava o buffer, reserva um lote e entrega. Retorna o tamanho do lote."""
+        await self._gravar_novos()
+
+        try:
+            eventos = await self.armazem.reservar(self.max_lote, RESERVA_S, destinos=sorted(self._destinos))
+        except Exception as e:
+            self._metricas["erros_armazem"] += 1
+            logger.warning("Outbox: erro ao reservar lote", error=str(e))
+            return 0
+        if not eventos:
+            return 0
+
+        resultados = await self._entregar_lote(eventos)
+        self._metricas["lotes"] += 1
+
+        try:
+            await self.armazem.concluir(resultados)
+        except Exception as e:
+            # Reserva expira em RESERVA_S e o lote volta: destino recebe de novo (idempotency key)
+            self._metricas["erros_armazem"] += 1
+            logger.warning("Outbox: erro ao concluir lote", error=str(e), eventos=len(resultados))
+        return len(eventos)
+
+    async def purgar(self) -> int:
+        """Retenção: apaga os concluídos além de retencao_dias, em lotes até esvaziar."""
+        total = 0
+        try:
+            while True:
+                apagados = await self.armazem.purgar(self.retencao_dias, LOTE_PURGA)
+                total += apagados
+                if apagados < LOTE_PURGA:
+                    break
+        except Exception as e:
+            self._metricas["erros_armazem"] += 1
+            logger.warning("Outbox: erro ao purgar eventos concluídos", error=str(e))
+        if total:
+            self._metricas["purgados"] += total
+            logger.info("Outbox: eventos concluídos purgados", eventos=total, retencao_dias=self.retencao_dias)
+        return total
+
+    async def _gravar_novos(self) -> None:
+        """Regrava os eventos que falharam no caminho da requisição."""
+        if not self._novos:
+            return
+        novos = list(self._novos)
+        self._novos.clear()
+        try:
+            self._contar_gravados(novos, set(await self.armazem.gravar(novos)))
+        except Exception as e:
+            # Volta para a frente da fila, na ordem original
+            self._novos.extendleft(reversed(novos))
+            self._metricas["erros_armazem"] += 1
+            logger.warning("Outbox: erro ao regravar eventos", error=str(e), eventos=len(novos))
+
+    async def _entregar_lote(self, eventos: list[Evento]) -> list[dict]:
+        """Chaves em paralelo (até `concorrencia`), mesma chave em sequência."""
+        por_chave: "OrderedDict[str, list[Evento]]" = OrderedDict()
+        for evento in eventos:
+            por_chave.setdefault(evento.chave_ordem or evento.id, []).append(evento)
+
+        limite = asyncio.Semaphore(self.concorrencia)
+
+        async def em_sequencia(fila: list[Evento]) -> list[dict]:
+            resultados = []
+            for i, evento in enumerate(fila):
+                async with limite:
+                    resultado = await self._entregar(evento)
+                resultados.append(resultado)
+                if resultado["status"] == "pendente":
+                    # Segura os seguintes da mesma chave até este sair
+                    resultados.extend(
+                        {"id": e.id, "status": "pendente", "tentou": False} for e in fila[i + 1:]
+                    )
+                    break
+            return resultados
+
+        grupos = await asyncio.gather(*(em_sequencia(fila) for fila in por_chave.values()))
+        return [r for grupo in grupos for r in grupo]
+
+    async def _entregar(self, evento: Evento) -> dict:
+        tentativa = evento.tentativas + 1
+        entregar = self._destinos.get(evento.destino)
+        try:
+            if entregar is None:
+                raise ErroPermanente(f"destino sem entregador: {evento.destino}")
+            await asyncio.wait_for(entregar(evento), TIMEOUT_ENTREGA_S)
+        except ErroPermanente as e:
+            self._metricas["falhas"] += 1
+            logger.warning("Outbox: evento recusado", destino=evento.destino, tipo=evento.tipo, error=str(e))
+            return {"id": evento.id, "status": "falhou", "tentou": True, "erro": str(e)[:500]}
+        except Exception as e:
+            erro = str(e) or type(e).__name__
+            if tentativa >= self.max_tentativas:
+                self._metricas["falhas"] += 1
+                logger.error(
+                    "Outbox: evento desistido",
+                    destino=evento.destino, tipo=evento.tipo, tentativas=tentativa, error=erro
+                )
+                return {"id": evento.id, "status": "falhou", "tentou": True, "erro": erro[:500]}
+            self._metricas["retentativas"] += 1
+            espera = calcular_backoff(tentativa, self.backoff_base_s, self.backoff_max_s)
+            proximo = datetime.now(timezone.utc) + timedelta(seconds=espera)
+            return {
+                "id": evento.id, "status": "pendente", "tentou": True,
+                "erro": erro[:500], "proximo_envio_em": proximo.isoformat()
+            }
+
+        self._metricas["enviados"] += 1
+        self._por_destino[evento.destino] = self._por_destino.get(evento.destino, 0) + 1
+        self._latencias_ms.append(evento.idade_ms())
+        return {"id": evento.id, "status": "enviado", "tentou": True}
+
+    def get_metricas(self) -> dict:
+        """Contadores, pendências e atraso registro → entrega."""
+        latencias = sorted(self._latencias_ms)
+        return {
+            **self._metricas,
+            "modo": self.armazem.modo,
+            "ativa": self.ativa,
+            "destinos": sorted(self._destinos),
+            "enviados_por_destino": dict(self._por_destino),
+            "nao_gravados": len(self._novos),
+            "pendentes_memoria": self.armazem.pendentes() if isinstance(self.armazem, ArmazemMemoria) else None,
+            "atraso_p50_ms": round(latencias[len(latencias) // 2], 1) if latencias else 0.0,
+            "atraso_p95_ms": round(latencias[int(0.95 * (len(latencias) - 1))], 1) if latencias else 0.0,
+        }
+
+
+# ==========================================
+# DESTINO: KESTRA
+# ==========================================
+
+def criar_entregador_kestra(kestra_url: str, kestra_token: Optional[str] = None) -> Entregador:
+    """Entrega o evento no webhook do workflow (evento.tipo) do Kestra."""
+    from app.core.http import get_http_client
+
+    base = kestra_url.rstrip("/")
+
+    async def entregar(evento: Evento) -> None:
+        headers = {"Content-Type": "application/json", "Idempotency-Key": evento.id}
+        if kestra_token:
+            headers["Authorization"] = f"Bearer {kestra_token}"
+
+        client = get_http_client("kestra")
+        response = await client.post(
+            f"{base}/api/v1/executions/webhook/clinica/{evento.tipo}",
+            json=evento.payload,
+            headers=headers,
+        )
+        if response.status_code in (408, 429) or response.status_code >= 500:
+            raise RuntimeError(f"Kestra {evento.tipo}: HTTP {response.status_code}")
+        if response.status_code >= 400:
+            raise ErroPermanente(f"Kestra {evento.tipo}: HTTP {response.status_code}")
+
+    return entregar
+
+
+# ==========================================
+# INSTÂNCIA DA APLICAÇÃO
+# ==========================================
+
+_outbox: Optional[Outbox] = None
+
+
+def get_outbox() -> Outbox:
+    """Outbox da aplicação (criada sob demanda; despacha após iniciar_outbox)."""
+    global _outbox
+    if _outbox is None:
+        _outbox = Outbox()
+    return _outbox
+
+
+async def registrar_evento(
+    destino: str,
+    tipo: str,
+    payload: dict,
+    clinica_id: Optional[str] = None,
+    chave_dedupe: Optional[str] = None,
+    chave_ordem: Optional[str] = None,
+) -> Optional[str]:
+    """Atalho para get_outbox().registrar(...)."""
+    return await get_outbox().registrar(
+        destino, tipo, payload,
+        clinica_id=clinica_id, chave_dedupe=chave_dedupe, chave_ordem=chave_ordem
+    )
+
+
+async def registrar_eventos(eventos: list[Evento]) -> list[str]:
+    """Atalho para get_outbox().registrar_lote(...): vários eventos em um insert."""
+    return await get_outbox().registrar_lote(eventos)
+
+
+async def iniciar_outbox(db, settings=None) -> Outbox:
+    """Liga a outbox ao banco, registra o Kestra (se configurado) e sobe o dispatcher."""
+    outbox = get_outbox()
+    outbox.armazem = ArmazemBanco(db)
+    outbox.retencao_dias = getattr(settings, "outbox_retencao_dias", RETENCAO_DIAS)
+
+    kestra_url = getattr(settings, "kestra_url", None)
+    if kestra_url:
+        outbox.registrar_destino("kestra", criar_entregador_kestra(kestra_url, getattr(settings, "kestra_token", None)))
+    else:
+        logger.info("Outbox: Kestra não configurado - eventos do Kestra serão ignorados")
+
+    await outbox.iniciar()
+    return outbox
+
+
+async def encerrar_outbox() -> None:
+    """Para o dispatcher e grava eventos pendentes (shutdown, antes de fechar os clientes HTTP)."""
+    if _outbox is not None:
+        await _outbox.encerrar()
+
+
+def get_metricas_outbox() -> dict:
+    return get_outbox().get_metricas()
+
+
+# ==========================================
+# DEMONSTRAÇÃO (servidor stub local)
+# ==========================================
+
+class _StubDestino:
+    """
+    Servidor HTTP local que recebe as entregas e registra a ordem de
+    chegada. `falhas` mapeia id do evento → lista de status a devolver
+    nas primeiras tentativas (depois responde 200).
+    """
+
+    def __init__(self, latencia_ms: float = 5.0):
+        self.latencia_s = latencia_ms / 1000
+        self.falhas: dict[str, list[int]] = {}
+        self.recebidos: list[dict] = []
+        self.tentativas: dict[str, int] = {}
+        self._servidor = None
+        self.url = ""
+
+    async def iniciar(self) -> str:
+        self._servidor = await asyncio.start_server(self._atender, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self._servidor.sockets[0].getsockname()[1]}"
+        return self.url
+
+    async def encerrar(self) -> None:
+        if self._servidor:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        import json
+
+        try:
+            while True:
+                cabecalho = (await reader.readuntil(b"\r\n\r\n")).decode()
+                linhas = cabecalho.split("\r\n")
+                headers = {k.lower(): v.strip() for k, _, v in (l.partition(":") for l in linhas[1:] if l)}
+                tamanho = int(headers.get("content-length", 0))
+                corpo = json.loads(await reader.readexactly(tamanho)) if tamanho else {}
+                evento_id = headers.get("idempotency-key", "")
+
+                await asyncio.sleep(self.latencia_s)
+                self.tentativas[evento_id] = self.tentativas.get(evento_id, 0) + 1
+                roteiro = self.falhas.get(evento_id) or []
+                status = roteiro.pop(0) if roteiro else 200
+                if status == 200:
+                    self.recebidos.append({"id": evento_id, "workflow": linhas[0].split()[1].rsplit("/", 1)[-1], **corpo})
+
+                writer.write(f"HTTP/1.1 {status} X\r\nContent-Length: 0\r\n\r\n".encode())
+                await writer.drain()
+        except (asyncio.CancelledError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _demonstrar(eventos_por_chave: int = 20, chaves: int = 10, db=None) -> dict:
+    """
+    Entrega com falhas transitórias e permanentes; confere ordem e dedupe.
+
+    Dois dispatchers dividem o mesmo armazenamento, como dois processos do
+    backend: nenhum evento pode ser entregue pelos dois. Com `db`, o
+    armazenamento é o ArmazemBanco (RPCs da migração 011); os eventos usam
+    o destino "demo" e chaves próprias da rodada, sem tocar nos reais.
+    """
+    from app.core.http import fechar_http_clients
+
+    stub = _StubDestino()
+    url = await stub.iniciar()
+
+    armazem = ArmazemBanco(db) if db is not None else ArmazemMemoria()
+    config = dict(intervalo_s=0.02, max_lote=25, backoff_base_s=0.05, backoff_max_s=0.2, max_tentativas=4)
+    outbox = Outbox(armazem, **config)
+    segundo = Outbox(armazem, **config)
+    for o in (outbox, segundo):
+        o.registrar_destino("demo", criar_entregador_kestra(url))
+
+    # Registro intercalado entre chaves
+    rodada = uuid.uuid4().hex[:8]
+    ids_por_chave: dict[int, list[str]] = {}
+    for n in range(eventos_por_chave):
+        for c in range(chaves):
+            chave = f"demo:{rodada}:agendamento:{c}"
+            evento_id = await outbox.registrar(
+                "demo", "evento-agenda", {"chave": chave, "n": n},
+                chave_dedupe=f"{chave}:{n}", chave_ordem=chave
+            )
+            ids_por_chave.setdefault(c, []).append(evento_id)
+
+    # Os mesmos eventos registrados no outro processo, em um insert: o armazenamento descarta
+    await segundo.registrar_lote([
+        Evento(
+            "demo", "evento-agenda", {"chave": f"demo:{rodada}:agendamento:{c}", "n": n},
+            chave_dedupe=f"demo:{rodada}:agendamento:{c}:{n}", chave_ordem=f"demo:{rodada}:agendamento:{c}"
+        )
+        for n in range(eventos_por_chave)
+        for c in range(chaves)
+    ])
+
+    # Falhas transitórias (503, 429) e uma permanente (400) no meio das sequências
+    stub.falhas[ids_por_chave[0][3]] = [503, 503]
+    stub.falhas[ids_por_chave[1][0]] = [429]
+    stub.falhas[ids_por_chave[2][5]] = [400]
+    stub.falhas[ids_por_chave[3][7]] = [503] * 10  # esgota as tentativas
+
+    inicio = time.perf_counter()
+    await outbox.iniciar()
+    await segundo.iniciar()
+    total = eventos_por_chave * chaves
+    esperados = total - 2  # o recusado e o desistido não chegam
+    while len(stub.recebidos) < esperados and time.perf_counter() - inicio < 15:
+        await asyncio.sleep(0.02)
+    await asyncio.sleep(0.3)  # dá tempo de aparecer entrega duplicada, se houver
+    duracao_s = time.perf_counter() - inicio
+    await outbox.encerrar()
+    await segundo.encerrar()
+    await stub.encerrar()
+    await fechar_http_clients()
+
+    recebidos_por_chave: dict[str, list[int]] = {}
+    for r in stub.recebidos:
+        recebidos_por_chave.setdefault(r["chave"], []).append(r["n"])
+    ids_recebidos = [r["id"] for r in stub.recebidos]
+
+    return {
+        # iniciar() cai para memória se as RPCs faltarem: o modo real fica no resultado
+        "armazem": outbox.armazem.modo,
+        "registrados": total,
+        "entregues": len(stub.recebidos),
+        "entregas_duplicadas": len(ids_recebidos) - len(set(ids_recebidos)),
+        "duplicados_descartados_pelo_armazem": segundo.get_metricas()["duplicados"],
+        "ordem_preservada": all(ns == sorted(ns) for ns in recebidos_por_chave.values()),
+        "duracao_s": round(duracao_s, 2),
+        "metricas": {"dispatcher_1": outbox.get_metricas(), "dispatcher_2": segundo.get_metricas()},
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    banco = None
+    if "--banco" in sys.argv:
+        from app.core.database import get_admin_db
+        banco = get_admin_db()
+
+    resultado = asyncio.run(_demonstrar(db=banco))
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    ok = (
+        resultado["armazem"] == ("banco" if banco is not None else "memoria")
+        and resultado["entregues"] == resultado["registrados"] - 2
+        and resultado["entregas_duplicadas"] == 0
+        and resultado["duplicados_descartados_pelo_armazem"] == resultado["registrados"]
+        and resultado["ordem_preservada"]
+    )
+    raise SystemExit(0 if ok else 1)
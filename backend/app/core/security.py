@@ -2,6 +2,7 @@
 Core - Security
 Autenticação e autorização via JWT/Supabase.
 """
+import hmac
 from typing import Optional
 
 from fastapi import Depends, HTTPException, status
@@ -100,6 +101,22 @@ async def get_current_user(
     )
 
 
+async def require_internal_token(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> None:
+    """
+    Dependency dos endpoints internos chamados pelos workflows (Kestra).
+    Aceita só o Bearer igual a settings.api_internal_token; sem token
+    configurado, os endpoints internos ficam fechados.
+    """
+    if not settings.api_internal_token:
+        raise UnauthorizedError("Endpoints internos desabilitados")
+    if not credentials or not hmac.compare_digest(
+        credentials.credentials.encode(), settings.api_internal_token.encode()
+    ):
+        raise UnauthorizedError("Token interno inválido")
+
+
 def require_permission(module: str, action: str):
     """
     Dependency factory para verificar permissão específica.
@@ -191,6 +191,7 @@ async def registrar_evidencia(
 )
 async def listar_validacoes(
     trigger: Optional[TriggerType] = Query(None, description="Filtrar por tipo de trigger"),
+    limit: int = Query(200, ge=1, le=500, description="Máximo de itens retornados"),
     current_user: CurrentUser = Depends(require_permission("governanca", "L"))
 ):
     """
@@ -203,7 +204,8 @@ async def listar_validacoes(
     """
     return await governanca_service.listar_pendentes(
         current_user=current_user,
-        trigger=trigger
+        trigger=trigger,
+        limit=limit
     )
 
 
@@ -223,13 +225,7 @@ async def get_validacao(
     - Dados para verificação
     - Perguntas orientadoras
     """
-    # Por simplicidade, retorna da lista filtrada
-    pendentes = await governanca_service.listar_pendentes(current_user)
-    validacao = next((v for v in pendentes["itens"] if v["id"] == validacao_id), None)
-    if not validacao:
-        from app.core.exceptions import NotFoundError
-        raise NotFoundError("Validação não encontrada")
-    return validacao
+    return await governanca_service.obter_validacao(validacao_id, current_user)
 
 
 @router.post(
@@ -303,7 +299,7 @@ async def get_dashboard(
     Inclui:
     - Status de implantação (dias restantes)
     - Validações pendentes
-    - Performance dos últimos 30 dias
+    - Performance dos últimos 7/30/90 dias (resumo materializado)
     - Trust scores por categoria
     """
     return await governanca_service.get_dashboard(current_user)
@@ -31,15 +31,23 @@ PERÍODO DE IMPLANTAÇÃO:
 """
 from __future__ import annotations
 
+import asyncio
+import time
 from datetime import datetime, timedelta
 from typing import Optional, List
 from enum import Enum
 
-from app.core.database import get_authenticated_db
+import structlog
+
+from app.core.database import get_admin_db, get_authenticated_db, rpc_inexistente
+from app.core.outbox import ErroPermanente, Evento, get_outbox
 from app.core.security import CurrentUser
 from app.core.exceptions import NotFoundError, ValidationError
 
 
+logger = structlog.get_logger()
+
+
 class TriggerType(str, Enum):
     MENSAGEM_WHATSAPP = "mensagem_whatsapp"
     CARD_CRIADO = "card_criado"
@@ -64,6 +72,16 @@ DIAS_IMPLANTACAO = 30
 AJUSTE_APROVADO = 2
 AJUSTE_CORRIGIDO = -5
 AJUSTE_REJEITADO = -15
+TRUST_INICIAL = 50.0
+
+# Cache em memória do contexto de governança por clínica
+# (data de implantação + trust scores). Atualizado a cada escrita.
+CONTEXTO_CACHE_TTL = 300  # segundos
+_contexto_cache: dict[str, dict] = {}
+
+# Dashboard
+JANELAS_METRICAS = (7, 30, 90)
+LIMITE_PENDENTES = 200
 
 # Evidências esperadas por tarefa
 EVIDENCIAS_ESPERADAS = {
@@ -108,7 +126,13 @@ class GovernancaService:
         Governança verifica se interpretou certo
         """
         db = get_authenticated_db(current_user.access_token)
-        
+        return await self._avaliar_mensagem_whatsapp(
+            db, clinica_id, telefone, mensagem, interpretacao, acao_tomada
+        )
+
+    async def _avaliar_mensagem_whatsapp(
+        self, db, clinica_id: str, telefone: str, mensagem: str, interpretacao: dict, acao_tomada: dict
+    ) -> dict:
         evidencia = {
             "tipo": "mensagem_whatsapp",
             "dados": {
@@ -157,7 +181,11 @@ class GovernancaService:
         Governança verifica dados e tarefas
         """
         db = get_authenticated_db(current_user.access_token)
-        
+        return await self._avaliar_card_criado(db, clinica_id, card_id, agendamento, paciente)
+
+    async def _avaliar_card_criado(
+        self, db, clinica_id: str, card_id: str, agendamento: dict, paciente: dict
+    ) -> dict:
         evidencias = [
             {"tipo": "card", "dados": {"card_id": card_id}},
             {"tipo": "agendamento", "dados": agendamento},
@@ -183,6 +211,30 @@ class GovernancaService:
         
         return {"requer_validacao": requer, "validacao_id": validacao_id}
 
+    # ==========================================
+    # TRIGGERS VIA OUTBOX
+    # ==========================================
+    async def entregar_evento(self, evento: Evento) -> None:
+        """
+        Destino "governanca" da outbox: chat e agenda registram o trigger
+        e ele é avaliado aqui, fora do caminho da requisição.
+        """
+        db = get_admin_db()
+        dados = evento.payload
+        
+        if evento.tipo == TriggerType.MENSAGEM_WHATSAPP.value:
+            await self._avaliar_mensagem_whatsapp(
+                db, evento.clinica_id, dados.get("telefone") or "", dados.get("mensagem") or "",
+                dados.get("interpretacao") or {}, dados.get("acao_tomada") or {}
+            )
+        elif evento.tipo == TriggerType.CARD_CRIADO.value:
+            await self._avaliar_card_criado(
+                db, evento.clinica_id, dados["card_id"],
+                dados.get("agendamento") or {}, dados.get("paciente") or {}
+            )
+        else:
+            raise ErroPermanente(f"trigger desconhecido: {evento.tipo}")
+
     # ==========================================
     # TRIGGER 3: MUDANÇA DE FASE
     # ==========================================
@@ -324,27 +376,47 @@ class GovernancaService:
     # ==========================================
     # VALIDAÇÃO
     # ==========================================
-    async def listar_pendentes(self, current_user: CurrentUser, trigger: Optional[TriggerType] = None) -> dict:
+    async def listar_pendentes(
+        self,
+        current_user: CurrentUser,
+        trigger: Optional[TriggerType] = None,
+        limit: int = LIMITE_PENDENTES
+    ) -> dict:
         db = get_authenticated_db(current_user.access_token)
         
         filters = {"clinica_id": current_user.clinica_id, "status": StatusValidacao.PENDENTE.value}
         if trigger:
             filters["trigger_type"] = trigger.value
         
-        validacoes = await db.select(table="validacoes_governanca", filters=filters, order_by="created_at")
+        validacoes = await db.select(
+            table="validacoes_governanca",
+            filters=filters,
+            order_by="created_at",
+            limit=limit
+        )
         
-        por_trigger = {}
-        for v in validacoes:
-            t = v.get("trigger_type", "outro")
-            por_trigger[t] = por_trigger.get(t, 0) + 1
+        resumo = await self._resumo_pendentes(current_user.clinica_id, db)
+        if trigger:
+            resumo = {trigger.value: resumo.get(trigger.value, {"total": 0, "com_problemas": 0})}
         
         return {
-            "total": len(validacoes),
-            "com_problemas": len([v for v in validacoes if v.get("dados", {}).get("problemas")]),
-            "por_trigger": por_trigger,
+            "total": sum(r["total"] for r in resumo.values()),
+            "com_problemas": sum(r["com_problemas"] for r in resumo.values()),
+            "por_trigger": {t: r["total"] for t, r in resumo.items()},
             "itens": validacoes
         }
 
+    async def obter_validacao(self, validacao_id: str, current_user: CurrentUser) -> dict:
+        db = get_authenticated_db(current_user.access_token)
+        
+        validacao = await db.select_one(
+            table="validacoes_governanca",
+            filters={"id": validacao_id, "clinica_id": current_user.clinica_id}
+        )
+        if not validacao:
+            raise NotFoundError("Validação não encontrada")
+        return validacao
+
     async def processar_validacao(
         self,
         validacao_id: str,
@@ -399,21 +471,12 @@ class GovernancaService:
         db = get_authenticated_db(current_user.access_token)
         clinica_id = current_user.clinica_id
         
-        em_implantacao = await self._em_implantacao(clinica_id, db)
-        dias_restantes = await self._dias_restantes(clinica_id, db)
+        contexto = await self._get_contexto(clinica_id, db)
+        em_implantacao = self._em_implantacao(contexto)
+        dias_restantes = self._dias_restantes(contexto)
         pendentes = await self.listar_pendentes(current_user)
         
-        # Métricas 30 dias
-        data_inicio = datetime.utcnow() - timedelta(days=30)
-        validacoes = await db.select(
-            table="validacoes_governanca",
-            filters={"clinica_id": clinica_id, "created_at__gte": data_inicio.isoformat()}
-        )
-        
-        aprovadas = len([v for v in validacoes if v["status"] == "aprovado"])
-        corrigidas = len([v for v in validacoes if v["status"] == "corrigido"])
-        rejeitadas = len([v for v in validacoes if v["status"] == "rejeitado"])
-        total_processadas = aprovadas + corrigidas + rejeitadas
+        performance = await self._metricas_por_janela(clinica_id, db)
         
         return {
             "implantacao": {
@@ -422,68 +485,209 @@ class GovernancaService:
                 "taxa_validacao": "100%" if em_implantacao else "variável"
             },
             "pendentes": pendentes,
-            "performance_30d": {
-                "total": len(validacoes),
-                "aprovadas": aprovadas,
-                "corrigidas": corrigidas,
-                "rejeitadas": rejeitadas,
-                "taxa_acerto": round(aprovadas / total_processadas, 3) if total_processadas > 0 else 0
+            "performance_30d": performance["30d"],
+            "performance": performance
+        }
+
+    async def _resumo_pendentes(self, clinica_id: str, db) -> dict:
+        """Contagem de pendentes por trigger (agregada no banco)."""
+        try:
+            rows = await db.rpc(
+                function_name="get_resumo_pendentes",
+                params={"p_clinica_id": clinica_id}
+            )
+            return {
+                r["trigger_type"]: {"total": r["total"], "com_problemas": r["com_problemas"]}
+                for r in rows or []
             }
+        except Exception as e:
+            if not rpc_inexistente(e):
+                raise
+            logger.warning("RPC get_resumo_pendentes inexistente, usando fallback", error=str(e))
+        
+        # Fallback: carrega só as colunas necessárias das pendentes
+        rows = await db.select(
+            table="validacoes_governanca",
+            columns="trigger_type,problemas:dados->problemas",
+            filters={"clinica_id": clinica_id, "status": StatusValidacao.PENDENTE.value}
+        )
+        resumo = {}
+        for r in rows:
+            t = resumo.setdefault(r.get("trigger_type", "outro"), {"total": 0, "com_problemas": 0})
+            t["total"] += 1
+            if r.get("problemas"):
+                t["com_problemas"] += 1
+        return resumo
+
+    async def _metricas_por_janela(self, clinica_id: str, db) -> dict:
+        """
+        Performance das validações nas janelas de 7/30/90 dias.
+        
+        Lê o resumo diário materializado (mv_governanca_resumo_diario,
+        atualizado por iniciar_refresh_resumo) somado ao dia corrente
+        ao vivo; sem a RPC (migração não aplicada), usa contagens por
+        status direto na tabela. Outros erros da RPC sobem: o fallback
+        faz uma contagem por janela e status e não deve rodar sob carga.
+        """
+        metricas = {
+            f"{dias}d": {"total": 0, "aprovadas": 0, "corrigidas": 0, "rejeitadas": 0, "por_trigger": {}}
+            for dias in JANELAS_METRICAS
         }
+        
+        try:
+            rows = await db.rpc(
+                function_name="get_metricas_governanca",
+                params={"p_clinica_id": clinica_id, "p_janelas": list(JANELAS_METRICAS)}
+            )
+            for r in rows or []:
+                janela = metricas[f"{r['janela_dias']}d"]
+                for campo in ("total", "aprovadas", "corrigidas", "rejeitadas"):
+                    janela[campo] += r[campo] or 0
+                janela["por_trigger"][r["trigger_type"]] = r["total"]
+        except Exception as e:
+            if not rpc_inexistente(e):
+                raise
+            logger.warning("RPC get_metricas_governanca inexistente, usando fallback", error=str(e))
+            for dias in JANELAS_METRICAS:
+                janela = metricas[f"{dias}d"]
+                filtro = {
+                    "clinica_id": clinica_id,
+                    "created_at__gte": (datetime.utcnow() - timedelta(days=dias)).isoformat()
+                }
+                janela["total"] = await db.count(table="validacoes_governanca", filters=filtro)
+                for campo, status in (
+                    ("aprovadas", StatusValidacao.APROVADO),
+                    ("corrigidas", StatusValidacao.CORRIGIDO),
+                    ("rejeitadas", StatusValidacao.REJEITADO)
+                ):
+                    janela[campo] = await db.count(
+                        table="validacoes_governanca",
+                        filters={**filtro, "status": status.value}
+                    )
+        
+        for janela in metricas.values():
+            processadas = janela["aprovadas"] + janela["corrigidas"] + janela["rejeitadas"]
+            janela["taxa_acerto"] = round(janela["aprovadas"] / processadas, 3) if processadas > 0 else 0
+        
+        return metricas
 
     # ==========================================
     # HELPERS
     # ==========================================
     async def _requer_validacao(self, clinica_id: str, chave: str, db) -> bool:
         """Verifica se requer validação baseado em implantação + trust."""
-        if await self._em_implantacao(clinica_id, db):
+        contexto = await self._get_contexto(clinica_id, db)
+        
+        if self._em_implantacao(contexto):
             return True  # 100% nos primeiros 30 dias
         
-        trust = await self._get_trust(clinica_id, chave, db)
+        trust = contexto["trust"].get(chave, TRUST_INICIAL)
         return trust < 90  # Só dispensa se trust > 90%
 
-    async def _em_implantacao(self, clinica_id: str, db) -> bool:
-        clinica = await db.select_one(table="clinicas", filters={"id": clinica_id})
-        if not clinica or not clinica.get("data_inicio_sistema"):
+    def _em_implantacao(self, contexto: dict) -> bool:
+        inicio = contexto.get("data_inicio_sistema")
+        if not inicio:
             return True
         
-        inicio = clinica["data_inicio_sistema"]
-        if isinstance(inicio, str):
-            inicio = datetime.fromisoformat(inicio.replace("Z", ""))
-        
         return (datetime.utcnow() - inicio).days < DIAS_IMPLANTACAO
 
-    async def _dias_restantes(self, clinica_id: str, db) -> int:
-        clinica = await db.select_one(table="clinicas", filters={"id": clinica_id})
-        if not clinica or not clinica.get("data_inicio_sistema"):
+    def _dias_restantes(self, contexto: dict) -> int:
+        inicio = contexto.get("data_inicio_sistema")
+        if not inicio:
             return DIAS_IMPLANTACAO
         
-        inicio = clinica["data_inicio_sistema"]
+        return max(0, DIAS_IMPLANTACAO - (datetime.utcnow() - inicio).days)
+
+    async def _get_contexto(self, clinica_id: str, db) -> dict:
+        """
+        Retorna contexto de governança da clínica (cacheado).
+        
+        Contém tudo que os triggers precisam para decidir validação:
+        data de início do sistema e trust scores por chave.
+        """
+        contexto = _contexto_cache.get(clinica_id)
+        if contexto and time.monotonic() - contexto["carregado_em"] < CONTEXTO_CACHE_TTL:
+            return contexto
+        
+        contexto = await self._carregar_contexto(clinica_id, db)
+        _contexto_cache[clinica_id] = contexto
+        return contexto
+
+    async def _carregar_contexto(self, clinica_id: str, db) -> dict:
+        """Busca contexto de governança em uma única chamada RPC."""
+        try:
+            result = await db.rpc(
+                function_name="get_contexto_governanca",
+                params={"p_clinica_id": clinica_id}
+            )
+            row = result[0] if result else {}
+            inicio = row.get("data_inicio_sistema")
+            trust = row.get("trust_scores") or {}
+        except Exception as e:
+            if not rpc_inexistente(e):
+                raise
+            logger.warning("RPC get_contexto_governanca inexistente, usando fallback", error=str(e))
+            clinica = await db.select_one(
+                table="clinicas",
+                columns="data_inicio_sistema",
+                filters={"id": clinica_id}
+            )
+            scores = await db.select(
+                table="trust_scores",
+                columns="chave,valor",
+                filters={"clinica_id": clinica_id}
+            )
+            inicio = clinica.get("data_inicio_sistema") if clinica else None
+            trust = {s["chave"]: s["valor"] for s in scores}
+        
         if isinstance(inicio, str):
-            inicio = datetime.fromisoformat(inicio.replace("Z", ""))
+            inicio = datetime.fromisoformat(inicio.replace("Z", "")).replace(tzinfo=None)
         
-        return max(0, DIAS_IMPLANTACAO - (datetime.utcnow() - inicio).days)
+        return {
+            "data_inicio_sistema": inicio,
+            "trust": {k: float(v) for k, v in trust.items()},
+            "carregado_em": time.monotonic()
+        }
 
-    async def _get_trust(self, clinica_id: str, chave: str, db) -> float:
-        registro = await db.select_one(
-            table="trust_scores",
-            filters={"clinica_id": clinica_id, "chave": chave}
+    async def _atualizar_trust(self, clinica_id: str, chave: str, resultado: StatusValidacao, db) -> float:
+        ajuste = AJUSTE_APROVADO if resultado == StatusValidacao.APROVADO else (
+            AJUSTE_CORRIGIDO if resultado == StatusValidacao.CORRIGIDO else AJUSTE_REJEITADO
         )
-        return registro["valor"] if registro else 50.0
+        
+        # Upsert atômico: validações concorrentes não perdem incrementos
+        try:
+            result = await db.rpc(
+                function_name="atualizar_trust_score",
+                params={"p_clinica_id": clinica_id, "p_chave": chave, "p_ajuste": ajuste}
+            )
+            novo = float(result[0]["valor"])
+        except Exception as e:
+            if not rpc_inexistente(e):
+                raise
+            # Só sem a migração 006: o fallback não é atômico
+            logger.error(
+                "RPC atualizar_trust_score inexistente, usando read-modify-write NÃO atômico (aplique a migração 006)",
+                error=str(e)
+            )
+            novo = await self._atualizar_trust_fallback(clinica_id, chave, ajuste, db)
+        
+        # Mantém snapshot em memória coerente com a escrita
+        contexto = _contexto_cache.get(clinica_id)
+        if contexto:
+            contexto["trust"][chave] = novo
+        
+        return novo
 
-    async def _atualizar_trust(self, clinica_id: str, chave: str, resultado: StatusValidacao, db) -> float:
+    async def _atualizar_trust_fallback(self, clinica_id: str, chave: str, ajuste: int, db) -> float:
+        """Read-modify-write (não atômico) para bancos sem a RPC."""
         registro = await db.select_one(
             table="trust_scores",
             filters={"clinica_id": clinica_id, "chave": chave}
         )
         
-        valor = registro["valor"] if registro else 50.0
+        valor = float(registro["valor"]) if registro else TRUST_INICIAL
         total = registro["total"] if registro else 0
         
-        ajuste = AJUSTE_APROVADO if resultado == StatusValidacao.APROVADO else (
-            AJUSTE_CORRIGIDO if resultado == StatusValidacao.CORRIGIDO else AJUSTE_REJEITADO
-        )
-        
         novo = max(0, min(100, valor + ajuste))
         
         if registro:
@@ -518,3 +722,41 @@ class GovernancaService:
 
 
 governanca_service = GovernancaService()
+get_outbox().registrar_destino("governanca", governanca_service.entregar_evento)
+
+
+# ==========================================
+# REFRESH DO RESUMO MATERIALIZADO
+# ==========================================
+
+_refresh_task: Optional[asyncio.Task] = None
+
+
+async def _loop_refresh_resumo(db, intervalo_s: float) -> None:
+    while True:
+        try:
+            await db.rpc(function_name="refresh_governanca_resumo", params={})
+        except Exception as e:
+            if rpc_inexistente(e):
+                logger.warning("refresh_governanca_resumo inexistente (migração 007?), refresh desligado")
+                return
+            logger.error("Falha ao atualizar mv_governanca_resumo_diario", error=str(e))
+        await asyncio.sleep(intervalo_s)
+
+
+def iniciar_refresh_resumo(db, intervalo_s: float) -> None:
+    """Atualiza o resumo diário na subida e depois a cada `intervalo_s`."""
+    global _refresh_task
+    if _refresh_task is None or _refresh_task.done():
+        _refresh_task = asyncio.create_task(_loop_refresh_resumo(db, intervalo_s))
+
+
+async def encerrar_refresh_resumo() -> None:
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
@@ -23,14 +23,20 @@ MODELO DE VALIDAÇÃO:
 """
 from __future__ import annotations
 
+import time
 from datetime import datetime, timedelta
 from typing import Optional, List
 from enum import Enum
 
+import structlog
+
 from app.core.database import get_authenticated_db
 from app.core.security import CurrentUser
 
 
+logger = structlog.get_logger()
+
+
 class TipoEvidencia(str, Enum):
     """Tipos de evidência para tarefas."""
     LOG = "log"                 # Sistema registra automaticamente
@@ -415,7 +421,8 @@ class VerificacaoService:
         checklist = card.get("checklist", {})
         verificacoes = []
         
-        # Para cada item do checklist da fase anterior
+        # Seleciona itens do checklist que exigem evidência
+        itens = {}
         for item_key, item_data in checklist.items():
             config_evidencia = EVIDENCIAS_CHECKLIST.get(item_key, {})
             
@@ -426,13 +433,18 @@ class VerificacaoService:
             if config_evidencia.get("opcional") and not item_data.get("concluido"):
                 continue
             
-            # Verifica se evidência existe
-            evidencia = await self._buscar_evidencia(
-                db=db,
-                card=card,
-                item_key=item_key,
-                config=config_evidencia
-            )
+            itens[item_key] = config_evidencia
+        
+        # Busca evidências em lote (uma query por tabela)
+        evidencias, tempos_busca = await self._buscar_evidencias(
+            db=db,
+            card=card,
+            itens=itens
+        )
+        
+        for item_key, config_evidencia in itens.items():
+            item_data = checklist[item_key]
+            evidencia = evidencias.get(item_key)
             
             if evidencia:
                 verificacoes.append({
@@ -494,58 +506,101 @@ class VerificacaoService:
             "requer_atencao": requer_atencao,
             "total_itens": len(verificacoes),
             "itens_ok": len([v for v in verificacoes if v["status"] == "ok"]),
-            "itens_faltando": len([v for v in verificacoes if v["status"] == "incompleto"])
+            "itens_faltando": len([v for v in verificacoes if v["status"] == "incompleto"]),
+            "tempos_busca_ms": tempos_busca
         }
 
     # ==========================================
     # BUSCAR EVIDÊNCIA
     # ==========================================
     
-    async def _buscar_evidencia(
+    async def _buscar_evidencias(
         self,
         db,
         card: dict,
-        item_key: str,
-        config: dict
-    ) -> Optional[dict]:
-        """Busca evidência de uma tarefa na tabela apropriada."""
-        
-        tabela = config.get("tabela_evidencia")
-        filtro_base = config.get("filtro", {})
+        itens: dict
+    ) -> tuple[dict, dict]:
+        """
+        Busca evidências de várias tarefas agrupando por tabela.
         
-        if not tabela:
-            return None
+        Faz uma única query por tabela (filtrando por todos os tipos
+        esperados) e associa os registros a cada item em memória.
         
-        # Monta filtro específico por tabela
-        filtro = {**filtro_base}
+        Returns:
+            (evidências por item_key, tempo gasto por tabela em ms)
+        """
+        # Agrupa itens por tabela de evidência
+        por_tabela: dict[str, dict] = {}
+        for item_key, config in itens.items():
+            tabela = config.get("tabela_evidencia")
+            if tabela:
+                por_tabela.setdefault(tabela, {})[item_key] = config
+        
+        evidencias = {}
+        tempos = {}
+        
+        for tabela, configs in por_tabela.items():
+            filtro = self._filtro_referencia(card, tabela)
+            if filtro is None:
+                continue
+            
+            tipos = sorted({
+                c.get("filtro", {}).get("tipo")
+                for c in configs.values()
+                if c.get("filtro", {}).get("tipo")
+            })
+            if tipos:
+                filtro["tipo__in"] = tipos
+            
+            inicio = time.perf_counter()
+            try:
+                registros = await db.select(table=tabela, filters=filtro)
+            except Exception as e:
+                logger.warning(
+                    "Falha ao buscar evidências",
+                    tabela=tabela,
+                    card_id=card.get("id"),
+                    erro=str(e)
+                )
+                registros = []
+            tempos[tabela] = round((time.perf_counter() - inicio) * 1000, 2)
+            
+            # Associa registros aos itens em memória
+            for item_key, config in configs.items():
+                filtro_item = config.get("filtro", {})
+                reg = next(
+                    (
+                        r for r in registros
+                        if all(r.get(k) == v for k, v in filtro_item.items())
+                    ),
+                    None
+                )
+                if reg:
+                    evidencias[item_key] = {
+                        "tipo": config["tipo"].value,
+                        "tabela": tabela,
+                        "registro_id": reg.get("id"),
+                        "created_at": reg.get("created_at"),
+                        "dados_resumo": self._resumir_evidencia(reg, tabela)
+                    }
         
-        if tabela == "mensagens":
-            filtro["agendamento_id"] = card.get("agendamento_id")
-        elif tabela == "evidencias":
-            filtro["card_id"] = card["id"]
-        elif tabela == "card_eventos":
-            filtro["card_id"] = card["id"]
-        
-        # Busca registro
-        try:
-            registro = await db.select(
-                table=tabela,
-                filters=filtro,
-                limit=1
+        if tempos:
+            logger.info(
+                "Evidências verificadas",
+                card_id=card.get("id"),
+                itens=len(itens),
+                tempos_ms=tempos
             )
-            
-            if registro and len(registro) > 0:
-                reg = registro[0]
-                return {
-                    "tipo": config["tipo"].value,
-                    "tabela": tabela,
-                    "registro_id": reg.get("id"),
-                    "created_at": reg.get("created_at"),
-                    "dados_resumo": self._resumir_evidencia(reg, tabela)
-                }
-        except Exception as e:
-            pass
         
+        return evidencias, tempos
+    
+    def _filtro_referencia(self, card: dict, tabela: str) -> Optional[dict]:
+        """Filtro que vincula a tabela de evidência ao card."""
+        if tabela == "mensagens":
+            agendamento_id = card.get("agendamento_id")
+            return {"agendamento_id": agendamento_id} if agendamento_id else None
+        if tabela in ("evidencias", "card_eventos"):
+            return {"card_id": card["id"]}
         return None
     
     def _resumir_evidencia(self, registro: dict, tabela: str) -> dict:
@@ -748,15 +803,14 @@ class VerificacaoService:
         # Após implantação: calcula baseado em performance
         data_corte = datetime.utcnow() - timedelta(days=dias)
         
-        verificacoes = await db.select(
-            table="verificacoes_log",
-            filters={
-                "clinica_id": clinica_id,
-                "created_at__gte": data_corte.isoformat()
-            }
-        )
+        # Contagens agregadas no banco (não carrega o histórico)
+        filtro_periodo = {
+            "clinica_id": clinica_id,
+            "created_at__gte": data_corte.isoformat()
+        }
+        total = await db.count(table="verificacoes_log", filters=filtro_periodo)
         
-        if not verificacoes:
+        if not total:
             return {
                 "fase": "normal",
                 "taxa_validacao": 0.5,  # 50% default
@@ -764,9 +818,11 @@ class VerificacaoService:
             }
         
         # Calcula taxa de sucesso
-        total = len(verificacoes)
-        completos = len([v for v in verificacoes if v["status"] == "completo"])
-        taxa_sucesso = completos / total if total > 0 else 0
+        completos = await db.count(
+            table="verificacoes_log",
+            filters={**filtro_periodo, "status": StatusVerificacao.COMPLETO.value}
+        )
+        taxa_sucesso = completos / total
         
         # Taxa de validação inversamente proporcional ao sucesso
         # Sucesso 100% → Validação 5%
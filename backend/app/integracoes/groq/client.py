@@ -8,10 +8,10 @@ import tempfile
 from pathlib import Path
 from typing import Optional, Union
 
-import httpx
 import structlog
 
 from app.core.config import settings
+from app.core.http import get_http_client
 
 logger = structlog.get_logger()
 
@@ -87,14 +87,14 @@ class GroqClient:
             "Authorization": f"Bearer {self.api_key}",
         }
 
-        async with httpx.AsyncClient(timeout=300.0) as client:
-            response = await client.post(
-                f"{self.base_url}/audio/transcriptions",
-                headers=headers,
-                files=files,
-                data=data,
-            )
-            response.raise_for_status()
+        client = get_http_client("groq")
+        response = await client.post(
+            f"{self.base_url}/audio/transcriptions",
+            headers=headers,
+            files=files,
+            data=data,
+        )
+        response.raise_for_status()
 
         if response_format == "text":
             result = response.text
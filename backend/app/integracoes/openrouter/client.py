@@ -7,10 +7,10 @@ Suporta: Chat, Vision, Transcription
 import base64
 from typing import Optional, Union
 
-import httpx
 import structlog
 
 from app.core.config import settings
+from app.core.http import get_http_client
 
 logger = structlog.get_logger()
 
@@ -64,14 +64,14 @@ class OpenRouterClient:
 
         logger.info("OpenRouter chat request", model=model, messages_count=len(messages))
 
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload,
-            )
-            response.raise_for_status()
-            data = response.json()
+        client = get_http_client("openrouter")
+        response = await client.post(
+            f"{self.base_url}/chat/completions",
+            headers=self.headers,
+            json=payload,
+        )
+        response.raise_for_status()
+        data = response.json()
 
         content = data["choices"][0]["message"]["content"]
         logger.info("OpenRouter chat response", model=model, tokens=data.get("usage", {}))
@@ -126,14 +126,14 @@ class OpenRouterClient:
 
         logger.info("OpenRouter vision request", model=model)
 
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            response = await client.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload,
-            )
-            response.raise_for_status()
-            data = response.json()
+        client = get_http_client("openrouter")
+        response = await client.post(
+            f"{self.base_url}/chat/completions",
+            headers=self.headers,
+            json=payload,
+        )
+        response.raise_for_status()
+        data = response.json()
 
         content = data["choices"][0]["message"]["content"]
         logger.info("OpenRouter vision response", model=model)
@@ -10,6 +10,8 @@ import structlog
 
 from app.core.config import settings
 from app.core.exceptions import IntegrationError
+from app.core.http import get_http_client
+from app.integracoes.whatsapp.templates import renderizar
 
 logger = structlog.get_logger()
 
@@ -42,19 +44,44 @@ class WhatsAppClient:
         
         return phone
 
+    async def post_text(
+        self,
+        to: str,
+        message: str,
+        delay: int = 1000,
+        instance: Optional[str] = None
+    ) -> httpx.Response:
+        """
+        POST em /message/sendText sem checar o status da resposta.
+        Usado pelo dispatcher de envios, que decide se retenta.
+        """
+        client = get_http_client("whatsapp")
+        return await client.post(
+            f"{self.base_url}/message/sendText/{instance or self.instance}",
+            headers=self.headers,
+            json={
+                "number": self._format_phone(to),
+                "text": message,
+                "delay": delay
+            },
+            timeout=30.0
+        )
+
     async def send_text(
         self,
         to: str,
         message: str,
-        delay: int = 1000
+        delay: int = 1000,
+        instance: Optional[str] = None
     ) -> dict:
         """
         Envia mensagem de texto.
         
         Args:
             to: Número do destinatário
-            to: Texto da mensagem
+            message: Texto da mensagem
             delay: Delay em ms antes de enviar (simula digitação)
+            instance: Instância da Evolution (padrão: settings.evolution_instance)
         """
         if not self.base_url:
             logger.warning("WhatsApp não configurado")
@@ -65,23 +92,12 @@ class WhatsAppClient:
         logger.info("Enviando WhatsApp", to=phone[:8] + "****", preview=message[:50])
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/message/sendText/{self.instance}",
-                    headers=self.headers,
-                    json={
-                        "number": phone,
-                        "text": message,
-                        "delay": delay
-                    },
-                    timeout=30.0
-                )
-                
-                response.raise_for_status()
-                result = response.json()
+            response = await self.post_text(phone, message, delay=delay, instance=instance)
+            response.raise_for_status()
+            result = response.json()
                 
-                logger.info("WhatsApp enviado", message_id=result.get("key", {}).get("id"))
-                return result
+            logger.info("WhatsApp enviado", message_id=result.get("key", {}).get("id"))
+            return result
 
         except httpx.HTTPError as e:
             logger.error("Erro ao enviar WhatsApp", error=str(e))
@@ -96,70 +112,13 @@ class WhatsAppClient:
         """
         Envia mensagem usando template.
         
-        Templates disponíveis:
+        Templates em app/integracoes/whatsapp/templates.py:
         - confirmacao_consulta
         - lembrete_d1
         - anamnese_link
         - pesquisa_nps
         """
-        templates = {
-            "confirmacao_consulta": (
-                "Olá {paciente_nome}! 👋\n\n"
-                "Sua consulta está agendada:\n\n"
-                "📅 *Data:* {data}\n"
-                "🕐 *Horário:* {hora}\n"
-                "👨‍⚕️ *Médico:* {medico_nome}\n\n"
-                "Por favor, confirme sua presença respondendo:\n"
-                "✅ *SIM* - Confirmo minha consulta\n"
-                "❌ *CANCELAR* - Preciso cancelar\n"
-                "🔄 *REMARCAR* - Preciso remarcar\n\n"
-                "Qualquer dúvida, estamos à disposição!"
-            ),
-            "lembrete_d1": (
-                "Olá {paciente_nome}! 👋\n\n"
-                "Lembrete: sua consulta é *amanhã*!\n\n"
-                "📅 *Data:* {data}\n"
-                "🕐 *Horário:* {hora}\n"
-                "👨‍⚕️ *Médico:* {medico_nome}\n\n"
-                "Não se esqueça de trazer seus documentos e exames.\n\n"
-                "Até amanhã! 😊"
-            ),
-            "anamnese_link": (
-                "Olá {paciente_nome}! 👋\n\n"
-                "Para agilizar seu atendimento, pedimos que preencha "
-                "um breve questionário antes da consulta:\n\n"
-                "🔗 {link}\n\n"
-                "Leva apenas alguns minutos e nos ajuda a te atender melhor!\n\n"
-                "Sua consulta: {data} às {hora}"
-            ),
-            "pesquisa_nps": (
-                "Olá {paciente_nome}! 👋\n\n"
-                "Obrigado por sua visita hoje!\n\n"
-                "Gostaríamos de saber: de 0 a 10, qual a chance de você "
-                "recomendar nossa clínica para amigos e familiares?\n\n"
-                "Responda com um número de 0 a 10.\n\n"
-                "Sua opinião é muito importante para nós! 💙"
-            ),
-            "exame_recebido": (
-                "Olá {paciente_nome}! 👋\n\n"
-                "Recebemos seu exame! ✅\n\n"
-                "Nosso médico irá analisar e você será avisado se houver alguma "
-                "orientação antes da sua consulta.\n\n"
-                "Obrigado por enviar!"
-            ),
-            "falta_registrada": (
-                "Olá {paciente_nome}.\n\n"
-                "Sentimos sua falta na consulta de hoje às {hora}.\n\n"
-                "Se precisar remarcar, entre em contato conosco.\n\n"
-                "Esperamos vê-lo em breve!"
-            ),
-        }
-
-        template = templates.get(template_name)
-        if not template:
-            raise ValueError(f"Template '{template_name}' não encontrado")
-
-        message = template.format(**variables)
+        message = renderizar(template_name, variables)
         return await self.send_text(to, message)
 
     async def send_media(
@@ -196,26 +155,26 @@ class WhatsAppClient:
         endpoint = endpoint_map.get(media_type, "sendDocument")
 
         try:
-            async with httpx.AsyncClient() as client:
-                payload = {
-                    "number": phone,
-                    "mediaUrl": media_url
-                }
+            client = get_http_client("whatsapp")
+            payload = {
+                "number": phone,
+                "mediaUrl": media_url
+            }
                 
-                if caption:
-                    payload["caption"] = caption
-                if filename:
-                    payload["fileName"] = filename
-
-                response = await client.post(
-                    f"{self.base_url}/message/{endpoint}/{self.instance}",
-                    headers=self.headers,
-                    json=payload,
-                    timeout=60.0
-                )
+            if caption:
+                payload["caption"] = caption
+            if filename:
+                payload["fileName"] = filename
+
+            response = await client.post(
+                f"{self.base_url}/message/{endpoint}/{self.instance}",
+                headers=self.headers,
+                json=payload,
+                timeout=60.0
+            )
                 
-                response.raise_for_status()
-                return response.json()
+            response.raise_for_status()
+            return response.json()
 
         except httpx.HTTPError as e:
             logger.error("Erro ao enviar mídia WhatsApp", error=str(e))
@@ -229,24 +188,24 @@ class WhatsAppClient:
         phone = self._format_phone(phone)
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/whatsappNumbers/{self.instance}",
-                    headers=self.headers,
-                    json={"numbers": [phone]},
-                    timeout=10.0
-                )
+            client = get_http_client("whatsapp")
+            response = await client.post(
+                f"{self.base_url}/chat/whatsappNumbers/{self.instance}",
+                headers=self.headers,
+                json={"numbers": [phone]},
+                timeout=10.0
+            )
                 
-                response.raise_for_status()
-                result = response.json()
+            response.raise_for_status()
+            result = response.json()
                 
-                if result and len(result) > 0:
-                    return {
-                        "exists": result[0].get("exists", False),
-                        "jid": result[0].get("jid")
-                    }
+            if result and len(result) > 0:
+                return {
+                    "exists": result[0].get("exists", False),
+                    "jid": result[0].get("jid")
+                }
                 
-                return {"exists": False}
+            return {"exists": False}
 
         except httpx.HTTPError as e:
             logger.error("Erro ao verificar número", error=str(e))
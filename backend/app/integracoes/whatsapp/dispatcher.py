@@ -0,0 +1,728 @@
+"""
+WhatsApp - Dispatcher
+Envio em lote de mensagens (lembretes, confirmações, pesquisas,
+campanhas) com controle de taxa por instância da Evolution.
+
+A API de envio grava as mensagens já renderizadas (enfileirar, um
+insert por lote) e responde. Uma task do processo, a cada INTERVALO_S:
+
+1. Conclui os resultados dos envios em uma ida ao banco
+2. Reserva mensagens vencidas (FOR UPDATE SKIP LOCKED), mantendo no
+   máximo `max_buffer` em memória
+3. Distribui por instância: cada instância tem `concorrencia` workers e
+   um token bucket (`taxa_por_s`, rajada de `rajada`)
+
+Falhas transitórias (timeout, rede, 408, 5xx) voltam com backoff
+exponencial + jitter até MAX_TENTATIVAS; outros 4xx viram 'falhou'.
+429 da Evolution pausa o bucket da instância pelo Retry-After (ou
+PAUSA_429_S) e devolve a mensagem sem contar tentativa; as outras
+instâncias seguem enviando.
+
+Entrega pelo menos uma vez: se o processo cair no meio de um envio, a
+reserva expira (RESERVA_S) e a mensagem é enviada de novo.
+
+Armazenamento, reserva e ciclo de vida vêm de app/core/fila_persistida.py
+(mesma base da outbox).
+
+Uso:
+    from app.integracoes.whatsapp.dispatcher import Envio, get_dispatcher
+
+    await get_dispatcher().enfileirar([
+        Envio(telefone=telefone, texto=texto, clinica_id=clinica_id, chave_dedupe=chave)
+    ])
+
+Demonstração com Evolution simulada (limite por instância, 429 e 5xx):
+    python -m app.integracoes.whatsapp.dispatcher
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+import structlog
+
+from app.core import fila_persistida
+from app.core.fila_persistida import ErroPermanente, calcular_backoff, conferir_armazem, loop_em_lotes
+
+logger = structlog.get_logger()
+
+
+TAXA_POR_S = 5.0
+RAJADA = 10
+CONCORRENCIA = 4
+INTERVALO_S = 0.5
+MAX_LOTE = 100
+MAX_BUFFER = 500
+MAX_TENTATIVAS = 6
+BACKOFF_BASE_S = 5.0
+BACKOFF_MAX_S = 900.0
+RESERVA_S = 300
+PAUSA_429_S = 10.0
+TIMEOUT_ENVIO_S = 35.0
+MAX_FINAIS_MEMORIA = 50_000
+
+
+class LimiteProvedor(Exception):
+    """Evolution respondeu 429: instância acima do limite do provedor."""
+
+    def __init__(self, retry_after_s: Optional[float] = None):
+        super().__init__("HTTP 429")
+        self.retry_after_s = retry_after_s
+
+
+# ==========================================
+# TOKEN BUCKET
+# ==========================================
+
+class TokenBucket:
+    """Até `taxa_por_s` envios por segundo, com rajada de até `rajada`."""
+
+    def __init__(self, taxa_por_s: float, rajada: int):
+        self.taxa_por_s = taxa_por_s
+        self.rajada = max(1, rajada)
+        self._tokens = float(self.rajada)
+        self._atualizado = time.monotonic()
+        self._pausado_ate = 0.0
+
+    def _repor(self, agora: float) -> None:
+        self._tokens = min(self.rajada, self._tokens + (agora - self._atualizado) * self.taxa_por_s)
+        self._atualizado = agora
+
+    async def adquirir(self) -> None:
+        """Espera um token (ou o fim da pausa) e consome."""
+        while True:
+            agora = time.monotonic()
+            if agora < self._pausado_ate:
+                await asyncio.sleep(self._pausado_ate - agora)
+                continue
+            self._repor(agora)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.taxa_por_s)
+
+    def pausar(self, segundos: float) -> None:
+        """Zera os tokens e só volta a liberar depois de `segundos`."""
+        self._pausado_ate = max(self._pausado_ate, time.monotonic() + segundos)
+        self._tokens = 0.0
+        self._atualizado = self._pausado_ate
+
+    @property
+    def pausado(self) -> bool:
+        return time.monotonic() < self._pausado_ate
+
+    @property
+    def tokens(self) -> float:
+        if self.pausado:
+            return 0.0
+        self._repor(time.monotonic())
+        return round(self._tokens, 1)
+
+
+# ==========================================
+# ENVIO
+# ==========================================
+
+@dataclass
+class Envio:
+    """Mensagem já renderizada, pronta para enviar."""
+    telefone: str
+    texto: str
+    instancia: Optional[str] = None
+    clinica_id: Optional[str] = None
+    lote_id: Optional[str] = None
+    template: Optional[str] = None
+    referencia: Optional[str] = None
+    chave_dedupe: Optional[str] = None
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    seq: int = 0
+    tentativas: int = 0
+    created_at: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "clinica_id": self.clinica_id,
+            "lote_id": self.lote_id,
+            "instancia": self.instancia,
+            "telefone": self.telefone,
+            "texto": self.texto,
+            "template": self.template,
+            "referencia": self.referencia,
+            "chave_dedupe": self.chave_dedupe,
+            "created_at": self.created_at,
+        }
+
+    @classmethod
+    def from_row(cls, row: dict) -> "Envio":
+        return cls(
+            telefone=row["telefone"],
+            texto=row["texto"],
+            instancia=row.get("instancia"),
+            clinica_id=row.get("clinica_id"),
+            lote_id=row.get("lote_id"),
+            template=row.get("template"),
+            referencia=row.get("referencia"),
+            chave_dedupe=row.get("chave_dedupe"),
+            id=row["id"],
+            seq=row.get("seq") or 0,
+            tentativas=row.get("tentativas") or 0,
+            created_at=row.get("created_at") or datetime.now(timezone.utc).isoformat(),
+        )
+
+    def idade_ms(self) -> float:
+        """Tempo desde o registro."""
+        try:
+            criado = datetime.fromisoformat(self.created_at)
+        except ValueError:
+            return 0.0
+        if criado.tzinfo is None:
+            criado = criado.replace(tzinfo=timezone.utc)
+        return (datetime.now(timezone.utc) - criado).total_seconds() * 1000
+
+
+# ==========================================
+# ARMAZENAMENTO
+# ==========================================
+
+class ArmazemBanco(fila_persistida.ArmazemBanco):
+    """Fila na tabela envios_whatsapp (migração 013)."""
+
+    def __init__(self, db):
+        super().__init__(db, "envios_whatsapp", "p_envios", Envio.from_row)
+
+    async def resumo_lote(self, clinica_id: str, lote_id: str) -> dict:
+        resumo = await self.db.rpc(
+            "resumo_lote_envios_whatsapp",
+            {"p_clinica_id": clinica_id, "p_lote_id": lote_id}
+        )
+        return resumo if isinstance(resumo, dict) else {}
+
+
+class ArmazemMemoria(fila_persistida.ArmazemMemoria):
+    """Fila sem banco; guarda os últimos concluídos para o resumo_lote."""
+
+    status_reservado = "enviando"
+
+    def __init__(self):
+        super().__init__()
+        self._finais: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _finalizado(self, envio: Envio, status: str) -> None:
+        self._finais[envio.id] = (envio.clinica_id, envio.lote_id, status)
+        while len(self._finais) > MAX_FINAIS_MEMORIA:
+            self._finais.popitem(last=False)
+
+    async def resumo_lote(self, clinica_id: str, lote_id: str) -> dict:
+        resumo: dict[str, int] = {}
+        for registro in self._itens.values():
+            envio = registro["item"]
+            if envio.lote_id == lote_id and envio.clinica_id == clinica_id:
+                resumo[registro["status"]] = resumo.get(registro["status"], 0) + 1
+        for clinica, lote, status in self._finais.values():
+            if lote == lote_id and clinica == clinica_id:
+                resumo[status] = resumo.get(status, 0) + 1
+        return resumo
+
+
+# ==========================================
+# DISPATCHER
+# ==========================================
+
+Enviar = Callable[[Envio], Awaitable[Optional[str]]]
+
+
+class DispatcherWhatsApp:
+    """
+    Fila persistida + workers por instância com token bucket.
+
+    Args:
+        enviar: corrotina que envia uma mensagem e retorna o message_id.
+            Levanta ErroPermanente (não retenta), LimiteProvedor (429)
+            ou qualquer outra exceção (retenta com backoff)
+        taxa_por_s / rajada: limite de envios de cada instância
+        concorrencia: envios simultâneos por instância
+        instancia_padrao: usada quando o envio não informa instância
+    """
+
+    def __init__(
+        self,
+        enviar: Enviar,
+        armazem=None,
+        taxa_por_s: float = TAXA_POR_S,
+        rajada: int = RAJADA,
+        concorrencia: int = CONCORRENCIA,
+        intervalo_s: float = INTERVALO_S,
+        max_lote: int = MAX_LOTE,
+        max_buffer: int = MAX_BUFFER,
+        max_tentativas: int = MAX_TENTATIVAS,
+        backoff_base_s: float = BACKOFF_BASE_S,
+        backoff_max_s: float = BACKOFF_MAX_S,
+        instancia_padrao: Optional[str] = None,
+    ):
+        self.enviar = enviar
+        self.armazem = armazem or ArmazemMemoria()
+        self.taxa_por_s = taxa_por_s
+        self.rajada = rajada
+        self.concorrencia = concorrencia
+        self.intervalo_s = intervalo_s
+        self.max_lote = max_lote
+        self.max_buffer = max_buffer
+        self.max_tentativas = max_tentativas
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.instancia_padrao = instancia_padrao
+        self._filas: dict[str, asyncio.Queue] = {}
+        self._buckets: dict[str, TokenBucket] = {}
+        self._workers: list[asyncio.Task] = []
+        self._resultados: list[dict] = []
+        self._em_buffer = 0
+        self._acordar = asyncio.Event()
+        self._tarefa: Optional[asyncio.Task] = None
+        self._metricas = {
+            "enfileirados": 0, "duplicados": 0, "enviados": 0, "retentativas": 0,
+            "limitados_429": 0, "falhas": 0, "lotes": 0, "erros_armazem": 0,
+        }
+        self._enviados_por_instancia: dict[str, int] = {}
+        self._atrasos_ms: deque = deque(maxlen=1000)
+
+    # ==========================================
+    # ENFILEIRAR (caminho da requisição)
+    # ==========================================
+
+    async def enfileirar(self, envios: list[Envio]) -> list[str]:
+        """Grava o lote em um insert. Retorna os ids aceitos (sem os duplicados)."""
+        if not envios:
+            return []
+        for envio in envios:
+            envio.instancia = envio.instancia or self.instancia_padrao
+
+        inseridos = await self.armazem.gravar(envios)
+        self._metricas["enfileirados"] += len(inseridos)
+        self._metricas["duplicados"] += len(envios) - len(inseridos)
+        if inseridos:
+            self._acordar.set()
+        return inseridos
+
+    async def resumo_lote(self, clinica_id: str, lote_id: str) -> dict:
+        """Total de mensagens do lote por status."""
+        return await self.armazem.resumo_lote(clinica_id, lote_id)
+
+    # ==========================================
+    # CICLO DE VIDA
+    # ==========================================
+
+    @property
+    def ativo(self) -> bool:
+        return self._tarefa is not None and not self._tarefa.done()
+
+    async def iniciar(self) -> None:
+        """Confere as RPCs (memória só se não existirem) e sobe o dispatcher."""
+        if self.ativo:
+            return
+        self.armazem = await conferir_armazem(self.armazem, ArmazemMemoria, "Envios WhatsApp")
+        self._tarefa = asyncio.create_task(loop_em_lotes(
+            self._acordar, self.intervalo_s, self.processar, self.max_lote, "Envios WhatsApp"
+        ))
+
+    async def encerrar(self, timeout_s: float = 5.0) -> None:
+        """
+        Para de reservar, devolve o que ainda não saiu do buffer, espera os
+        envios em andamento (até timeout_s) e grava os resultados.
+        """
+        if self._tarefa:
+            self._tarefa.cancel()
+            try:
+                await self._tarefa
+            except asyncio.CancelledError:
+                pass
+            self._tarefa = None
+
+        for fila in self._filas.values():
+            while not fila.empty():
+                self._devolver(fila.get_nowait())
+
+        limite = time.monotonic() + timeout_s
+        while self._em_buffer and time.monotonic() < limite:
+            await asyncio.sleep(0.05)
+
+        for tarefa in self._workers:
+            tarefa.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._filas.clear()
+        self._em_buffer = 0
+        await self._concluir_resultados()
+
+    # ==========================================
+    # DESPACHO
+    # ==========================================
+
+    async def processar(self) -> int:
+        """Um ciclo: conclui resultados e reserva até encher o buffer. Retorna quantos reservou."""
+        await self._concluir_resultados()
+
+        vagas = min(self.max_lote, self.max_buffer - self._em_buffer)
+        if vagas <= 0:
+            return 0
+        try:
+            envios = await self.armazem.reservar(vagas, RESERVA_S)
+        except Exception as e:
+            self._metricas["erros_armazem"] += 1
+            logger.warning("Envios WhatsApp: erro ao reservar lote", error=str(e))
+            return 0
+
+        for envio in envios:
+            self._fila_da_instancia(envio.instancia or "padrao").put_nowait(envio)
+            self._em_buffer += 1
+        if envios:
+            self._metricas["lotes"] += 1
+        return len(envios)
+
+    def _fila_da_instancia(self, instancia: str) -> asyncio.Queue:
+        fila = self._filas.get(instancia)
+        if fila is None:
+            fila = self._filas[instancia] = asyncio.Queue()
+            self._buckets.setdefault(instancia, TokenBucket(self.taxa_por_s, self.rajada))
+            self._workers.extend(
+                asyncio.create_task(self._worker(instancia, fila)) for _ in range(self.concorrencia)
+            )
+        return fila
+
+    async def _worker(self, instancia: str, fila: asyncio.Queue) -> None:
+        bucket = self._buckets[instancia]
+        while True:
+            envio = await fila.get()
+            try:
+                await bucket.adquirir()
+            except asyncio.CancelledError:
+                # Ainda não saiu: volta para a fila do banco
+                self._devolver(envio)
+                self._em_buffer -= 1
+                raise
+            try:
+                resultado = await self._enviar(envio, instancia, bucket)
+            finally:
+                self._em_buffer -= 1
+            self._resultados.append(resultado)
+            if len(self._resultados) >= self.max_lote:
+                self._acordar.set()
+
+    def _devolver(self, envio: Envio) -> None:
+        self._resultados.append({"id": envio.id, "status": "pendente", "tentou": False})
+
+    async def _enviar(self, envio: Envio, instancia: str, bucket: TokenBucket) -> dict:
+        tentativa = envio.tentativas + 1
+        try:
+            message_id = await asyncio.wait_for(self.enviar(envio), TIMEOUT_ENVIO_S)
+        except ErroPermanente as e:
+            self._metricas["falhas"] += 1
+            logger.warning("Envio WhatsApp recusado", instancia=instancia, error=str(e))
+            return {"id": envio.id, "status": "falhou", "tentou": True, "erro": str(e)[:500]}
+        except LimiteProvedor as e:
+            # Limite da instância: pausa o bucket e devolve sem contar tentativa
+            pausa = e.retry_after_s or PAUSA_429_S
+            bucket.pausar(pausa)
+            self._metricas["limitados_429"] += 1
+            logger.warning("Evolution limitou a instância", instancia=instancia, pausa_s=pausa)
+            proximo = datetime.now(timezone.utc) + timedelta(seconds=pausa)
+            return {
+                "id": envio.id, "status": "pendente", "tentou": False,
+                "erro": str(e), "proximo_envio_em": proximo.isoformat()
+            }
+        except Exception as e:
+            erro = str(e) or type(e).__name__
+            if tentativa >= self.max_tentativas:
+                self._metricas["falhas"] += 1
+                logger.error("Envio WhatsApp desistido", instancia=instancia, tentativas=tentativa, error=erro)
+                return {"id": envio.id, "status": "falhou", "tentou": True, "erro": erro[:500]}
+            self._metricas["retentativas"] += 1
+            espera = calcular_backoff(tentativa, self.backoff_base_s, self.backoff_max_s)
+            proximo = datetime.now(timezone.utc) + timedelta(seconds=espera)
+            return {
+                "id": envio.id, "status": "pendente", "tentou": True,
+                "erro": erro[:500], "proximo_envio_em": proximo.isoformat()
+            }
+
+        self._metricas["enviados"] += 1
+        self._enviados_por_instancia[instancia] = self._enviados_por_instancia.get(instancia, 0) + 1
+        self._atrasos_ms.append(envio.idade_ms())
+        return {"id": envio.id, "status": "enviado", "tentou": True, "message_id": message_id}
+
+    async def _concluir_resultados(self) -> None:
+        if not self._resultados:
+            return
+        resultados = self._resultados
+        self._resultados = []
+        try:
+            await self.armazem.concluir(resultados)
+        except Exception as e:
+            # Mantém para o próximo ciclo: perder o 'enviado' faria a reserva
+            # expirar e a mensagem sair de novo
+            self._resultados = resultados + self._resultados
+            self._metricas["erros_armazem"] += 1
+            logger.warning("Envios WhatsApp: erro ao concluir lote", error=str(e), envios=len(resultados))
+
+    def get_metricas(self) -> dict:
+        """Contadores, buffer e tokens por instância, atraso registro → envio."""
+        atrasos = sorted(self._atrasos_ms)
+        return {
+            **self._metricas,
+            "modo": self.armazem.modo,
+            "ativo": self.ativo,
+            "em_buffer": self._em_buffer,
+            "resultados_a_gravar": len(self._resultados),
+            "taxa_por_s": self.taxa_por_s,
+            "concorrencia": self.concorrencia,
+            "instancias": {
+                instancia: {
+                    "na_fila": self._filas[instancia].qsize() if instancia in self._filas else 0,
+                    "tokens": bucket.tokens,
+                    "pausado": bucket.pausado,
+                    "enviados": self._enviados_por_instancia.get(instancia, 0),
+                }
+                for instancia, bucket in self._buckets.items()
+            },
+            "atraso_p50_ms": round(atrasos[len(atrasos) // 2], 1) if atrasos else 0.0,
+            "atraso_p95_ms": round(atrasos[int(0.95 * (len(atrasos) - 1))], 1) if atrasos else 0.0,
+        }
+
+
+# ==========================================
+# ENVIO PELA EVOLUTION API
+# ==========================================
+
+def criar_enviador_evolution(client=None) -> Enviar:
+    """Envia pelo WhatsAppClient e classifica a resposta da Evolution."""
+    if client is None:
+        from app.integracoes.whatsapp.client import whatsapp_client as client
+
+    async def enviar(envio: Envio) -> Optional[str]:
+        response = await client.post_text(envio.telefone, envio.texto, instance=envio.instancia)
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.headers.get("Retry-After", ""))
+            except ValueError:
+                retry_after = None
+            raise LimiteProvedor(retry_after)
+        if response.status_code == 408 or response.status_code >= 500:
+            raise RuntimeError(f"Evolution: HTTP {response.status_code}")
+        if response.status_code >= 400:
+            raise ErroPermanente(f"Evolution: HTTP {response.status_code}")
+        try:
+            return (response.json().get("key") or {}).get("id")
+        except ValueError:
+            return None
+
+    return enviar
+
+
+# ==========================================
+# INSTÂNCIA DA APLICAÇÃO
+# ==========================================
+
+_dispatcher: Optional[DispatcherWhatsApp] = None
+
+
+def get_dispatcher() -> DispatcherWhatsApp:
+    """Dispatcher da aplicação (envia após iniciar_dispatcher_whatsapp)."""
+    global _dispatcher
+    if _dispatcher is None:
+        from app.core.config import settings
+
+        _dispatcher = DispatcherWhatsApp(
+            criar_enviador_evolution(),
+            taxa_por_s=settings.whatsapp_envios_por_s,
+            rajada=settings.whatsapp_envios_rajada,
+            concorrencia=settings.whatsapp_envios_concorrencia,
+            instancia_padrao=settings.evolution_instance,
+        )
+    return _dispatcher
+
+
+async def iniciar_dispatcher_whatsapp(db, settings=None) -> DispatcherWhatsApp:
+    """Liga a fila ao banco e sobe o dispatcher (se a Evolution estiver configurada)."""
+    dispatcher = get_dispatcher()
+    dispatcher.armazem = ArmazemBanco(db)
+
+    if not getattr(settings, "evolution_api_url", None):
+        # Mensagens continuam sendo aceitas e ficam pendentes no banco
+        logger.info("Envios WhatsApp: Evolution não configurada - dispatcher parado")
+        return dispatcher
+
+    await dispatcher.iniciar()
+    return dispatcher
+
+
+async def encerrar_dispatcher_whatsapp() -> None:
+    """Para o dispatcher e grava os resultados (shutdown, antes de fechar os clientes HTTP)."""
+    if _dispatcher is not None:
+        await _dispatcher.encerrar()
+
+
+# ==========================================
+# DEMONSTRAÇÃO (Evolution simulada)
+# ==========================================
+
+class _StubEvolution:
+    """
+    Servidor HTTP local no formato do /message/sendText da Evolution.
+    Responde 429 acima de `limite_por_s` por instância (janela de 1s)
+    e 503 em uma fração `erros` das chamadas.
+    """
+
+    def __init__(self, limite_por_s: int, erros: float = 0.02, latencia_ms: float = 20.0, semente: int = 7):
+        import random
+
+        self.limite_por_s = limite_por_s
+        self.erros = erros
+        self.latencia_s = latencia_ms / 1000
+        self._aleatorio = random.Random(semente)
+        self._janelas: dict[str, deque] = {}
+        self.recebidos: list[str] = []
+        self.respostas: dict[int, int] = {}
+        self.pico_por_s: dict[str, int] = {}
+        self._servidor = None
+        self.url = ""
+
+    async def iniciar(self) -> str:
+        self._servidor = await asyncio.start_server(self._atender, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self._servidor.sockets[0].getsockname()[1]}"
+        return self.url
+
+    async def encerrar(self) -> None:
+        if self._servidor:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+
+    def _status(self, instancia: str) -> int:
+        agora = time.monotonic()
+        janela = self._janelas.setdefault(instancia, deque())
+        while janela and agora - janela[0] > 1.0:
+            janela.popleft()
+        if len(janela) >= self.limite_por_s:
+            return 429
+        janela.append(agora)
+        self.pico_por_s[instancia] = max(self.pico_por_s.get(instancia, 0), len(janela))
+        return 503 if self._aleatorio.random() < self.erros else 200
+
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        import json
+
+        try:
+            while True:
+                cabecalho = (await reader.readuntil(b"\r\n\r\n")).decode()
+                linhas = cabecalho.split("\r\n")
+                headers = {k.lower(): v.strip() for k, _, v in (l.partition(":") for l in linhas[1:] if l)}
+                tamanho = int(headers.get("content-length", 0))
+                corpo = json.loads(await reader.readexactly(tamanho)) if tamanho else {}
+                instancia = linhas[0].split()[1].rsplit("/", 1)[-1]
+
+                await asyncio.sleep(self.latencia_s)
+                status = self._status(instancia)
+                self.respostas[status] = self.respostas.get(status, 0) + 1
+                resposta = b""
+                extra = ""
+                if status == 200:
+                    self.recebidos.append(corpo.get("text", ""))
+                    resposta = json.dumps({"key": {"id": uuid.uuid4().hex[:16]}}).encode()
+                elif status == 429:
+                    extra = "Retry-After: 1\r\n"
+
+                writer.write(
+                    f"HTTP/1.1 {status} X\r\nContent-Type: application/json\r\n{extra}"
+                    f"Content-Length: {len(resposta)}\r\n\r\n".encode() + resposta
+                )
+                await writer.drain()
+        except (asyncio.CancelledError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _demonstrar(
+    mensagens_por_instancia: int = 600,
+    instancias: int = 3,
+    taxa_por_s: float = 100.0,
+    limite_provedor_por_s: int = 120,
+) -> dict:
+    """Lote grande em várias instâncias; confere envio único, taxa e retentativas."""
+    from app.core.http import fechar_http_clients
+    from app.integracoes.whatsapp.client import WhatsAppClient
+
+    stub = _StubEvolution(limite_provedor_por_s)
+    url = await stub.iniciar()
+    client = WhatsAppClient()
+    client.base_url = url
+    client.api_key = "demo"
+
+    dispatcher = DispatcherWhatsApp(
+        criar_enviador_evolution(client),
+        taxa_por_s=taxa_por_s,
+        rajada=int(taxa_por_s // 5),
+        concorrencia=8,
+        intervalo_s=0.05,
+        backoff_base_s=0.05,
+        backoff_max_s=0.5,
+    )
+
+    envios = [
+        Envio(
+            telefone=f"119{i:08d}",
+            texto=f"lembrete:{n}:{i}",
+            instancia=f"clinica-{n}",
+            chave_dedupe=f"lembrete:{n}:{i}",
+        )
+        for i in range(mensagens_por_instancia)
+        for n in range(instancias)
+    ]
+    total = len(envios)
+
+    inicio = time.perf_counter()
+    aceitos = await dispatcher.enfileirar(envios)
+    # Reexecução do workflow: tudo duplicado
+    reenvio = await dispatcher.enfileirar([
+        Envio(telefone=e.telefone, texto=e.texto, instancia=e.instancia, chave_dedupe=e.chave_dedupe)
+        for e in envios[:200]
+    ])
+    await dispatcher.iniciar()
+    while len(set(stub.recebidos)) < total and time.perf_counter() - inicio < 60:
+        await asyncio.sleep(0.05)
+    duracao_s = time.perf_counter() - inicio
+    await asyncio.sleep(0.3)  # dá tempo de aparecer envio duplicado, se houver
+    await dispatcher.encerrar()
+    await stub.encerrar()
+    await fechar_http_clients()
+
+    return {
+        "mensagens": total,
+        "aceitas": len(aceitos),
+        "duplicadas_na_entrada": 200 - len(reenvio),
+        "entregues": len(set(stub.recebidos)),
+        "entregas_duplicadas": len(stub.recebidos) - len(set(stub.recebidos)),
+        "respostas_evolution": stub.respostas,
+        "pico_por_s_por_instancia": stub.pico_por_s,
+        "duracao_s": round(duracao_s, 2),
+        "mensagens_por_s": round(total / duracao_s, 1) if duracao_s else 0.0,
+        "metricas": dispatcher.get_metricas(),
+    }
+
+
+if __name__ == "__main__":
+    import json
+
+    resultado = asyncio.run(_demonstrar())
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    ok = (
+        resultado["entregues"] == resultado["mensagens"]
+        and resultado["entregas_duplicadas"] == 0
+        and resultado["duplicadas_na_entrada"] == 200
+        # Bucket abaixo do limite do provedor: 429 só na rajada inicial
+        and resultado["respostas_evolution"].get(429, 0) < 0.05 * resultado["mensagens"]
+    )
+    raise SystemExit(0 if ok else 1)
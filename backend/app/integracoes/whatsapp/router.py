@@ -0,0 +1,89 @@
+"""
+WhatsApp - Router
+Envio de mensagens em lote (lembretes, confirmações, pesquisas, campanhas).
+
+O lote é gravado na fila de envios e a resposta sai na hora; o
+dispatcher envia em background respeitando o limite de cada instância.
+
+/whatsapp/internal/envios é o mesmo envio para os workflows do Kestra:
+autenticado pelo API_INTERNAL_TOKEN, com a clínica em cada mensagem.
+"""
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, status
+
+from app.core.security import CurrentUser, require_internal_token, require_permission
+from app.integracoes.whatsapp.schemas import (
+    EnvioLoteInternoRequest,
+    EnvioLoteRequest,
+    EnvioLoteResponse,
+    EnvioLoteStatus,
+)
+from app.integracoes.whatsapp.service import envio_whatsapp_service
+
+router = APIRouter(prefix="/whatsapp", tags=["WhatsApp"])
+
+
+@router.post(
+    "/envios",
+    response_model=EnvioLoteResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Enviar mensagens em lote"
+)
+async def enviar_lote(
+    data: EnvioLoteRequest,
+    current_user: CurrentUser = Depends(require_permission("agenda", "C"))
+):
+    """
+    Registra até 5000 mensagens (texto pronto ou template + variáveis).
+
+    - Itens com template/variáveis inválidos voltam em `recusados`
+    - `chave_dedupe` repetida (ex.: lembrete_d1:<agendamento_id>) não é enviada de novo
+    """
+    return await envio_whatsapp_service.enviar_lote(data, current_user)
+
+
+@router.post(
+    "/internal/envios",
+    response_model=EnvioLoteResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    include_in_schema=False
+)
+async def internal_enviar_lote(
+    data: EnvioLoteInternoRequest,
+    _: None = Depends(require_internal_token)
+):
+    """
+    Endpoint interno para workflows enviarem em lote.
+
+    Cada mensagem informa `clinica_id` e sai pela instância da clínica;
+    `chave_dedupe` vale por clínica, como no envio autenticado.
+    """
+    return await envio_whatsapp_service.enviar_lote_interno(data)
+
+
+@router.get(
+    "/envios/status",
+    summary="Status do dispatcher de envios"
+)
+async def status_dispatcher(
+    current_user: CurrentUser = Depends(require_permission("agenda", "L"))
+):
+    """
+    Fila, tokens e enviados da instância da clínica do usuário.
+    Admin vê o dispatcher inteiro (todas as instâncias).
+    """
+    return await envio_whatsapp_service.status_dispatcher(current_user)
+
+
+@router.get(
+    "/envios/{lote_id}",
+    response_model=EnvioLoteStatus,
+    summary="Andamento do lote"
+)
+async def status_lote(
+    lote_id: str,
+    current_user: CurrentUser = Depends(require_permission("agenda", "L"))
+):
+    """Total de mensagens do lote por status (pendente, enviando, enviado, falhou)."""
+    return await envio_whatsapp_service.status_lote(lote_id, current_user)
@@ -0,0 +1,62 @@
+"""
+WhatsApp - Schemas
+DTOs do envio de mensagens em lote.
+"""
+
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+
+MAX_MENSAGENS_LOTE = 5000
+
+
+class EnvioItem(BaseModel):
+    """Uma mensagem do lote: texto pronto ou variáveis do template."""
+    telefone: str = Field(..., min_length=8, max_length=20)
+    texto: Optional[str] = Field(default=None, max_length=4096)
+    template: Optional[str] = Field(default=None, description="Sobrepõe o template do lote")
+    variaveis: dict = Field(default_factory=dict)
+    referencia: Optional[str] = Field(default=None, max_length=150, description="Ex.: agendamento:<id>")
+    chave_dedupe: Optional[str] = Field(
+        default=None, max_length=150,
+        description="Mesma chave na mesma clínica não é enviada duas vezes"
+    )
+
+
+class EnvioLoteRequest(BaseModel):
+    """Lote de mensagens (lembretes, confirmações, campanhas)."""
+    template: Optional[str] = None
+    mensagens: list[EnvioItem] = Field(..., min_length=1, max_length=MAX_MENSAGENS_LOTE)
+
+
+class EnvioItemInterno(EnvioItem):
+    """Item de lote de workflow: cada mensagem informa a clínica."""
+    clinica_id: str
+
+
+class EnvioLoteInternoRequest(BaseModel):
+    """Lote de workflow (Kestra) com mensagens de várias clínicas."""
+    template: Optional[str] = None
+    mensagens: list[EnvioItemInterno] = Field(..., min_length=1, max_length=MAX_MENSAGENS_LOTE)
+
+
+class EnvioRecusado(BaseModel):
+    """Item recusado na entrada (template ou variáveis inválidos)."""
+    indice: int
+    erro: str
+
+
+class EnvioLoteResponse(BaseModel):
+    """Resultado do registro do lote (o envio segue em background)."""
+    lote_id: str
+    aceitos: int
+    duplicados: int
+    recusados: list[EnvioRecusado] = []
+
+
+class EnvioLoteStatus(BaseModel):
+    """Andamento do lote por status."""
+    lote_id: str
+    total: int
+    por_status: dict[str, int]
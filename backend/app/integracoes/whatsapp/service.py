@@ -0,0 +1,141 @@
+"""
+WhatsApp - Service
+Envio de mensagens em lote pelo dispatcher (app/integracoes/whatsapp/dispatcher.py).
+
+Os templates são renderizados na entrada: itens com template ou
+variáveis inválidos voltam como recusados e o resto do lote segue.
+O dispatcher só envia texto pronto.
+
+Lotes de workflow (enviar_lote_interno) trazem a clínica em cada item:
+cada mensagem sai pela instância da sua clínica.
+"""
+from __future__ import annotations
+
+import uuid
+from typing import Callable, Optional, Union
+
+import structlog
+
+from app.core.exceptions import ValidationError
+from app.core.security import CurrentUser
+from app.integracoes.whatsapp.dispatcher import Envio, get_dispatcher
+from app.integracoes.whatsapp.schemas import (
+    EnvioItem,
+    EnvioLoteInternoRequest,
+    EnvioLoteRequest,
+    EnvioLoteResponse,
+    EnvioLoteStatus,
+    EnvioRecusado,
+)
+from app.integracoes.whatsapp.templates import renderizar
+from app.webhooks.roteamento import instancia_da_clinica
+
+logger = structlog.get_logger()
+
+
+class EnvioWhatsAppService:
+    """Service para envio de mensagens WhatsApp em lote."""
+
+    async def enviar_lote(self, data: EnvioLoteRequest, current_user: CurrentUser) -> EnvioLoteResponse:
+        """Renderiza, valida e grava o lote; sai sempre pela instância da clínica do usuário."""
+        return await self._registrar_lote(data, lambda item: current_user.clinica_id)
+
+    async def enviar_lote_interno(self, data: EnvioLoteInternoRequest) -> EnvioLoteResponse:
+        """Lote de workflow: clínica por item, instância resolvida por clínica."""
+        return await self._registrar_lote(data, lambda item: item.clinica_id)
+
+    async def _registrar_lote(
+        self,
+        data: Union[EnvioLoteRequest, EnvioLoteInternoRequest],
+        clinica_do_item: Callable[[EnvioItem], str]
+    ) -> EnvioLoteResponse:
+        """Renderiza, valida e grava; a instância é resolvida uma vez por clínica."""
+        lote_id = str(uuid.uuid4())
+        instancias: dict[str, Optional[str]] = {}
+
+        envios = []
+        recusados = []
+        for indice, item in enumerate(data.mensagens):
+            clinica_id = clinica_do_item(item)
+            try:
+                uuid.UUID(str(clinica_id))
+            except ValueError:
+                recusados.append(EnvioRecusado(indice=indice, erro="clinica_id inválido"))
+                continue
+            if clinica_id not in instancias:
+                instancias[clinica_id] = await instancia_da_clinica(clinica_id)
+
+            template = item.template or data.template
+            try:
+                if item.texto:
+                    texto = item.texto
+                elif template:
+                    texto = renderizar(template, item.variaveis)
+                else:
+                    raise ValueError("Informe texto ou template")
+            except ValueError as e:
+                recusados.append(EnvioRecusado(indice=indice, erro=str(e)))
+                continue
+
+            envios.append(Envio(
+                telefone=item.telefone,
+                texto=texto,
+                instancia=instancias[clinica_id],
+                clinica_id=clinica_id,
+                lote_id=lote_id,
+                template=None if item.texto else template,
+                referencia=item.referencia,
+                # Chave por clínica: clínicas diferentes não colidem
+                chave_dedupe=f"{clinica_id}:{item.chave_dedupe}" if item.chave_dedupe else None,
+            ))
+
+        aceitos = await get_dispatcher().enfileirar(envios)
+
+        logger.info(
+            "Lote WhatsApp registrado",
+            lote_id=lote_id,
+            clinicas=len(instancias),
+            aceitos=len(aceitos),
+            duplicados=len(envios) - len(aceitos),
+            recusados=len(recusados)
+        )
+        return EnvioLoteResponse(
+            lote_id=lote_id,
+            aceitos=len(aceitos),
+            duplicados=len(envios) - len(aceitos),
+            recusados=recusados
+        )
+
+    async def status_dispatcher(self, current_user: CurrentUser) -> dict:
+        """Métricas do dispatcher; fora do admin, só a instância da própria clínica."""
+        metricas = get_dispatcher().get_metricas()
+        if current_user.tipo == "admin":
+            return metricas
+
+        instancia = await instancia_da_clinica(current_user.clinica_id)
+        return {
+            "modo": metricas["modo"],
+            "ativo": metricas["ativo"],
+            "taxa_por_s": metricas["taxa_por_s"],
+            "concorrencia": metricas["concorrencia"],
+            "instancia": instancia,
+            **metricas["instancias"].get(instancia, {"na_fila": 0, "tokens": None, "pausado": False, "enviados": 0}),
+        }
+
+    async def status_lote(self, lote_id: str, current_user: CurrentUser) -> EnvioLoteStatus:
+        """Andamento do lote (só da clínica do usuário)."""
+        try:
+            uuid.UUID(lote_id)
+        except ValueError:
+            raise ValidationError("lote_id inválido")
+
+        por_status = await get_dispatcher().resumo_lote(current_user.clinica_id, lote_id)
+        return EnvioLoteStatus(
+            lote_id=lote_id,
+            total=sum(por_status.values()),
+            por_status=por_status
+        )
+
+
+# Singleton
+envio_whatsapp_service = EnvioWhatsAppService()
@@ -0,0 +1,123 @@
+"""
+WhatsApp Templates
+Textos das mensagens enviadas aos pacientes.
+
+Cada template é analisado uma vez no import (variáveis que usa), então
+renderizar() valida as variáveis antes de formatar: o envio em lote
+recusa o item na entrada, em vez de falhar no meio do disparo.
+
+Valores de `data` em ISO (AAAA-MM-DD) saem como "Segunda, 20/out",
+o formato que os workflows do Kestra montavam item a item.
+"""
+
+import string
+from datetime import date, datetime
+from typing import Optional
+
+
+TEMPLATES = {
+    "confirmacao_consulta": (
+        "Olá {paciente_nome}! 👋\n\n"
+        "Sua consulta está agendada:\n\n"
+        "📅 *Data:* {data}\n"
+        "🕐 *Horário:* {hora}\n"
+        "👨‍⚕️ *Médico:* {medico_nome}\n\n"
+        "Por favor, confirme sua presença respondendo:\n"
+        "✅ *SIM* - Confirmo minha consulta\n"
+        "❌ *CANCELAR* - Preciso cancelar\n"
+        "🔄 *REMARCAR* - Preciso remarcar\n\n"
+        "Qualquer dúvida, estamos à disposição!"
+    ),
+    "lembrete_d1": (
+        "Olá {paciente_nome}! 👋\n\n"
+        "Lembrete: sua consulta é *amanhã*!\n\n"
+        "📅 *Data:* {data}\n"
+        "🕐 *Horário:* {hora}\n"
+        "👨‍⚕️ *Médico:* {medico_nome}\n\n"
+        "Não se esqueça de trazer seus documentos e exames.\n\n"
+        "Até amanhã! 😊"
+    ),
+    # Texto do workflow 02-lembrete-d1 (pede confirmação)
+    "lembrete_d1_confirmar": (
+        "Olá, {paciente_nome}! 🔔\n\n"
+        "Lembramos que você tem consulta *amanhã*:\n\n"
+        "📅 {data}\n"
+        "⏰ {hora}\n"
+        "👨‍⚕️ {medico_nome}\n\n"
+        "Confirme sua presença respondendo *SIM*.\n\n"
+        "Caso precise remarcar, responda *REMARCAR*."
+    ),
+    "anamnese_link": (
+        "Olá {paciente_nome}! 👋\n\n"
+        "Para agilizar seu atendimento, pedimos que preencha "
+        "um breve questionário antes da consulta:\n\n"
+        "🔗 {link}\n\n"
+        "Leva apenas alguns minutos e nos ajuda a te atender melhor!\n\n"
+        "Sua consulta: {data} às {hora}"
+    ),
+    "pesquisa_nps": (
+        "Olá {paciente_nome}! 👋\n\n"
+        "Obrigado por sua visita hoje!\n\n"
+        "Gostaríamos de saber: de 0 a 10, qual a chance de você "
+        "recomendar nossa clínica para amigos e familiares?\n\n"
+        "Responda com um número de 0 a 10.\n\n"
+        "Sua opinião é muito importante para nós! 💙"
+    ),
+    "exame_recebido": (
+        "Olá {paciente_nome}! 👋\n\n"
+        "Recebemos seu exame! ✅\n\n"
+        "Nosso médico irá analisar e você será avisado se houver alguma "
+        "orientação antes da sua consulta.\n\n"
+        "Obrigado por enviar!"
+    ),
+    "falta_registrada": (
+        "Olá {paciente_nome}.\n\n"
+        "Sentimos sua falta na consulta de hoje às {hora}.\n\n"
+        "Se precisar remarcar, entre em contato conosco.\n\n"
+        "Esperamos vê-lo em breve!"
+    ),
+}
+
+# Variáveis usadas por template (calculado uma vez)
+VARIAVEIS: dict[str, frozenset] = {
+    nome: frozenset(campo for _, campo, _, _ in string.Formatter().parse(texto) if campo)
+    for nome, texto in TEMPLATES.items()
+}
+
+_DIAS = ["Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado", "Domingo"]
+_MESES = ["", "jan", "fev", "mar", "abr", "mai", "jun", "jul", "ago", "set", "out", "nov", "dez"]
+
+
+def formatar_data(valor) -> str:
+    """AAAA-MM-DD (ou date) → "Segunda, 20/out"; outros valores passam como estão."""
+    if isinstance(valor, datetime):
+        valor = valor.date()
+    if isinstance(valor, str):
+        try:
+            valor = date.fromisoformat(valor[:10])
+        except ValueError:
+            return valor
+    if isinstance(valor, date):
+        return f"{_DIAS[valor.weekday()]}, {valor.day}/{_MESES[valor.month]}"
+    return str(valor)
+
+
+def renderizar(template_name: str, variables: Optional[dict] = None) -> str:
+    """
+    Texto final do template.
+
+    Raises:
+        ValueError: template inexistente ou variável faltando
+    """
+    template = TEMPLATES.get(template_name)
+    if template is None:
+        raise ValueError(f"Template '{template_name}' não encontrado")
+
+    variables = variables or {}
+    faltando = VARIAVEIS[template_name] - variables.keys()
+    if faltando:
+        raise ValueError(f"Template '{template_name}' sem variáveis: {', '.join(sorted(faltando))}")
+
+    if "data" in variables:
+        variables = {**variables, "data": formatar_data(variables["data"])}
+    return template.format(**variables)
@@ -8,13 +8,18 @@ LÓGICA PRINCIPAL:
 - Quando TODOS os itens obrigatórios de uma fase são completados,
   o card move automaticamente para a próxima fase
 - A nova fase recebe seu próprio checklist zerado
+- Quais movimentos são permitidos vem da tabela compartilhada com
+  cards e agenda (app/cards/transicoes.py); aqui ficam só os itens
+  do checklist do Kanban (chaves usadas pelos workflows)
 """
 from __future__ import annotations
 
+import copy
 from datetime import datetime
 from typing import Optional
 from enum import IntEnum
 
+from app.cards.transicoes import TabelaTransicoes, get_tabela_transicoes
 from app.core.database import get_authenticated_db
 from app.core.security import CurrentUser
 from app.core.exceptions import NotFoundError, ValidationError
@@ -94,6 +99,32 @@ SUBFASES_POR_FASE = {
 }
 
 
+def _compilar_checklist(config: dict) -> dict:
+    """Monta checklist zerado de uma fase a partir da configuração."""
+    checklist = {}
+    for obrigatorio, itens in ((True, config["obrigatorios"]), (False, config["opcionais"])):
+        for item in itens:
+            checklist[item["key"]] = {
+                "label": item["label"],
+                "obrigatorio": obrigatorio,
+                "auto": item.get("auto", False),
+                "concluido": False,
+                "concluido_em": None,
+                "concluido_por": None
+            }
+    return checklist
+
+
+# Regras compiladas uma vez no import (não reconstrói a cada chamada)
+CHECKLIST_VAZIO_POR_FASE = {
+    fase: _compilar_checklist(config) for fase, config in CHECKLIST_POR_FASE.items()
+}
+OBRIGATORIOS_POR_FASE = {
+    fase: tuple(item["key"] for item in config["obrigatorios"])
+    for fase, config in CHECKLIST_POR_FASE.items()
+}
+
+
 class KanbanService:
     """Serviço de gerenciamento de Kanban com automação."""
 
@@ -229,7 +260,8 @@ class KanbanService:
         }
         
         # Verifica se deve mover de fase
-        proxima_fase = self._verificar_transicao_fase(fase_atual, checklist)
+        tabela = await get_tabela_transicoes(db, current_user.clinica_id)
+        proxima_fase = self._verificar_transicao_fase(fase_atual, checklist, tabela)
         
         if proxima_fase is not None:
             update_data["fase"] = proxima_fase
@@ -272,7 +304,9 @@ class KanbanService:
     ) -> dict:
         """
         Move card para outra fase manualmente.
-        Usado quando o usuário quer forçar uma transição.
+        Mesmas regras de CardService (TRANSICOES_PERMITIDAS): avança uma
+        fase por vez, com os obrigatórios da fase atual concluídos; volta
+        uma fase ou para a 0 (reativação).
         """
         db = get_authenticated_db(current_user.access_token)
         
@@ -283,6 +317,16 @@ class KanbanService:
         if fase not in [f.value for f in FaseKanban]:
             raise ValidationError(f"Fase inválida: {fase}")
         
+        # Valida transição na tabela compartilhada
+        tabela = await get_tabela_transicoes(db, current_user.clinica_id)
+        erro = tabela.validar(
+            fase_anterior,
+            fase,
+            self._pendentes_obrigatorios(FaseKanban(fase_anterior), card.get("checklist") or {})
+        )
+        if erro:
+            raise ValidationError(erro)
+        
         # Valida subfase
         subfases_validas = SUBFASES_POR_FASE.get(FaseKanban(fase), [])
         if subfase and subfase not in subfases_validas:
@@ -416,46 +460,12 @@ class KanbanService:
 
     def _criar_checklist_fase(self, fase: FaseKanban) -> dict:
         """Cria checklist zerado para uma fase."""
-        config = CHECKLIST_POR_FASE.get(fase, {"obrigatorios": [], "opcionais": []})
-        
-        checklist = {}
-        
-        for item in config["obrigatorios"]:
-            checklist[item["key"]] = {
-                "label": item["label"],
-                "obrigatorio": True,
-                "auto": item.get("auto", False),
-                "concluido": False,
-                "concluido_em": None,
-                "concluido_por": None
-            }
-        
-        for item in config["opcionais"]:
-            checklist[item["key"]] = {
-                "label": item["label"],
-                "obrigatorio": False,
-                "auto": item.get("auto", False),
-                "concluido": False,
-                "concluido_em": None,
-                "concluido_por": None
-            }
-        
-        return checklist
+        return copy.deepcopy(CHECKLIST_VAZIO_POR_FASE.get(fase, {}))
 
-    def _verificar_transicao_fase(
-        self,
-        fase_atual: FaseKanban,
-        checklist: dict
-    ) -> Optional[int]:
-        """
-        Verifica se todos os itens obrigatórios estão completos.
-        Se sim, retorna a próxima fase.
-        """
-        config = CHECKLIST_POR_FASE.get(fase_atual, {"obrigatorios": []})
-        
-        # Verifica se todos os obrigatórios estão concluídos
-        for item in config["obrigatorios"]:
-            item_key = item["key"]
+    def _pendentes_obrigatorios(self, fase: FaseKanban, checklist: dict) -> int:
+        """Quantidade de itens obrigatórios da fase ainda não concluídos."""
+        pendentes = 0
+        for item_key in OBRIGATORIOS_POR_FASE.get(fase, ()):
             item_data = checklist.get(item_key, {})
             
             if isinstance(item_data, dict):
@@ -464,15 +474,25 @@ class KanbanService:
                 concluido = bool(item_data)
             
             if not concluido:
-                return None  # Ainda tem pendência
-        
-        # Todos concluídos - retorna próxima fase
+                pendentes += 1
+        return pendentes
+
+    def _verificar_transicao_fase(
+        self,
+        fase_atual: FaseKanban,
+        checklist: dict,
+        tabela: TabelaTransicoes
+    ) -> Optional[int]:
+        """
+        Verifica se todos os itens obrigatórios estão completos.
+        Se sim, retorna a próxima fase (se a tabela permitir o movimento).
+        """
         proxima = fase_atual.value + 1
+        if proxima > FaseKanban.FINALIZADO.value:
+            return None
         
-        if proxima <= FaseKanban.FINALIZADO.value:
-            return proxima
-        
-        return None
+        erro = tabela.validar(fase_atual.value, proxima, self._pendentes_obrigatorios(fase_atual, checklist))
+        return None if erro else proxima
 
     def _get_nome_fase(self, fase: FaseKanban) -> str:
         """Retorna nome amigável da fase."""
@@ -16,6 +16,9 @@ import structlog
 
 from app.core.config import settings
 from app.core.exceptions import AppException
+from app.core.database import get_admin_db
+from app.core.http import fechar_http_clients, get_metricas_http
+from app.core.outbox import iniciar_outbox, encerrar_outbox, get_metricas_outbox
 
 # =============================================================================
 # ROUTERS
@@ -42,16 +45,25 @@ from app.cids.router import router as cids_router
 
 # OPÇÃO 2: Chat LangGraph (stateful - RECOMENDADO para Sprint 5+)
 from app.chat_langgraph.router import router as chat_router
+from app.chat_langgraph.router import get_db as get_chat_db
+from app.chat_langgraph.llm_providers import get_llm_provider
+from app.chat_langgraph.service import iniciar_chat_service, encerrar_chat_service
 
 # Governança (se existir)
 try:
     from app.governanca.router import router as governanca_router
+    from app.governanca.service import iniciar_refresh_resumo, encerrar_refresh_resumo
     GOVERNANCA_DISPONIVEL = True
 except ImportError:
     GOVERNANCA_DISPONIVEL = False
 
 # Webhooks
-from app.webhooks.whatsapp import router as whatsapp_router
+from app.webhooks.whatsapp import router as whatsapp_router, encerrar_fila_webhook
+from app.webhooks.midia import encerrar_ingestao_midia
+
+# Envios WhatsApp em lote
+from app.integracoes.whatsapp.router import router as whatsapp_envios_router
+from app.integracoes.whatsapp.dispatcher import iniciar_dispatcher_whatsapp, encerrar_dispatcher_whatsapp
 
 logger = structlog.get_logger()
 
@@ -75,9 +87,42 @@ async def lifespan(app: FastAPI):
     llm_provider = getattr(settings, 'llm_provider', 'groq')
     logger.info(f"LLM Provider: {llm_provider}")
 
+    # Outbox: webhooks e triggers entregues fora do caminho das requisições
+    try:
+        await iniciar_outbox(get_admin_db(), settings)
+        logger.info("Outbox iniciada")
+    except Exception as e:
+        logger.error("Falha ao iniciar outbox", error=str(e))
+
+    # Envios WhatsApp: fila persistida com limite de taxa por instância
+    try:
+        await iniciar_dispatcher_whatsapp(get_admin_db(), settings)
+        logger.info("Dispatcher de envios WhatsApp iniciado")
+    except Exception as e:
+        logger.error("Falha ao iniciar dispatcher de envios WhatsApp", error=str(e))
+
+    # Governança: refresh periódico do resumo diário das métricas
+    if GOVERNANCA_DISPONIVEL:
+        iniciar_refresh_resumo(get_admin_db(), settings.governanca_refresh_resumo_s)
+
+    # Chat: grafo compilado e pool do checkpointer criados uma vez
+    try:
+        await iniciar_chat_service(get_chat_db(), get_llm_provider(), settings)
+        logger.info("Chat service iniciado")
+    except Exception as e:
+        logger.error("Falha ao iniciar chat service", error=str(e))
+
     yield
 
     # Shutdown
+    await encerrar_fila_webhook()
+    await encerrar_ingestao_midia()
+    await encerrar_chat_service()
+    await encerrar_outbox()
+    await encerrar_dispatcher_whatsapp()
+    if GOVERNANCA_DISPONIVEL:
+        await encerrar_refresh_resumo()
+    await fechar_http_clients()
     logger.info("Encerrando aplicação")
 
 
@@ -169,6 +214,18 @@ async def health_check():
     }
 
 
+@app.get("/health/http", tags=["Health"])
+async def health_http():
+    """Latência das chamadas externas (LLM, WhatsApp, etc) por host."""
+    return {"hosts": get_metricas_http()}
+
+
+@app.get("/health/outbox", tags=["Health"])
+async def health_outbox():
+    """Eventos registrados, entregues, em retentativa e atraso da outbox."""
+    return get_metricas_outbox()
+
+
 # =============================================================================
 # REGISTRA ROUTERS
 # =============================================================================
@@ -197,6 +254,9 @@ if GOVERNANCA_DISPONIVEL:
 # Webhooks
 app.include_router(whatsapp_router, prefix="/v1")
 
+# Envios WhatsApp em lote
+app.include_router(whatsapp_envios_router, prefix="/v1")
+
 
 # =============================================================================
 # ROOT
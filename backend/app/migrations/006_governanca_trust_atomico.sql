@@ -0,0 +1,76 @@
+-- ============================================
+-- MIGRAÇÃO: Trust Score Atômico + Contexto de Governança
+-- ============================================
+-- Substitui o read-modify-write de trust_scores por um
+-- upsert atômico e agrega em uma única chamada tudo que
+-- os triggers de governança precisam.
+-- ============================================
+
+-- ============================================
+-- FUNÇÃO: Atualizar trust score (atômico)
+-- ============================================
+-- Validações concorrentes não perdem atualizações:
+-- o incremento é aplicado na própria linha (ON CONFLICT).
+-- use_column: as colunas de retorno (chave, valor, total) têm o
+-- nome das colunas da tabela; sem isso o ON CONFLICT é ambíguo.
+
+CREATE OR REPLACE FUNCTION atualizar_trust_score(
+    p_clinica_id UUID,
+    p_chave VARCHAR,
+    p_ajuste NUMERIC
+)
+RETURNS TABLE (
+    chave VARCHAR,
+    valor NUMERIC,
+    total INTEGER
+) AS $$
+#variable_conflict use_column
+BEGIN
+    RETURN QUERY
+    INSERT INTO trust_scores AS t (clinica_id, chave, valor, total, ultima_atualizacao)
+    VALUES (
+        p_clinica_id,
+        p_chave,
+        LEAST(100, GREATEST(0, 50 + p_ajuste)),
+        1,
+        NOW()
+    )
+    ON CONFLICT (clinica_id, chave) DO UPDATE SET
+        valor = LEAST(100, GREATEST(0, t.valor + p_ajuste)),
+        total = t.total + 1,
+        ultima_atualizacao = NOW()
+    RETURNING t.chave, t.valor::NUMERIC, t.total;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION atualizar_trust_score IS 'Incrementa trust score de forma atômica (upsert) e retorna o novo valor';
+
+-- ============================================
+-- FUNÇÃO: Contexto de governança
+-- ============================================
+-- Uma única query com data de início da clínica e todos os
+-- trust scores, usada pelos triggers para decidir validação.
+
+CREATE OR REPLACE FUNCTION get_contexto_governanca(p_clinica_id UUID)
+RETURNS TABLE (
+    data_inicio_sistema TIMESTAMP WITH TIME ZONE,
+    trust_scores JSONB
+) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        c.data_inicio_sistema,
+        COALESCE(
+            (
+                SELECT jsonb_object_agg(t.chave, t.valor)
+                FROM trust_scores t
+                WHERE t.clinica_id = c.id
+            ),
+            '{}'::JSONB
+        )
+    FROM clinicas c
+    WHERE c.id = p_clinica_id;
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+COMMENT ON FUNCTION get_contexto_governanca IS 'Retorna data de implantação e trust scores da clínica em uma chamada';
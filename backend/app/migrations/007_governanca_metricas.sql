@@ -0,0 +1,138 @@
+-- ============================================
+-- MIGRAÇÃO: Métricas Agregadas de Governança
+-- ============================================
+-- Dashboard e fila de pendentes passam a ler contagens
+-- agregadas no banco em vez de carregar todo o histórico
+-- de validações para contar em Python.
+-- ============================================
+
+-- ============================================
+-- RESUMO DIÁRIO (materializado)
+-- ============================================
+-- Uma linha por clínica / dia / trigger.
+-- Atualizado por refresh_governanca_resumo(), chamado pela
+-- API a cada GOVERNANCA_REFRESH_RESUMO_S (padrão 15 min,
+-- app/governanca/service.py). O dia corrente não depende do
+-- refresh: get_metricas_governanca conta hoje direto na tabela.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_governanca_resumo_diario AS
+SELECT
+    clinica_id,
+    DATE(created_at) AS dia,
+    trigger_type,
+    COUNT(*) AS total,
+    COUNT(*) FILTER (WHERE status = 'pendente') AS pendentes,
+    COUNT(*) FILTER (WHERE status = 'aprovado') AS aprovadas,
+    COUNT(*) FILTER (WHERE status = 'corrigido') AS corrigidas,
+    COUNT(*) FILTER (WHERE status = 'rejeitado') AS rejeitadas
+FROM validacoes_governanca
+GROUP BY clinica_id, DATE(created_at), trigger_type;
+
+-- Índice único exigido pelo REFRESH CONCURRENTLY
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_governanca_resumo
+    ON mv_governanca_resumo_diario(clinica_id, dia, trigger_type);
+
+-- Com vários processos da API, só um refresh roda por vez
+-- (os demais saem sem esperar o lock).
+CREATE OR REPLACE FUNCTION refresh_governanca_resumo()
+RETURNS VOID AS $$
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('mv_governanca_resumo_diario')) THEN
+        RETURN;
+    END IF;
+    REFRESH MATERIALIZED VIEW CONCURRENTLY mv_governanca_resumo_diario;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Contagem ao vivo do dia corrente
+CREATE INDEX IF NOT EXISTS idx_validacoes_clinica_created
+    ON validacoes_governanca(clinica_id, created_at);
+
+-- ============================================
+-- FUNÇÃO: Métricas por janela de tempo
+-- ============================================
+
+CREATE OR REPLACE FUNCTION get_metricas_governanca(
+    p_clinica_id UUID,
+    p_janelas INTEGER[] DEFAULT ARRAY[7, 30, 90]
+)
+RETURNS TABLE (
+    janela_dias INTEGER,
+    trigger_type VARCHAR,
+    total BIGINT,
+    aprovadas BIGINT,
+    corrigidas BIGINT,
+    rejeitadas BIGINT
+) AS $$
+    WITH diario AS (
+        -- Dias anteriores: resumo materializado
+        SELECT r.dia, r.trigger_type, r.total, r.aprovadas, r.corrigidas, r.rejeitadas
+        FROM mv_governanca_resumo_diario r
+        WHERE r.clinica_id = p_clinica_id
+        AND r.dia < CURRENT_DATE
+        UNION ALL
+        -- Hoje: ao vivo (o resumo só muda no refresh)
+        SELECT
+            CURRENT_DATE,
+            v.trigger_type,
+            COUNT(*),
+            COUNT(*) FILTER (WHERE v.status = 'aprovado'),
+            COUNT(*) FILTER (WHERE v.status = 'corrigido'),
+            COUNT(*) FILTER (WHERE v.status = 'rejeitado')
+        FROM validacoes_governanca v
+        WHERE v.clinica_id = p_clinica_id
+        AND v.created_at >= CURRENT_DATE
+        GROUP BY v.trigger_type
+    )
+    SELECT
+        j.dias,
+        d.trigger_type,
+        SUM(d.total)::BIGINT,
+        SUM(d.aprovadas)::BIGINT,
+        SUM(d.corrigidas)::BIGINT,
+        SUM(d.rejeitadas)::BIGINT
+    FROM unnest(p_janelas) AS j(dias)
+    JOIN diario d ON d.dia >= CURRENT_DATE - j.dias
+    GROUP BY j.dias, d.trigger_type;
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION get_metricas_governanca IS 'Contagens de validações por status e trigger nas janelas informadas (resumo materializado + dia corrente ao vivo)';
+
+-- ============================================
+-- FILA DE PENDENTES (tempo real)
+-- ============================================
+
+CREATE INDEX IF NOT EXISTS idx_validacoes_pendentes
+    ON validacoes_governanca(clinica_id, trigger_type)
+    WHERE status = 'pendente';
+
+CREATE OR REPLACE FUNCTION get_resumo_pendentes(p_clinica_id UUID)
+RETURNS TABLE (
+    trigger_type VARCHAR,
+    total BIGINT,
+    com_problemas BIGINT
+) AS $$
+    SELECT
+        v.trigger_type,
+        COUNT(*),
+        COUNT(*) FILTER (
+            WHERE CASE
+                WHEN jsonb_typeof(v.dados -> 'problemas') = 'array'
+                THEN jsonb_array_length(v.dados -> 'problemas') > 0
+                ELSE FALSE
+            END
+        )
+    FROM validacoes_governanca v
+    WHERE v.clinica_id = p_clinica_id
+    AND v.status = 'pendente'
+    GROUP BY v.trigger_type;
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION get_resumo_pendentes IS 'Contagem de validações pendentes por trigger, incluindo as com problemas';
+
+-- ============================================
+-- VERIFICAÇÕES (taxa de validação)
+-- ============================================
+
+CREATE INDEX IF NOT EXISTS idx_verificacoes_clinica_created
+    ON verificacoes_log(clinica_id, created_at, status);
@@ -0,0 +1,37 @@
+-- ============================================
+-- MIGRAÇÃO: Uso de Tokens por Conversa
+-- ============================================
+-- Totais de tokens (prompt/completion) e custo estimado
+-- do agente por conversa. A escrita atrasada do chat junta
+-- os turnos de cada conversa e soma tudo numa chamada a
+-- registrar_uso_tokens_conversa() (incremento atômico, sem
+-- ler-modificar-escrever no Python); p_turnos diz quantos
+-- turnos a chamada representa.
+-- ============================================
+
+ALTER TABLE conversas
+    ADD COLUMN IF NOT EXISTS tokens_prompt BIGINT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS tokens_completion BIGINT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS custo_estimado NUMERIC(12, 6) NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS turnos_llm INTEGER NOT NULL DEFAULT 0;
+
+-- Versão anterior, sem p_turnos (evita sobrecarga ambígua no PostgREST)
+DROP FUNCTION IF EXISTS registrar_uso_tokens_conversa(UUID, BIGINT, BIGINT, NUMERIC);
+
+CREATE OR REPLACE FUNCTION registrar_uso_tokens_conversa(
+    p_conversa_id UUID,
+    p_tokens_prompt BIGINT,
+    p_tokens_completion BIGINT,
+    p_custo NUMERIC,
+    p_turnos INTEGER DEFAULT 1
+)
+RETURNS VOID AS $$
+BEGIN
+    UPDATE conversas
+    SET tokens_prompt = tokens_prompt + COALESCE(p_tokens_prompt, 0),
+        tokens_completion = tokens_completion + COALESCE(p_tokens_completion, 0),
+        custo_estimado = custo_estimado + COALESCE(p_custo, 0),
+        turnos_llm = turnos_llm + COALESCE(p_turnos, 1)
+    WHERE id = p_conversa_id;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,21 @@
+-- ============================================
+-- MIGRAÇÃO: Busca/Criação Atômica de Conversa
+-- ============================================
+-- O chat buscava a conversa ativa (SELECT) e, se não achasse,
+-- inseria (INSERT): duas idas ao banco por mensagem e corrida
+-- entre mensagens simultâneas do mesmo telefone.
+-- obter_ou_criar_conversa() faz o upsert em um único comando,
+-- usando a constraint uk_conversa_telefone_clinica.
+-- ============================================
+
+CREATE OR REPLACE FUNCTION obter_ou_criar_conversa(
+    p_clinica_id UUID,
+    p_telefone VARCHAR
+)
+RETURNS SETOF conversas AS $$
+    INSERT INTO conversas (clinica_id, telefone, ativa)
+    VALUES (p_clinica_id, p_telefone, true)
+    ON CONFLICT (telefone, clinica_id)
+    DO UPDATE SET ativa = true
+    RETURNING *;
+$$ LANGUAGE sql;
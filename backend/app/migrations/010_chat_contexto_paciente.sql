@@ -0,0 +1,65 @@
+-- ============================================
+-- MIGRAÇÃO: Contexto do Paciente para o Chat
+-- ============================================
+-- verificar_cliente fazia até 4 consultas em sequência
+-- (paciente por celular, por whatsapp, card ativo e
+-- agendamento) e agendar_consulta ainda buscava o médico
+-- da clínica. contexto_paciente() devolve tudo em uma ida
+-- ao banco: paciente, card ativo, próximo agendamento e
+-- médico padrão da clínica (este mesmo sem paciente).
+-- ============================================
+
+CREATE OR REPLACE FUNCTION contexto_paciente(
+    p_clinica_id UUID,
+    p_telefone VARCHAR
+)
+RETURNS JSONB AS $$
+    WITH paciente AS (
+        SELECT p.*
+        FROM pacientes p
+        WHERE p.clinica_id = p_clinica_id
+          AND (p.celular = p_telefone OR p.whatsapp = p_telefone)
+        ORDER BY (p.celular = p_telefone) DESC NULLS LAST
+        LIMIT 1
+    ),
+    card AS (
+        SELECT c.*
+        FROM cards c
+        JOIN paciente p ON p.id = c.paciente_id
+        WHERE c.clinica_id = p_clinica_id
+          AND c.status = 'ativo'
+        ORDER BY c.created_at DESC
+        LIMIT 1
+    ),
+    agendamento AS (
+        SELECT to_jsonb(a) || jsonb_strip_nulls(jsonb_build_object('medico_nome', u.nome)) AS dados
+        FROM agendamentos a
+        JOIN paciente p ON p.id = a.paciente_id
+        LEFT JOIN usuarios u ON u.id = a.medico_id
+        WHERE a.clinica_id = p_clinica_id
+          AND a.status = 'agendado'
+        ORDER BY a.data
+        LIMIT 1
+    ),
+    medico AS (
+        SELECT u.id, u.nome
+        FROM usuarios u
+        WHERE u.clinica_id = p_clinica_id
+          AND u.ativo
+          AND (u.tipo = 'medico' OR u.crm IS NOT NULL)
+        ORDER BY (u.tipo = 'medico') DESC NULLS LAST
+        LIMIT 1
+    )
+    SELECT jsonb_build_object(
+        'paciente', (SELECT to_jsonb(p) FROM paciente p),
+        'card', (SELECT to_jsonb(c) FROM card c),
+        'agendamento', (SELECT dados FROM agendamento),
+        'medico_padrao', (SELECT to_jsonb(m) FROM medico m)
+    );
+$$ LANGUAGE sql STABLE;
+
+-- Índices usados pela função
+CREATE INDEX IF NOT EXISTS idx_pacientes_clinica_celular ON pacientes(clinica_id, celular);
+CREATE INDEX IF NOT EXISTS idx_pacientes_clinica_whatsapp ON pacientes(clinica_id, whatsapp);
+CREATE INDEX IF NOT EXISTS idx_cards_paciente_ativo ON cards(paciente_id, created_at DESC) WHERE status = 'ativo';
+CREATE INDEX IF NOT EXISTS idx_agendamentos_paciente_agendado ON agendamentos(paciente_id, data) WHERE status = 'agendado';
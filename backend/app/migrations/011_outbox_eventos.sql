@@ -0,0 +1,171 @@
+-- ============================================
+-- MIGRAÇÃO: Outbox de Eventos
+-- ============================================
+-- Webhooks do Kestra eram chamados dentro do turno do chat,
+-- antes de a resposta voltar: Kestra lento atrasava o
+-- paciente e falhas se perdiam. Agora o caminho da requisição
+-- só registra o evento e o dispatcher do processo (app/core/
+-- outbox.py) entrega em lote, com retentativa e backoff.
+--
+-- - chave_dedupe: o mesmo evento registrado duas vezes vira
+--   uma linha só (ON CONFLICT DO NOTHING)
+-- - chave_ordem: eventos da mesma chave (ex.: agendamento)
+--   são entregues na ordem em que foram registrados
+-- - reservado_ate: reserva expira se o processo cair no meio
+--   da entrega (o evento volta a ficar disponível)
+-- - retenção: enviados/desistidos são apagados depois de N dias
+--   (purgar_eventos_outbox, chamada pelo dispatcher); a chave_dedupe
+--   só protege contra repetição dentro dessa janela
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS outbox_eventos (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    seq BIGSERIAL,
+    clinica_id UUID,
+    destino VARCHAR(30) NOT NULL,          -- kestra | governanca
+    tipo VARCHAR(100) NOT NULL,            -- workflow do Kestra, trigger da governança...
+    payload JSONB NOT NULL DEFAULT '{}',
+    chave_dedupe VARCHAR(200),
+    chave_ordem VARCHAR(200),
+    status VARCHAR(20) NOT NULL DEFAULT 'pendente',  -- pendente | processando | enviado | falhou
+    tentativas INT NOT NULL DEFAULT 0,
+    ultimo_erro TEXT,
+    proximo_envio_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+    reservado_ate TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    enviado_em TIMESTAMPTZ
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_chave_dedupe ON outbox_eventos(chave_dedupe);
+CREATE INDEX IF NOT EXISTS idx_outbox_disponiveis ON outbox_eventos(seq)
+    WHERE status IN ('pendente', 'processando');
+CREATE INDEX IF NOT EXISTS idx_outbox_chave_ordem ON outbox_eventos(chave_ordem, seq)
+    WHERE status IN ('pendente', 'processando');
+CREATE INDEX IF NOT EXISTS idx_outbox_concluidos ON outbox_eventos(created_at)
+    WHERE status IN ('enviado', 'falhou');
+
+-- Só o backend (service_role) lê e escreve a outbox
+ALTER TABLE outbox_eventos ENABLE ROW LEVEL SECURITY;
+
+-- ============================================
+-- REGISTRAR: lote de eventos em um insert
+-- ============================================
+-- Devolve só os ids inseridos (duplicados ficam de fora).
+
+CREATE OR REPLACE FUNCTION registrar_eventos_outbox(p_eventos JSONB)
+RETURNS TABLE(id UUID) AS $$
+    INSERT INTO outbox_eventos AS o (
+        id, clinica_id, destino, tipo, payload, chave_dedupe, chave_ordem, created_at
+    )
+    SELECT
+        (t.e->>'id')::UUID,
+        (t.e->>'clinica_id')::UUID,
+        t.e->>'destino',
+        t.e->>'tipo',
+        COALESCE(t.e->'payload', '{}'::JSONB),
+        t.e->>'chave_dedupe',
+        t.e->>'chave_ordem',
+        COALESCE((t.e->>'created_at')::TIMESTAMPTZ, now())
+    FROM jsonb_array_elements(p_eventos) WITH ORDINALITY AS t(e, n)
+    ORDER BY t.n
+    ON CONFLICT (chave_dedupe) DO NOTHING
+    RETURNING o.id;
+$$ LANGUAGE sql;
+
+-- ============================================
+-- RESERVAR: próximo lote a entregar
+-- ============================================
+-- Disponível = pendente e vencido, ou reserva expirada.
+-- Um evento só entra se nenhum anterior da mesma chave_ordem
+-- estiver esperando backoff ou reservado por outro processo.
+-- p_destinos: só reserva eventos dos destinos que o processo
+-- sabe entregar (NULL = todos).
+
+-- Versão anterior, sem p_destinos (evita sobrecarga ambígua no PostgREST)
+DROP FUNCTION IF EXISTS reservar_eventos_outbox(INT, INT);
+
+CREATE OR REPLACE FUNCTION reservar_eventos_outbox(
+    p_limite INT DEFAULT 50,
+    p_reserva_s INT DEFAULT 60,
+    p_destinos TEXT[] DEFAULT NULL
+)
+RETURNS SETOF outbox_eventos AS $$
+    UPDATE outbox_eventos e
+    SET status = 'processando',
+        reservado_ate = now() + make_interval(secs => p_reserva_s)
+    WHERE e.id IN (
+        SELECT c.id
+        FROM outbox_eventos c
+        WHERE ((c.status = 'pendente' AND c.proximo_envio_em <= now())
+               OR (c.status = 'processando' AND c.reservado_ate < now()))
+          AND (p_destinos IS NULL OR c.destino = ANY(p_destinos))
+          AND NOT EXISTS (
+              SELECT 1
+              FROM outbox_eventos a
+              WHERE a.chave_ordem = c.chave_ordem
+                AND a.seq < c.seq
+                AND ((a.status = 'pendente' AND a.proximo_envio_em > now())
+                     OR (a.status = 'processando' AND a.reservado_ate >= now()))
+          )
+        ORDER BY c.seq
+        LIMIT p_limite
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING e.*;
+$$ LANGUAGE sql;
+
+-- ============================================
+-- CONCLUIR: resultado do lote em uma ida
+-- ============================================
+-- p_resultados: [{id, status, tentou, erro, proximo_envio_em}]
+-- status = enviado | pendente (volta com backoff) | falhou
+
+CREATE OR REPLACE FUNCTION concluir_eventos_outbox(p_resultados JSONB)
+RETURNS INT AS $$
+    WITH r AS (
+        SELECT *
+        FROM jsonb_to_recordset(p_resultados) AS x(
+            id UUID, status VARCHAR, tentou BOOLEAN, erro TEXT, proximo_envio_em TIMESTAMPTZ
+        )
+    ),
+    atualizados AS (
+        UPDATE outbox_eventos e
+        SET status = r.status,
+            tentativas = e.tentativas + CASE WHEN r.tentou THEN 1 ELSE 0 END,
+            ultimo_erro = COALESCE(r.erro, e.ultimo_erro),
+            proximo_envio_em = COALESCE(r.proximo_envio_em, e.proximo_envio_em),
+            reservado_ate = NULL,
+            enviado_em = CASE WHEN r.status = 'enviado' THEN now() ELSE e.enviado_em END
+        FROM r
+        WHERE e.id = r.id
+          AND e.status = 'processando'
+        RETURNING 1
+    )
+    SELECT count(*)::INT FROM atualizados;
+$$ LANGUAGE sql;
+
+-- ============================================
+-- PURGAR: retenção dos eventos concluídos
+-- ============================================
+-- Apaga até p_limite eventos enviados/desistidos com mais de
+-- p_dias (pelo created_at). Retorna quantos saíram; o dispatcher
+-- repete enquanto vier o lote cheio.
+
+CREATE OR REPLACE FUNCTION purgar_eventos_outbox(
+    p_dias INT DEFAULT 7,
+    p_limite INT DEFAULT 5000
+)
+RETURNS INT AS $$
+    WITH apagados AS (
+        DELETE FROM outbox_eventos
+        WHERE id IN (
+            SELECT id
+            FROM outbox_eventos
+            WHERE status IN ('enviado', 'falhou')
+              AND created_at < now() - make_interval(days => p_dias)
+            LIMIT p_limite
+        )
+        RETURNING 1
+    )
+    SELECT count(*)::INT FROM apagados;
+$$ LANGUAGE sql;
@@ -0,0 +1,73 @@
+-- ============================================
+-- MIGRAÇÃO: Roteamento de Mensagens do WhatsApp
+-- ============================================
+-- O webhook buscava o telefone em pacientes de todas as
+-- clínicas (só na coluna telefone) e ficava com o primeiro.
+-- Agora cada instância da Evolution pertence a uma clínica
+-- (clinicas.whatsapp_instancia) e o paciente é buscado só
+-- nela, pelo telefone normalizado em telefone, celular ou
+-- whatsapp, em uma consulta indexada.
+-- ============================================
+
+ALTER TABLE clinicas ADD COLUMN IF NOT EXISTS whatsapp_instancia VARCHAR(100);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_clinicas_whatsapp_instancia
+    ON clinicas(whatsapp_instancia) WHERE whatsapp_instancia IS NOT NULL;
+
+-- ============================================
+-- NORMALIZAR TELEFONE
+-- ============================================
+-- Só dígitos, sem o 55 do Brasil ("+55 (11) 98765-4321" →
+-- "11987654321"). Mesma regra de normalizar_telefone() em
+-- app/webhooks/roteamento.py.
+
+CREATE OR REPLACE FUNCTION normalizar_telefone(p_telefone TEXT)
+RETURNS TEXT AS $$
+    SELECT NULLIF(
+        regexp_replace(
+            regexp_replace(COALESCE(p_telefone, ''), '\D', '', 'g'),
+            '^55(\d{10,11})$', '\1'
+        ),
+        ''
+    );
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE INDEX IF NOT EXISTS idx_pacientes_clinica_telefone_norm
+    ON pacientes(clinica_id, normalizar_telefone(telefone));
+CREATE INDEX IF NOT EXISTS idx_pacientes_clinica_celular_norm
+    ON pacientes(clinica_id, normalizar_telefone(celular));
+CREATE INDEX IF NOT EXISTS idx_pacientes_clinica_whatsapp_norm
+    ON pacientes(clinica_id, normalizar_telefone(whatsapp));
+
+-- ============================================
+-- BUSCAR PACIENTE POR TELEFONE
+-- ============================================
+-- Um paciente da clínica com o número em qualquer das três
+-- colunas. Prefere ativo; empate: telefone > celular > whatsapp.
+
+CREATE OR REPLACE FUNCTION buscar_paciente_por_telefone(
+    p_clinica_id UUID,
+    p_telefone TEXT
+)
+RETURNS SETOF pacientes AS $$
+    SELECT p.*
+    FROM pacientes p
+    WHERE p.id = (
+        SELECT c.id
+        FROM (
+            SELECT id, ativo, 1 AS prioridade FROM pacientes
+            WHERE clinica_id = p_clinica_id
+              AND normalizar_telefone(telefone) = normalizar_telefone(p_telefone)
+            UNION ALL
+            SELECT id, ativo, 2 FROM pacientes
+            WHERE clinica_id = p_clinica_id
+              AND normalizar_telefone(celular) = normalizar_telefone(p_telefone)
+            UNION ALL
+            SELECT id, ativo, 3 FROM pacientes
+            WHERE clinica_id = p_clinica_id
+              AND normalizar_telefone(whatsapp) = normalizar_telefone(p_telefone)
+        ) c
+        ORDER BY c.ativo DESC NULLS LAST, c.prioridade
+        LIMIT 1
+    );
+$$ LANGUAGE sql STABLE;
@@ -0,0 +1,191 @@
+-- ============================================
+-- MIGRAÇÃO: Fila de Envios do WhatsApp
+-- ============================================
+-- Lembretes D-1, confirmações, pesquisas e anamneses saíam
+-- uma chamada HTTP por vez (EachSequential no Kestra,
+-- send_text no Python), sem retentativa nem controle de
+-- taxa. Agora a API de envio em lote grava as mensagens já
+-- renderizadas aqui e o dispatcher do processo (app/
+-- integracoes/whatsapp/dispatcher.py) envia respeitando o
+-- limite de cada instância da Evolution.
+--
+-- - chave_dedupe: reexecutar o workflow não manda de novo
+--   (ON CONFLICT DO NOTHING)
+-- - status: pendente | enviando | enviado | falhou
+-- - reservado_ate: reserva expira se o processo cair no meio
+--   do envio (a mensagem volta a ficar disponível)
+-- - lembretes (template lembrete*, referencia agendamento:<id>)
+--   enviados marcam agendamentos.lembrete_enviado e entram no
+--   histórico do card (cards_mensagens), como o passo
+--   "registrar" do workflow fazia
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS envios_whatsapp (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    seq BIGSERIAL,
+    clinica_id UUID REFERENCES clinicas(id),
+    lote_id UUID,
+    instancia VARCHAR(100),
+    telefone VARCHAR(20) NOT NULL,
+    texto TEXT NOT NULL,
+    template VARCHAR(50),
+    referencia VARCHAR(200),               -- ex.: agendamento:<id>
+    chave_dedupe VARCHAR(200),
+    status VARCHAR(20) NOT NULL DEFAULT 'pendente',
+    tentativas INT NOT NULL DEFAULT 0,
+    ultimo_erro TEXT,
+    message_id VARCHAR(100),               -- id devolvido pela Evolution
+    proximo_envio_em TIMESTAMPTZ NOT NULL DEFAULT now(),
+    reservado_ate TIMESTAMPTZ,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    enviado_em TIMESTAMPTZ
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_envios_whatsapp_dedupe ON envios_whatsapp(chave_dedupe);
+CREATE INDEX IF NOT EXISTS idx_envios_whatsapp_disponiveis ON envios_whatsapp(seq)
+    WHERE status IN ('pendente', 'enviando');
+CREATE INDEX IF NOT EXISTS idx_envios_whatsapp_lote ON envios_whatsapp(lote_id, status);
+
+ALTER TABLE envios_whatsapp ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "envios_whatsapp_clinica" ON envios_whatsapp;
+CREATE POLICY "envios_whatsapp_clinica" ON envios_whatsapp
+    FOR SELECT
+    USING (clinica_id = (auth.jwt() ->> 'clinica_id')::uuid);
+
+-- ============================================
+-- REGISTRAR: lote em um insert
+-- ============================================
+-- Devolve só os ids inseridos (duplicados ficam de fora).
+
+CREATE OR REPLACE FUNCTION registrar_envios_whatsapp(p_envios JSONB)
+RETURNS TABLE(id UUID) AS $$
+    INSERT INTO envios_whatsapp AS e (
+        id, clinica_id, lote_id, instancia, telefone, texto,
+        template, referencia, chave_dedupe, created_at
+    )
+    SELECT
+        (t.e->>'id')::UUID,
+        (t.e->>'clinica_id')::UUID,
+        (t.e->>'lote_id')::UUID,
+        t.e->>'instancia',
+        t.e->>'telefone',
+        t.e->>'texto',
+        t.e->>'template',
+        t.e->>'referencia',
+        t.e->>'chave_dedupe',
+        COALESCE((t.e->>'created_at')::TIMESTAMPTZ, now())
+    FROM jsonb_array_elements(p_envios) WITH ORDINALITY AS t(e, n)
+    ORDER BY t.n
+    ON CONFLICT (chave_dedupe) DO NOTHING
+    RETURNING e.id;
+$$ LANGUAGE sql;
+
+-- ============================================
+-- RESERVAR: próximo lote a enviar
+-- ============================================
+-- Disponível = pendente e vencido, ou reserva expirada.
+
+CREATE OR REPLACE FUNCTION reservar_envios_whatsapp(
+    p_limite INT DEFAULT 100,
+    p_reserva_s INT DEFAULT 300
+)
+RETURNS SETOF envios_whatsapp AS $$
+    UPDATE envios_whatsapp e
+    SET status = 'enviando',
+        reservado_ate = now() + make_interval(secs => p_reserva_s)
+    WHERE e.id IN (
+        SELECT c.id
+        FROM envios_whatsapp c
+        WHERE (c.status = 'pendente' AND c.proximo_envio_em <= now())
+           OR (c.status = 'enviando' AND c.reservado_ate < now())
+        ORDER BY c.seq
+        LIMIT p_limite
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING e.*;
+$$ LANGUAGE sql;
+
+-- ============================================
+-- CONCLUIR: resultado do lote em uma ida
+-- ============================================
+-- p_resultados: [{id, status, tentou, erro, message_id, proximo_envio_em}]
+-- status = enviado | pendente (volta com backoff) | falhou
+-- Lembretes enviados são registrados no agendamento e no card
+-- na mesma transação.
+
+CREATE OR REPLACE FUNCTION concluir_envios_whatsapp(p_resultados JSONB)
+RETURNS INT AS $$
+    WITH r AS (
+        SELECT *
+        FROM jsonb_to_recordset(p_resultados) AS x(
+            id UUID, status VARCHAR, tentou BOOLEAN, erro TEXT,
+            message_id VARCHAR, proximo_envio_em TIMESTAMPTZ
+        )
+    ),
+    atualizados AS (
+        UPDATE envios_whatsapp e
+        SET status = r.status,
+            tentativas = e.tentativas + CASE WHEN r.tentou THEN 1 ELSE 0 END,
+            ultimo_erro = COALESCE(r.erro, e.ultimo_erro),
+            message_id = COALESCE(r.message_id, e.message_id),
+            proximo_envio_em = COALESCE(r.proximo_envio_em, e.proximo_envio_em),
+            reservado_ate = NULL,
+            enviado_em = CASE WHEN r.status = 'enviado' THEN now() ELSE e.enviado_em END
+        FROM r
+        WHERE e.id = r.id
+          AND e.status = 'enviando'
+        RETURNING e.status, e.clinica_id, e.template, e.referencia, e.texto
+    ),
+    lembretes AS (
+        SELECT
+            u.clinica_id,
+            u.template,
+            u.texto,
+            -- CASE antes do cast: referência fora do padrão não derruba o lote
+            CASE WHEN u.referencia ~* '^agendamento:[0-9a-f-]{36}$'
+                 THEN substring(u.referencia FROM 13)::UUID
+            END AS agendamento_id
+        FROM atualizados u
+        WHERE u.status = 'enviado'
+          AND u.template LIKE 'lembrete%'
+    ),
+    agendamentos_marcados AS (
+        UPDATE agendamentos a
+        SET lembrete_enviado = true,
+            lembrete_enviado_em = now()
+        FROM lembretes l
+        WHERE a.id = l.agendamento_id
+          AND a.clinica_id = l.clinica_id
+        RETURNING a.id
+    ),
+    mensagens_card AS (
+        INSERT INTO cards_mensagens (
+            card_id, direcao, tipo, conteudo, template_nome, status_entrega, enviada_por_sistema
+        )
+        SELECT c.id, 'enviada', 'lembrete', l.texto, l.template, 'enviada', true
+        FROM lembretes l
+        JOIN cards c ON c.agendamento_id = l.agendamento_id AND c.clinica_id = l.clinica_id
+        RETURNING 1
+    )
+    SELECT count(*)::INT FROM atualizados;
+$$ LANGUAGE sql;
+
+-- ============================================
+-- RESUMO DO LOTE: total por status
+-- ============================================
+
+CREATE OR REPLACE FUNCTION resumo_lote_envios_whatsapp(
+    p_clinica_id UUID,
+    p_lote_id UUID
+)
+RETURNS JSONB AS $$
+    SELECT COALESCE(jsonb_object_agg(s.status, s.total), '{}'::JSONB)
+    FROM (
+        SELECT status, count(*) AS total
+        FROM envios_whatsapp
+        WHERE clinica_id = p_clinica_id
+          AND lote_id = p_lote_id
+        GROUP BY status
+    ) s;
+$$ LANGUAGE sql STABLE;
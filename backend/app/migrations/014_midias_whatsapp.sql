@@ -0,0 +1,33 @@
+-- ============================================
+-- MIGRAÇÃO: Mídias Recebidas no WhatsApp
+-- ============================================
+-- handle_media gravava a URL temporária da Evolution em
+-- arquivo_url: o link expirava e OCR/transcrição precisavam
+-- buscar a mídia de novo no WhatsApp. Agora a ingestão
+-- (app/webhooks/midia.py) copia o arquivo para o Storage em
+-- streaming, calcula o SHA-256 no caminho (mesmo hash de
+-- evidencias.arquivo_hash) e guarda cada conteúdo uma vez.
+--
+-- Uma linha por conteúdo distinto por clínica: o mesmo exame
+-- reenviado aponta para o mesmo objeto no Storage.
+-- ============================================
+
+CREATE TABLE IF NOT EXISTS midias_whatsapp (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    clinica_id UUID NOT NULL REFERENCES clinicas(id) ON DELETE CASCADE,
+    sha256 VARCHAR(64) NOT NULL,
+    storage_path TEXT NOT NULL,             -- caminho no bucket (settings.storage_bucket)
+    mime_type VARCHAR(100),
+    tamanho_bytes BIGINT,
+    message_id VARCHAR(100),                -- mensagem que trouxe o arquivo primeiro
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_midias_whatsapp_hash ON midias_whatsapp(clinica_id, sha256);
+
+ALTER TABLE midias_whatsapp ENABLE ROW LEVEL SECURITY;
+
+DROP POLICY IF EXISTS "midias_whatsapp_clinica" ON midias_whatsapp;
+CREATE POLICY "midias_whatsapp_clinica" ON midias_whatsapp
+    FOR SELECT
+    USING (clinica_id = (auth.jwt() ->> 'clinica_id')::uuid);
@@ -0,0 +1,33 @@
+"""
+Pacientes - Eventos
+Aviso de telefones de paciente criados/alterados para quem os indexa.
+
+Quem cria ou altera paciente (PacienteService, cadastrar_cliente do chat)
+não conhece os consumidores: cada um assina aqui (ex.: cache de
+telefone → paciente do webhook, app/webhooks/roteamento.py).
+"""
+from __future__ import annotations
+
+from typing import Callable, Optional
+
+import structlog
+
+logger = structlog.get_logger()
+
+_assinantes: list[Callable[..., None]] = []
+
+
+def ao_alterar_telefones(callback: Callable[..., None]) -> Callable[..., None]:
+    """Registra callback chamado com (clinica_id, *telefones) do paciente alterado."""
+    if callback not in _assinantes:
+        _assinantes.append(callback)
+    return callback
+
+
+def notificar_telefones(clinica_id: Optional[str], *telefones: Optional[str]) -> None:
+    """Avisa os assinantes; falha de um não impede os demais nem a alteração."""
+    for callback in _assinantes:
+        try:
+            callback(clinica_id, *telefones)
+        except Exception as e:
+            logger.warning("Falha ao notificar telefones do paciente", callback=getattr(callback, "__name__", "?"), error=str(e))
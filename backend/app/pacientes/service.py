@@ -17,6 +17,7 @@ from app.core.database import get_authenticated_db
 from app.core.exceptions import ConflictError, NotFoundError
 from app.core.security import CurrentUser
 from app.core.utils import calculate_age
+from app.pacientes.eventos import notificar_telefones
 from app.pacientes.schemas import (
     PacienteCreate,
     PacienteResponse,
@@ -154,6 +155,11 @@ class PacienteService:
             data=paciente_data
         )
 
+        notificar_telefones(
+            current_user.clinica_id,
+            paciente.get("telefone"), paciente.get("celular"), paciente.get("whatsapp")
+        )
+
         logger.info("Paciente criado", id=paciente["id"])
         return await self.get(paciente["id"], current_user)
 
@@ -211,6 +217,13 @@ class PacienteService:
             filters={"id": id}
         )
 
+        # Números antigos e novos: o webhook não pode rotear pelo cache velho
+        notificar_telefones(
+            current_user.clinica_id,
+            existing.get("telefone"), existing.get("celular"), existing.get("whatsapp"),
+            update_data.get("telefone"), update_data.get("celular"), update_data.get("whatsapp")
+        )
+
         logger.info("Paciente atualizado", id=id)
         return await self.get(id, current_user)
 
@@ -238,6 +251,11 @@ class PacienteService:
             filters={"id": id}
         )
 
+        notificar_telefones(
+            current_user.clinica_id,
+            existing.get("telefone"), existing.get("celular"), existing.get("whatsapp")
+        )
+
         logger.info("Paciente inativado", id=id)
 
     # ==========================================
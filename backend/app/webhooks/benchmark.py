@@ -0,0 +1,213 @@
+"""
+Webhooks - Benchmark
+Teste de carga do webhook do WhatsApp: replay de milhares de eventos.
+
+Dispara os payloads contra o endpoint real (/webhooks/whatsapp, via ASGI,
+sem rede) com N requisições simultâneas. Só o processamento do evento é
+trocado por um simulado (latência configurável), que registra a ordem em
+que cada telefone foi atendido.
+
+Relata:
+- tempo de resposta do webhook (p50/p95/máx) e vazão de aceite
+- duplicados descartados (reenvios com o mesmo message_id)
+- eventos recusados por contrapressão (fila cheia → 503)
+- violações de ordem por telefone e eventos processados em dobro
+- métricas da fila (espera até o worker, tempo de processamento)
+
+Sai com código 1 se algum evento for processado em dobro, fora de ordem,
+ou se a resposta do webhook passar de --max-p95-ms.
+
+Uso:
+    python -m app.webhooks.benchmark
+    python -m app.webhooks.benchmark --eventos 20000 --telefones 2000 --duplicados 0.3
+    python -m app.webhooks.benchmark --capacidade 200 --latencia-ms 50   # força contrapressão
+    python -m app.webhooks.benchmark --payloads eventos_gravados.jsonl
+
+Formato de --payloads (JSONL): um payload do webhook da Evolution por linha.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Optional
+
+
+def payloads_sinteticos(eventos: int, telefones: int, duplicados: float, semente: int = 42) -> list[dict]:
+    """
+    Eventos messages.upsert de `telefones` pacientes, intercalados.
+    Uma fração `duplicados` é reenviada (mesmo message_id) logo depois.
+    """
+    aleatorio = random.Random(semente)
+    sequencia: Counter = Counter()
+    payloads = []
+    reenvios = []
+    for n in range(eventos):
+        telefone = f"119{aleatorio.randrange(telefones):08d}"
+        sequencia[telefone] += 1
+        payload = {
+            "event": "messages.upsert",
+            "instance": "benchmark",
+            "data": {
+                "key": {"remoteJid": f"55{telefone}@s.whatsapp.net", "fromMe": False, "id": f"MSG{n:08d}"},
+                "message": {"conversation": f"seq:{sequencia[telefone]}"},
+                "messageTimestamp": int(time.time()),
+            },
+        }
+        payloads.append(payload)
+        if aleatorio.random() < duplicados:
+            reenvios.append((n + aleatorio.randrange(1, 500), payload))
+
+    # Reenvio da Evolution: mesmo evento, um pouco depois
+    for posicao, payload in sorted(reenvios, key=lambda r: r[0], reverse=True):
+        payloads.insert(min(posicao, len(payloads)), json.loads(json.dumps(payload)))
+    return payloads
+
+
+def carregar_payloads(caminho: str) -> list[dict]:
+    with open(caminho, encoding="utf-8") as arquivo:
+        return [json.loads(linha) for linha in arquivo if linha.strip()]
+
+
+async def executar(
+    payloads: list[dict],
+    concorrencia: int = 200,
+    workers: int = 16,
+    capacidade: int = 5000,
+    latencia_ms: float = 20.0,
+) -> dict:
+    import httpx
+    from fastapi import FastAPI
+
+    from app.webhooks import whatsapp
+    from app.webhooks.fila import ACEITO, FilaWebhook
+
+    aceitos: dict[str, list[int]] = defaultdict(list)
+    processados: dict[str, list[int]] = defaultdict(list)
+    por_message_id: Counter = Counter()
+
+    async def processar_simulado(evento: dict) -> None:
+        data = evento["data"]
+        key = data.get("key", {})
+        await asyncio.sleep(latencia_ms / 1000)
+        por_message_id[key.get("id")] += 1
+        texto = (data.get("message") or {}).get("conversation", "")
+        if texto.startswith("seq:"):
+            processados[whatsapp.extrair_telefone(key)].append(int(texto[4:]))
+
+    fila = FilaWebhook(processar_simulado, workers=workers, capacidade=capacidade)
+    whatsapp._fila_webhook = fila
+
+    # Ordem de referência: a ordem em que o webhook aceitou cada evento
+    aceitar = fila.aceitar
+
+    def aceitar_registrando(chave: str, message_id: Optional[str], evento: dict) -> str:
+        resultado = aceitar(chave, message_id, evento)
+        data = evento["data"]
+        texto = (data.get("message") or {}).get("conversation", "")
+        if resultado == ACEITO and texto.startswith("seq:"):
+            aceitos[whatsapp.extrair_telefone(data.get("key", {}))].append(int(texto[4:]))
+        return resultado
+
+    fila.aceitar = aceitar_registrando
+
+    app = FastAPI()
+    app.include_router(whatsapp.router)
+
+    tempos_ms: list[float] = []
+    respostas: Counter = Counter()
+    limite = asyncio.Semaphore(concorrencia)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://webhook") as client:
+        async def enviar(payload: dict) -> None:
+            async with limite:
+                inicio = time.perf_counter()
+                response = await client.post("/webhooks/whatsapp", json=payload)
+                tempos_ms.append((time.perf_counter() - inicio) * 1000)
+                status = response.json().get("status") if response.status_code == 200 else str(response.status_code)
+                respostas[status] += 1
+
+        inicio = time.perf_counter()
+        for i in range(0, len(payloads), concorrencia):
+            await asyncio.gather(*(enviar(p) for p in payloads[i:i + concorrencia]))
+        duracao_aceite_s = time.perf_counter() - inicio
+
+        await fila.esvaziar()
+        duracao_total_s = time.perf_counter() - inicio
+        metricas_fila = fila.get_metricas()
+        await fila.encerrar()
+
+    whatsapp._fila_webhook = None
+
+    tempos_ms.sort()
+    fora_de_ordem = sum(1 for telefone, seqs in processados.items() if seqs != aceitos[telefone])
+    em_dobro = sum(1 for total in por_message_id.values() if total > 1)
+
+    def percentil(p: float) -> float:
+        return round(tempos_ms[min(len(tempos_ms) - 1, int(round(p / 100 * (len(tempos_ms) - 1))))], 2) if tempos_ms else 0.0
+
+    return {
+        "payloads": len(payloads),
+        "respostas": dict(respostas),
+        "webhook_p50_ms": percentil(50),
+        "webhook_p95_ms": percentil(95),
+        "webhook_max_ms": round(tempos_ms[-1], 2) if tempos_ms else 0.0,
+        "aceites_por_s": round(len(payloads) / duracao_aceite_s, 1) if duracao_aceite_s else 0.0,
+        "processados": sum(por_message_id.values()),
+        "processados_em_dobro": em_dobro,
+        "telefones_fora_de_ordem": fora_de_ordem,
+        "duracao_total_s": round(duracao_total_s, 2),
+        "fila": metricas_fila,
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga do webhook WhatsApp")
+    parser.add_argument("--eventos", type=int, default=5000)
+    parser.add_argument("--telefones", type=int, default=500)
+    parser.add_argument("--duplicados", type=float, default=0.2, help="fração de eventos reenviados")
+    parser.add_argument("--payloads", help="JSONL com payloads gravados (padrão: sintéticos)")
+    parser.add_argument("--concorrencia", type=int, default=200, help="requisições simultâneas ao webhook")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--capacidade", type=int, default=5000)
+    parser.add_argument("--latencia-ms", type=float, default=20.0, help="processamento simulado por evento")
+    parser.add_argument("--max-p95-ms", type=float, default=50.0, help="p95 máximo aceito da resposta do webhook")
+    parser.add_argument("--verbose", action="store_true", help="mostra o log do webhook")
+    args = parser.parse_args(argv)
+
+    if not args.verbose:
+        import logging
+        import structlog
+        structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.ERROR))
+
+    payloads = (
+        carregar_payloads(args.payloads) if args.payloads
+        else payloads_sinteticos(args.eventos, args.telefones, args.duplicados)
+    )
+    resultado = asyncio.run(executar(
+        payloads,
+        concorrencia=args.concorrencia,
+        workers=args.workers,
+        capacidade=args.capacidade,
+        latencia_ms=args.latencia_ms,
+    ))
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+    falhas = []
+    if resultado["processados_em_dobro"]:
+        falhas.append(f"{resultado['processados_em_dobro']} eventos processados em dobro")
+    if resultado["telefones_fora_de_ordem"]:
+        falhas.append(f"{resultado['telefones_fora_de_ordem']} telefones processados fora de ordem")
+    if resultado["webhook_p95_ms"] > args.max_p95_ms:
+        falhas.append(f"p95 do webhook {resultado['webhook_p95_ms']} ms > {args.max_p95_ms} ms")
+    for falha in falhas:
+        print(f"[ERROR] {falha}")
+    return 1 if falhas else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
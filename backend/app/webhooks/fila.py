@@ -0,0 +1,205 @@
+"""
+Webhooks - Fila
+Fila de eventos do webhook do WhatsApp, processada por um pool de workers.
+
+O endpoint só valida, enfileira e responde: a Evolution API reenvia o
+evento quando a resposta demora, e processar inline (busca do paciente,
+atualizações no banco, envio de mensagens) gerava duplicados sob carga.
+
+- Dedupe por message_id: reenvios do mesmo evento são ignorados
+  (janela de DEDUPE_TTL_S, últimos MAX_DEDUPE ids)
+- Ordem por telefone: eventos do mesmo telefone são processados um de
+  cada vez, na ordem de chegada; telefones diferentes em paralelo
+- Pool limitado: no máximo `workers` eventos em processamento
+- Contrapressão: com `capacidade` eventos pendentes a fila recusa novos
+  (o endpoint devolve 503 e a Evolution tenta de novo mais tarde)
+
+A fila é em memória: eventos aceitos e ainda não processados se perdem
+se o processo cair (no shutdown, encerrar() espera a fila esvaziar).
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Optional
+
+import structlog
+
+logger = structlog.get_logger()
+
+
+WORKERS = 16
+CAPACIDADE = 5_000
+DEDUPE_TTL_S = 6 * 3600
+MAX_DEDUPE = 50_000
+AMOSTRAS = 1_000
+
+ACEITO = "enfileirado"
+DUPLICADO = "duplicado"
+CHEIA = "fila_cheia"
+
+Processar = Callable[[dict], Awaitable[None]]
+
+
+class FilaWebhook:
+    """
+    Caixa de entrada por telefone + pool de workers.
+
+    Args:
+        processar: corrotina que trata um evento (o item passado a aceitar)
+        workers: eventos processados ao mesmo tempo
+        capacidade: eventos pendentes aceitos antes de recusar
+    """
+
+    def __init__(self, processar: Processar, workers: int = WORKERS, capacidade: int = CAPACIDADE):
+        self.processar = processar
+        self.workers = workers
+        self.capacidade = capacidade
+        self._caixas: dict[str, deque] = {}
+        self._prontos: asyncio.Queue = asyncio.Queue()
+        self._em_processamento: set = set()
+        self._pendentes = 0
+        self._vistos: "OrderedDict[str, float]" = OrderedDict()
+        self._tarefas: list[asyncio.Task] = []
+        self._metricas = {
+            "recebidos": 0, "enfileirados": 0, "duplicados": 0, "recusados": 0,
+            "processados": 0, "erros": 0, "pendentes_max": 0,
+        }
+        self._esperas_ms: deque = deque(maxlen=AMOSTRAS)
+        self._duracoes_ms: deque = deque(maxlen=AMOSTRAS)
+
+    # ==========================================
+    # ENTRADA (caminho do webhook, sem I/O)
+    # ==========================================
+
+    def aceitar(self, telefone: str, message_id: Optional[str], data: dict) -> str:
+        """
+        Enfileira o evento. Retorna ACEITO, DUPLICADO ou CHEIA.
+        `telefone` é a chave de ordem (o webhook usa instância + telefone).
+        """
+        self._metricas["recebidos"] += 1
+
+        if message_id and self._ja_visto(message_id):
+            self._metricas["duplicados"] += 1
+            return DUPLICADO
+
+        if self._pendentes >= self.capacidade:
+            # Não marca como visto: o reenvio da Evolution deve ser aceito
+            self._metricas["recusados"] += 1
+            return CHEIA
+
+        if message_id:
+            self._marcar_visto(message_id)
+
+        chave = telefone or message_id or ""
+        caixa = self._caixas.get(chave)
+        if caixa is None:
+            caixa = self._caixas[chave] = deque()
+        caixa.append((time.monotonic(), data))
+        self._pendentes += 1
+        self._metricas["enfileirados"] += 1
+        self._metricas["pendentes_max"] = max(self._metricas["pendentes_max"], self._pendentes)
+
+        # Telefone entra na fila de prontos só se não estiver com um worker
+        if len(caixa) == 1 and chave not in self._em_processamento:
+            self._prontos.put_nowait(chave)
+        return ACEITO
+
+    def _ja_visto(self, message_id: str) -> bool:
+        visto_em = self._vistos.get(message_id)
+        if visto_em is None:
+            return False
+        if time.monotonic() - visto_em > DEDUPE_TTL_S:
+            del self._vistos[message_id]
+            return False
+        return True
+
+    def _marcar_visto(self, message_id: str) -> None:
+        self._vistos[message_id] = time.monotonic()
+        self._vistos.move_to_end(message_id)
+        while len(self._vistos) > MAX_DEDUPE:
+            self._vistos.popitem(last=False)
+
+    # ==========================================
+    # WORKERS
+    # ==========================================
+
+    @property
+    def ativa(self) -> bool:
+        return any(not t.done() for t in self._tarefas)
+
+    def iniciar(self) -> None:
+        if not self.ativa:
+            self._tarefas = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def encerrar(self, timeout_s: float = 10.0) -> None:
+        """Espera os pendentes (até timeout_s) e para os workers."""
+        limite = time.monotonic() + timeout_s
+        while self._pendentes and self.ativa and time.monotonic() < limite:
+            await asyncio.sleep(0.05)
+        if self._pendentes:
+            logger.warning("Fila do webhook encerrada com eventos pendentes", pendentes=self._pendentes)
+        for tarefa in self._tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas, return_exceptions=True)
+        self._tarefas = []
+
+    async def esvaziar(self) -> None:
+        """Aguarda todos os eventos aceitos serem processados."""
+        while self._pendentes:
+            await asyncio.sleep(0.01)
+
+    async def _worker(self) -> None:
+        while True:
+            chave = await self._prontos.get()
+            caixa = self._caixas.get(chave)
+            if not caixa:
+                continue
+
+            self._em_processamento.add(chave)
+            chegada, data = caixa.popleft()
+            inicio = time.monotonic()
+            self._esperas_ms.append((inicio - chegada) * 1000)
+            try:
+                await self.processar(data)
+                self._metricas["processados"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._metricas["erros"] += 1
+                logger.error("Erro ao processar evento do webhook", error=str(e))
+            finally:
+                self._duracoes_ms.append((time.monotonic() - inicio) * 1000)
+                self._pendentes -= 1
+                self._em_processamento.discard(chave)
+                # Próximo evento do mesmo telefone volta para o fim da fila de prontos
+                if caixa:
+                    self._prontos.put_nowait(chave)
+                elif self._caixas.get(chave) is caixa:
+                    del self._caixas[chave]
+
+    # ==========================================
+    # MÉTRICAS
+    # ==========================================
+
+    def get_metricas(self) -> dict:
+        """Contadores, profundidade da fila e tempos de espera/processamento."""
+
+        def percentil(amostras: deque, p: float) -> float:
+            ordenadas = sorted(amostras)
+            if not ordenadas:
+                return 0.0
+            return round(ordenadas[min(len(ordenadas) - 1, int(round(p / 100 * (len(ordenadas) - 1))))], 1)
+
+        return {
+            **self._metricas,
+            "pendentes": self._pendentes,
+            "capacidade": self.capacidade,
+            "workers": self.workers,
+            "em_processamento": len(self._em_processamento),
+            "telefones_na_fila": len(self._caixas),
+            "espera_p50_ms": percentil(self._esperas_ms, 50),
+            "espera_p95_ms": percentil(self._esperas_ms, 95),
+            "processamento_p95_ms": percentil(self._duracoes_ms, 95),
+        }
@@ -0,0 +1,860 @@
+"""
+Webhooks - Mídia
+Ingestão das mídias recebidas no WhatsApp (exames, documentos, áudios).
+
+handle_media gravava a URL temporária da Evolution no documento: o link
+expirava e OCR/transcrição precisavam buscar a mídia de novo. Agora cada
+mídia entra numa fila com pool limitado de workers, que:
+
+1. Pula o download se o hash informado pela Evolution (fileSha256, hash
+   do arquivo decifrado) já está armazenado na clínica
+2. Baixa em pedaços de CHUNK_BYTES e envia cada pedaço direto para o
+   Storage (objeto temporário), calculando o SHA-256 no caminho.
+   O arquivo nunca fica inteiro em memória. A `url` do WhatsApp aponta
+   para o arquivo cifrado (.enc): cada pedaço é decifrado com a mediaKey
+   da mensagem (DecifradorMidia) antes do hash e do upload. Com o S3 da
+   Evolution ligado, o mediaUrl da mensagem já é o arquivo decifrado
+3. Recusa acima de `max_bytes` (pelo tamanho informado, pelo
+   Content-Length ou contando os bytes, o que vier primeiro)
+4. Move o temporário para um caminho endereçado pelo conteúdo
+   (whatsapp/<clinica>/<sha[:2]>/<sha>.<ext>): o mesmo arquivo
+   reenviado vira um objeto só; o temporário do repetido é apagado
+5. Registra o conteúdo em midias_whatsapp e aponta o documento do
+   paciente para o caminho no Storage
+
+O SHA-256 é o mesmo de evidencias.arquivo_hash: o nome do objeto serve
+de verificação de integridade.
+
+Falhas transitórias (rede, 5xx, MAC inválido) são retentadas até
+TENTATIVAS vezes; link expirado (403/404/410), arquivo grande demais e
+mídia cifrada sem mediaKey não. Quando a ingestão desiste, ao_falhar
+marca o documento (status falha_download).
+
+Demonstração com servidor de mídia e Storage locais (memória, dedupe,
+limite de tamanho, mídia cifrada como a do WhatsApp):
+    python -m app.webhooks.midia
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import mimetypes
+import os
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import structlog
+
+from app.core.database import violacao_unica
+from app.core.outbox import calcular_backoff
+from app.webhooks.fila import FilaWebhook
+
+logger = structlog.get_logger()
+
+
+CHUNK_BYTES = 256 * 1024
+MAX_BYTES = 32 * 1024 * 1024
+WORKERS = 4
+CAPACIDADE = 500
+TENTATIVAS = 3
+BACKOFF_BASE_S = 2.0
+PREFIXO_TEMPORARIO = "whatsapp/_tmp"
+
+# Chaves derivadas da mediaKey por tipo de mídia (HKDF-SHA256, 112 bytes)
+INFO_CHAVES = {
+    "image": b"WhatsApp Image Keys",
+    "video": b"WhatsApp Video Keys",
+    "audio": b"WhatsApp Audio Keys",
+    "document": b"WhatsApp Document Keys",
+}
+TAMANHO_MAC = 10
+# Arquivo cifrado = decifrado + padding (até 16) + MAC
+SOBRA_CIFRA = 16 + TAMANHO_MAC
+
+
+class MidiaRecusada(Exception):
+    """Mídia que não adianta baixar de novo (grande demais, link expirado)."""
+
+
+def _bytes_do_payload(valor) -> Optional[bytes]:
+    """Campo binário do payload: base64 ou objeto {"0": n, ...} (Buffer serializado)."""
+    try:
+        if isinstance(valor, str):
+            return base64.b64decode(valor) or None
+        if isinstance(valor, dict):
+            return bytes(valor[k] for k in sorted(valor, key=int)) or None
+        if isinstance(valor, list):
+            return bytes(valor) or None
+    except (ValueError, TypeError):
+        pass
+    return None
+
+
+@dataclass
+class Midia:
+    """
+    Mídia recebida, a copiar para o Storage.
+
+    Com `cifrada`, `url` é o arquivo cifrado do WhatsApp e `chave_midia`
+    (mediaKey) decifra; sem ela, `url` já é o arquivo original.
+    """
+    clinica_id: str
+    url: str
+    message_id: Optional[str] = None
+    paciente_id: Optional[str] = None
+    documento_id: Optional[str] = None
+    mime_type: Optional[str] = None
+    tamanho_informado: Optional[int] = None
+    sha256_informado: Optional[str] = None
+    tipo: str = "document"
+    cifrada: bool = False
+    chave_midia: Optional[bytes] = None
+
+    @classmethod
+    def da_mensagem(cls, info: dict, tipo: str, url_decifrada: Optional[str] = None, **campos) -> "Midia":
+        """
+        A partir do imageMessage/documentMessage/audioMessage da Evolution.
+
+        url_decifrada: mediaUrl da mensagem (S3 da Evolution), preferido à
+        url cifrada do WhatsApp quando existe.
+        """
+        sha256 = _bytes_do_payload(info.get("fileSha256"))
+        try:
+            tamanho = int(info.get("fileLength") or 0) or None
+        except (ValueError, TypeError):
+            tamanho = None
+        return cls(
+            url=url_decifrada or info.get("url"),
+            mime_type=(info.get("mimetype") or "").split(";")[0] or None,
+            tamanho_informado=tamanho,
+            sha256_informado=sha256.hex() if sha256 else None,
+            tipo=tipo,
+            cifrada=not url_decifrada,
+            chave_midia=None if url_decifrada else _bytes_do_payload(info.get("mediaKey")),
+            **campos
+        )
+
+
+class DecifradorMidia:
+    """
+    Decifra em streaming uma mídia do WhatsApp (AES-256-CBC + HMAC-SHA256).
+
+    O arquivo baixado é cifrado || MAC (10 bytes); iv, chave e chave do MAC
+    saem da mediaKey por HKDF. Os últimos bytes de cada pedaço ficam
+    retidos até saber se são o MAC.
+    """
+
+    def __init__(self, chave_midia: bytes, tipo: str):
+        from cryptography.hazmat.primitives import hashes, padding
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+        info = INFO_CHAVES.get(tipo)
+        if info is None:
+            raise MidiaRecusada(f"tipo de mídia sem chave conhecida: {tipo}")
+        expandida = HKDF(algorithm=hashes.SHA256(), length=112, salt=None, info=info).derive(chave_midia)
+        iv, chave, chave_mac = expandida[:16], expandida[16:48], expandida[48:80]
+
+        self._decifrador = Cipher(algorithms.AES(chave), modes.CBC(iv)).decryptor()
+        self._padding = padding.PKCS7(128).unpadder()
+        self._mac = hmac.new(chave_mac, iv, hashlib.sha256)
+        self._retido = b""
+
+    def atualizar(self, pedaco: bytes) -> bytes:
+        dados = self._retido + pedaco
+        self._retido = dados[-TAMANHO_MAC:]
+        cifrado = dados[:-TAMANHO_MAC]
+        self._mac.update(cifrado)
+        return self._padding.update(self._decifrador.update(cifrado))
+
+    def finalizar(self) -> bytes:
+        """Confere o MAC e devolve o resto do arquivo (ValueError se não conferir)."""
+        if len(self._retido) < TAMANHO_MAC or not hmac.compare_digest(
+            self._mac.digest()[:TAMANHO_MAC], self._retido
+        ):
+            raise ValueError("MAC da mídia não confere (download incompleto ou corrompido)")
+        return self._padding.update(self._decifrador.finalize()) + self._padding.finalize()
+
+
+@dataclass
+class ResultadoIngestao:
+    sha256: str
+    storage_path: str
+    tamanho_bytes: Optional[int]
+    mime_type: Optional[str]
+    duplicada: bool = False
+
+
+def caminho_conteudo(clinica_id: str, sha256: str, mime_type: Optional[str]) -> str:
+    """Caminho no Storage endereçado pelo conteúdo."""
+    extensao = mimetypes.guess_extension(mime_type or "") or ""
+    return f"whatsapp/{clinica_id}/{sha256[:2]}/{sha256}{extensao}"
+
+
+# ==========================================
+# STORAGE
+# ==========================================
+
+class StorageSupabase:
+    """Supabase Storage via REST (upload em streaming, move e remoção)."""
+
+    def __init__(self, url: str, chave: str, bucket: str):
+        self.base = f"{url.rstrip('/')}/storage/v1"
+        self.bucket = bucket
+        self.headers = {"Authorization": f"Bearer {chave}", "apikey": chave}
+
+    async def enviar(self, caminho: str, pedacos: AsyncIterator[bytes], mime_type: Optional[str]) -> None:
+        from app.core.http import get_http_client
+
+        response = await get_http_client("storage").post(
+            f"{self.base}/object/{self.bucket}/{caminho}",
+            content=pedacos,
+            headers={
+                **self.headers,
+                "Content-Type": mime_type or "application/octet-stream",
+                "x-upsert": "true",
+            },
+        )
+        if response.status_code >= 400:
+            raise RuntimeError(f"Storage upload: HTTP {response.status_code}")
+
+    async def mover(self, origem: str, destino: str) -> bool:
+        """Move o objeto. False se o destino já existe (conteúdo repetido)."""
+        from app.core.http import get_http_client
+
+        response = await get_http_client("storage").post(
+            f"{self.base}/object/move",
+            json={"bucketId": self.bucket, "sourceKey": origem, "destinationKey": destino},
+            headers=self.headers,
+        )
+        if response.status_code == 409 or "already exists" in response.text or "Duplicate" in response.text:
+            return False
+        if response.status_code >= 400:
+            raise RuntimeError(f"Storage move: HTTP {response.status_code}")
+        return True
+
+    async def remover(self, caminho: str) -> None:
+        from app.core.http import get_http_client
+
+        try:
+            await get_http_client("storage").request(
+                "DELETE",
+                f"{self.base}/object/{self.bucket}",
+                json={"prefixes": [caminho]},
+                headers=self.headers,
+            )
+        except Exception as e:
+            logger.warning("Falha ao remover objeto temporário", caminho=caminho, error=str(e))
+
+
+class StorageLocal:
+    """Mesma interface gravando em disco (desenvolvimento e demonstração)."""
+
+    def __init__(self, diretorio: str):
+        self.diretorio = diretorio
+
+    def _arquivo(self, caminho: str) -> str:
+        return os.path.join(self.diretorio, *caminho.split("/"))
+
+    async def enviar(self, caminho: str, pedacos: AsyncIterator[bytes], mime_type: Optional[str]) -> None:
+        arquivo = self._arquivo(caminho)
+        os.makedirs(os.path.dirname(arquivo), exist_ok=True)
+        with open(arquivo, "wb") as saida:
+            async for pedaco in pedacos:
+                saida.write(pedaco)
+
+    async def mover(self, origem: str, destino: str) -> bool:
+        arquivo = self._arquivo(destino)
+        if os.path.exists(arquivo):
+            return False
+        os.makedirs(os.path.dirname(arquivo), exist_ok=True)
+        os.replace(self._arquivo(origem), arquivo)
+        return True
+
+    async def remover(self, caminho: str) -> None:
+        try:
+            os.remove(self._arquivo(caminho))
+        except FileNotFoundError:
+            pass
+
+
+# ==========================================
+# REGISTRO (hash → objeto)
+# ==========================================
+
+class RegistroBanco:
+    """Conteúdos já armazenados, na tabela midias_whatsapp (migração 014)."""
+
+    TABLE = "midias_whatsapp"
+
+    def __init__(self, db):
+        self.db = db
+
+    async def buscar(self, clinica_id: str, sha256: str) -> Optional[dict]:
+        try:
+            return await self.db.select_one(
+                table=self.TABLE,
+                filters={"clinica_id": clinica_id, "sha256": sha256}
+            )
+        except Exception as e:
+            logger.warning("Falha ao consultar midias_whatsapp (migração 014?)", error=str(e))
+            return None
+
+    async def registrar(self, midia: dict) -> bool:
+        """
+        False se o conteúdo já estava registrado (índice único clinica_id + sha256).
+        Outros erros sobem: o objeto já está no Storage, mas sem a linha
+        buscar() não o encontra.
+        """
+        try:
+            await self.db.insert(table=self.TABLE, data=midia)
+            return True
+        except Exception as e:
+            if not violacao_unica(e):
+                logger.error("Falha ao registrar mídia", sha256=midia.get("sha256"), error=str(e))
+                raise
+            logger.debug("Mídia já registrada", sha256=midia.get("sha256"))
+            return False
+
+
+class RegistroMemoria:
+    """Mesma interface, sem banco."""
+
+    def __init__(self):
+        self._midias: dict[tuple, dict] = {}
+
+    async def buscar(self, clinica_id: str, sha256: str) -> Optional[dict]:
+        return self._midias.get((clinica_id, sha256))
+
+    async def registrar(self, midia: dict) -> bool:
+        chave = (midia["clinica_id"], midia["sha256"])
+        if chave in self._midias:
+            return False
+        self._midias[chave] = midia
+        return True
+
+
+# ==========================================
+# INGESTÃO
+# ==========================================
+
+AoConcluir = Callable[[Midia, ResultadoIngestao], Awaitable[None]]
+AoFalhar = Callable[[Midia, str], Awaitable[None]]
+
+
+class IngestaoMidia:
+    """
+    Fila + pool de workers que copia mídias para o Storage.
+
+    Args:
+        storage: StorageSupabase ou StorageLocal
+        registro: RegistroBanco ou RegistroMemoria
+        headers_download: headers do GET na URL da mídia
+        ao_concluir: corrotina chamada com o resultado (ex.: atualizar o documento)
+        ao_falhar: corrotina chamada com o motivo quando a ingestão desiste
+        max_bytes: tamanho máximo aceito
+        workers / capacidade: downloads simultâneos e mídias pendentes aceitas
+    """
+
+    def __init__(
+        self,
+        storage,
+        registro=None,
+        headers_download: Optional[dict] = None,
+        ao_concluir: Optional[AoConcluir] = None,
+        ao_falhar: Optional[AoFalhar] = None,
+        max_bytes: int = MAX_BYTES,
+        workers: int = WORKERS,
+        capacidade: int = CAPACIDADE,
+        tentativas: int = TENTATIVAS,
+        backoff_base_s: float = BACKOFF_BASE_S,
+    ):
+        self.storage = storage
+        self.registro = registro or RegistroMemoria()
+        self.headers_download = headers_download or {}
+        self.ao_concluir = ao_concluir
+        self.ao_falhar = ao_falhar
+        self.max_bytes = max_bytes
+        self.tentativas = tentativas
+        self.backoff_base_s = backoff_base_s
+        self._fila = FilaWebhook(self._processar, workers=workers, capacidade=capacidade)
+        self._metricas = {
+            "armazenadas": 0, "duplicadas": 0, "duplicadas_sem_download": 0,
+            "recusadas": 0, "retentativas": 0, "erros": 0, "bytes_recebidos": 0,
+        }
+        self._duracoes_ms: deque = deque(maxlen=500)
+
+    # ==========================================
+    # ENTRADA
+    # ==========================================
+
+    def aceitar(self, midia: Midia) -> str:
+        """Enfileira a mídia (sem I/O). Retorna ACEITO, DUPLICADO ou CHEIA (fila.py)."""
+        self._fila.iniciar()
+        return self._fila.aceitar(midia.message_id or midia.url, midia.message_id, midia)
+
+    async def esvaziar(self) -> None:
+        await self._fila.esvaziar()
+
+    async def encerrar(self, timeout_s: float = 30.0) -> None:
+        await self._fila.encerrar(timeout_s)
+
+    # ==========================================
+    # WORKER
+    # ==========================================
+
+    async def _processar(self, midia: Midia) -> None:
+        inicio = time.monotonic()
+        resultado = None
+        for tentativa in range(1, self.tentativas + 1):
+            try:
+                resultado = await self.ingerir(midia)
+                break
+            except MidiaRecusada as e:
+                self._metricas["recusadas"] += 1
+                logger.warning("Mídia recusada", message_id=midia.message_id, motivo=str(e))
+                await self.falhou(midia, str(e))
+                return
+            except Exception as e:
+                if tentativa >= self.tentativas:
+                    self._metricas["erros"] += 1
+                    logger.error("Falha na ingestão da mídia", message_id=midia.message_id, error=str(e))
+                    await self.falhou(midia, str(e) or type(e).__name__)
+                    return
+                self._metricas["retentativas"] += 1
+                await asyncio.sleep(calcular_backoff(tentativa, self.backoff_base_s, 30.0))
+
+        self._duracoes_ms.append((time.monotonic() - inicio) * 1000)
+        if self.ao_concluir:
+            try:
+                await self.ao_concluir(midia, resultado)
+            except Exception as e:
+                logger.error("Erro ao concluir ingestão da mídia", message_id=midia.message_id, error=str(e))
+
+    async def falhou(self, midia: Midia, motivo: str) -> None:
+        """Avisa ao_falhar (também usado por quem recebe CHEIA de aceitar)."""
+        if not self.ao_falhar:
+            return
+        try:
+            await self.ao_falhar(midia, motivo)
+        except Exception as e:
+            logger.error("Erro ao registrar falha da mídia", message_id=midia.message_id, error=str(e))
+
+    async def ingerir(self, midia: Midia) -> ResultadoIngestao:
+        """Copia a mídia para o Storage (ou reaproveita o conteúdo já armazenado)."""
+        from app.core.http import get_http_client
+
+        if not midia.url:
+            raise MidiaRecusada("mídia sem URL")
+        if midia.cifrada and not midia.chave_midia:
+            raise MidiaRecusada("mídia cifrada sem mediaKey")
+
+        # Conteúdo já armazenado: nem baixa
+        if midia.sha256_informado:
+            existente = await self.registro.buscar(midia.clinica_id, midia.sha256_informado)
+            if existente:
+                self._metricas["duplicadas_sem_download"] += 1
+                return ResultadoIngestao(
+                    sha256=midia.sha256_informado,
+                    storage_path=existente["storage_path"],
+                    tamanho_bytes=existente.get("tamanho_bytes"),
+                    mime_type=existente.get("mime_type") or midia.mime_type,
+                    duplicada=True,
+                )
+
+        if midia.tamanho_informado and midia.tamanho_informado > self.max_bytes:
+            raise MidiaRecusada(f"tamanho informado {midia.tamanho_informado} > {self.max_bytes} bytes")
+
+        temporario = f"{PREFIXO_TEMPORARIO}/{uuid.uuid4().hex}"
+        hasher = hashlib.sha256()
+        recebidos = 0
+        tamanho = 0
+        mime_type = midia.mime_type
+        decifrador = DecifradorMidia(midia.chave_midia, midia.tipo) if midia.cifrada else None
+        limite_download = self.max_bytes + (SOBRA_CIFRA if decifrador else 0)
+
+        try:
+            client = get_http_client("midia")
+            async with client.stream("GET", midia.url, headers=self.headers_download) as response:
+                if response.status_code in (403, 404, 410):
+                    raise MidiaRecusada(f"link indisponível: HTTP {response.status_code}")
+                if response.status_code >= 400:
+                    raise RuntimeError(f"download: HTTP {response.status_code}")
+
+                declarado = int(response.headers.get("content-length") or 0)
+                if declarado > limite_download:
+                    raise MidiaRecusada(f"Content-Length {declarado} > {self.max_bytes} bytes")
+                if not decifrador:
+                    # O content-type do arquivo cifrado não diz nada (octet-stream)
+                    mime_type = mime_type or response.headers.get("content-type", "").split(";")[0] or None
+
+                def conferir(pedaco: bytes) -> bytes:
+                    nonlocal tamanho
+                    tamanho += len(pedaco)
+                    if tamanho > self.max_bytes:
+                        raise MidiaRecusada(f"mais de {self.max_bytes} bytes")
+                    hasher.update(pedaco)
+                    return pedaco
+
+                async def pedacos() -> AsyncIterator[bytes]:
+                    nonlocal recebidos
+                    async for pedaco in response.aiter_bytes(CHUNK_BYTES):
+                        recebidos += len(pedaco)
+                        if recebidos > limite_download:
+                            raise MidiaRecusada(f"mais de {self.max_bytes} bytes")
+                        if decifrador:
+                            pedaco = decifrador.atualizar(pedaco)
+                        if pedaco:
+                            yield conferir(pedaco)
+                    if decifrador:
+                        final = decifrador.finalizar()
+                        if final:
+                            yield conferir(final)
+                    if midia.sha256_informado and hasher.hexdigest() != midia.sha256_informado:
+                        # Ainda dentro do upload: o temporário é removido
+                        raise ValueError("SHA-256 do arquivo difere do fileSha256 informado")
+
+                await self.storage.enviar(temporario, pedacos(), mime_type)
+        except BaseException:
+            await self.storage.remover(temporario)
+            raise
+        finally:
+            self._metricas["bytes_recebidos"] += recebidos
+
+        sha256 = hasher.hexdigest()
+        destino = caminho_conteudo(midia.clinica_id, sha256, mime_type)
+        resultado = ResultadoIngestao(
+            sha256=sha256, storage_path=destino, tamanho_bytes=tamanho, mime_type=mime_type
+        )
+
+        existente = await self.registro.buscar(midia.clinica_id, sha256)
+        if existente or not await self.storage.mover(temporario, destino):
+            # Mesmo conteúdo já armazenado (inclusive por outro worker agora)
+            await self.storage.remover(temporario)
+            self._metricas["duplicadas"] += 1
+            resultado.duplicada = True
+            if existente:
+                resultado.storage_path = existente["storage_path"]
+            return resultado
+
+        await self.registro.registrar({
+            "clinica_id": midia.clinica_id,
+            "sha256": sha256,
+            "storage_path": destino,
+            "mime_type": mime_type,
+            "tamanho_bytes": tamanho,
+            "message_id": midia.message_id,
+        })
+        self._metricas["armazenadas"] += 1
+        return resultado
+
+    def get_metricas(self) -> dict:
+        duracoes = sorted(self._duracoes_ms)
+        fila = self._fila.get_metricas()
+        return {
+            **self._metricas,
+            "recebidas": fila["enfileirados"],
+            "recusadas_fila_cheia": fila["recusados"],
+            "pendentes": fila["pendentes"],
+            "em_processamento": fila["em_processamento"],
+            "workers": fila["workers"],
+            "max_bytes": self.max_bytes,
+            "duracao_p50_ms": round(duracoes[len(duracoes) // 2], 1) if duracoes else 0.0,
+            "duracao_p95_ms": round(duracoes[int(0.95 * (len(duracoes) - 1))], 1) if duracoes else 0.0,
+        }
+
+
+# ==========================================
+# INSTÂNCIA DA APLICAÇÃO
+# ==========================================
+
+async def atualizar_documento(midia: Midia, resultado: ResultadoIngestao) -> None:
+    """Documento do paciente passa a apontar para o objeto no Storage."""
+    if not midia.documento_id:
+        return
+    from app.core.database import get_admin_db
+
+    await get_admin_db().update(
+        table="pacientes_documentos",
+        data={"arquivo_url": resultado.storage_path},
+        filters={"id": midia.documento_id}
+    )
+
+
+async def marcar_falha_documento(midia: Midia, motivo: str) -> None:
+    """
+    Ingestão desistiu (ou a fila estava cheia): o documento fica com a URL
+    original e status falha_download, para a equipe pedir o arquivo de novo.
+    """
+    if not midia.documento_id:
+        return
+    from app.core.database import get_admin_db
+
+    logger.warning("Documento sem cópia no Storage", documento_id=midia.documento_id, motivo=motivo)
+    await get_admin_db().update(
+        table="pacientes_documentos",
+        data={"status": "falha_download"},
+        filters={"id": midia.documento_id}
+    )
+
+
+_ingestao: Optional[IngestaoMidia] = None
+
+
+def get_ingestao_midia() -> IngestaoMidia:
+    """Ingestão da aplicação (workers sobem na primeira mídia)."""
+    global _ingestao
+    if _ingestao is None:
+        from app.core.config import settings
+        from app.core.database import get_admin_db
+
+        _ingestao = IngestaoMidia(
+            StorageSupabase(settings.supabase_url, settings.supabase_service_key, settings.storage_bucket),
+            RegistroBanco(get_admin_db()),
+            # CDN do WhatsApp e S3 da Evolution: sem a apikey da Evolution
+            ao_concluir=atualizar_documento,
+            ao_falhar=marcar_falha_documento,
+            max_bytes=settings.whatsapp_midia_max_mb * 1024 * 1024,
+            workers=settings.whatsapp_midia_workers,
+            capacidade=settings.whatsapp_midia_capacidade,
+        )
+    return _ingestao
+
+
+async def encerrar_ingestao_midia() -> None:
+    """Termina as mídias em andamento e para os workers (shutdown)."""
+    if _ingestao is not None:
+        await _ingestao.encerrar()
+
+
+# ==========================================
+# DEMONSTRAÇÃO (servidor de mídia + Storage em disco)
+# ==========================================
+
+def _conteudo(semente: int, tamanho: int):
+    """Bytes determinísticos gerados em pedaços (o servidor também não guarda o arquivo)."""
+    bloco = 0
+    enviados = 0
+    while enviados < tamanho:
+        base = hashlib.sha256(f"{semente}:{bloco}".encode()).digest()
+        pedaco = (base * (CHUNK_BYTES // len(base)))[: tamanho - enviados]
+        enviados += len(pedaco)
+        bloco += 1
+        yield pedaco
+
+
+def _chave_demo(semente: int) -> bytes:
+    return hashlib.sha256(f"mediaKey:{semente}".encode()).digest()
+
+
+def _cifrar(pedacos, chave_midia: bytes, tipo: str = "document"):
+    """Cifra como o WhatsApp (AES-256-CBC, PKCS7, HMAC truncado no fim), em pedaços."""
+    from cryptography.hazmat.primitives import hashes, padding
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+    expandida = HKDF(algorithm=hashes.SHA256(), length=112, salt=None, info=INFO_CHAVES[tipo]).derive(chave_midia)
+    iv, chave, chave_mac = expandida[:16], expandida[16:48], expandida[48:80]
+    cifrador = Cipher(algorithms.AES(chave), modes.CBC(iv)).encryptor()
+    preenchimento = padding.PKCS7(128).padder()
+    mac = hmac.new(chave_mac, iv, hashlib.sha256)
+    for pedaco in pedacos:
+        cifrado = cifrador.update(preenchimento.update(pedaco))
+        mac.update(cifrado)
+        yield cifrado
+    cifrado = cifrador.update(preenchimento.finalize()) + cifrador.finalize()
+    mac.update(cifrado)
+    yield cifrado + mac.digest()[:TAMANHO_MAC]
+
+
+class _StubMidia:
+    """
+    GET /<semente>/<tamanho>[/sem-tamanho] devolve o conteúdo em streaming;
+    /<semente>/<tamanho>/cifrado devolve o .enc, como a CDN do WhatsApp.
+    """
+
+    def __init__(self):
+        self._servidor = None
+        self.url = ""
+
+    async def iniciar(self) -> str:
+        self._servidor = await asyncio.start_server(self._atender, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self._servidor.sockets[0].getsockname()[1]}"
+        return self.url
+
+    async def encerrar(self) -> None:
+        if self._servidor:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            cabecalho = (await reader.readuntil(b"\r\n\r\n")).decode()
+            partes = cabecalho.split()[1].strip("/").split("/")
+            semente, tamanho = int(partes[0]), int(partes[1])
+            opcao = partes[2] if len(partes) > 2 else None
+
+            conteudo = _conteudo(semente, tamanho)
+            linhas = ["HTTP/1.1 200 OK", "Connection: close"]
+            if opcao == "cifrado":
+                conteudo = _cifrar(conteudo, _chave_demo(semente))
+                linhas.append("Content-Type: application/octet-stream")
+                linhas.append(f"Content-Length: {(tamanho // 16 + 1) * 16 + TAMANHO_MAC}")
+            else:
+                linhas.append("Content-Type: application/pdf")
+                if opcao != "sem-tamanho":
+                    linhas.append(f"Content-Length: {tamanho}")
+            writer.write(("\r\n".join(linhas) + "\r\n\r\n").encode())
+            for pedaco in conteudo:
+                writer.write(pedaco)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _demonstrar(arquivos: int = 6, repeticoes: int = 3, tamanho_mb: int = 24) -> dict:
+    """
+    Mídias repetidas, cifradas e grandes demais; confere hash, dedupe e
+    pico de memória. As cópias cifradas precisam cair no mesmo objeto das
+    originais (hash do conteúdo decifrado); depois, o mesmo conteúdo com
+    fileSha256 informado não é nem baixado.
+    """
+    import tempfile
+    import tracemalloc
+
+    from app.core.http import fechar_http_clients
+
+    stub = _StubMidia()
+    url = await stub.iniciar()
+    tamanho = tamanho_mb * 1024 * 1024
+    concluidas: list[ResultadoIngestao] = []
+    falhas: list[str] = []
+
+    async def registrar(midia: Midia, resultado: ResultadoIngestao) -> None:
+        concluidas.append(resultado)
+
+    async def registrar_falha(midia: Midia, motivo: str) -> None:
+        falhas.append(midia.message_id)
+
+    with tempfile.TemporaryDirectory() as diretorio:
+        ingestao = IngestaoMidia(
+            StorageLocal(diretorio),
+            ao_concluir=registrar,
+            ao_falhar=registrar_falha,
+            max_bytes=2 * tamanho,
+            workers=4,
+            backoff_base_s=0.05,
+        )
+
+        midias = [
+            Midia(clinica_id="clinica", url=f"{url}/{semente}/{tamanho}", message_id=f"{semente}-{r}")
+            for r in range(repeticoes)
+            for semente in range(arquivos)
+        ]
+        # Grande demais: pelo Content-Length, contando bytes e pelo tamanho informado
+        midias.append(Midia(clinica_id="clinica", url=f"{url}/900/{3 * tamanho}", message_id="grande-1"))
+        midias.append(Midia(clinica_id="clinica", url=f"{url}/901/{3 * tamanho}/sem-tamanho", message_id="grande-2"))
+        midias.append(Midia(
+            clinica_id="clinica", url=f"{url}/902/{tamanho}", message_id="grande-3", tamanho_informado=3 * tamanho
+        ))
+        # Como chegam do WhatsApp: .enc + mediaKey, com e sem a chave
+        midias.extend(
+            Midia.da_mensagem(
+                {
+                    "url": f"{url}/{semente}/{tamanho}/cifrado",
+                    "mediaKey": base64.b64encode(_chave_demo(semente)).decode(),
+                    "mimetype": "application/pdf",
+                },
+                tipo="document", clinica_id="clinica", message_id=f"{semente}-cifrada",
+            )
+            for semente in range(arquivos)
+        )
+        midias.append(Midia.da_mensagem(
+            {"url": f"{url}/0/{tamanho}/cifrado"}, tipo="document", clinica_id="clinica", message_id="sem-chave"
+        ))
+
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        for midia in midias:
+            ingestao.aceitar(midia)
+        await ingestao.esvaziar()
+        duracao_s = time.perf_counter() - inicio
+        _, pico_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        esperados = {}
+        for semente in range(arquivos):
+            hasher = hashlib.sha256()
+            for pedaco in _conteudo(semente, tamanho):
+                hasher.update(pedaco)
+            esperados[hasher.hexdigest()] = semente
+
+        # Reenvio com fileSha256 (hash do decifrado): reaproveita sem baixar
+        for sha256, semente in esperados.items():
+            ingestao.aceitar(Midia.da_mensagem(
+                {
+                    "url": f"{url}/{semente}/{tamanho}/cifrado",
+                    "mediaKey": base64.b64encode(_chave_demo(semente)).decode(),
+                    "fileSha256": base64.b64encode(bytes.fromhex(sha256)).decode(),
+                },
+                tipo="document", clinica_id="clinica", message_id=f"{semente}-reenvio",
+            ))
+        await ingestao.esvaziar()
+        await ingestao.encerrar()
+
+        objetos = [
+            os.path.join(raiz, nome)
+            for raiz, _, nomes in os.walk(diretorio)
+            for nome in nomes
+        ]
+        integros = 0
+        for objeto in objetos:
+            hasher = hashlib.sha256()
+            with open(objeto, "rb") as arquivo:
+                for pedaco in iter(lambda: arquivo.read(CHUNK_BYTES), b""):
+                    hasher.update(pedaco)
+            integros += os.path.basename(objeto).startswith(hasher.hexdigest())
+
+    await stub.encerrar()
+    await fechar_http_clients()
+
+    return {
+        "midias": len(midias),
+        "tamanho_mb": tamanho_mb,
+        "objetos_no_storage": len(objetos),
+        "objetos_integros": integros,
+        "hashes_esperados_encontrados": len({r.sha256 for r in concluidas} & esperados.keys()),
+        "concluidas": len(concluidas),
+        "falhas_registradas": sorted(falhas),
+        "duracao_s": round(duracao_s, 2),
+        "mb_por_s": round(ingestao.get_metricas()["bytes_recebidos"] / 1024 / 1024 / duracao_s, 1),
+        "pico_memoria_mb": round(pico_bytes / 1024 / 1024, 2),
+        "metricas": ingestao.get_metricas(),
+    }
+
+
+if __name__ == "__main__":
+    import json
+
+    resultado = asyncio.run(_demonstrar())
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    ok = (
+        resultado["objetos_no_storage"] == 6
+        and resultado["objetos_integros"] == 6
+        and resultado["hashes_esperados_encontrados"] == 6
+        and resultado["metricas"]["recusadas"] == 4
+        and resultado["falhas_registradas"] == ["grande-1", "grande-2", "grande-3", "sem-chave"]
+        and resultado["metricas"]["armazenadas"] == 6
+        and resultado["metricas"]["duplicadas_sem_download"] == 6
+        # Memória limitada pelos pedaços em trânsito (workers x CHUNK_BYTES,
+        # servidor incluso), não pelo tamanho dos arquivos
+        and resultado["pico_memoria_mb"] < resultado["tamanho_mb"]
+    )
+    raise SystemExit(0 if ok else 1)
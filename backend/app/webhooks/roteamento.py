@@ -0,0 +1,231 @@
+"""
+Webhooks - Roteamento
+Identifica clínica e paciente de uma mensagem recebida no WhatsApp.
+
+Antes o webhook buscava o telefone em `pacientes` de todas as clínicas
+e ficava com o primeiro resultado (e só olhava a coluna telefone,
+enquanto o chat usa celular/whatsapp). Agora:
+
+1. instance da Evolution → clinica_id: mapa em memória, carregado de
+   clinicas.whatsapp_instancia e recarregado a cada MAPA_TTL_S.
+   Sem mapeamento, a instância de settings.evolution_instance (ou
+   payload sem instance) cai em settings.default_clinica_id.
+   Instância desconhecida não é roteada: a mensagem é descartada.
+2. (clinica_id, telefone normalizado) → paciente: uma ida ao banco
+   (RPC buscar_paciente_por_telefone, índices de expressão sobre
+   telefone/celular/whatsapp da clínica), com cache LRU.
+
+O mapa é recarregado após alteração da clínica (app/clinicas/eventos.py)
+e o cache de pacientes descarta os telefones de paciente criado ou
+alterado (app/pacientes/eventos.py); este módulo assina os dois eventos
+ao ser importado. Com vários processos, o TTL limita o tempo de vida;
+telefones não encontrados ficam em cache por pouco tempo (NEGATIVO_TTL_S).
+"""
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import structlog
+
+from app.clinicas.eventos import ao_alterar_clinica
+from app.core.config import settings
+from app.core.database import get_admin_db, rpc_inexistente
+from app.pacientes.eventos import ao_alterar_telefones
+
+logger = structlog.get_logger()
+
+
+MAPA_TTL_S = 300
+PACIENTE_TTL_S = 600
+NEGATIVO_TTL_S = 30
+RPC_AUSENTE_TTL_S = 600
+MAX_PACIENTES = 20_000
+
+COLUNAS_PACIENTE = "id, clinica_id, nome, telefone, celular, whatsapp, ativo"
+COLUNAS_TELEFONE = ("telefone", "celular", "whatsapp")
+
+_mapa_instancias: dict[str, str] = {}
+_mapa_expira_em = 0.0
+_mapa_lock: Optional[asyncio.Lock] = None
+
+_pacientes: "OrderedDict[Tuple[str, str], Tuple[Optional[dict], float]]" = OrderedDict()
+_rpc_ausente_ate = 0.0
+_metricas = {"hits": 0, "misses": 0, "consultas": 0, "sem_clinica": 0}
+
+
+def normalizar_telefone(telefone: Optional[str]) -> str:
+    """
+    Só dígitos, sem o 55 do Brasil.
+    Mesma regra da função SQL normalizar_telefone (migração 012).
+    """
+    digitos = re.sub(r"\D", "", telefone or "")
+    if digitos.startswith("55") and len(digitos) in (12, 13):
+        digitos = digitos[2:]
+    return digitos
+
+
+# ==========================================
+# INSTÂNCIA → CLÍNICA
+# ==========================================
+
+async def _carregar_mapa() -> None:
+    global _mapa_instancias, _mapa_expira_em
+
+    try:
+        db = get_admin_db()
+        clinicas = await db.select(
+            table="clinicas",
+            columns="id, whatsapp_instancia",
+            filters={"ativo": True}
+        )
+        _mapa_instancias = {
+            c["whatsapp_instancia"]: c["id"]
+            for c in clinicas
+            if c.get("whatsapp_instancia")
+        }
+    except Exception as e:
+        # Coluna ainda não migrada ou banco fora: mantém o mapa anterior
+        logger.warning("Falha ao carregar instâncias do WhatsApp", error=str(e))
+    _mapa_expira_em = time.monotonic() + MAPA_TTL_S
+
+
+async def _garantir_mapa() -> None:
+    global _mapa_lock
+
+    if time.monotonic() >= _mapa_expira_em:
+        if _mapa_lock is None:
+            _mapa_lock = asyncio.Lock()
+        async with _mapa_lock:
+            if time.monotonic() >= _mapa_expira_em:
+                await _carregar_mapa()
+
+
+async def clinica_da_instancia(instance: Optional[str]) -> Optional[str]:
+    """clinica_id atendida pela instância da Evolution (None se desconhecida)."""
+    await _garantir_mapa()
+
+    clinica_id = _mapa_instancias.get(instance) if instance else None
+    if clinica_id:
+        return clinica_id
+
+    if (not instance or instance == settings.evolution_instance) and settings.default_clinica_id:
+        return settings.default_clinica_id
+
+    _metricas["sem_clinica"] += 1
+    return None
+
+
+async def instancia_da_clinica(clinica_id: Optional[str]) -> Optional[str]:
+    """Instância da Evolution que envia pela clínica (caminho inverso do mapa)."""
+    await _garantir_mapa()
+    for instance, clinica in _mapa_instancias.items():
+        if clinica == clinica_id:
+            return instance
+    return settings.evolution_instance
+
+
+def invalidar_instancias() -> None:
+    """Força recarga do mapa na próxima mensagem (ex.: clínica alterada)."""
+    global _mapa_expira_em
+    _mapa_expira_em = 0.0
+
+
+@ao_alterar_clinica
+def _clinica_alterada(clinica_id: str) -> None:
+    invalidar_instancias()
+
+
+# ==========================================
+# TELEFONE → PACIENTE
+# ==========================================
+
+async def buscar_paciente(clinica_id: str, telefone: str) -> Optional[dict]:
+    """
+    Paciente da clínica com o telefone em telefone, celular ou whatsapp.
+    Prefere pacientes ativos. Retorna None se não houver.
+    """
+    numero = normalizar_telefone(telefone)
+    if not clinica_id or not numero:
+        return None
+
+    chave = (str(clinica_id), numero)
+    item = _pacientes.get(chave)
+    if item is not None and item[1] > time.monotonic():
+        _pacientes.move_to_end(chave)
+        _metricas["hits"] += 1
+        return item[0]
+
+    _metricas["misses"] += 1
+    paciente = await _consultar_paciente(str(clinica_id), numero)
+
+    ttl = PACIENTE_TTL_S if paciente else NEGATIVO_TTL_S
+    _pacientes[chave] = (paciente, time.monotonic() + ttl)
+    _pacientes.move_to_end(chave)
+    while len(_pacientes) > MAX_PACIENTES:
+        _pacientes.popitem(last=False)
+    return paciente
+
+
+async def _consultar_paciente(clinica_id: str, numero: str) -> Optional[dict]:
+    global _rpc_ausente_ate
+
+    db = get_admin_db()
+    _metricas["consultas"] += 1
+
+    if time.monotonic() >= _rpc_ausente_ate:
+        try:
+            resultado = await db.rpc(
+                "buscar_paciente_por_telefone",
+                {"p_clinica_id": clinica_id, "p_telefone": numero}
+            )
+            if isinstance(resultado, list):
+                resultado = resultado[0] if resultado else None
+            return resultado or None
+        except Exception as e:
+            if rpc_inexistente(e):
+                # Migração 012 não aplicada: fallback até conferir de novo
+                _rpc_ausente_ate = time.monotonic() + RPC_AUSENTE_TTL_S
+                logger.warning("RPC buscar_paciente_por_telefone inexistente, usando fallback", error=str(e))
+            else:
+                # Timeout ou erro pontual: fallback só nesta consulta
+                logger.warning("Erro na RPC buscar_paciente_por_telefone, usando fallback", error=str(e))
+
+    # Fallback: ainda restrito à clínica; cobre o número com e sem o 55
+    variantes = [numero, f"55{numero}"]
+    resultados = await asyncio.gather(*(
+        db.select(
+            table="pacientes",
+            columns=COLUNAS_PACIENTE,
+            filters={"clinica_id": clinica_id, f"{coluna}__in": variantes},
+            limit=5
+        )
+        for coluna in COLUNAS_TELEFONE
+    ))
+    candidatos = [p for lista in resultados for p in lista]
+    if not candidatos:
+        return None
+    return next((p for p in candidatos if p.get("ativo") is not False), candidatos[0])
+
+
+@ao_alterar_telefones
+def invalidar_telefones(clinica_id: Optional[str], *telefones: Optional[str]) -> None:
+    """Descarta do cache os telefones de um paciente criado/alterado."""
+    if not clinica_id:
+        return
+    for telefone in telefones:
+        numero = normalizar_telefone(telefone)
+        if numero:
+            _pacientes.pop((str(clinica_id), numero), None)
+
+
+def get_metricas() -> dict:
+    return {
+        **_metricas,
+        "instancias": len(_mapa_instancias),
+        "pacientes_em_cache": len(_pacientes),
+        "rpc_disponivel": time.monotonic() >= _rpc_ausente_ate,
+    }
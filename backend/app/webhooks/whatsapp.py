@@ -4,6 +4,16 @@ Recebe e processa mensagens do WhatsApp via Evolution API.
 
 NOTA: Webhooks usam get_admin_db() porque são chamados externamente
 sem contexto de usuário autenticado. Isso é uma exceção intencional.
+
+O endpoint só valida e enfileira (app/webhooks/fila.py); o processamento
+roda no pool de workers, um evento por telefone de cada vez.
+
+Clínica e paciente vêm de app/webhooks/roteamento.py: a instância da
+Evolution define a clínica e o telefone é buscado só nela.
+
+Mídias (exames, documentos, áudios) são copiadas para o Storage por
+app/webhooks/midia.py; o documento guarda o caminho no Storage, não a
+URL temporária da Evolution.
 """
 
 import hashlib
@@ -11,11 +21,15 @@ import hmac
 from typing import Optional
 
 from fastapi import APIRouter, Header, HTTPException, Request, status
+from fastapi.responses import JSONResponse
 import structlog
 
 from app.core.config import settings
 from app.core.database import get_admin_db
 from app.integracoes.whatsapp.client import whatsapp_client
+from app.webhooks import roteamento
+from app.webhooks.fila import CHEIA, DUPLICADO, FilaWebhook
+from app.webhooks.midia import Midia, get_ingestao_midia, marcar_falha_documento
 
 logger = structlog.get_logger()
 
@@ -65,19 +79,58 @@ async def webhook_whatsapp(
     instance = payload.get("instance")
     data = payload.get("data", {})
 
-    logger.info("Webhook WhatsApp recebido", event=event, instance=instance)
+    logger.info("Webhook WhatsApp recebido", evento=event, instance=instance)
 
-    # Processa apenas mensagens recebidas
-    if event == "messages.upsert":
-        await process_incoming_message(data)
-    elif event == "messages.update":
+    if event == "messages.update":
         # Status de mensagem enviada (entregue, lida, etc)
         logger.debug("Status atualizado", data=data)
+        return {"status": "ignored"}
+
+    # Processa apenas mensagens recebidas
+    if event != "messages.upsert" or not isinstance(data, dict):
+        return {"status": "ignored"}
+
+    key = data.get("key") or {}
+    if key.get("fromMe"):
+        return {"status": "ignored"}
+
+    fila = get_fila_webhook()
+    fila.iniciar()
+    resultado = fila.aceitar(
+        f"{instance}:{extrair_telefone(key)}",
+        key.get("id"),
+        {"instance": instance, "data": data}
+    )
+
+    if resultado == CHEIA:
+        logger.warning("Fila do webhook cheia, recusando evento", pendentes=fila.capacidade)
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "busy"},
+            headers={"Retry-After": "5"}
+        )
+    if resultado == DUPLICADO:
+        return {"status": "duplicate"}
+    return {"status": "queued"}
+
+
+def extrair_telefone(key: dict) -> str:
+    """Telefone do remetente (sem @s.whatsapp.net e sem o 55 do Brasil)."""
+    remote_jid = key.get("remoteJid", "")
+    phone = remote_jid.split("@")[0] if "@" in remote_jid else remote_jid
+    
+    # Remove código do país se presente
+    if phone.startswith("55") and len(phone) > 11:
+        phone = phone[2:]
+    return phone
+
 
-    return {"status": "processed"}
+async def processar_evento(evento: dict):
+    """Worker da fila do webhook: evento = {instance, data}."""
+    await process_incoming_message(evento["data"], evento.get("instance"))
 
 
-async def process_incoming_message(data: dict):
+async def process_incoming_message(data: dict, instance: Optional[str] = None):
     """Processa mensagem recebida do paciente."""
     key = data.get("key", {})
     message = data.get("message", {})
@@ -87,13 +140,7 @@ async def process_incoming_message(data: dict):
         return
 
     # Extrai dados
-    remote_jid = key.get("remoteJid", "")
-    phone = remote_jid.split("@")[0] if "@" in remote_jid else remote_jid
-    
-    # Remove código do país se presente
-    if phone.startswith("55") and len(phone) > 11:
-        phone = phone[2:]
-
+    phone = extrair_telefone(key)
     message_id = key.get("id")
     timestamp = data.get("messageTimestamp")
 
@@ -101,6 +148,7 @@ async def process_incoming_message(data: dict):
     text = None
     media_type = None
     media_url = None
+    media_info: dict = {}
 
     if "conversation" in message:
         text = message["conversation"]
@@ -108,15 +156,18 @@ async def process_incoming_message(data: dict):
         text = message["extendedTextMessage"].get("text")
     elif "imageMessage" in message:
         media_type = "image"
-        media_url = message["imageMessage"].get("url")
+        media_info = message["imageMessage"]
+        media_url = media_info.get("url")
         text = message["imageMessage"].get("caption")
     elif "documentMessage" in message:
         media_type = "document"
-        media_url = message["documentMessage"].get("url")
+        media_info = message["documentMessage"]
+        media_url = media_info.get("url")
         text = message["documentMessage"].get("caption")
     elif "audioMessage" in message:
         media_type = "audio"
-        media_url = message["audioMessage"].get("url")
+        media_info = message["audioMessage"]
+        media_url = media_info.get("url")
 
     logger.info(
         "Mensagem recebida",
@@ -125,20 +176,17 @@ async def process_incoming_message(data: dict):
         media_type=media_type
     )
 
-    # Busca paciente pelo telefone
-    # Primeiro, precisamos identificar a clínica
-    # Por enquanto, busca em todas (depois melhorar com multi-tenant)
-    
-    db = get_admin_db()
-    pacientes = await db.select(
-        table="pacientes",
-        columns="id, clinica_id, nome, telefone",
-        filters={"telefone": phone}
-    )
+    # Clínica pela instância da Evolution; paciente só nessa clínica
+    clinica_id = await roteamento.clinica_da_instancia(instance)
+    if not clinica_id:
+        logger.warning("Instância do WhatsApp sem clínica, mensagem descartada", instance=instance)
+        return
+
+    paciente = await roteamento.buscar_paciente(clinica_id, phone)
 
-    if not pacientes:
+    if not paciente:
         # Paciente não cadastrado
-        logger.info("Paciente não encontrado", phone=phone[:4] + "****")
+        logger.info("Paciente não encontrado", phone=phone[:4] + "****", clinica_id=clinica_id)
         await whatsapp_client.send_text(
             phone,
             "Olá! Não encontramos seu cadastro em nosso sistema. "
@@ -146,8 +194,7 @@ async def process_incoming_message(data: dict):
         )
         return
 
-    paciente = pacientes[0]
-    clinica_id = paciente["clinica_id"]
+    db = get_admin_db()
     paciente_id = paciente["id"]
     paciente_nome = paciente["nome"]
 
@@ -193,8 +240,11 @@ async def process_incoming_message(data: dict):
             phone=phone,
             clinica_id=clinica_id,
             media_type=media_type,
-            media_url=media_url,
-            caption=text
+            media_info=media_info,
+            message_id=message_id,
+            caption=text,
+            # Arquivo já decifrado, quando o S3 da Evolution está ligado
+            media_url_decifrada=message.get("mediaUrl")
         )
 
     # Registra mensagem no banco
@@ -350,26 +400,50 @@ async def handle_media(
     phone: str,
     clinica_id: str,
     media_type: str,
-    media_url: str,
-    caption: Optional[str]
+    media_info: dict,
+    message_id: Optional[str],
+    caption: Optional[str],
+    media_url_decifrada: Optional[str] = None
 ):
-    """Processa mídia recebida (provavelmente exame)."""
+    """
+    Processa mídia recebida (provavelmente exame).
+
+    O documento é criado na hora com a URL original; o arquivo vai para o
+    Storage pela ingestão (app/webhooks/midia.py), que troca arquivo_url
+    pelo caminho no Storage ou, se desistir, marca status falha_download.
+    """
     logger.info("Mídia recebida", paciente_id=paciente_id, media_type=media_type)
 
+    midia = Midia.da_mensagem(
+        media_info,
+        tipo=media_type,
+        url_decifrada=media_url_decifrada,
+        clinica_id=clinica_id,
+        message_id=message_id,
+        paciente_id=paciente_id,
+    )
+
     # Registra como documento do paciente
     db = get_admin_db()
-    await db.insert(
+    documento = await db.insert(
         table="pacientes_documentos",
         data={
             "clinica_id": clinica_id,
             "paciente_id": paciente_id,
             "tipo": "exame",
             "descricao": caption or "Exame enviado via WhatsApp",
-            "arquivo_url": media_url,
+            "arquivo_url": midia.url,
             "origem": "whatsapp",
             "status": "pendente_analise"
         }
     )
+    midia.documento_id = documento.get("id") if documento else None
+
+    # Copia para o Storage em segundo plano (streaming, decifra, hash, dedupe)
+    situacao = get_ingestao_midia().aceitar(midia)
+    if situacao == CHEIA:
+        logger.error("Fila de mídias cheia, arquivo não copiado", message_id=message_id)
+        await marcar_falha_documento(midia, "fila de mídias cheia")
 
     # Confirma recebimento
     await whatsapp_client.send_template(
@@ -390,7 +464,42 @@ async def handle_media(
             "prioridade": "baixa",
             "dados": {
                 "paciente_id": paciente_id,
-                "media_url": media_url
+                "documento_id": documento.get("id") if documento else None
             }
         }
     )
+
+
+# ==========================================
+# FILA DO WEBHOOK
+# ==========================================
+
+_fila_webhook: Optional[FilaWebhook] = None
+
+
+def get_fila_webhook() -> FilaWebhook:
+    """Fila da aplicação (workers sobem no primeiro evento)."""
+    global _fila_webhook
+    if _fila_webhook is None:
+        _fila_webhook = FilaWebhook(
+            processar_evento,
+            workers=settings.whatsapp_webhook_workers,
+            capacidade=settings.whatsapp_webhook_capacidade
+        )
+    return _fila_webhook
+
+
+async def encerrar_fila_webhook() -> None:
+    """Processa o que restou na fila e para os workers (shutdown)."""
+    if _fila_webhook is not None:
+        await _fila_webhook.encerrar()
+
+
+@router.get("/whatsapp/status", summary="Fila do webhook WhatsApp")
+async def webhook_whatsapp_status():
+    """Métricas da fila (recebidos, duplicados, recusados, tempos) e do roteamento."""
+    return {
+        **get_fila_webhook().get_metricas(),
+        "roteamento": roteamento.get_metricas(),
+        "midias": get_ingestao_midia().get_metricas(),
+    }
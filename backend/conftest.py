@@ -0,0 +1,11 @@
+"""
+Configuração do pytest para o backend.
+
+As configurações (app.core.config) exigem as credenciais do Supabase na
+importação; os testes não acessam o banco, então valores fictícios bastam.
+"""
+import os
+
+os.environ.setdefault("SUPABASE_URL", "https://teste.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "teste")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "teste")
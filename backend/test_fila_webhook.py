@@ -0,0 +1,84 @@
+"""
+Testes da fila do webhook do WhatsApp (app/webhooks/fila.py): ordem por
+telefone com telefones diferentes em paralelo, dedupe por message_id e
+contrapressão. A carga completa fica em app/webhooks/benchmark.py.
+"""
+import asyncio
+import random
+
+from app.webhooks.fila import ACEITO, CHEIA, DUPLICADO, FilaWebhook
+
+
+def test_ordem_por_telefone_e_paralelo_entre_telefones():
+    async def cenario():
+        aleatorio = random.Random(3)
+        processados: dict[str, list[int]] = {}
+        em_andamento: dict[str, int] = {}
+        simultaneos = {"por_telefone": 0, "total": 0}
+
+        async def processar(item: dict) -> None:
+            telefone = item["telefone"]
+            em_andamento[telefone] = em_andamento.get(telefone, 0) + 1
+            simultaneos["por_telefone"] = max(simultaneos["por_telefone"], em_andamento[telefone])
+            simultaneos["total"] = max(simultaneos["total"], sum(em_andamento.values()))
+            await asyncio.sleep(aleatorio.uniform(0, 0.003))
+            processados.setdefault(telefone, []).append(item["n"])
+            em_andamento[telefone] -= 1
+
+        fila = FilaWebhook(processar, workers=8)
+        fila.iniciar()
+        for n in range(20):
+            for t in range(6):
+                telefone = f"5511999990{t:03d}"
+                assert fila.aceitar(telefone, f"{telefone}:{n}", {"telefone": telefone, "n": n}) == ACEITO
+        await asyncio.wait_for(fila.esvaziar(), 5)
+        await fila.encerrar()
+        return processados, simultaneos
+
+    processados, simultaneos = asyncio.run(cenario())
+    assert len(processados) == 6
+    assert all(ns == list(range(20)) for ns in processados.values())
+    assert simultaneos["por_telefone"] == 1
+    assert simultaneos["total"] > 1
+
+
+def test_reenvio_do_mesmo_message_id_e_descartado():
+    async def cenario():
+        processados = []
+
+        async def processar(item: dict) -> None:
+            processados.append(item["message_id"])
+
+        fila = FilaWebhook(processar, workers=2)
+        fila.iniciar()
+        resultados = [
+            fila.aceitar("5511999990001", "msg-1", {"message_id": "msg-1"}),
+            fila.aceitar("5511999990001", "msg-1", {"message_id": "msg-1"}),
+            fila.aceitar("5511999990002", "msg-2", {"message_id": "msg-2"}),
+        ]
+        await asyncio.wait_for(fila.esvaziar(), 5)
+        # Reenvio depois de processado continua duplicado
+        resultados.append(fila.aceitar("5511999990001", "msg-1", {"message_id": "msg-1"}))
+        await fila.encerrar()
+        return resultados, processados, fila.get_metricas()
+
+    resultados, processados, metricas = asyncio.run(cenario())
+    assert resultados == [ACEITO, DUPLICADO, ACEITO, DUPLICADO]
+    assert sorted(processados) == ["msg-1", "msg-2"]
+    assert metricas["duplicados"] == 2
+
+
+def test_fila_cheia_recusa_sem_marcar_como_visto():
+    async def cenario():
+        fila = FilaWebhook(lambda item: asyncio.sleep(0), workers=1, capacidade=2)
+        # Sem workers: nada sai da fila
+        resultados = [fila.aceitar(f"55119999900{i:02d}", f"msg-{i}", {}) for i in range(3)]
+        fila.iniciar()
+        await asyncio.wait_for(fila.esvaziar(), 5)
+        # A Evolution reenvia o recusado: agora é aceito
+        resultados.append(fila.aceitar("5511999990002", "msg-2", {}))
+        await asyncio.wait_for(fila.esvaziar(), 5)
+        await fila.encerrar()
+        return resultados
+
+    assert asyncio.run(cenario()) == [ACEITO, ACEITO, CHEIA, ACEITO]
@@ -0,0 +1,163 @@
+"""
+Testes da outbox (app/core/outbox.py) com o servidor stub local:
+entrega em ordem por chave, retentativa com backoff, recusa permanente,
+dedupe e queda para memória só sem as RPCs.
+"""
+import asyncio
+import time
+
+from app.core.http import fechar_http_clients
+from app.core.outbox import (
+    ArmazemBanco,
+    ArmazemMemoria,
+    Evento,
+    Outbox,
+    OutboxIndisponivel,
+    _StubDestino,
+    criar_entregador_kestra,
+)
+
+CONFIG = dict(intervalo_s=0.01, max_lote=10, backoff_base_s=0.02, backoff_max_s=0.05, max_tentativas=3)
+
+
+async def _com_stub(cenario):
+    """Sobe o stub, roda o cenário com uma outbox ligada a ele e encerra tudo."""
+    stub = _StubDestino(latencia_ms=1)
+    url = await stub.iniciar()
+    outbox = Outbox(ArmazemMemoria(), **CONFIG)
+    outbox.registrar_destino("demo", criar_entregador_kestra(url))
+    try:
+        return await cenario(outbox, stub)
+    finally:
+        await outbox.encerrar()
+        await stub.encerrar()
+        await fechar_http_clients()
+
+
+async def _esperar(condicao, timeout_s: float = 5.0) -> None:
+    limite = time.monotonic() + timeout_s
+    while not condicao() and time.monotonic() < limite:
+        await asyncio.sleep(0.01)
+
+
+def test_entrega_na_ordem_por_chave_mesmo_com_falha_transitoria():
+    async def cenario(outbox, stub):
+        ids = {}
+        for n in range(8):
+            for chave in ("a", "b", "c"):
+                ids[(chave, n)] = await outbox.registrar(
+                    "demo", "evento", {"chave": chave, "n": n}, chave_ordem=chave
+                )
+        # Falha no meio da sequência de "a": os seguintes esperam a retentativa
+        stub.falhas[ids[("a", 2)]] = [503, 503]
+
+        await outbox.iniciar()
+        await _esperar(lambda: len(stub.recebidos) == 24)
+
+        por_chave = {}
+        for r in stub.recebidos:
+            por_chave.setdefault(r["chave"], []).append(r["n"])
+        assert por_chave == {chave: list(range(8)) for chave in ("a", "b", "c")}
+        assert stub.tentativas[ids[("a", 2)]] == 3
+        assert outbox.get_metricas()["retentativas"] == 2
+
+    asyncio.run(_com_stub(cenario))
+
+
+def test_desiste_apos_max_tentativas_e_nao_retenta_recusa_permanente():
+    async def cenario(outbox, stub):
+        transitorio = await outbox.registrar("demo", "evento", {"n": 1}, chave_ordem="x")
+        seguinte = await outbox.registrar("demo", "evento", {"n": 2}, chave_ordem="x")
+        recusado = await outbox.registrar("demo", "evento", {"n": 3}, chave_ordem="y")
+        stub.falhas[transitorio] = [503] * 10
+        stub.falhas[recusado] = [400]
+
+        await outbox.iniciar()
+        await _esperar(lambda: outbox.get_metricas()["falhas"] == 2 and stub.recebidos)
+
+        assert stub.tentativas[transitorio] == CONFIG["max_tentativas"]
+        assert stub.tentativas[recusado] == 1
+        # Desistido libera a chave: o seguinte é entregue
+        assert [r["id"] for r in stub.recebidos] == [seguinte]
+
+    asyncio.run(_com_stub(cenario))
+
+
+def test_dedupe_no_processo_e_no_armazenamento():
+    async def cenario(outbox, stub):
+        primeiro = await outbox.registrar("demo", "evento", {"n": 1}, chave_dedupe="agendamento:1")
+        assert await outbox.registrar("demo", "evento", {"n": 1}, chave_dedupe="agendamento:1") is None
+
+        # Outro processo com o mesmo armazenamento: o armazém descarta
+        segundo = Outbox(outbox.armazem, **CONFIG)
+        segundo.registrar_destino("demo", criar_entregador_kestra(stub.url))
+        aceitos = await segundo.registrar_lote([
+            Evento("demo", "evento", {"n": 1}, chave_dedupe="agendamento:1"),
+            Evento("demo", "evento", {"n": 2}, chave_dedupe="agendamento:2"),
+        ])
+        assert len(aceitos) == 1
+
+        await outbox.iniciar()
+        await segundo.iniciar()
+        await _esperar(lambda: len(stub.recebidos) == 2)
+        await asyncio.sleep(0.1)
+        await segundo.encerrar()
+
+        ids = [r["id"] for r in stub.recebidos]
+        assert sorted(ids) == sorted([primeiro, aceitos[0]])
+        assert segundo.get_metricas()["duplicados"] == 1
+
+    asyncio.run(_com_stub(cenario))
+
+
+def test_destino_nao_configurado_nao_grava():
+    async def cenario(outbox, stub):
+        assert await outbox.registrar("kestra", "evento", {}) is None
+        assert outbox.get_metricas()["sem_destino"] == 1
+        assert outbox.armazem.pendentes() == 0
+
+    asyncio.run(_com_stub(cenario))
+
+
+class _BancoFalhando:
+    def __init__(self, erro: Exception):
+        self.erro = erro
+
+    async def rpc(self, funcao: str, params: dict):
+        raise self.erro
+
+
+def test_memoria_so_quando_as_rpcs_nao_existem():
+    async def cenario():
+        ausente = Outbox(ArmazemBanco(_BancoFalhando(Exception("PGRST202: Could not find the function"))))
+        await ausente.iniciar()
+        fora = Outbox(ArmazemBanco(_BancoFalhando(TimeoutError("timeout"))))
+        await fora.iniciar()
+        modos = (ausente.armazem.modo, fora.armazem.modo)
+        await ausente.encerrar()
+        await fora.encerrar()
+        return modos
+
+    assert asyncio.run(cenario()) == ("memoria", "banco")
+
+
+def test_banco_fora_guarda_para_regravar_e_recusa_com_buffer_cheio(monkeypatch):
+    import app.core.outbox as modulo
+
+    async def cenario():
+        outbox = Outbox(ArmazemBanco(_BancoFalhando(TimeoutError("timeout"))))
+        outbox.registrar_destino("demo", criar_entregador_kestra("http://127.0.0.1:9"))
+        assert await outbox.registrar("demo", "evento", {"n": 1}) is not None
+        assert outbox.get_metricas()["nao_gravados"] == 1
+
+        monkeypatch.setattr(modulo, "MAX_PENDENTES", 1)
+        try:
+            await outbox.registrar("demo", "evento", {"n": 2})
+        except OutboxIndisponivel:
+            pass
+        else:
+            raise AssertionError("registrar deveria recusar com o buffer cheio")
+        assert outbox.get_metricas()["nao_gravados"] == 1
+        assert outbox.get_metricas()["recusados"] == 1
+
+    asyncio.run(cenario())
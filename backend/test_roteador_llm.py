@@ -0,0 +1,145 @@
+"""
+Testes do roteador de provedores de LLM (app/chat_langgraph/roteador_llm.py):
+failover, hedge e circuit breaker. As chamadas são simuladas em processo
+(executar recebe a função a rodar com cada provedor), sem rede.
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.chat_langgraph.roteador_llm import ProviderCompativelOpenAI, RoteadorLLM
+
+
+def _provider(nome: str) -> ProviderCompativelOpenAI:
+    return ProviderCompativelOpenAI(nome, "http://127.0.0.1:9", "modelo")
+
+
+def _chamada(comportamentos: dict, chamados: list):
+    """
+    Função para executar(): `comportamentos` mapeia o nome do provedor
+    para (atraso_s, erro ou None).
+    """
+    async def funcao(provider):
+        nome = provider.get_provider_name()
+        chamados.append(nome)
+        atraso_s, erro = comportamentos[nome]
+        await asyncio.sleep(atraso_s)
+        if erro:
+            raise erro
+        return nome
+
+    return funcao
+
+
+def test_failover_para_o_proximo_provedor():
+    roteador = RoteadorLLM([_provider("fora_do_ar"), _provider("reserva")])
+    chamados = []
+    funcao = _chamada({"fora_do_ar": (0, RuntimeError("HTTP 503")), "reserva": (0, None)}, chamados)
+
+    assert asyncio.run(roteador.executar(funcao)) == "reserva"
+    assert chamados == ["fora_do_ar", "reserva"]
+    assert roteador.metricas["failovers"] == 1
+    metricas = roteador.get_metricas()["providers"]
+    assert metricas["fora_do_ar:modelo"]["erros"] == 1
+    assert metricas["reserva:modelo"]["erros"] == 0
+
+    # Medido e sem erro, o reserva passa a ser o primeiro
+    chamados.clear()
+    assert asyncio.run(roteador.executar(funcao)) == "reserva"
+    assert chamados == ["reserva"]
+
+
+def test_sem_failover_quando_a_tentativa_ja_teve_efeito():
+    roteador = RoteadorLLM([_provider("principal"), _provider("reserva")])
+    chamados = []
+    funcao = _chamada({"principal": (0, RuntimeError("caiu no meio")), "reserva": (0, None)}, chamados)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(roteador.executar(funcao, pode_repetir=lambda: False))
+    assert chamados == ["principal"]
+
+
+def test_hedge_fica_com_a_primeira_resposta_e_mede_o_perdedor():
+    roteador = RoteadorLLM([_provider("lento"), _provider("rapido")], hedge=True, hedge_min_ms=50)
+    chamados = []
+    funcao = _chamada({"lento": (1.0, None), "rapido": (0.01, None)}, chamados)
+
+    inicio = time.perf_counter()
+    assert asyncio.run(roteador.executar(funcao)) == "rapido"
+    assert time.perf_counter() - inicio < 0.5
+    assert roteador.metricas["hedges"] == 1
+    assert roteador.metricas["hedges_vencedores"] == 1
+
+    # O perdedor cancelado conta como amostra (limite inferior), não como erro
+    lento = roteador.get_metricas()["providers"]["lento:modelo"]
+    assert lento["canceladas"] == 1
+    assert lento["erros"] == 0
+    assert lento["p50_ms"] >= 50
+    assert [e.chave for e in roteador._ordem()] == ["rapido:modelo", "lento:modelo"]
+
+
+def test_hedge_nao_dispara_quando_o_principal_responde_a_tempo():
+    roteador = RoteadorLLM([_provider("principal"), _provider("reserva")], hedge=True, hedge_min_ms=200)
+    chamados = []
+    funcao = _chamada({"principal": (0.01, None), "reserva": (0, None)}, chamados)
+
+    assert asyncio.run(roteador.executar(funcao)) == "principal"
+    assert chamados == ["principal"]
+    assert roteador.metricas["hedges"] == 0
+
+
+def test_circuit_breaker_abre_apos_falhas_seguidas_e_fecha_no_teste_meio_aberto():
+    roteador = RoteadorLLM([_provider("instavel")], falhas_para_abrir=3, espera_circuito_s=0.1)
+    instavel = roteador.estados[0]
+    comportamentos = {"instavel": (0, RuntimeError("HTTP 500"))}
+    chamados = []
+    funcao = _chamada(comportamentos, chamados)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            asyncio.run(roteador.executar(funcao))
+    assert instavel.circuito == "fechado"
+    with pytest.raises(RuntimeError):
+        asyncio.run(roteador.executar(funcao))
+    assert instavel.circuito == "aberto"
+    assert not instavel.disponivel()
+
+    # Meio-aberto: uma única chamada de teste por vez; sucesso fecha o circuito
+    time.sleep(0.15)
+    assert instavel.circuito == "meio_aberto"
+    instavel.iniciar()
+    assert not instavel.disponivel()
+    instavel.teste_em_andamento = False
+
+    comportamentos["instavel"] = (0, None)
+    assert asyncio.run(roteador.executar(funcao)) == "instavel"
+    assert instavel.circuito == "fechado"
+    assert instavel.falhas_seguidas == 0
+
+
+def test_circuito_aberto_fica_fora_da_ordem():
+    roteador = RoteadorLLM([_provider("instavel"), _provider("reserva")], falhas_para_abrir=1)
+    chamados = []
+    funcao = _chamada({"instavel": (0, RuntimeError("HTTP 500")), "reserva": (0, None)}, chamados)
+
+    assert asyncio.run(roteador.executar(funcao)) == "reserva"
+    assert roteador.estados[0].circuito == "aberto"
+    assert [e.chave for e in roteador._ordem()] == ["reserva:modelo"]
+
+
+def test_falha_no_meio_aberto_reabre_o_circuito():
+    roteador = RoteadorLLM([_provider("instavel")], falhas_para_abrir=2, espera_circuito_s=0.05)
+    chamados = []
+    funcao = _chamada({"instavel": (0, RuntimeError("HTTP 500"))}, chamados)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            asyncio.run(roteador.executar(funcao))
+    assert roteador.estados[0].circuito == "aberto"
+
+    time.sleep(0.08)
+    with pytest.raises(RuntimeError):
+        asyncio.run(roteador.executar(funcao))
+    assert roteador.estados[0].circuito == "aberto"
+    assert len(chamados) == 3